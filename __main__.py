@@ -0,0 +1,39 @@
+"""
+Command line entry point
+
+    python -m oneC_etl run company_products [--config env|airflow|path.json] [--force]
+"""
+
+import os
+import sys
+import json
+import argparse
+
+def main():
+    """Parse arguments and run requested command"""
+    parser = argparse.ArgumentParser(prog="python -m oneC_etl", description="oneC_etl pipelines without Airflow")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run pipeline in-process")
+    run_parser.add_argument("pipeline", help="Pipeline name from config/pipelines.py, e.g. company_products")
+    run_parser.add_argument(
+        "--config",
+        default=os.environ.get('ONEC_ETL_CONFIG', 'env'),
+        help="Configuration provider: 'env', 'airflow' or path to JSON file (default: env)"
+    )
+    run_parser.add_argument("--force", action="store_true", help="Run even if the PowerBI dataset was not refreshed")
+
+    args = parser.parse_args()
+
+    # Провайдер задаётся до импорта задач, чтобы все модули читали одну конфигурацию
+    from oneC_etl.config.provider import create_provider, set_provider
+    set_provider(create_provider(args.config))
+
+    from oneC_etl.tasks.pipeline import run_pipeline
+
+    summary = run_pipeline(args.pipeline, force=args.force)
+    print(json.dumps(summary, ensure_ascii=False, indent=2, default=str))
+    return 0 if summary['status'] in ('success', 'skipped') else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
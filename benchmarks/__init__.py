@@ -0,0 +1,3 @@
+"""
+Offline benchmarking tools: local service stand-ins and synthetic data
+"""
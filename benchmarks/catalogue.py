@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Synthetic CompanyProducts catalogue generator
+
+Produces realistic catalogues of configurable size (10k to millions of rows) with
+Cyrillic descriptions, brands, categories, Product_Properties strings in the
+"key: value | ..." format, UUID ids and optional embedding vectors. Products come
+in families (the same model in several finishes) so embeddings cluster like the
+real catalogue does.
+
+Rows are generated in chunks and written as a PowerBI executeQueries response,
+Parquet or a PostgreSQL COPY file, so every pipeline stage can be benchmarked at scale.
+"""
+
+import os
+import json
+import uuid
+import random
+import argparse
+from typing import Dict, Any, List, Iterator, Optional
+
+# Target column -> PowerBI result column, as in the CompanyProductsETL mapping
+POWERBI_COLUMNS = {
+    'id': 'CompanyProducts[ID]',
+    'description': 'CompanyProducts[Description]',
+    'brand': 'CompanyProducts[Brand]',
+    'category': 'CompanyProducts[Category]',
+    'withdrawn_from_range': 'CompanyProducts[Withdrawn_from_range]',
+    'item_number': 'CompanyProducts[item_number]',
+    'product_category': 'УТ_Товарные категории[_description]',
+    'on_order': 'УТ_РСвДополнительныеСведения2_0[Под заказ]',
+    'product_properties': '[Product_Properties]',
+}
+
+# Char_table result columns (characteristics as a long table, see tasks/properties.py)
+CHAR_TABLE_COLUMNS = ['Char_table[Артикул]', 'Char_table[_description]', 'Char_table[Значение]', 'Char_table[SortOrder]']
+
+# Columns of companyproducts written to COPY files
+COPY_COLUMNS = list(POWERBI_COLUMNS.keys()) + ['merged', 'is_vector']
+
+BRANDS = {
+    'Lemark': ('LM', 'Чехия'),
+    'Haiba': ('HB', 'Китай'),
+    'Avrora': ('AV', 'Россия'),
+    'Kaiser': ('KS', 'Германия'),
+    'Milardo': ('ML', 'Россия'),
+    'Iddis': ('ID', 'Россия'),
+    'Rossinka': ('RS', 'Россия'),
+    'Grohe': ('GR', 'Германия'),
+}
+
+# Category -> (product category, product types)
+CATEGORIES = {
+    'Смесители': ('Смесители для кухни', ['Смеситель для кухни', 'Смеситель для раковины', 'Смеситель для ванны', 'Смеситель для биде']),
+    'Запчасти для смесителей': ('Комплектующие', ['Излив в сборе', 'Кран-букса', 'Картридж', 'Переключатель - дивертор', 'Аэратор']),
+    'Душ': ('Душевые системы', ['Стойка душевая', 'Лейка душевая', 'Шланг душевой', 'Душевой гарнитур']),
+    'Аксессуары': ('Аксессуары для ванной', ['Держатель для полотенец', 'Мыльница', 'Крючок', 'Полка стеклянная']),
+    'Мойки': ('Мойки кухонные', ['Мойка кухонная', 'Мойка врезная', 'Мойка накладная']),
+}
+
+SERIES = ['Neo', 'Comfort', 'Vintage', 'Plus', 'Prime', 'Luna', 'Atlantiss', 'Status', 'Allegro', 'Bellario']
+FINISHES = ['хром', 'черный матовый', 'золото', 'белый', 'бронза', 'графит', 'нержавеющая сталь', 'хром/зол']
+MATERIALS = ['Латунь', 'Нержавеющая сталь', 'Пластик', 'Силумин', 'Гранит']
+INSTALLATION = ['На стену', 'На раковину', 'На борт ванны', 'Врезная']
+WARRANTY = ['1 год', '3 года', '4 года', '5 лет', '7 лет']
+
+def _product_family(rng: random.Random, index: int) -> Dict[str, Any]:
+    """Random product model shared by several finishes"""
+    brand = rng.choice(list(BRANDS))
+    category = rng.choice(list(CATEGORIES))
+    prefix, country = BRANDS[brand]
+    return {
+        'index': index,
+        'brand': brand,
+        'category': category,
+        'product_category': CATEGORIES[category][0],
+        'product_type': rng.choice(CATEGORIES[category][1]),
+        'series': rng.choice(SERIES),
+        # Код из номера семейства: артикулы уникальны при любом размере каталога (Char_table связывается по артикулу)
+        'code': f"{prefix}{index:07d}",
+        'country': country,
+        'material': rng.choice(MATERIALS),
+        'installation': rng.choice(INSTALLATION),
+        'warranty': rng.choice(WARRANTY),
+        'size': rng.choice([150, 200, 250, 300, 350, 810, 1200]),
+        'finishes': rng.sample(FINISHES, rng.randint(1, 4)),
+    }
+
+def _product_row(rng: random.Random, family: Dict[str, Any], finish: str) -> Dict[str, Any]:
+    """Product row in target column names"""
+    item_number = f"{family['code']}{FINISHES.index(finish)}"
+    description = (
+        f"\"{family['category']}\" {item_number} {family['product_type']} "
+        f"{family['series']} {family['size']} мм, {finish}"
+    )
+    properties = [
+        ('Бренд', family['brand']),
+        ('Материал', family['material']),
+        ('Цвет', finish.capitalize()),
+        ('Гарантия', family['warranty']),
+        ('Страна', family['country']),
+        ('Серия', f"Серия {family['series']}"),
+        ('Тип установки', family['installation']),
+        ('Товарная категория', family['product_category']),
+    ]
+    return {
+        'id': str(uuid.UUID(int=rng.getrandbits(128))),
+        'description': description,
+        'brand': family['brand'],
+        'category': family['category'],
+        'withdrawn_from_range': rng.random() < 0.1,
+        'item_number': item_number,
+        'product_category': family['product_category'],
+        'on_order': rng.random() < 0.2,
+        'product_properties': ' | '.join(f"{key}: {value}" for key, value in properties),
+        'family': family['index'],
+    }
+
+def merged_text(row: Dict[str, Any]) -> str:
+    """
+    Text used for embeddings: description | Brand | Category
+
+    Args:
+        row (dict): Product row in target column names
+
+    Returns:
+        str: Merged text in the format of companyproducts.merged
+    """
+    return f"{row['description']} | Brand: {row['brand']} | Category: {row['category']}"
+
+def generate_products(
+    count: int,
+    seed: int = 42,
+    chunk_size: int = 50000,
+    embedding_dim: Optional[int] = None,
+    first_family: int = 0
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Generate synthetic catalogue in chunks
+
+    Args:
+        count (int): Total number of products
+        seed (int): Random seed; the same seed always yields the same catalogue
+        chunk_size (int): Rows per yielded chunk
+        embedding_dim (int): If set, attach unit-length float32 'embedding' vectors
+        first_family (int): Number of the first product family (item numbers are derived from it)
+
+    Yields:
+        List[Dict[str, Any]]: Chunk of rows in target column names
+    """
+    rng = random.Random(seed)
+    category_vectors = None
+    if embedding_dim:
+        import numpy as np
+        vector_rng = np.random.default_rng(seed)
+        category_vectors = {
+            category: vector_rng.standard_normal(embedding_dim).astype(np.float32)
+            for category in CATEGORIES
+        }
+
+    produced = 0
+    family_index = first_family
+    while produced < count:
+        size = min(chunk_size, count - produced)
+        chunk = []
+        # Семейства не пересекают границы чанков, чтобы векторы считались по чанку целиком
+        while len(chunk) < size:
+            family = _product_family(rng, family_index)
+            family_index += 1
+            for finish in family['finishes'][:size - len(chunk)]:
+                chunk.append(_product_row(rng, family, finish))
+
+        if embedding_dim:
+            _attach_embeddings(chunk, category_vectors, np.random.default_rng([seed, produced]), embedding_dim)
+
+        produced += size
+        yield chunk
+
+def _attach_embeddings(chunk, category_vectors, vector_rng, embedding_dim) -> None:
+    """Attach clustered embeddings: category + family + per-finish noise"""
+    import numpy as np
+
+    families = {}
+    noise = vector_rng.standard_normal((len(chunk), embedding_dim)).astype(np.float32)
+    for i, row in enumerate(chunk):
+        if row['family'] not in families:
+            families[row['family']] = vector_rng.standard_normal(embedding_dim).astype(np.float32)
+        vector = 0.6 * category_vectors[row['category']] + 0.7 * families[row['family']] + 0.15 * noise[i]
+        row['embedding'] = vector / np.linalg.norm(vector)
+
+def mutate_catalogue(rows: List[Dict[str, Any]], change_rate: float, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Simulate catalogue changes between two extracts
+
+    A share of products get a new description and on_order flag; a tenth of the
+    changes are products dropping out of the extract and the same number are new products.
+
+    Args:
+        rows (list): Current catalogue rows in target column names
+        change_rate (float): Share of rows to change, 0..1
+        seed (int): Random seed
+
+    Returns:
+        List[Dict[str, Any]]: New catalogue rows (input rows are not modified)
+    """
+    rng = random.Random(seed)
+    changed = int(len(rows) * change_rate)
+    if not changed:
+        return list(rows)
+
+    result = [dict(row) for row in rows]
+    for i in rng.sample(range(len(result)), changed):
+        row = result[i]
+        row['description'] = f"{row['description']} (ред. {seed})"
+        row['on_order'] = not row['on_order']
+
+    # Часть изменений - товары, выпавшие из выгрузки, и новые товары
+    churn = max(1, changed // 10)
+    for i in sorted(rng.sample(range(len(result)), churn), reverse=True):
+        result.pop(i)
+    # Новые товары - новые семейства, их артикулы не совпадают с существующими
+    first_family = max((row['family'] for row in rows), default=-1) + 1
+    result.extend(next(generate_products(churn, seed=seed + 1_000_003, chunk_size=churn, first_family=first_family)))
+    return result
+
+def to_powerbi_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert product row to PowerBI executeQueries result row
+
+    Args:
+        row (dict): Product row in target column names
+
+    Returns:
+        dict: Row keyed by PowerBI column names
+    """
+    return {powerbi_column: row[column] for column, powerbi_column in POWERBI_COLUMNS.items()}
+
+def to_char_table_rows(powerbi_row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Char_table rows of a product, derived from its Product_Properties string
+
+    Args:
+        powerbi_row (dict): Product row keyed by PowerBI column names
+
+    Returns:
+        List[dict]: Rows keyed by CHAR_TABLE_COLUMNS
+    """
+    article_column, key_column, value_column, sort_column = CHAR_TABLE_COLUMNS
+    rows = []
+    for sort_order, prop in enumerate((powerbi_row.get(POWERBI_COLUMNS['product_properties']) or '').split(' | ')):
+        key, _, value = prop.partition(': ')
+        if key and value:
+            rows.append({
+                article_column: powerbi_row[POWERBI_COLUMNS['item_number']],
+                key_column: key,
+                value_column: value,
+                sort_column: sort_order,
+            })
+    return rows
+
+def write_powerbi_response(chunks: Iterator[List[Dict[str, Any]]], path: str) -> int:
+    """
+    Stream catalogue into executeQueries response JSON
+
+    Args:
+        chunks: Chunks from generate_products
+        path (str): Output file
+
+    Returns:
+        int: Number of rows written
+    """
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"results": [{"tables": [{"rows": [')
+        for chunk in chunks:
+            for row in chunk:
+                if written:
+                    f.write(',\n')
+                f.write(json.dumps(to_powerbi_row(row), ensure_ascii=False))
+                written += 1
+        f.write(']}]}]}')
+    return written
+
+def write_parquet(chunks: Iterator[List[Dict[str, Any]]], path: str) -> int:
+    """
+    Stream catalogue into Parquet file (one row group per chunk)
+
+    Args:
+        chunks: Chunks from generate_products
+        path (str): Output file
+
+    Returns:
+        int: Number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    written = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            columns = {column: [row[column] for row in chunk] for column in POWERBI_COLUMNS}
+            columns['merged'] = [merged_text(row) for row in chunk]
+            if 'embedding' in chunk[0]:
+                columns['embedding'] = pa.array([row['embedding'] for row in chunk], type=pa.list_(pa.float32()))
+            table = pa.table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            written += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+def write_copy(chunks: Iterator[List[Dict[str, Any]]], path: str) -> int:
+    """
+    Stream catalogue into COPY text file for companyproducts
+
+    The column list is COPY_COLUMNS, plus 'vector' when embeddings are generated:
+        COPY companyproducts (<columns>) FROM STDIN
+
+    Args:
+        chunks: Chunks from generate_products
+        path (str): Output file
+
+    Returns:
+        int: Number of rows written
+    """
+    from oneC_etl.services.postgres.client import copy_value
+
+    written = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            for row in chunk:
+                values = [row.get(column) for column in COPY_COLUMNS[:-2]]
+                values.append(merged_text(row))
+                if 'embedding' in row:
+                    values.append(True)
+                    values.append('[' + ','.join(f"{x:.6g}" for x in row['embedding']) + ']')
+                else:
+                    values.append(False)
+                f.write('\t'.join(copy_value(value) for value in values))
+                f.write('\n')
+                written += 1
+    return written
+
+WRITERS = {
+    'json': ('powerbi.json', write_powerbi_response),
+    'parquet': ('parquet', write_parquet),
+    'copy': ('copy.tsv', write_copy),
+}
+
+def main():
+    """Generate synthetic catalogue from command line"""
+    parser = argparse.ArgumentParser(description="Synthetic CompanyProducts catalogue generator")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50000)
+    parser.add_argument("--embedding-dim", type=int, default=None, help="Generate embeddings of this dimension")
+    parser.add_argument("--format", nargs='+', choices=list(WRITERS), default=['json'])
+    parser.add_argument("--out", default=os.path.join("data", "synthetic"))
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    for output_format in args.format:
+        suffix, writer = WRITERS[output_format]
+        path = os.path.join(args.out, f"CompanyProducts_{args.rows}.{suffix}")
+        chunks = generate_products(args.rows, args.seed, args.chunk_size, args.embedding_dim)
+        written = writer(chunks, path)
+        print(f"{output_format}: {written} rows -> {path}")
+
+if __name__ == '__main__':
+    main()
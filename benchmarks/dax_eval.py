@@ -0,0 +1,197 @@
+"""
+Minimal DAX evaluator for the PowerBI stand-in
+
+Evaluates the query shapes the extractor sends (SUMMARIZECOLUMNS with TREATAS and
+FILTER(ALL(column), LEFT(column, n) IN {...}) prefix filters, FILTER/KEEPFILTERS/TOPN
+wrappers, the ROW size probe, GROUPBY partition counts over columns or ADDCOLUMNS
+prefixes, DISTINCT/SELECTCOLUMNS) over in-memory rows keyed like executeQueries
+result columns. Other FILTER predicates and filters on columns the rows do not have
+are ignored: the stand-in is about result shape and size, not model semantics.
+"""
+
+from typing import Any, Callable, Dict, List
+from oneC_etl.utils.dax_parser import DaxQuery, Node, parse_query, summarize_columns_args
+
+Rows = List[Dict[str, Any]]
+
+def _column_key(node: Node) -> str:
+    return f"{node.table or ''}[{node.value}]"
+
+def _single(expr: Node) -> Node:
+    """Single item of an argument expression"""
+    if expr.kind == 'expr' and len(expr.children) == 1:
+        return _single(expr.children[0])
+    if expr.kind == 'paren':
+        return _single(expr.children[0])
+    return expr
+
+def _literal(node: Node) -> Any:
+    """Python value of a DAX literal"""
+    node = _single(node)
+    if node.kind == 'string':
+        return node.value
+    if node.kind == 'number':
+        value = float(node.value)
+        return int(value) if value.is_integer() else value
+    if node.kind == 'call' and node.value in ('TRUE', 'FALSE') and not node.children:
+        return node.value == 'TRUE'
+    if node.kind == 'call' and node.value == 'BLANK':
+        return None
+    raise ValueError(f"Unsupported literal: {node}")
+
+class DaxEvaluator:
+    """Evaluates a parsed query over base rows"""
+
+    def __init__(self, query: DaxQuery, source: Callable[[List[str]], Rows]):
+        """
+        Args:
+            query (DaxQuery): Parsed query
+            source (callable): Base rows for a list of requested column keys
+        """
+        self.query = query
+        self.source = source
+        self.variables: Dict[str, Any] = {}
+
+    def variable(self, name: str) -> Any:
+        if name not in self.variables:
+            self.variables[name] = self.table(self.query.variables[name])
+        return self.variables[name]
+
+    def table(self, node: Node) -> Rows:
+        """Evaluate table expression"""
+        node = _single(node)
+        if node.kind == 'ident' and node.value in self.query.variables:
+            return self.variable(node.value)
+        if node.kind != 'call':
+            raise ValueError(f"Unsupported table expression: {node}")
+
+        args = node.children
+        if node.value == 'SUMMARIZECOLUMNS':
+            return self.summarize_columns(node)
+        if node.value in ('FILTER', 'KEEPFILTERS'):
+            return self.table(args[0])
+        if node.value == 'TOPN':
+            return self.table(args[1])[:int(_literal(args[0]))]
+        if node.value == 'DISTINCT':
+            return self.distinct(self.table(args[0]))
+        if node.value == 'SELECTCOLUMNS':
+            rows = self.table(args[0])
+            projections = [(f"[{_literal(name)}]", _column_key(_single(expr))) for name, expr in zip(args[1::2], args[2::2])]
+            return [{name: row.get(key) for name, key in projections} for row in rows]
+        if node.value == 'ADDCOLUMNS':
+            rows = self.table(args[0])
+            columns = [(f"[{_literal(name)}]", expr) for name, expr in zip(args[1::2], args[2::2])]
+            return [dict(row, **{name: self.row_value(expr, row) for name, expr in columns}) for row in rows]
+        if node.value == 'GROUPBY':
+            return self.group_by(node)
+        if node.value == 'ROW':
+            return [{f"[{_literal(name)}]": self.scalar(expr) for name, expr in zip(args[0::2], args[1::2])}]
+        raise ValueError(f"Unsupported table function: {node.value}")
+
+    def scalar(self, node: Node) -> Any:
+        """Evaluate scalar expression (COUNTROWS or literal)"""
+        node = _single(node)
+        if node.kind == 'call' and node.value == 'COUNTROWS':
+            return len(self.table(node.children[0]))
+        return _literal(node)
+
+    def row_value(self, node: Node, row: Dict[str, Any]) -> Any:
+        """Evaluate row-context expression (column reference, LEFT or literal)"""
+        node = _single(node)
+        if node.kind == 'column':
+            return row.get(_column_key(node))
+        if node.kind == 'call' and node.value == 'LEFT':
+            value = self.row_value(node.children[0], row)
+            # LEFT от BLANK() даёт пустую строку
+            return '' if value is None else str(value)[:int(_literal(node.children[1]))]
+        return _literal(node)
+
+    def row_predicate(self, node: Node, row: Dict[str, Any]) -> bool:
+        """Evaluate <expression> IN {...} or <expression> = <expression> predicate"""
+        items = node.children if node.kind == 'expr' else [node]
+        if len(items) == 3 and items[1].kind == 'ident' and items[1].value.upper() == 'IN' and items[2].kind == 'braces':
+            return self.row_value(items[0], row) in {_literal(value) for value in items[2].children}
+        if len(items) == 3 and items[1].kind == 'op' and items[1].value == '=':
+            return self.row_value(items[0], row) == self.row_value(items[2], row)
+        raise ValueError(f"Unsupported predicate: {node}")
+
+    @staticmethod
+    def distinct(rows: Rows) -> Rows:
+        seen = {}
+        for row in rows:
+            seen.setdefault(tuple(row.values()), row)
+        return list(seen.values())
+
+    def summarize_columns(self, node: Node) -> Rows:
+        args = summarize_columns_args(node)
+        keys = [_column_key(column) for column in args['group_by']]
+        keys.extend(f"[{name}]" for name, _ in args['extensions'])
+        rows = self.source(keys)
+
+        # Фильтры TREATAS и FILTER(ALL(column), ...) по колонкам, которые есть в строках
+        for filter_expr in args['filters']:
+            call = _single(filter_expr)
+            if call.kind == 'ident' and call.value in self.query.variables:
+                call = _single(self.query.variables[call.value])
+            if call.kind != 'call' or call.value not in ('TREATAS', 'FILTER') or len(call.children) != 2:
+                continue
+            if call.value == 'FILTER':
+                table = _single(call.children[0])
+                if table.kind != 'call' or table.value != 'ALL' or len(table.children) != 1:
+                    continue
+                column = _single(table.children[0])
+                if column.kind != 'column' or (rows and _column_key(column) not in rows[0]):
+                    continue
+                rows = [row for row in rows if self.row_predicate(call.children[1], row)]
+                continue
+            values_node = _single(call.children[0])
+            column = _single(call.children[1])
+            if values_node.kind != 'braces' or column.kind != 'column':
+                continue
+            key = _column_key(column)
+            if rows and key not in rows[0]:
+                continue
+            values = {_literal(value) for value in values_node.children}
+            rows = [row for row in rows if row.get(key) in values]
+
+        group_keys = [_column_key(column) for column in args['group_by']]
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(tuple(row.get(key) for key in group_keys), {key: row.get(key) for key in keys})
+        return list(grouped.values())
+
+    def group_by(self, node: Node) -> Rows:
+        rows = self.table(node.children[0])
+        keys = []
+        names = []
+        for arg in node.children[1:]:
+            item = _single(arg)
+            if item.kind == 'column':
+                keys.append(_column_key(item))
+            elif item.kind == 'string':
+                names.append(f"[{item.value}]")
+        counts = {}
+        for row in rows:
+            group = tuple(row.get(key) for key in keys)
+            counts[group] = counts.get(group, 0) + 1
+        # Вычисляемые поля GROUPBY считаются как число строк группы (SUMX(CURRENTGROUP(), 1))
+        return [dict(dict(zip(keys, group)), **{name: count for name in names}) for group, count in counts.items()]
+
+def evaluate(query: str, source: Callable[[List[str]], Rows]) -> Rows:
+    """
+    Evaluate single-EVALUATE DAX query
+
+    Args:
+        query (str): DAX query
+        source (callable): Returns base rows for the requested column keys
+
+    Returns:
+        Rows: Result rows keyed like executeQueries columns
+
+    Raises:
+        ValueError: If the query uses unsupported constructs
+    """
+    parsed = parse_query(query)
+    if len(parsed.evaluates) != 1:
+        raise ValueError("Expected exactly one EVALUATE")
+    return DaxEvaluator(parsed, source).table(parsed.evaluates[0])
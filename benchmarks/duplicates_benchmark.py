@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate detection benchmark
+
+Builds a memory-mapped index (vector_search/memmap.py) from the synthetic
+catalogue, whose product families come in up to four finishes with nearly the
+same vector, and runs the duplicate detection of tasks/duplicates.py on it
+(no database). Reports the time of the k-means partitioning, of the neighbour
+graph and of the union-find, and the quality of the groups:
+
+    pair precision / recall - pairs of products grouped together against pairs
+                              of the same family (the known duplicates)
+    graph recall            - pairs above the threshold found by exact search for
+                              a sample of products that ended up in one group
+
+Example:
+    python -m oneC_etl.benchmarks.duplicates_benchmark --rows 1000000 --embedding-dim 256
+"""
+
+import json
+import time
+import tempfile
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+from oneC_etl.benchmarks.catalogue import generate_products
+
+def build_index(path: str, rows: int, embedding_dim: int, seed: int = 42):
+    """
+    Synthetic catalogue in a memory-mapped index
+
+    Args:
+        path (str): Index directory
+        rows (int): Catalogue size
+        embedding_dim (int): Vector dimensions
+        seed (int): Catalogue seed
+
+    Returns:
+        Tuple[MemmapVectorIndex, np.ndarray]: Saved index and product family per row
+    """
+    from oneC_etl.vector_search.memmap import MemmapVectorIndex
+
+    index = MemmapVectorIndex(path)
+    families: List[int] = []
+    for chunk in generate_products(rows, seed, embedding_dim=embedding_dim):
+        index.upsert([{'id': row['id'], 'description': row['description'], 'brand': row['brand'],
+                       'category': row['category'], 'vector': row['embedding']} for row in chunk])
+        families.extend(row['family'] for row in chunk)
+    index.save()
+    return index, np.array(families, dtype=np.int64)
+
+def _pairs(labels: np.ndarray) -> int:
+    """Number of unordered pairs sharing a label"""
+    sizes = np.unique(labels, return_counts=True)[1].astype(np.int64)
+    return int((sizes * (sizes - 1) // 2).sum())
+
+def pair_quality(groups: Dict[str, np.ndarray], families: np.ndarray) -> Dict[str, Any]:
+    """
+    Pair precision and recall of the groups against product families
+
+    Args:
+        groups (dict): Groups from tasks.duplicates.duplicate_groups
+        families (np.ndarray): Family per matrix row
+
+    Returns:
+        dict: expected, found and correct pairs, precision, recall
+    """
+    expected = _pairs(families)
+    found = _pairs(groups['group'])
+    # Верные пары - пары внутри пересечения (группа, семейство)
+    correct = _pairs(groups['group'] * (int(families.max()) + 1) + families[groups['row']]) if len(groups['row']) else 0
+    return {
+        'expected_pairs': expected,
+        'found_pairs': found,
+        'correct_pairs': correct,
+        'precision': round(correct / found, 4) if found else None,
+        'recall': round(correct / expected, 4) if expected else None,
+    }
+
+def graph_recall(index, groups: Dict[str, np.ndarray], threshold: float, samples: int, k: int,
+                 same_category: bool, seed: int = 42) -> float:
+    """Share of exact above-threshold neighbours of sampled products that share their group"""
+    group_of = np.full(index.count, -1, dtype=np.int64)
+    group_of[groups['row']] = groups['group']
+    sample = np.random.default_rng(seed).choice(index.count, min(samples, index.count), replace=False)
+    best_rows, _, best_similarity = index.top_k(
+        np.asarray(index.vectors[sample]), k,
+        query_categories=[index.categories[row] for row in sample] if same_category else None,
+        exclude_rows=sample, category_weight=0.5 if same_category else 0.0
+    )
+    hits = total = 0
+    for row, neighbours, similarity in zip(sample, best_rows, best_similarity):
+        for neighbour, sim in zip(neighbours, similarity):
+            if neighbour < 0 or sim < threshold:
+                continue
+            if same_category and index.categories[neighbour] != index.categories[row]:
+                continue
+            total += 1
+            hits += int(group_of[row] >= 0 and group_of[row] == group_of[neighbour])
+    return round(hits / total, 4) if total else 1.0
+
+def main():
+    """Run benchmark from command line"""
+    parser = argparse.ArgumentParser(description="Near-duplicate detection benchmark")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--embedding-dim", type=int, default=256)
+    parser.add_argument("--threshold", type=float, default=0.96)
+    parser.add_argument("--partitions", type=int, default=None, help="Default: sqrt(rows)")
+    parser.add_argument("--probes", type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument("--max-neighbours", type=int, default=10)
+    parser.add_argument("--any-category", action='store_true', help="Also group products of different categories")
+    parser.add_argument("--samples", type=int, default=2000, help="Products checked against exact search")
+    parser.add_argument("--index-path", default=None, help="Index directory (default: temporary)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default='duplicates_bench.json')
+    args = parser.parse_args()
+
+    from oneC_etl.tasks.duplicates import detect_duplicates
+
+    same_category = not args.any_category
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        started = time.perf_counter()
+        index, families = build_index(args.index_path or tmp_dir, args.rows, args.embedding_dim, args.seed)
+        build_s = time.perf_counter() - started
+        print(f"index: {index.count} rows x {args.embedding_dim} built in {build_s:.1f} s")
+
+        runs = []
+        for probes in args.probes:
+            task_config = {'threshold': args.threshold, 'partitions': args.partitions, 'probes': probes,
+                           'max_neighbours': args.max_neighbours, 'same_category': same_category,
+                           'seed': args.seed}
+            started = time.perf_counter()
+            groups, stats = detect_duplicates(index, task_config)
+            total_s = time.perf_counter() - started
+            run = {
+                **stats,
+                'union_find_s': round(total_s - stats['partition_s'] - stats['graph_s'], 3),
+                'total_s': round(total_s, 3),
+                **pair_quality(groups, families),
+                'graph_recall': graph_recall(index, groups, args.threshold, args.samples, args.max_neighbours,
+                                             same_category, args.seed),
+            }
+            runs.append(run)
+            print(f"  probes {probes}: {run['total_s']} s (partitions {run['partition_s']} s, graph {run['graph_s']} s, "
+                  f"union-find {run['union_find_s']} s), {run['groups']} groups, precision {run['precision']}, "
+                  f"recall {run['recall']}, graph recall {run['graph_recall']}")
+
+    results = {
+        'created_at': datetime.utcnow().isoformat(),
+        'rows': args.rows,
+        'embedding_dim': args.embedding_dim,
+        'threshold': args.threshold,
+        'build_s': round(build_s, 1),
+        'runs': runs,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, default=str)
+    print(f"Results saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Local embedding API stand-in
+
+Serves an OpenAI-compatible POST /v1/embeddings endpoint so the embedding stage can
+be run and benchmarked without an API key. Vectors are deterministic unit-length
+pseudo-random vectors seeded by the input text, so the same text always gets the
+same vector. Latency, throttling, error rates and the per-request input/token
+limits of the real API are configurable.
+
+Point OpenAIEmbeddingProvider at the stand-in with Airflow Variables:
+    embedding_api_url = http://127.0.0.1:8766/v1
+    embedding_api_key = standin-key
+"""
+
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional
+
+# Default stand-in configuration
+DEFAULT_STANDIN_CONFIG = {
+    'dimensions': 1536,         # Vector dimensions (text-embedding-ada-002)
+    'seed': 42,                 # Seed mixed into per-text vectors and fault simulation
+    'latency_ms': 0,            # Fixed latency per request
+    'latency_per_1k_tokens_ms': 0,  # Additional latency per 1000 input tokens
+    'throttle_rate': 0.0,       # Share of requests answered with 429
+    'retry_after': 1,           # Retry-After header for throttled responses, seconds
+    'error_rate': 0.0,          # Share of requests answered with 500
+    'max_inputs': 2048,         # Inputs per request limit of the real API
+    'max_tokens': 300000,       # Tokens per request limit of the real API
+}
+
+EMBEDDINGS_PATH = "/v1/embeddings"
+
+def text_tokens(text: str) -> int:
+    """Token estimate used for limits and usage (~2 characters per token for Cyrillic text)"""
+    return max(1, math.ceil(len(text) / 2))
+
+def text_vector(text: str, dimensions: int, seed: int = 42) -> List[float]:
+    """
+    Deterministic unit-length vector for text
+
+    Args:
+        text (str): Input text
+        dimensions (int): Vector dimensions
+        seed (int): Seed mixed into the text hash
+
+    Returns:
+        List[float]: Vector
+    """
+    digest = hashlib.sha256(f"{seed}:{text}".encode('utf-8')).digest()
+    rng = random.Random(int.from_bytes(digest[:8], 'big'))
+    vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [round(x / norm, 7) for x in vector]
+
+class EmbeddingStandin:
+    """Stateful embedding API stand-in with request statistics"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize stand-in
+
+        Args:
+            config (dict): Overrides for DEFAULT_STANDIN_CONFIG
+        """
+        self.config = dict(DEFAULT_STANDIN_CONFIG, **(config or {}))
+        self.rng = random.Random(self.config['seed'])
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'inputs': 0, 'tokens': 0, 'throttled': 0, 'errors': 0, 'rejected': 0}
+
+    def fault(self) -> Optional[int]:
+        """Pick simulated fault status for request, if any"""
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.config['throttle_rate']:
+            return 429
+        if roll < self.config['throttle_rate'] + self.config['error_rate']:
+            return 500
+        return None
+
+    def count(self, key: str, amount: int = 1) -> None:
+        """Increment request statistics counter"""
+        with self.lock:
+            self.stats[key] += amount
+
+    def embeddings_response(self, body: Dict[str, Any]):
+        """
+        Build /embeddings response
+
+        Args:
+            body (dict): Request body with 'input' (string or list) and 'model'
+
+        Returns:
+            Tuple[int, dict, int]: HTTP status, response body, input tokens
+        """
+        inputs = body.get('input')
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        if not isinstance(inputs, list) or not inputs or not all(isinstance(text, str) for text in inputs):
+            return 400, {"error": {"message": "'input' must be a string or a non-empty list of strings"}}, 0
+
+        tokens = sum(text_tokens(text) for text in inputs)
+        if len(inputs) > self.config['max_inputs'] or tokens > self.config['max_tokens']:
+            return 400, {"error": {"message": f"Request too large: {len(inputs)} inputs, {tokens} tokens"}}, tokens
+
+        data = [
+            {"object": "embedding", "index": i, "embedding": text_vector(text, self.config['dimensions'], self.config['seed'])}
+            for i, text in enumerate(inputs)
+        ]
+        return 200, {
+            "object": "list",
+            "data": data,
+            "model": body.get('model'),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }, tokens
+
+def make_handler(standin: EmbeddingStandin):
+    """
+    Create request handler class bound to stand-in state
+
+    Args:
+        standin (EmbeddingStandin): Stand-in state
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass
+    """
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Не засоряем вывод бенчмарков логами каждого запроса
+            pass
+
+        def _send_json(self, status: int, body, headers: Optional[Dict[str, str]] = None) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length", 0))
+            return self.rfile.read(length) if length else b""
+
+        def do_POST(self):
+            path = self.path.split('?', 1)[0]
+            body = self._read_body()
+
+            if path != EMBEDDINGS_PATH:
+                self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+                return
+
+            standin.count('requests')
+            status = standin.fault()
+            if status == 429:
+                standin.count('throttled')
+                self._send_json(429, {"error": {"message": "Rate limit reached"}}, {"Retry-After": str(standin.config['retry_after'])})
+                return
+            if status == 500:
+                standin.count('errors')
+                self._send_json(500, {"error": {"message": "Internal error"}})
+                return
+
+            try:
+                request = json.loads(body)
+            except ValueError:
+                request = {}
+            status, response, tokens = standin.embeddings_response(request)
+            if status != 200:
+                standin.count('rejected')
+                self._send_json(status, response)
+                return
+
+            delay_ms = standin.config['latency_ms'] + standin.config['latency_per_1k_tokens_ms'] * tokens / 1000
+            if delay_ms:
+                time.sleep(delay_ms / 1000)
+            standin.count('inputs', len(response['data']))
+            standin.count('tokens', tokens)
+            self._send_json(200, response)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == "/standin/stats":
+                with standin.lock:
+                    self._send_json(200, dict(standin.stats))
+                return
+            self._send_json(404, {"error": {"message": f"Unknown path {path}"}})
+
+    return StandinHandler
+
+def start_standin(config: Optional[Dict[str, Any]] = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Start stand-in server in a background thread
+
+    Args:
+        config (dict): Overrides for DEFAULT_STANDIN_CONFIG
+        host (str): Interface to bind
+        port (int): Port to bind, 0 for a free port
+
+    Returns:
+        Tuple[ThreadingHTTPServer, EmbeddingStandin]: Running server and its state;
+            stop with server.shutdown()
+    """
+    standin = EmbeddingStandin(config)
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, standin
+
+def standin_variables(server) -> Dict[str, str]:
+    """
+    Airflow Variables pointing OpenAIEmbeddingProvider at a running stand-in
+
+    Args:
+        server (ThreadingHTTPServer): Running stand-in server
+
+    Returns:
+        Dict[str, str]: Variable names and values
+    """
+    host, port = server.server_address[:2]
+    return {
+        'embedding_api_url': f"http://{host}:{port}/v1",
+        'embedding_api_key': 'standin-key',
+    }
+
+def main():
+    """Run stand-in server from command line"""
+    parser = argparse.ArgumentParser(description="Local embedding API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--dimensions", type=int, default=DEFAULT_STANDIN_CONFIG['dimensions'])
+    parser.add_argument("--seed", type=int, default=DEFAULT_STANDIN_CONFIG['seed'])
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-per-1k-tokens-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=DEFAULT_STANDIN_CONFIG['retry_after'])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-inputs", type=int, default=DEFAULT_STANDIN_CONFIG['max_inputs'])
+    parser.add_argument("--max-tokens", type=int, default=DEFAULT_STANDIN_CONFIG['max_tokens'])
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key in DEFAULT_STANDIN_CONFIG}
+    server, standin = start_standin(config, args.host, args.port)
+
+    print(f"Embedding stand-in listening on http://{args.host}:{server.server_address[1]}")
+    for name, value in standin_variables(server).items():
+        print(f"  {name} = {value}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
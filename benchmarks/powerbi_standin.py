@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Local PowerBI REST API stand-in
+
+Serves the token, executeQueries and refresh history endpoints so extraction can be
+benchmarked and regression-tested without Azure credentials. Responses are either
+synthetic rows of configurable size or a recorded executeQueries response, with
+configurable latency, throttling and error rates. Synthetic responses are computed
+from the DAX query (benchmarks/dax_eval.py): SUMMARIZECOLUMNS columns of products
+or Char_table rows, TREATAS partitions, the size probe and partition counts.
+
+Point PowerBIClient at the stand-in with Airflow Variables:
+    powerbi_api_url   = http://127.0.0.1:8765/v1.0/myorg
+    powerbi_token_url = http://127.0.0.1:8765/{tenant_id}/oauth2/v2.0/token
+"""
+
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, List, Optional, Tuple
+
+from oneC_etl.benchmarks.catalogue import generate_products, to_powerbi_row, to_char_table_rows
+from oneC_etl.benchmarks.dax_eval import evaluate
+from oneC_etl.utils.dax_parser import check_summarize_columns, parse_query
+
+# Default stand-in configuration
+DEFAULT_STANDIN_CONFIG = {
+    'rows': 1000,               # Number of synthetic rows per executeQueries response
+    'seed': 42,                 # Seed for synthetic data
+    'response_file': None,      # Recorded executeQueries response to serve instead of synthetic rows
+    'latency_ms': 0,            # Fixed latency per request
+    'latency_per_1k_rows_ms': 0,  # Additional latency per 1000 returned rows
+    'throttle_rate': 0.0,       # Share of requests answered with 429
+    'retry_after': 1,           # Retry-After header for throttled responses, seconds
+    'error_rate': 0.0,          # Share of requests answered with 500
+    'max_rows': 100000,         # executeQueries row limit of the real service
+    'max_values': 1000000,      # executeQueries value limit of the real service
+}
+
+# Serialized responses kept per query; partitioned extraction sends many distinct queries
+PAYLOAD_CACHE_SIZE = 32
+
+EXECUTE_QUERIES_PATH = re.compile(r"^/v1\.0/myorg/groups/[^/]+/datasets/(?P<dataset_id>[^/]+)/executeQueries$")
+REFRESHES_PATH = re.compile(r"^/v1\.0/myorg/groups/[^/]+/datasets/(?P<dataset_id>[^/]+)/refreshes$")
+TOKEN_PATH = re.compile(r"^/[^/]+/oauth2(/v2\.0)?/token$")
+
+def synthetic_rows(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Generate synthetic CompanyProducts rows in executeQueries format
+
+    Args:
+        count (int): Number of rows
+        seed (int): Random seed
+
+    Returns:
+        List[Dict[str, Any]]: Rows keyed like PowerBI result columns
+    """
+    return [to_powerbi_row(row) for chunk in generate_products(count, seed) for row in chunk]
+
+class PowerBIStandin:
+    """Stateful PowerBI stand-in with request statistics"""
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        """
+        Initialize stand-in
+
+        Args:
+            config (dict): Overrides for DEFAULT_STANDIN_CONFIG
+        """
+        self.config = dict(DEFAULT_STANDIN_CONFIG, **(config or {}))
+        self.rng = random.Random(self.config['seed'])
+        self.lock = threading.Lock()
+        self.stats = {
+            'token': 0, 'execute_queries': 0, 'refreshes': 0, 'throttled': 0, 'errors': 0,
+            'rows_served': 0, 'bytes_served': 0,
+        }
+        self.refreshes = [self._make_refresh(datetime.utcnow() - timedelta(hours=1))]
+        self._payload_cache = OrderedDict()
+        self._payload_generation = 0
+        self._rows_override = None
+
+    def _make_refresh(self, end_time: datetime) -> Dict[str, Any]:
+        """Build refresh history entry in PowerBI format"""
+        return {
+            "requestId": str(uuid.uuid4()),
+            "refreshType": "Scheduled",
+            "startTime": (end_time - timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "endTime": end_time.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "status": "Completed"
+        }
+
+    def trigger_refresh(self) -> Dict[str, Any]:
+        """Simulate completed dataset refresh"""
+        with self.lock:
+            refresh = self._make_refresh(datetime.utcnow())
+            self.refreshes.insert(0, refresh)
+            return refresh
+
+    def set_rows(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Replace served rows, e.g. with a mutated catalogue between benchmark runs
+
+        Args:
+            rows (list): Rows keyed like PowerBI result columns
+        """
+        with self.lock:
+            self._rows_override = rows
+            self._payload_cache.clear()
+            self._payload_generation += 1
+
+    def _rows(self) -> List[Dict[str, Any]]:
+        """Rows to serve: explicitly set rows, recorded response or synthetic catalogue"""
+        if self._rows_override is not None:
+            return self._rows_override
+        if self.config['response_file']:
+            with open(self.config['response_file'], 'r', encoding='utf-8') as f:
+                return json.load(f)['results'][0]['tables'][0]['rows']
+        return synthetic_rows(self.config['rows'], self.config['seed'])
+
+    @staticmethod
+    def _source_rows(rows: List[Dict[str, Any]], keys: List[str]) -> List[Dict[str, Any]]:
+        """Product or Char_table rows projected to requested result columns"""
+        if any(key.startswith('Char_table[') for key in keys):
+            rows = [char_row for row in rows for char_row in to_char_table_rows(row)]
+        return [{key: row.get(key) for key in keys} for row in rows]
+
+    @staticmethod
+    def check_query(query: Optional[str]) -> None:
+        """
+        Reject queries the service would fail to execute
+
+        Raises:
+            ValueError: If SUMMARIZECOLUMNS arguments are out of order
+        """
+        if not query:
+            return
+        try:
+            parsed = parse_query(query)
+        except ValueError:
+            # Конструкции, которые парсер не поддерживает, не проверяем
+            return
+        check_summarize_columns(parsed)
+
+    def execute_queries_payload(self, query: Optional[str] = None) -> Tuple[bytes, int]:
+        """
+        Serialized executeQueries response, truncated to service limits like the real API
+
+        Args:
+            query (str): DAX query; synthetic rows are evaluated against it
+
+        Returns:
+            Tuple[bytes, int]: JSON response body and number of rows in it
+        """
+        with self.lock:
+            if query in self._payload_cache:
+                self._payload_cache.move_to_end(query)
+                return self._payload_cache[query]
+            generation = self._payload_generation
+            rows = self._rows_override
+
+        # Ответ считается вне блокировки: параллельные запросы не ждут друг друга
+        if rows is None:
+            rows = self._rows()
+        if query and not self.config['response_file']:
+            try:
+                rows = evaluate(query, lambda keys: self._source_rows(rows, keys))
+            except ValueError:
+                pass
+        columns = len(rows[0]) if rows else 1
+        limit = min(self.config['max_rows'] or len(rows), (self.config['max_values'] or len(rows) * columns) // columns)
+        rows = rows[:limit]
+        body = {"results": [{"tables": [{"rows": rows}]}]}
+        payload = (json.dumps(body, ensure_ascii=False).encode('utf-8'), len(rows))
+
+        with self.lock:
+            # Ответ по строкам, заменённым set_rows во время расчёта, не кэшируем
+            if generation == self._payload_generation:
+                self._payload_cache[query] = payload
+                self._payload_cache.move_to_end(query)
+                while len(self._payload_cache) > PAYLOAD_CACHE_SIZE:
+                    self._payload_cache.popitem(last=False)
+        return payload
+
+    def fault(self) -> Optional[int]:
+        """Pick simulated fault status for request, if any"""
+        with self.lock:
+            roll = self.rng.random()
+        if roll < self.config['throttle_rate']:
+            return 429
+        if roll < self.config['throttle_rate'] + self.config['error_rate']:
+            return 500
+        return None
+
+    def count(self, key: str, amount: int = 1) -> None:
+        """Increment request statistics counter"""
+        with self.lock:
+            self.stats[key] += amount
+
+def make_handler(standin: PowerBIStandin):
+    """
+    Create request handler class bound to stand-in state
+
+    Args:
+        standin (PowerBIStandin): Stand-in state
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass
+    """
+    class StandinHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            # Не засоряем вывод бенчмарков логами каждого запроса
+            pass
+
+        def _send_json(self, status: int, body, headers: Optional[Dict[str, str]] = None) -> None:
+            payload = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _read_body(self) -> bytes:
+            length = int(self.headers.get("Content-Length", 0))
+            return self.rfile.read(length) if length else b""
+
+        def _check_fault(self) -> bool:
+            status = standin.fault()
+            if status == 429:
+                standin.count('throttled')
+                self._send_json(429, {"error": {"code": "TooManyRequests"}}, {"Retry-After": str(standin.config['retry_after'])})
+                return True
+            if status == 500:
+                standin.count('errors')
+                self._send_json(500, {"error": {"code": "InternalServerError"}})
+                return True
+            return False
+
+        def do_POST(self):
+            path = self.path.split('?', 1)[0]
+            body = self._read_body()
+
+            if TOKEN_PATH.match(path):
+                standin.count('token')
+                self._send_json(200, {"token_type": "Bearer", "expires_in": 3599, "access_token": "standin-token"})
+                return
+
+            if path == "/standin/refresh":
+                self._send_json(200, standin.trigger_refresh())
+                return
+
+            if path == "/standin/rows":
+                # Строки для stand-in в отдельном процессе (benchmarks/pipeline_benchmark.py)
+                rows = json.loads(body)
+                standin.set_rows(rows)
+                self._send_json(200, {"rows": len(rows)})
+                return
+
+            if EXECUTE_QUERIES_PATH.match(path):
+                standin.count('execute_queries')
+                if self._check_fault():
+                    return
+                try:
+                    query = json.loads(body)['queries'][0]['query']
+                except (ValueError, KeyError, IndexError, TypeError):
+                    query = None
+                try:
+                    standin.check_query(query)
+                except ValueError as error:
+                    self._send_json(400, {"error": {"code": "DatasetExecuteQueriesError", "message": str(error)}})
+                    return
+                payload, rows = standin.execute_queries_payload(query)
+                delay_ms = standin.config['latency_ms'] + standin.config['latency_per_1k_rows_ms'] * rows / 1000
+                if delay_ms:
+                    time.sleep(delay_ms / 1000)
+                standin.count('rows_served', rows)
+                standin.count('bytes_served', len(payload))
+                self._send_json(200, payload)
+                return
+
+            self._send_json(404, {"error": {"code": "NotFound", "path": path}})
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+
+            if REFRESHES_PATH.match(path):
+                standin.count('refreshes')
+                if self._check_fault():
+                    return
+                with standin.lock:
+                    refreshes = list(standin.refreshes)
+                self._send_json(200, {"value": refreshes})
+                return
+
+            if path == "/standin/stats":
+                with standin.lock:
+                    self._send_json(200, dict(standin.stats))
+                return
+
+            self._send_json(404, {"error": {"code": "NotFound", "path": path}})
+
+    return StandinHandler
+
+def start_standin(config: Optional[Dict[str, Any]] = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Start stand-in server in a background thread
+
+    Args:
+        config (dict): Overrides for DEFAULT_STANDIN_CONFIG
+        host (str): Interface to bind
+        port (int): Port to bind, 0 for a free port
+
+    Returns:
+        Tuple[ThreadingHTTPServer, PowerBIStandin]: Running server and its state;
+            stop with server.shutdown()
+    """
+    standin = PowerBIStandin(config)
+    server = ThreadingHTTPServer((host, port), make_handler(standin))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, standin
+
+def standin_variables(server, tenant_id: str = "standin-tenant") -> Dict[str, str]:
+    """
+    Airflow Variables pointing PowerBIClient at a running stand-in
+
+    Args:
+        server (ThreadingHTTPServer): Running stand-in server
+        tenant_id (str): Tenant ID to report
+
+    Returns:
+        Dict[str, str]: Variable names and values
+    """
+    host, port = server.server_address[:2]
+    base = f"http://{host}:{port}"
+    return {
+        'powerbi_client_id': 'standin-client',
+        'powerbi_client_secret': 'standin-secret',
+        'powerbi_tenant_id': tenant_id,
+        'powerbi_workspace_id': 'standin-workspace',
+        'powerbi_api_url': f"{base}/v1.0/myorg",
+        'powerbi_token_url': f"{base}/{{tenant_id}}/oauth2/v2.0/token",
+    }
+
+def main():
+    """Run stand-in server from command line"""
+    parser = argparse.ArgumentParser(description="Local PowerBI REST API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rows", type=int, default=DEFAULT_STANDIN_CONFIG['rows'])
+    parser.add_argument("--seed", type=int, default=DEFAULT_STANDIN_CONFIG['seed'])
+    parser.add_argument("--response-file", default=None, help="Recorded executeQueries response JSON")
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--latency-per-1k-rows-ms", type=float, default=0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=DEFAULT_STANDIN_CONFIG['retry_after'])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rows", type=int, default=DEFAULT_STANDIN_CONFIG['max_rows'])
+    parser.add_argument("--max-values", type=int, default=DEFAULT_STANDIN_CONFIG['max_values'])
+    parser.add_argument("--config", default=None, help="JSON object with configuration overrides (applied last)")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key in DEFAULT_STANDIN_CONFIG}
+    if args.config:
+        config.update(json.loads(args.config))
+    server, standin = start_standin(config, args.host, args.port)
+
+    print(f"PowerBI stand-in listening on http://{args.host}:{server.server_address[1]}")
+    for name, value in standin_variables(server).items():
+        print(f"  {name} = {value}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -8,7 +8,7 @@ import sys
 import os
 from datetime import datetime, timedelta
 from airflow import DAG
-from airflow.operators.python import PythonOperator
+from airflow.operators.python import PythonOperator, ShortCircuitOperator
 from airflow.models import Variable
 
 # 🎯 КРИТИЧЕСКИ ВАЖНО: Настройка путей для utils.logger
@@ -22,6 +22,11 @@ from utils.logger import get_logger
 # Создаем logger для конкретного DAG'а
 logger = get_logger("company_products_etl", "oneC_etl")
 
+# Конфигурация задач общая для DAG и запуска без Airflow (python -m oneC_etl run company_products)
+from oneC_etl.config.pipelines import get_pipeline
+
+pipeline = get_pipeline('company_products')
+
 # Настройка DAG
 default_args = {
     'owner': 'airflow',
@@ -39,9 +44,28 @@ dag = DAG(
     description='ETL процесс для извлечения данных о товарах компании из Power BI и загрузки в PostgreSQL',
     schedule_interval='35 4-13 * * 1-5',  # Пн-Пт каждые 35 минут с 4:00 до 13:00 UTC (9:00-18:00 UTC+5)
     catchup=False,
-    tags=['etl', 'powerbi', 'postgres', 'company_products', 'product_properties']
+    tags=['etl', 'powerbi', 'postgres', 'company_products', 'product_properties', 'embeddings']
 )
 
+def check_dataset_refresh_task(**context):
+    """Проверка, обновлялся ли датасет Power BI с прошлой загрузки"""
+    try:
+        logger.info("🔄 Проверяем историю обновлений датасета Power BI...")
+        
+        from oneC_etl.tasks.refresh_check import check_dataset_refresh
+        
+        # Принудительный запуск без проверки: Variable company_products_force_run = true
+        force = Variable.get('company_products_force_run', default_var='false').lower() == 'true'
+        result = check_dataset_refresh(dict(pipeline['refresh_check'], force=force))
+        context['ti'].xcom_push(key='refresh_check', value=result)
+        
+        # False пропускает все последующие задачи
+        return result['changed']
+        
+    except Exception as e:
+        logger.exception(f"❌ Ошибка проверки обновления датасета: {str(e)}")
+        raise
+
 def extract_powerbi_data_task(**context):
     """Извлечение данных о товарах из Power BI через DAX"""
     try:
@@ -49,26 +73,8 @@ def extract_powerbi_data_task(**context):
         
         from oneC_etl.tasks.extract import extract_powerbi_data
         
-        # Конфигурация задачи согласно документации
-        task_config = {
-            'dataset_id': '022e7796-b30f-44d4-b076-15331e612d47',  # 1cExportDataset (правильный датасет)
-            'dax_query': 'company_products',  # Загружается из Airflow Variables
-            'columns': {
-                'CompanyProducts[ID]': 'id',
-                'CompanyProducts[Description]': 'description',
-                'CompanyProducts[Brand]': 'brand',
-                'CompanyProducts[Category]': 'category',
-                'CompanyProducts[Withdrawn_from_range]': 'withdrawn_from_range',
-                'CompanyProducts[item_number]': 'item_number',
-                '[Product_Properties]': 'product_properties',
-                'УТ_Товарные категории[_description]': 'product_category',
-                'УТ_РСвДополнительныеСведения2_0[Под заказ]': 'on_order',
-                'Выводится_без_остатков': 'is_vector',
-                'CountRowsУТ_РСвДополнительныеСведения2_0': 'count_rows'
-            }
-        }
-        
-        result = extract_powerbi_data(task_config)
+        # Файлы spill пишутся в каталог запуска и удаляются задачей remove_spill_files
+        result = extract_powerbi_data(dict(pipeline['extract'], run_id=context['run_id']))
         return result
         
     except Exception as e:
@@ -80,27 +86,17 @@ def load_to_postgres_task(**context):
     try:
         logger.info("🔄 Начинаем загрузку данных в PostgreSQL...")
         
-        from oneC_etl.tasks.load import execute_etl_task
+        from oneC_etl.tasks.load import load_extracted_rows
         
         # Получаем данные из предыдущей задачи
         ti = context['ti']
+        # В режиме spill в XCom передаётся путь к файлу выгрузки, строки читаются из него пакетами
         data = ti.xcom_pull(task_ids='extract_powerbi_data')
         
         if data is None:
             raise ValueError("Нет данных для загрузки")
         
-        # Преобразуем список словарей в pandas DataFrame
-        import pandas as pd
-        df = pd.DataFrame(data)
-        
-        # Конфигурация загрузки согласно документации
-        task_config = {
-            'source_table': 'powerbi_company_products',
-            'target_table': 'companyproducts',
-            'mapping_name': 'company_products'
-        }
-        
-        result = execute_etl_task(df, task_config)
+        result = load_extracted_rows(data, pipeline['load'])
         return result
         
     except Exception as e:
@@ -108,44 +104,41 @@ def load_to_postgres_task(**context):
         raise
 
 
+def load_product_properties_task(**context):
+    """Загрузка характеристик товаров из Char_table в product_properties"""
+    try:
+        logger.info("🔄 Начинаем загрузку характеристик товаров...")
+        
+        from oneC_etl.tasks.properties import load_product_properties
+        
+        ti = context['ti']
+        # В режиме spill в XCom передаётся путь к файлу выгрузки
+        data = ti.xcom_pull(task_ids='extract_powerbi_data')
+        
+        if data is None:
+            raise ValueError("Нет данных о товарах для сопоставления характеристик")
+        
+        result = load_product_properties(data, dict(pipeline['properties'], run_id=context['run_id']))
+        if result.get('status') != 'success':
+            raise RuntimeError(result.get('error'))
+        return result
+        
+    except Exception as e:
+        logger.exception(f"❌ Ошибка загрузки характеристик: {str(e)}")
+        raise
+
 
 def validate_data_task(**context):
     """Валидация загруженных данных о товарах"""
     try:
         logger.info("🔄 Начинаем валидацию данных о товарах...")
         
-        from oneC_etl.services.postgres.client import PostgresClient
+        from oneC_etl.tasks.validate import validate_products
         
-        db_client = PostgresClient()
+        result = validate_products(pipeline['validate']['target_table'])
         
-        # Проверяем количество загруженных товаров
-        products_query = """
-        SELECT 
-            COUNT(*) as total_products,
-            COUNT(CASE WHEN description IS NOT NULL THEN 1 END) as products_with_description,
-            COUNT(CASE WHEN brand IS NOT NULL THEN 1 END) as products_with_brand,
-            COUNT(CASE WHEN category IS NOT NULL THEN 1 END) as products_with_category,
-            COUNT(CASE WHEN item_number IS NOT NULL THEN 1 END) as products_with_item_number
-        FROM companyproducts
-        """
-        
-        products_result = db_client.execute_query(products_query)
-        
-        if products_result:
-            products_stats = products_result[0]
-            
-            # Проверяем качество данных
-            validation_status = "success"
-            if products_stats['total_products'] == 0:
-                validation_status = "error"
-                logger.error("❌ В таблице нет товаров")
-            elif products_stats['products_with_description'] == 0:
-                validation_status = "warning"
-                logger.warning("⚠️ У товаров нет описаний")
-            elif products_stats['products_with_brand'] == 0:
-                logger.warning("⚠️ У товаров нет брендов")
-            else:
-                logger.info("✅ Данные о товарах загружены корректно")
+        if 'products' in result:
+            products_stats = result['products']
             
             # Получаем результаты очистки из предыдущей задачи
             ti = context['ti']
@@ -154,12 +147,7 @@ def validate_data_task(**context):
             if cleanup_result and cleanup_result.get('status') == 'success':
                 logger.info(f"🗑️ Очистка: удалено {cleanup_result.get('deleted_records', 0)} устаревших записей")
             
-            result = {
-                "status": validation_status,
-                "products": products_stats,
-                "cleanup": cleanup_result,
-                "message": f"Проверено {products_stats['total_products']} товаров"
-            }
+            result["cleanup"] = cleanup_result
             
             # Добавляем итоговую строку
             logger.info("🎯 ========================================")
@@ -168,11 +156,8 @@ def validate_data_task(**context):
             if cleanup_result and cleanup_result.get('status') == 'success':
                 logger.info(f"   - Удалено устаревших: {cleanup_result.get('deleted_records', 0)}")
             logger.info("🎯 ========================================")
-            
-            return result
-        else:
-            logger.warning("⚠️ Не удалось получить результаты валидации")
-            return {"status": "error", "message": "Validation failed"}
+        
+        return result
         
     except Exception as e:
         logger.exception(f"❌ Ошибка валидации: {str(e)}")
@@ -187,26 +172,86 @@ def cleanup_orphaned_records_task(**context):
         
         # Получаем данные из предыдущей задачи
         ti = context['ti']
+        # В режиме spill в XCom передаётся путь к файлу выгрузки, ключи читаются из него построчно
         data = ti.xcom_pull(task_ids='extract_powerbi_data')
         
         if data is None:
             raise ValueError("Нет данных для очистки")
         
-        # Конфигурация очистки
-        cleanup_config = {
-            'source_table': 'powerbi_company_products',
-            'target_table': 'companyproducts',
-            'key_column': 'id'  # Используем 'id' как в PowerBI данных
-        }
-        
-        result = cleanup_orphaned_records(data, cleanup_config)
+        result = cleanup_orphaned_records(data, pipeline['cleanup'])
         return result
         
     except Exception as e:
         logger.exception(f"❌ Ошибка очистки устаревших записей: {str(e)}")
         raise
 
+def generate_embeddings_task(**context):
+    """Расчёт векторов для товаров с is_vector = false"""
+    try:
+        logger.info("🔄 Начинаем расчёт векторов товаров...")
+        
+        from oneC_etl.tasks.embed import generate_embeddings
+        
+        # Задача ничего не делает, если enable_vector_updates выключен в powerbi_etl_config
+        result = generate_embeddings(pipeline['embed'])
+        if result.get('status') == 'failed':
+            raise RuntimeError(result.get('error') or "Не удалось рассчитать векторы")
+        return result
+        
+    except Exception as e:
+        logger.exception(f"❌ Ошибка расчёта векторов: {str(e)}")
+        raise
+
+def compute_similarities_task(**context):
+    """Пересчёт похожих товаров для товаров с изменёнными векторами"""
+    try:
+        logger.info("🔄 Начинаем расчёт похожих товаров...")
+        
+        from oneC_etl.tasks.similarities import compute_product_similarities
+        
+        result = compute_product_similarities(pipeline['similarities'])
+        if result.get('status') == 'failed':
+            raise RuntimeError(result.get('error') or "Не удалось рассчитать похожие товары")
+        return result
+        
+    except Exception as e:
+        logger.exception(f"❌ Ошибка расчёта похожих товаров: {str(e)}")
+        raise
+
+def mark_refresh_processed_task(**context):
+    """Сохранение обработанного обновления датасета Power BI"""
+    try:
+        from oneC_etl.tasks.refresh_check import mark_refresh_processed
+        
+        ti = context['ti']
+        refresh_check = ti.xcom_pull(task_ids='check_dataset_refresh', key='refresh_check')
+        
+        return mark_refresh_processed(refresh_check, pipeline['refresh_check'])
+        
+    except Exception as e:
+        logger.exception(f"❌ Ошибка сохранения состояния обновления: {str(e)}")
+        raise
+
+def remove_spill_files_task(**context):
+    """Удаление файлов выгрузки spill запуска (выполняется и после сбоя задач)"""
+    try:
+        from oneC_etl.tasks.extract import remove_spill
+        
+        return remove_spill(context['run_id'])
+        
+    except Exception as e:
+        logger.exception(f"❌ Ошибка удаления файлов выгрузки: {str(e)}")
+        raise
+
 # Создание задач согласно архитектуре из документации
+check_refresh_operator = ShortCircuitOperator(
+    task_id='check_dataset_refresh',
+    python_callable=check_dataset_refresh_task,
+    # Пропускается только извлечение (и по цепочке загрузка), векторизация выполняется по своему trigger_rule
+    ignore_downstream_trigger_rules=False,
+    dag=dag
+)
+
 extract_operator = PythonOperator(
     task_id='extract_powerbi_data',
     python_callable=extract_powerbi_data_task,
@@ -219,7 +264,11 @@ load_operator = PythonOperator(
     dag=dag
 )
 
-
+properties_operator = PythonOperator(
+    task_id='load_product_properties',
+    python_callable=load_product_properties_task,
+    dag=dag
+)
 
 validate_operator = PythonOperator(
     task_id='validate_data',
@@ -233,12 +282,49 @@ cleanup_operator = PythonOperator(
     dag=dag
 )
 
+embed_operator = PythonOperator(
+    task_id='generate_embeddings',
+    python_callable=generate_embeddings_task,
+    # Выполняется и при пропуске загрузки (датасет не обновлялся), но не после её сбоя
+    trigger_rule='none_failed',
+    dag=dag
+)
+
+similarities_operator = PythonOperator(
+    task_id='compute_product_similarities',
+    python_callable=compute_similarities_task,
+    dag=dag
+)
+
+mark_refresh_operator = PythonOperator(
+    task_id='mark_refresh_processed',
+    python_callable=mark_refresh_processed_task,
+    dag=dag
+)
+
+remove_spill_operator = PythonOperator(
+    task_id='remove_spill_files',
+    python_callable=remove_spill_files_task,
+    trigger_rule='all_done',
+    dag=dag
+)
+
 # Настройка зависимостей согласно потоку данных:
+# 0. Проверка обновления датасета (пропуск запуска, если данные не менялись)
 # 1. Извлечение данных из Power BI через DAX
 # 2. Загрузка в таблицу companyproducts
-# 3. Валидация загруженных данных о товарах
-# 4. Очистка устаревших записей
-extract_operator >> load_operator >> validate_operator >> cleanup_operator
+# 3. Загрузка характеристик из Char_table в product_properties
+# 4. Валидация загруженных данных о товарах
+# 5. Очистка устаревших записей
+# 6. Сохранение обработанного обновления датасета
+# 7. Расчёт векторов для новых и изменённых товаров (параллельно с 6: сбой API эмбеддингов
+#    не откладывает отметку обновления). Запускается и когда 0 пропускает загрузку, поэтому
+#    невекторизованные строки подхватит следующий запуск DAG, а не следующее обновление датасета
+# 8. Пересчёт похожих товаров для изменённых векторов
+# 9. Удаление файлов выгрузки запуска (после всех задач, в том числе упавших)
+check_refresh_operator >> extract_operator >> load_operator >> properties_operator >> validate_operator >> cleanup_operator >> mark_refresh_operator
+cleanup_operator >> embed_operator >> similarities_operator
+[mark_refresh_operator, similarities_operator] >> remove_spill_operator
 
 if __name__ == "__main__":
     dag.cli()
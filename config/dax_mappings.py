@@ -107,6 +107,14 @@ ORDER BY
     """
 }
 
+# Target column types (everything else is TEXT)
+COLUMN_TYPES = {
+    'id': 'UUID',
+    'withdrawn_from_range': 'BOOLEAN',
+    'on_order': 'BOOLEAN',
+    'is_vector': 'BOOLEAN',
+}
+
 DAX_MAPPINGS = {
     'company_products': {
         'query': DAX_QUERIES['COMPANY_PRODUCTS_ETL_QUERY'],
@@ -157,4 +165,16 @@ def get_dax_mapping(mapping_name: str) -> dict:
     """
     if mapping_name not in DAX_MAPPINGS:
         raise KeyError(f"DAX mapping '{mapping_name}' not found")
-    return DAX_MAPPINGS[mapping_name] 
\ No newline at end of file
+    return DAX_MAPPINGS[mapping_name] 
+
+def get_column_type(column_name: str) -> str:
+    """
+    Get PostgreSQL type of target column
+
+    Args:
+        column_name (str): Target column name
+
+    Returns:
+        str: Column type (UUID, BOOLEAN or TEXT)
+    """
+    return COLUMN_TYPES.get(column_name, 'TEXT')
@@ -0,0 +1,125 @@
+"""
+Pipeline definitions
+This file contains task configurations shared by the Airflow DAGs and the
+in-process runner (python -m oneC_etl run <pipeline>).
+"""
+
+COMPANY_PRODUCTS_DATASET_ID = '022e7796-b30f-44d4-b076-15331e612d47'  # 1cExportDataset
+
+PIPELINES = {
+    'company_products': {
+        'refresh_check': {
+            'dataset_id': COMPANY_PRODUCTS_DATASET_ID,
+            'state_table': 'etl_refresh_state'  # database/sql/create_etl_refresh_state_table.sql
+        },
+        'extract': {
+            'dataset_id': COMPANY_PRODUCTS_DATASET_ID,
+            'dax_query': 'company_products',  # Загружается из переменной dax_queries
+            'columns': {
+                'CompanyProducts[ID]': 'id',
+                'CompanyProducts[Description]': 'description',
+                'CompanyProducts[Brand]': 'brand',
+                'CompanyProducts[Category]': 'category',
+                'CompanyProducts[Withdrawn_from_range]': 'withdrawn_from_range',
+                'CompanyProducts[item_number]': 'item_number',
+                'УТ_Товарные категории[_description]': 'product_category',
+                'УТ_РСвДополнительныеСведения2_0[Под заказ]': 'on_order'
+            },
+            # is_vector выставляет загрузчик, count_rows не используется - из запроса не выгружаем
+            'pushdown_columns': True,
+            # Пробный COUNTROWS выбирает разбиение по partition_keys и выгрузку на диск (см. extract_spill_* в powerbi_etl_config)
+            'plan_extraction': True
+        },
+        'load': {
+            'source_table': 'powerbi_company_products',
+            'target_table': 'companyproducts',
+            'mapping_name': 'company_products'
+        },
+        # Характеристики выгружаются из Char_table длинной таблицей, а не строкой
+        # [Product_Properties] (CONCATENATEX по каждому товару)
+        'properties': {
+            'dataset_id': COMPANY_PRODUCTS_DATASET_ID,
+            'dax_query': 'char_table',  # Загружается из переменной dax_queries
+            'columns': {
+                'Char_table[Артикул]': 'article',
+                'Char_table[_description]': 'prop_key',
+                'Char_table[Значение]': 'prop_value',
+                'Char_table[SortOrder]': 'sort_order'
+            },
+            'plan_extraction': True,
+            'target_table': 'product_properties',
+            'products_table': 'companyproducts',
+            'product_key': 'item_number'
+        },
+        'validate': {
+            'target_table': 'companyproducts'
+        },
+        # Векторы для строк с is_vector = false (включается enable_vector_updates в powerbi_etl_config)
+        'embed': {
+            'target_table': 'companyproducts',
+            'batch_tokens': 50000,  # Токенов в одном запросе к API эмбеддингов
+            'batch_inputs': 500,    # Текстов в одном запросе
+            'concurrency': 4,       # Параллельных запросов
+            'write_rows': 5000,     # Векторов на одну запись COPY + UPDATE
+            'max_rows': None,
+            'ensure_index': True,
+            'partial_indexes': True,  # Частичные ANN индексы крупнейших категорий для поиска с фильтром
+            'cache_table': 'embedding_cache',  # database/sql/create_embedding_cache_table.sql
+            # Больше 1 - параллельные воркеры через очередь (database/sql/create_embedding_queue_table.sql)
+            'workers': 1,
+            'queue_table': 'embedding_queue',
+            'claim_rows': 500,      # Товаров в одном пакете воркера
+            'lease_seconds': 300,   # Аренда пакета: после неё пакет упавшего воркера забирает другой
+            'max_attempts': 5,      # Отказов API по товару, после которых он ждёт следующего запуска
+            'retry_seconds': 5,     # Пауза после сбоя API или базы, удваивается при сбоях подряд
+            'max_retry_seconds': 300,
+            'max_failures': 10      # Сбоев подряд, после которых воркер останавливается и запуск завершается ошибкой
+        },
+        # Похожие товары по векторам (database/sql/create_product_similarities_table.sql)
+        'similarities': {
+            'target_table': 'product_similarities',
+            'products_table': 'companyproducts',
+            'index_path': None,          # Матрица векторов, по умолчанию data/vector_index
+            'k': 20,                     # Похожих товаров на товар
+            'category_weight': 0.3,
+            'exclude_same_brand': False,
+            'tile_rows': 1024,           # Товаров в одном умножении на матрицу
+            'write_products': 50000      # Списков на одну запись COPY + DELETE/INSERT
+        },
+        'duplicates': {
+            'target_table': 'product_duplicates',
+            'products_table': 'companyproducts',
+            'index_path': None,          # Матрица векторов, по умолчанию data/vector_index
+            'threshold': 0.96,           # Минимальное сходство пары дубликатов
+            'partitions': None,          # Разделов k-means, по умолчанию sqrt(число товаров)
+            'probes': 2,                 # Ближайших разделов, просматриваемых для товара
+            'max_neighbours': 10,        # Соседей товара в одном разделе
+            'same_category': True,       # Дубликаты только внутри категории
+            'kmeans_iterations': 10,
+            'tile_rows': 1024,           # Товаров в одном умножении на раздел
+            'block_rows': 16384          # Строк раздела в одном блоке умножения
+        },
+        'cleanup': {
+            'source_table': 'powerbi_company_products',
+            'target_table': 'companyproducts',
+            'key_column': 'id'  # Используем 'id' как в PowerBI данных
+        }
+    }
+}
+
+def get_pipeline(pipeline_name: str) -> dict:
+    """
+    Get pipeline configuration by name
+
+    Args:
+        pipeline_name (str): Name of the pipeline to retrieve
+
+    Returns:
+        dict: Task configurations keyed by stage
+
+    Raises:
+        KeyError: If pipeline not found
+    """
+    if pipeline_name not in PIPELINES:
+        raise KeyError(f"Pipeline '{pipeline_name}' not found")
+    return PIPELINES[pipeline_name]
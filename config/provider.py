@@ -0,0 +1,257 @@
+"""
+Pluggable configuration provider
+
+All configuration reads go through get_variable(), which mirrors Airflow's
+Variable.get() signature but is backed by one of the providers below:
+
+- AirflowConfigProvider: Airflow Variables (imported lazily, default inside Airflow)
+- EnvConfigProvider: ONEC_ETL_<NAME> or AIRFLOW_VAR_<NAME> environment variables
+- FileConfigProvider: JSON file with variable names as keys
+
+The provider is selected with the ONEC_ETL_CONFIG environment variable:
+'airflow' (default), 'env', or a path to a JSON file.
+
+Values are cached per process with per-key TTLs, so each variable costs one
+backend (metastore) read and one JSON decode per TTL. Cached values are shared
+between callers and must be treated as read-only.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, Optional
+
+# Маркер отсутствия значения по умолчанию (как в Variable.get)
+_NO_DEFAULT = object()
+# Маркер отсутствующей переменной в кэше
+_MISSING = object()
+
+# Default cache TTL in seconds
+DEFAULT_VARIABLE_TTL = 300
+
+# Per-variable cache TTLs in seconds (0 disables caching)
+VARIABLE_TTLS = {
+    'dax_queries': 600,
+    'datasets': 600,
+    'postgres_connection': 3600,
+    'powerbi_client_id': 3600,
+    'powerbi_client_secret': 3600,
+    'powerbi_tenant_id': 3600,
+    'powerbi_workspace_id': 3600,
+    'powerbi_api_url': 3600,
+    'powerbi_token_url': 3600,
+    'powerbi_etl_config': 300,
+}
+
+class ConfigProvider:
+    """Base configuration provider"""
+
+    name = "base"
+
+    def _get_raw(self, key: str) -> Optional[Any]:
+        """
+        Get raw value of variable
+
+        Args:
+            key (str): Variable name
+
+        Returns:
+            Any: Stored value or None if the variable is not set
+        """
+        raise NotImplementedError
+
+    def get(self, key: str, default_var: Any = _NO_DEFAULT, deserialize_json: bool = False) -> Any:
+        """
+        Get variable value
+
+        Args:
+            key (str): Variable name
+            default_var (Any): Value returned when the variable is not set
+            deserialize_json (bool): Decode stored value as JSON
+
+        Returns:
+            Any: Variable value
+
+        Raises:
+            KeyError: If the variable is not set and no default is given
+        """
+        value = self._get_raw(key)
+        if value is None:
+            if default_var is _NO_DEFAULT:
+                raise KeyError(f"Variable {key} does not exist in {self.name} config")
+            return default_var
+
+        if deserialize_json:
+            return json.loads(value) if isinstance(value, (str, bytes)) else value
+        if not isinstance(value, str):
+            return json.dumps(value, ensure_ascii=False)
+        return value
+
+class AirflowConfigProvider(ConfigProvider):
+    """Airflow Variables provider"""
+
+    name = "airflow"
+
+    def get(self, key: str, default_var: Any = _NO_DEFAULT, deserialize_json: bool = False) -> Any:
+        from airflow.models import Variable
+
+        if default_var is _NO_DEFAULT:
+            return Variable.get(key, deserialize_json=deserialize_json)
+        return Variable.get(key, default_var=default_var, deserialize_json=deserialize_json)
+
+class EnvConfigProvider(ConfigProvider):
+    """Environment variables provider (ONEC_ETL_<NAME>, then AIRFLOW_VAR_<NAME>)"""
+
+    name = "env"
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        name = key.upper()
+        value = os.environ.get(f"ONEC_ETL_{name}")
+        if value is None:
+            value = os.environ.get(f"AIRFLOW_VAR_{name}")
+        return value
+
+class FileConfigProvider(ConfigProvider):
+    """JSON file provider"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        """
+        Initialize provider
+
+        Args:
+            path (str): JSON file with variable names as keys
+        """
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            self.values: Dict[str, Any] = json.load(f)
+
+    def _get_raw(self, key: str) -> Optional[Any]:
+        return self.values.get(key)
+
+_provider: Optional[ConfigProvider] = None
+
+_cache_lock = threading.Lock()
+# (key, deserialize_json) -> (value or _MISSING, expires_at)
+_cache: Dict[tuple, tuple] = {}
+_cache_stats = {'hits': 0, 'backend_reads': 0, 'backend_reads_by_key': {}}
+
+def create_provider(spec: Optional[str] = None) -> ConfigProvider:
+    """
+    Create provider from specification
+
+    Args:
+        spec (str): 'airflow', 'env' or path to JSON file; defaults to ONEC_ETL_CONFIG
+
+    Returns:
+        ConfigProvider: Provider instance
+    """
+    spec = spec or os.environ.get('ONEC_ETL_CONFIG', 'airflow')
+    if spec == 'airflow':
+        return AirflowConfigProvider()
+    if spec == 'env':
+        return EnvConfigProvider()
+    return FileConfigProvider(spec)
+
+def get_provider() -> ConfigProvider:
+    """Get active configuration provider"""
+    global _provider
+    if _provider is None:
+        _provider = create_provider()
+    return _provider
+
+def set_provider(provider: ConfigProvider) -> None:
+    """
+    Set active configuration provider
+
+    Args:
+        provider (ConfigProvider): Provider to use for all subsequent reads
+    """
+    global _provider
+    _provider = provider
+    clear_cache()
+
+def get_variable(key: str, default_var: Any = _NO_DEFAULT, deserialize_json: bool = False) -> Any:
+    """
+    Get configuration variable from the active provider (same signature as Variable.get)
+
+    The value is read from the backend and decoded at most once per TTL
+    (see VARIABLE_TTLS); missing variables are cached too.
+
+    Args:
+        key (str): Variable name
+        default_var (Any): Value returned when the variable is not set
+        deserialize_json (bool): Decode stored value as JSON
+
+    Returns:
+        Any: Variable value
+
+    Raises:
+        KeyError: If the variable is not set and no default is given
+    """
+    cache_key = (key, deserialize_json)
+    now = time.monotonic()
+
+    with _cache_lock:
+        cached = _cache.get(cache_key)
+        if cached is not None and cached[1] > now:
+            _cache_stats['hits'] += 1
+            return _resolve(key, cached[0], default_var)
+
+    try:
+        value = get_provider().get(key, deserialize_json=deserialize_json)
+    except KeyError:
+        value = _MISSING
+
+    ttl = VARIABLE_TTLS.get(key, DEFAULT_VARIABLE_TTL)
+    with _cache_lock:
+        _cache_stats['backend_reads'] += 1
+        by_key = _cache_stats['backend_reads_by_key']
+        by_key[key] = by_key.get(key, 0) + 1
+        if ttl > 0:
+            _cache[cache_key] = (value, now + ttl)
+
+    return _resolve(key, value, default_var)
+
+def _resolve(key: str, value: Any, default_var: Any) -> Any:
+    """Apply default to cached value of missing variable"""
+    if value is _MISSING:
+        if default_var is _NO_DEFAULT:
+            raise KeyError(f"Variable {key} does not exist")
+        return default_var
+    return value
+
+def set_variable_ttl(key: str, ttl: int) -> None:
+    """
+    Set cache TTL for variable
+
+    Args:
+        key (str): Variable name
+        ttl (int): TTL in seconds, 0 disables caching
+    """
+    VARIABLE_TTLS[key] = ttl
+    with _cache_lock:
+        for cache_key in [cache_key for cache_key in _cache if cache_key[0] == key]:
+            del _cache[cache_key]
+
+def clear_cache() -> None:
+    """Drop all cached variable values"""
+    with _cache_lock:
+        _cache.clear()
+
+def get_cache_stats() -> Dict[str, Any]:
+    """
+    Get variable cache statistics
+
+    Returns:
+        Dict[str, Any]: 'hits' (served from cache), 'backend_reads' (metastore /
+            provider reads) and 'backend_reads_by_key'
+    """
+    with _cache_lock:
+        return {
+            'hits': _cache_stats['hits'],
+            'backend_reads': _cache_stats['backend_reads'],
+            'backend_reads_by_key': dict(_cache_stats['backend_reads_by_key']),
+        }
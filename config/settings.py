@@ -3,7 +3,7 @@ Configuration management for Power BI ETL process
 """
 
 import json
-from airflow.models import Variable
+from oneC_etl.config.provider import get_variable
 
 # Default configuration values
 DEFAULT_CONFIG = {
@@ -11,7 +11,16 @@ DEFAULT_CONFIG = {
     'max_retries': 3,
     'retry_delay': 300,  # seconds
     'enable_vector_updates': True,
-    'vector_model': 'text-embedding-ada-002'
+    'vector_model': 'text-embedding-ada-002',
+    'vector_index_method': 'hnsw',   # ANN index on companyproducts.vector: hnsw or ivfflat
+    'vector_quantization': 'none',   # Compact ANN index: none (full vectors), halfvec or binary
+    'vector_storage': 'inline',      # Product vectors: inline (companyproducts.vector) or side_table (product_embeddings)
+    'text_search_method': 'trgm',    # Product text search: trgm (pg_trgm similarity) or fts (Russian tsvector)
+    'embedding_provider': 'openai',  # Embedding provider (services/embeddings/client.py PROVIDERS)
+    'extract_max_rows': 100000,      # executeQueries row limit per query
+    'extract_max_values': 1000000,   # executeQueries value (rows x columns) limit per query
+    'extract_spill_rows': 250000,    # Estimated rows from which extracts are spilled to disk
+    'extract_spill_dir': None        # Spill directory shared by all workers (default: <project>/data/extract_spill)
 }
 
 def get_config():
@@ -25,9 +34,18 @@ def get_config():
             - retry_delay: Delay between retries in seconds
             - enable_vector_updates: Whether to enable vector search updates
             - vector_model: Model to use for vector embeddings
+            - vector_index_method: ANN index method for the vector column (hnsw or ivfflat)
+            - vector_quantization: Representation indexed by the ANN index (none, halfvec or binary)
+            - vector_storage: Where product vectors are stored (inline or side_table)
+            - text_search_method: Product description / item_number search method (trgm or fts)
+            - embedding_provider: Embedding provider name
+            - extract_max_rows / extract_max_values: executeQueries limits used to partition extracts
+            - extract_spill_rows: Estimated extract size from which rows are spilled to disk
+            - extract_spill_dir: Directory for spilled extracts; DAG tasks may run on different
+              workers, so it must be on storage shared by them (files go to <dir>/<run_id>/)
     """
     try:
-        config = json.loads(Variable.get('powerbi_etl_config', default_var='{}'))
+        config = get_variable('powerbi_etl_config', default_var={}, deserialize_json=True)
     except json.JSONDecodeError:
         config = {}
     
@@ -36,5 +54,14 @@ def get_config():
         'max_retries': int(config.get('max_retries', DEFAULT_CONFIG['max_retries'])),
         'retry_delay': int(config.get('retry_delay', DEFAULT_CONFIG['retry_delay'])),
         'enable_vector_updates': bool(config.get('enable_vector_updates', DEFAULT_CONFIG['enable_vector_updates'])),
-        'vector_model': config.get('vector_model', DEFAULT_CONFIG['vector_model'])
+        'vector_model': config.get('vector_model', DEFAULT_CONFIG['vector_model']),
+        'vector_index_method': config.get('vector_index_method', DEFAULT_CONFIG['vector_index_method']),
+        'vector_quantization': config.get('vector_quantization', DEFAULT_CONFIG['vector_quantization']) or 'none',
+        'vector_storage': config.get('vector_storage', DEFAULT_CONFIG['vector_storage']),
+        'text_search_method': config.get('text_search_method', DEFAULT_CONFIG['text_search_method']),
+        'embedding_provider': config.get('embedding_provider', DEFAULT_CONFIG['embedding_provider']),
+        'extract_max_rows': int(config.get('extract_max_rows', DEFAULT_CONFIG['extract_max_rows'])),
+        'extract_max_values': int(config.get('extract_max_values', DEFAULT_CONFIG['extract_max_values'])),
+        'extract_spill_rows': int(config.get('extract_spill_rows', DEFAULT_CONFIG['extract_spill_rows'])),
+        'extract_spill_dir': config.get('extract_spill_dir', DEFAULT_CONFIG['extract_spill_dir'])
     } 
\ No newline at end of file
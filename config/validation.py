@@ -4,7 +4,7 @@ Configuration validation module
 
 from typing import Dict, Any, Tuple
 from loguru import logger
-from airflow.models import Variable
+from oneC_etl.config.provider import get_variable
 
 def validate_dataset_config(dataset_name: str) -> Tuple[bool, str]:
     """
@@ -17,7 +17,7 @@ def validate_dataset_config(dataset_name: str) -> Tuple[bool, str]:
         Tuple[bool, str]: (is_valid, error_message)
     """
     try:
-        datasets = Variable.get("datasets", deserialize_json=True)
+        datasets = get_variable("datasets", deserialize_json=True)
         if not datasets:
             return False, "No datasets configured in Airflow Variables"
             
@@ -47,7 +47,7 @@ def validate_query_config(query_name: str) -> Tuple[bool, str]:
         Tuple[bool, str]: (is_valid, error_message)
     """
     try:
-        queries = Variable.get("dax_queries", deserialize_json=True)
+        queries = get_variable("dax_queries", deserialize_json=True)
         if not queries:
             return False, "No DAX queries configured in Airflow Variables"
             
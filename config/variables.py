@@ -2,7 +2,7 @@
 Airflow Variables configuration handler
 """
 
-from airflow.models import Variable
+from oneC_etl.config.provider import get_variable
 from typing import Dict, Any, Optional
 from loguru import logger
 import json
@@ -19,7 +19,7 @@ def get_dataset_config(dataset_name: str) -> Dict[str, Any]:
         Dict[str, Any]: Dataset configuration
     """
     try:
-        datasets = Variable.get("datasets", deserialize_json=True)
+        datasets = get_variable("datasets", deserialize_json=True)
         if not datasets or dataset_name not in datasets:
             raise ValueError(f"Dataset configuration '{dataset_name}' not found in Airflow Variables")
         return datasets[dataset_name]
@@ -35,7 +35,7 @@ def get_available_datasets() -> Dict[str, str]:
         Dict[str, str]: Dictionary of dataset names and their descriptions
     """
     try:
-        datasets = Variable.get("datasets", deserialize_json=True)
+        datasets = get_variable("datasets", deserialize_json=True)
         if not datasets:
             return {}
         return {name: config.get("description", "") for name, config in datasets.items()}
@@ -51,7 +51,7 @@ def get_available_queries() -> Dict[str, str]:
         Dict[str, str]: Dictionary of query names and their descriptions
     """
     try:
-        queries = Variable.get("dax_queries", deserialize_json=True)
+        queries = get_variable("dax_queries", deserialize_json=True)
         if not queries:
             return {}
         return {name: config.get("description", "") for name, config in queries.items()}
@@ -70,7 +70,7 @@ def get_dax_query(query_name: str) -> Dict[str, Any]:
         Dict[str, Any]: Query configuration
     """
     try:
-        queries = Variable.get("dax_queries", deserialize_json=True)
+        queries = get_variable("dax_queries", deserialize_json=True)
         if not queries or query_name not in queries:
             raise ValueError(f"Query configuration '{query_name}' not found in Airflow Variables")
         return queries[query_name]
@@ -0,0 +1,6 @@
+-- Миграция для загрузки характеристик из Char_table длинной таблицей (tasks/properties.py)
+-- Порядок характеристик берётся из Char_table[SortOrder]
+
+ALTER TABLE public.product_properties ADD COLUMN IF NOT EXISTS sort_order INTEGER;
+
+COMMENT ON COLUMN public.product_properties.sort_order IS 'Порядок характеристики (Char_table[SortOrder])';
@@ -77,8 +77,13 @@ def get_table_structure(table_name):
         conn.close()
 
 def get_required_columns():
-    """Получить список нужных колонок"""
-    return {
+    """
+    Получить список нужных колонок
+
+    При VECTOR_STORAGE=side_table векторы хранятся в product_embeddings
+    (database/scripts/migrate_vectors_to_side_table.py), колонки vector и merged не нужны
+    """
+    columns = {
         'id': 'uuid',
         'description': 'text', 
         'brand': 'character varying',
@@ -94,6 +99,9 @@ def get_required_columns():
         'updated_at': 'timestamp with time zone',
         'vector': 'USER-DEFINED'  # pgvector тип
     }
+    if os.getenv('VECTOR_STORAGE', 'inline') == 'side_table':
+        del columns['merged'], columns['vector']
+    return columns
 
 def confirm_cleanup(columns_to_drop, current_structure):
     """Спросить подтверждение у пользователя"""
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Перенос векторов companyproducts.vector в боковую таблицу product_embeddings
+
+- Создаёт product_embeddings (database/sql/create_product_embeddings_table.sql)
+  с размерностью столбца companyproducts.vector
+- Копирует актуальные векторы (is_vector = true) пакетами по id, text_hash считается
+  по текущему тексту merged товара
+- Повторный запуск продолжает перенос: уже перенесённые векторы не перезаписываются
+
+После переноса: vector_storage = side_table в powerbi_etl_config, затем
+VECTOR_STORAGE=side_table python cleanup_table_structure.py удаляет колонки vector и merged.
+
+Example:
+    python database/scripts/migrate_vectors_to_side_table.py --ensure-index
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+from loguru import logger
+
+SCRIPT_DIR = Path(__file__).parent
+PROJECT_ROOT = SCRIPT_DIR.parent.parent  # oneC_etl/
+
+# Пакет oneC_etl импортируется из каталога dags
+sys.path.append(str(PROJECT_ROOT.parent))
+
+from oneC_etl.services.embeddings.cache import embedding_key_sql
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.tasks.embed import MERGED_TEXT_SQL
+from oneC_etl.vector_search.storage import DEFAULT_EMBEDDINGS_TABLE, VectorSource
+
+def create_embeddings_table(client, source):
+    """
+    Create the side table with the dimensions of the inline vector column
+
+    Args:
+        client (PostgresClient): Initialized client
+        source (VectorSource): Side table source
+    """
+    sql = (PROJECT_ROOT / 'database' / 'sql' / 'create_product_embeddings_table.sql').read_text(encoding='utf-8')
+    dimensions = VectorSource(source.products_table, 'inline').index_manager(client).dimensions()
+    if dimensions is not None:
+        sql = sql.replace('vector(1536)', f'vector({dimensions})')
+    sql = sql.replace('product_embeddings', source.embeddings_table).replace('companyproducts', source.products_table)
+
+    connection = client.engine.raw_connection()
+    try:
+        connection.cursor().execute(sql)
+        connection.commit()
+    finally:
+        connection.close()
+    logger.info(f"✅ Таблица {source.embeddings_table} готова (размерность {dimensions or 1536})")
+
+def copy_vectors(client, source, batch_rows=50000):
+    """
+    Copy current inline vectors into the side table in id order
+
+    Args:
+        client (PostgresClient): Initialized client
+        source (VectorSource): Side table source
+        batch_rows (int): Products per transaction
+
+    Returns:
+        dict: {'copied', 'batches', 'duration_s'}
+    """
+    text_hash = embedding_key_sql(source.model_literal, MERGED_TEXT_SQL)
+    stats = {'copied': 0, 'batches': 0}
+    started = time.perf_counter()
+    after = None
+
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        while True:
+            # Граница пакета по id: ON CONFLICT DO NOTHING не возвращает пропущенные строки
+            cursor.execute(f"""
+                SELECT MAX(id) FROM (
+                    SELECT id FROM {source.products_table}
+                    WHERE is_vector = true AND vector IS NOT NULL {'AND id > %(after)s' if after else ''}
+                    ORDER BY id
+                    LIMIT %(batch_rows)s
+                ) batch
+            """, {'after': after, 'batch_rows': batch_rows})
+            last = cursor.fetchone()[0]
+            if last is None:
+                break
+
+            cursor.execute(f"""
+                INSERT INTO {source.embeddings_table} (product_id, model, vector, text_hash)
+                SELECT p.id, {source.model_literal}, p.vector, {text_hash}
+                FROM {source.products_table} p
+                WHERE p.is_vector = true AND p.vector IS NOT NULL
+                {'AND p.id > %(after)s' if after else ''} AND p.id <= %(last)s
+                ON CONFLICT (product_id, model) DO NOTHING
+            """, {'after': after, 'last': last})
+            stats['copied'] += cursor.rowcount
+            stats['batches'] += 1
+            connection.commit()
+            after = last
+            logger.info(f"📦 Пакет {stats['batches']}: перенесено {stats['copied']} векторов")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+    stats['duration_s'] = round(time.perf_counter() - started, 1)
+    return stats
+
+def main():
+    """Run migration from command line"""
+    parser = argparse.ArgumentParser(description="Move product vectors into the product_embeddings side table")
+    parser.add_argument("--products-table", default='companyproducts')
+    parser.add_argument("--embeddings-table", default=DEFAULT_EMBEDDINGS_TABLE)
+    parser.add_argument("--model", default=None, help="Model of the inline vectors (default: vector_model from config)")
+    parser.add_argument("--batch-rows", type=int, default=50000)
+    parser.add_argument("--ensure-index", action='store_true', help="Build the ANN index on the side table")
+    args = parser.parse_args()
+
+    client = PostgresClient()
+    source = VectorSource(args.products_table, 'side_table', args.embeddings_table, args.model)
+
+    create_embeddings_table(client, source)
+    stats = copy_vectors(client, source, args.batch_rows)
+    logger.success(f"✅ Перенесено {stats['copied']} векторов модели {source.model} "
+                   f"за {stats['duration_s']} с ({stats['batches']} пакетов)")
+
+    if args.ensure_index:
+        result = source.index_manager(client).ensure_index()
+        logger.info(f"🏗️ Индекс {source.embeddings_table}: {result['status']}")
+
+if __name__ == '__main__':
+    main()
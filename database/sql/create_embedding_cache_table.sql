@@ -0,0 +1,21 @@
+-- Кэш эмбеддингов по хэшу (модель, текст merged): вектор переиспользуется, если текст товара
+-- не изменился (смена небизнесовых колонок, возврат товара в выгрузку)
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key CHAR(64) PRIMARY KEY,
+    model VARCHAR(255) NOT NULL,
+    vector vector NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Индекс для очистки давно неиспользуемых записей
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_last_used_at ON embedding_cache(last_used_at);
+
+-- Комментарии к таблице
+COMMENT ON TABLE embedding_cache IS 'Кэш эмбеддингов, адресуемый содержимым';
+COMMENT ON COLUMN embedding_cache.key IS 'sha256 от модели и текста merged (services/embeddings/cache.py)';
+COMMENT ON COLUMN embedding_cache.model IS 'Модель эмбеддингов';
+COMMENT ON COLUMN embedding_cache.vector IS 'Вектор текста';
+COMMENT ON COLUMN embedding_cache.last_used_at IS 'Последнее использование (запись или попадание в кэш)';
@@ -0,0 +1,20 @@
+-- Очередь товаров на векторизацию (services/embeddings/queue.py): воркеры забирают пакеты
+-- через FOR UPDATE SKIP LOCKED и арендуют их до lease_until; запись удаляется вместе с записью вектора
+CREATE TABLE IF NOT EXISTS embedding_queue (
+    product_id UUID PRIMARY KEY REFERENCES companyproducts(id) ON DELETE CASCADE,
+    enqueued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    claimed_by VARCHAR(255),
+    lease_until TIMESTAMP,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+
+-- Выбор самых старых свободных записей
+CREATE INDEX IF NOT EXISTS idx_embedding_queue_enqueued_at ON embedding_queue(enqueued_at);
+
+-- Комментарии к таблице
+COMMENT ON TABLE embedding_queue IS 'Очередь товаров без актуального вектора';
+COMMENT ON COLUMN embedding_queue.product_id IS 'Товар';
+COMMENT ON COLUMN embedding_queue.enqueued_at IS 'Время постановки в очередь';
+COMMENT ON COLUMN embedding_queue.claimed_by IS 'Воркер, взявший запись';
+COMMENT ON COLUMN embedding_queue.lease_until IS 'Окончание аренды: после него запись забирает другой воркер; без claimed_by - время повтора после сбоя';
+COMMENT ON COLUMN embedding_queue.attempts IS 'Число отказов API эмбеддингов по товару (сбои транспорта не считаются)';
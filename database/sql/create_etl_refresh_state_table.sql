@@ -0,0 +1,15 @@
+-- Обработанные обновления датасетов Power BI (tasks/refresh_check.py): запуск пропускается,
+-- если последнее успешное обновление датасета уже загружено
+CREATE TABLE IF NOT EXISTS etl_refresh_state (
+    dataset_id VARCHAR(64) PRIMARY KEY,
+    request_id VARCHAR(64),
+    end_time VARCHAR(64) NOT NULL,
+    processed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Комментарии к таблице
+COMMENT ON TABLE etl_refresh_state IS 'Последние обработанные ETL обновления датасетов Power BI';
+COMMENT ON COLUMN etl_refresh_state.dataset_id IS 'Идентификатор датасета Power BI';
+COMMENT ON COLUMN etl_refresh_state.request_id IS 'Идентификатор обновления (requestId)';
+COMMENT ON COLUMN etl_refresh_state.end_time IS 'Время окончания обновления (endTime из истории обновлений, как в API)';
+COMMENT ON COLUMN etl_refresh_state.processed_at IS 'Время отметки обновления как обработанного';
@@ -0,0 +1,22 @@
+-- Группы почти одинаковых товаров (tasks/duplicates.py): компоненты связности графа соседей
+-- со сходством векторов не ниже порога; таблица перезаписывается целиком при каждом запуске
+CREATE TABLE IF NOT EXISTS product_duplicates (
+    product_id UUID PRIMARY KEY REFERENCES companyproducts(id) ON DELETE CASCADE,
+    group_id UUID NOT NULL,
+    group_size INTEGER NOT NULL,
+    similarity REAL NOT NULL,
+    is_representative BOOLEAN NOT NULL,
+    computed_at TIMESTAMP NOT NULL
+);
+
+-- Все товары группы
+CREATE INDEX IF NOT EXISTS idx_product_duplicates_group_id ON product_duplicates(group_id);
+
+-- Комментарии к таблице
+COMMENT ON TABLE product_duplicates IS 'Группы дубликатов товаров, найденные пакетно по векторам';
+COMMENT ON COLUMN product_duplicates.product_id IS 'Товар';
+COMMENT ON COLUMN product_duplicates.group_id IS 'Группа: товар-представитель (больше всего похожих в группе)';
+COMMENT ON COLUMN product_duplicates.group_size IS 'Число товаров в группе';
+COMMENT ON COLUMN product_duplicates.similarity IS 'Наибольшее сходство векторов с другим товаром группы';
+COMMENT ON COLUMN product_duplicates.is_representative IS 'Товар является представителем группы';
+COMMENT ON COLUMN product_duplicates.computed_at IS 'Время расчёта групп';
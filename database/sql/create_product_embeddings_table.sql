@@ -0,0 +1,23 @@
+-- Векторы товаров в узкой боковой таблице (vector_storage = side_table, vector_search/storage.py):
+-- MERGE бизнес-колонок companyproducts не переписывает векторы, запись векторов не переписывает строки товаров
+CREATE EXTENSION IF NOT EXISTS vector;
+
+CREATE TABLE IF NOT EXISTS product_embeddings (
+    product_id UUID NOT NULL REFERENCES companyproducts(id) ON DELETE CASCADE,
+    model VARCHAR(255) NOT NULL,
+    vector vector(1536) NOT NULL,  -- размерность модели (text-embedding-ada-002); ANN индексу нужна размерность столбца
+    text_hash CHAR(64) NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (product_id, model)
+);
+
+-- Вектор хранится вне строки (TOAST) без сжатия: векторы почти не сжимаются, а распаковка тратит время поиска
+ALTER TABLE product_embeddings ALTER COLUMN vector SET STORAGE EXTERNAL;
+
+-- Комментарии к таблице
+COMMENT ON TABLE product_embeddings IS 'Векторы товаров по моделям эмбеддингов';
+COMMENT ON COLUMN product_embeddings.product_id IS 'Товар';
+COMMENT ON COLUMN product_embeddings.model IS 'Модель эмбеддингов';
+COMMENT ON COLUMN product_embeddings.vector IS 'Вектор текста merged товара';
+COMMENT ON COLUMN product_embeddings.text_hash IS 'sha256 от модели и текста merged, по которому посчитан вектор (services/embeddings/cache.py)';
+COMMENT ON COLUMN product_embeddings.updated_at IS 'Время записи вектора';
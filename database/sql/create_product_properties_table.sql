@@ -4,6 +4,7 @@ CREATE TABLE IF NOT EXISTS product_properties (
     product_id UUID REFERENCES companyproducts(id) ON DELETE CASCADE,
     prop_key VARCHAR(255) NOT NULL,
     prop_value TEXT NOT NULL,
+    sort_order INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -34,4 +35,5 @@ CREATE TRIGGER update_product_properties_updated_at
 COMMENT ON TABLE product_properties IS 'Характеристики продуктов в формате key-value';
 COMMENT ON COLUMN product_properties.product_id IS 'ID продукта из таблицы companyproducts';
 COMMENT ON COLUMN product_properties.prop_key IS 'Название характеристики (например: Цвет, Бренд, Материал)';
-COMMENT ON COLUMN product_properties.prop_value IS 'Значение характеристики'; 
\ No newline at end of file
+COMMENT ON COLUMN product_properties.prop_value IS 'Значение характеристики';
+COMMENT ON COLUMN product_properties.sort_order IS 'Порядок характеристики (Char_table[SortOrder])'; 
\ No newline at end of file
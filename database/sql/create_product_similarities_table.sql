@@ -0,0 +1,26 @@
+-- Предрассчитанные похожие товары (tasks/similarities.py): top-k соседей каждого векторизованного товара
+-- с учётом совпадения категории и исключения бренда
+CREATE TABLE IF NOT EXISTS product_similarities (
+    product_id UUID NOT NULL REFERENCES companyproducts(id) ON DELETE CASCADE,
+    similar_id UUID NOT NULL,
+    rank SMALLINT NOT NULL,
+    score REAL NOT NULL,
+    vector_distance REAL NOT NULL,
+    category_match BOOLEAN NOT NULL,
+    computed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (product_id, rank)
+);
+
+-- Поиск списков, ссылающихся на изменённые товары (similar_id без внешнего ключа:
+-- ссылки на удалённые товары находятся и пересчитываются следующим запуском)
+CREATE INDEX IF NOT EXISTS idx_product_similarities_similar_id ON product_similarities(similar_id);
+
+-- Комментарии к таблице
+COMMENT ON TABLE product_similarities IS 'Похожие товары, рассчитанные пакетно по векторам';
+COMMENT ON COLUMN product_similarities.product_id IS 'Товар';
+COMMENT ON COLUMN product_similarities.similar_id IS 'Похожий товар';
+COMMENT ON COLUMN product_similarities.rank IS 'Место в списке (1 - самый похожий)';
+COMMENT ON COLUMN product_similarities.score IS 'Итоговая оценка: сходство * (1 - вес категории) + совпадение категории * вес';
+COMMENT ON COLUMN product_similarities.vector_distance IS 'Косинусное расстояние векторов';
+COMMENT ON COLUMN product_similarities.category_match IS 'Категории товаров совпадают';
+COMMENT ON COLUMN product_similarities.computed_at IS 'Время расчёта списка (сравнивается с updated_at товара)';
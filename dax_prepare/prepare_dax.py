@@ -1,19 +1,36 @@
 #!/usr/bin/env python3
 """
 Prepare DAX queries for Airflow Variables
-This script processes raw DAX queries and prepares them for Airflow Variables.
+This script processes raw DAX queries and builds a versioned query bundle for the
+dax_queries Airflow Variable. Each entry holds the minified query, its content hash,
+the parsed result columns with target types, business columns, partitioning keys and,
+for pipelines with pushdown_columns, the precompiled extraction query, plus the
+extraction plan queries of both (size probe, per-key row counts, result column
+count and where partition filters go), so tasks never parse DAX at runtime. The bundle is checked structurally (SUMMARIZECOLUMNS
+argument order, group-by columns against the column mappings of config/) and then
+run against the local PowerBI stand-in.
 """
 
 import json
 import re
 import sys
+import argparse
+import urllib.error
+import urllib.request
 from pathlib import Path
 from loguru import logger
-from typing import Dict, Any
+from typing import Dict, Any, List, Set
 
 # Add parent directory to path to import raw_queries
 sys.path.append(str(Path(__file__).parent))
+# Каталог dags для импорта пакета oneC_etl
+sys.path.append(str(Path(__file__).absolute().parent.parent.parent))
 from raw_queries import *  # Import all query variables
+from oneC_etl.utils.dax_utils import build_bundle_entry, DAX_BUNDLE_VERSION
+from oneC_etl.utils.dax_parser import check_summarize_columns, parse_query, summarize_columns_args
+from oneC_etl.utils.dax_rewrite import add_partition_filter
+from oneC_etl.config.pipelines import PIPELINES
+from oneC_etl.config.dax_mappings import DAX_MAPPINGS
 
 def clean_dax_query(query: str) -> str:
     """
@@ -51,12 +68,28 @@ def get_query_variables() -> Dict[str, str]:
     }
     return query_vars
 
-def prepare_queries() -> Dict[str, Dict[str, str]]:
+def get_extract_config(dag_name: str) -> Dict[str, Any]:
     """
-    Prepare DAX queries for Airflow Variables
+    Get pipeline extraction task configuration that uses the query
+
+    Args:
+        dag_name (str): Query name in dax_queries (e.g. company_products)
+
+    Returns:
+        Dict[str, Any]: Task configuration with 'columns', or empty dict
+    """
+    for pipeline in PIPELINES.values():
+        for task_config in pipeline.values():
+            if isinstance(task_config, dict) and task_config.get('dax_query') == dag_name:
+                return task_config
+    return {}
+
+def prepare_queries() -> Dict[str, Dict[str, Any]]:
+    """
+    Prepare DAX query bundle for Airflow Variables
     
     Returns:
-        Dict[str, Dict[str, str]]: Processed queries ready for Airflow Variables
+        Dict[str, Dict[str, Any]]: Bundle entries keyed by query name
     """
     try:
         # Get all query variables
@@ -71,16 +104,20 @@ def prepare_queries() -> Dict[str, Dict[str, str]]:
             # Convert query name to DAG name format
             dag_name = query_name.lower().replace('_query', '')
             
-            # Clean and store query
-            cleaned_query = clean_dax_query(query)
-            result[dag_name] = {
-                "description": f"DAX query for {query_name}",
-                "query": cleaned_query
-            }
+            # Minify query and precompute everything tasks need from it
+            task_config = get_extract_config(dag_name)
+            result[dag_name] = build_bundle_entry(
+                dag_name,
+                clean_dax_query(query),
+                columns_mapping=task_config.get('columns'),
+                partition_keys=PARTITION_KEYS.get(query_name),
+                pushdown_columns=task_config.get('pushdown_columns', False)
+            )
             
-            logger.info(f"Processed query: {query_name}")
+            logger.info(f"Processed query: {query_name} ({result[dag_name]['hash'][:12]}, "
+                        f"{len(result[dag_name]['columns'])} columns)")
             logger.debug(f"Original query: {query}")
-            logger.debug(f"Cleaned query: {cleaned_query}")
+            logger.debug(f"Minified query: {result[dag_name]['query']}")
         
         return result
         
@@ -88,6 +125,131 @@ def prepare_queries() -> Dict[str, Dict[str, str]]:
         logger.exception(f"Error preparing DAX queries: {str(e)}")
         raise
 
+def get_mapped_columns(dag_name: str) -> Set[str]:
+    """
+    PowerBI columns the configuration maps for a query
+
+    Args:
+        dag_name (str): Query name in dax_queries
+
+    Returns:
+        Set[str]: 'Table[Column]' and extension keys of the pipeline task and DAX_MAPPINGS entry
+    """
+    columns = set(get_extract_config(dag_name).get('columns') or {})
+    columns.update(DAX_MAPPINGS.get(dag_name, {}).get('columns') or {})
+    return columns
+
+def check_structure(name: str, entry: Dict[str, Any]) -> List[str]:
+    """
+    Check bundle entry queries without executing them
+
+    Every SUMMARIZECOLUMNS must list group-by columns and filter tables before its
+    "Name", <expression> pairs, and every group-by column must be mapped in the
+    configuration (pipeline task columns or DAX_MAPPINGS). Columns the pipeline task
+    maps but the query does not select are only logged (they load as NULL).
+
+    Args:
+        name (str): Query name in dax_queries
+        entry (Dict[str, Any]): Bundle entry
+
+    Returns:
+        List[str]: Problems found
+    """
+    problems = []
+    mapped = get_mapped_columns(name)
+    task_columns = [key for key in get_extract_config(name).get('columns') or {} if '[' in key and not key.startswith('[')]
+
+    for field, plan_field in (('query', 'plan'), ('extraction_query', 'extraction_plan')):
+        if field not in entry:
+            continue
+        try:
+            query = parse_query(entry[field])
+            check_summarize_columns(query)
+        except ValueError as e:
+            problems.append(f"{name}.{field}: {e}")
+            continue
+
+        plan = entry.get(plan_field)
+        if plan and plan.get('filter_position') and entry['partition_keys']:
+            # Фильтр в сохранённом месте должен давать корректный SUMMARIZECOLUMNS
+            try:
+                check_summarize_columns(parse_query(add_partition_filter(
+                    entry[field], entry['partition_keys'][0], [None], plan['filter_position'])))
+            except ValueError as e:
+                problems.append(f"{name}.{plan_field}.filter_position: {e}")
+
+        group_by = set()
+        for call in query.find_calls('SUMMARIZECOLUMNS'):
+            group_by.update(f"{column.table}[{column.value}]" for column in summarize_columns_args(call)['group_by'])
+        if mapped:
+            unmapped = sorted(group_by - mapped)
+            if unmapped:
+                problems.append(f"{name}.{field}: group-by columns not in column mappings: {', '.join(unmapped)}")
+        missing = [key for key in task_columns if key not in group_by]
+        if missing:
+            logger.warning(f"{name}.{field}: mapped columns not selected by the query: {', '.join(missing)}")
+
+    return problems
+
+def verify_queries(queries: Dict[str, Dict[str, Any]], rows: int = 100) -> List[str]:
+    """
+    Check bundle structure (check_structure), then run bundled queries against the
+    local PowerBI stand-in and check that the result has the bundled columns
+
+    Args:
+        queries (Dict[str, Dict[str, Any]]): Bundle entries
+        rows (int): Synthetic catalogue size served by the stand-in
+
+    Returns:
+        List[str]: Problems found (empty if the bundle is consistent)
+    """
+    from oneC_etl.benchmarks.powerbi_standin import start_standin, standin_variables
+
+    server, _ = start_standin({'rows': rows})
+    api_url = standin_variables(server)['powerbi_api_url']
+    problems = []
+
+    try:
+        for name, entry in queries.items():
+            if entry.get('version') != DAX_BUNDLE_VERSION:
+                problems.append(f"{name}: unexpected bundle version {entry.get('version')}")
+                continue
+
+            structure = check_structure(name, entry)
+            if structure:
+                problems.extend(structure)
+                continue
+
+            expected = [column['key'] for column in entry['columns']]
+            checks = [('query', entry['query'], expected)]
+            if 'extraction_query' in entry:
+                mapped = [column['key'] for column in entry['columns'] if column['column']]
+                checks.append(('extraction_query', entry['extraction_query'], mapped))
+
+            for field, query, columns in checks:
+                request = urllib.request.Request(
+                    f"{api_url}/groups/standin/datasets/standin/executeQueries",
+                    data=json.dumps({"queries": [{"query": query}]}).encode('utf-8'),
+                    headers={"Content-Type": "application/json"}
+                )
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        result_rows = json.load(response)['results'][0]['tables'][0]['rows']
+                except urllib.error.HTTPError as e:
+                    problems.append(f"{name}.{field}: stand-in rejected query: HTTP {e.code} {e.read().decode('utf-8', 'replace')}")
+                    continue
+
+                if not result_rows:
+                    problems.append(f"{name}.{field}: no rows returned")
+                    continue
+                missing = [column for column in columns if column not in result_rows[0]]
+                if missing:
+                    problems.append(f"{name}.{field}: columns missing from result: {', '.join(missing)}")
+    finally:
+        server.shutdown()
+
+    return problems
+
 def save_to_json(queries: Dict[str, Dict[str, str]], output_file: str) -> None:
     """
     Save processed queries to JSON file
@@ -113,11 +275,21 @@ def save_to_json(queries: Dict[str, Dict[str, str]], output_file: str) -> None:
         raise
 
 def main():
-    """Main function to prepare and save DAX queries"""
+    """Main function to prepare, verify and save DAX queries"""
+    parser = argparse.ArgumentParser(description="Build DAX query bundle for the dax_queries Variable")
+    parser.add_argument("--no-verify", action="store_true", help="Skip verification against the PowerBI stand-in")
+    args = parser.parse_args()
+
     try:
         # Prepare queries
         queries = prepare_queries()
         
+        if not args.no_verify:
+            problems = verify_queries(queries)
+            if problems:
+                raise ValueError("DAX bundle verification failed:\n" + "\n".join(problems))
+            logger.info("DAX bundle verified against PowerBI stand-in")
+        
         # Save to JSON
         output_file = Path(__file__).parent / 'dax_queries.json'
         save_to_json(queries, str(output_file))
@@ -13,6 +13,14 @@ Customize it for your specific project.
 #     )
 # """
 
+# Partitioning keys per query: group-by columns whose values split the extraction
+# into TREATAS partitions, in order of preference; a value too large for one
+# partition is split by the next key, so the last key should be fine-grained
+PARTITION_KEYS = {
+    'COMPANY_PRODUCTS_QUERY': ["'CompanyProducts'[Category]", "'CompanyProducts'[Brand]"],
+    'CHAR_TABLE_QUERY': ["'Char_table'[_description]", "'Char_table'[Артикул]"],
+}
+
 # Add your DAX queries below:
 
 COMPANY_PRODUCTS_QUERY = """
@@ -45,3 +53,15 @@ TOPN(15000,
     'CompanyProducts'[ID]
 )
 """
+
+# Характеристики товаров одной длинной таблицей (артикул, ключ, значение, порядок)
+# вместо CONCATENATEX по каждому товару; соединяются с товарами в tasks/properties.py
+CHAR_TABLE_QUERY = """
+EVALUATE
+SUMMARIZECOLUMNS(
+    'Char_table'[Артикул],
+    'Char_table'[_description],
+    'Char_table'[Значение],
+    'Char_table'[SortOrder]
+)
+"""
@@ -0,0 +1,121 @@
+"""
+Content-addressed embedding cache
+
+Vectors are stored in PostgreSQL (database/sql/create_embedding_cache_table.sql)
+under sha256 of (model, text), so a product whose merged text did not change gets
+its vector back without an API call, whatever else changed in the row.
+"""
+
+import hashlib
+from typing import Dict, Iterable
+from loguru import logger
+
+def embedding_key(model: str, text: str) -> str:
+    """
+    Cache key of text embedded by model
+
+    Args:
+        model (str): Embedding model
+        text (str): Embedded text
+
+    Returns:
+        str: sha256 hex digest
+    """
+    return hashlib.sha256(f"{model}\n{text}".encode('utf-8')).hexdigest()
+
+def embedding_key_sql(model: str, text: str) -> str:
+    """
+    SQL expression computing embedding_key in the database
+
+    Args:
+        model (str): SQL expression of the model
+        text (str): SQL expression of the embedded text
+
+    Returns:
+        str: Expression returning the sha256 hex digest
+    """
+    return f"encode(sha256(convert_to({model} || E'\\n' || {text}, 'UTF8')), 'hex')"
+
+class PostgresEmbeddingCache:
+    """Embedding cache table in PostgreSQL"""
+
+    def __init__(self, client, table: str = 'embedding_cache', lookup_chunk: int = 10000):
+        """
+        Initialize cache
+
+        Args:
+            client (PostgresClient): Initialized client
+            table (str): Cache table
+            lookup_chunk (int): Keys per lookup query
+        """
+        self.client = client
+        self.table = table
+        self.lookup_chunk = lookup_chunk
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up cached vectors
+
+        Args:
+            keys (Iterable[str]): Cache keys
+
+        Returns:
+            Dict[str, str]: Key -> vector in pgvector text format, for found keys only
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        connection = self.client.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            for start in range(0, len(keys), self.lookup_chunk):
+                cursor.execute(
+                    f"SELECT key, vector::text FROM {self.table} WHERE key = ANY(%s)",
+                    (keys[start:start + self.lookup_chunk],)
+                )
+                found.update(cursor.fetchall())
+            connection.commit()
+        finally:
+            connection.close()
+        return found
+
+    def store(self, cursor, source_table: str) -> None:
+        """
+        Store vectors and refresh last use from a staging table with key, model and vector columns
+
+        Runs on the caller's cursor, so the cache is written in the same transaction
+        as the vectors themselves.
+
+        Args:
+            cursor: DBAPI cursor of an open transaction
+            source_table (str): Staging table (key CHAR(64), model, vector as text)
+        """
+        cursor.execute(f"""
+            INSERT INTO {self.table} (key, model, vector)
+            SELECT DISTINCT ON (key) key, model, vector::vector
+            FROM {source_table}
+            ON CONFLICT (key) DO UPDATE SET last_used_at = CURRENT_TIMESTAMP
+        """)
+
+    def prune(self, unused_days: int) -> int:
+        """
+        Delete entries not used for unused_days
+
+        Args:
+            unused_days (int): Age of last use in days
+
+        Returns:
+            int: Number of deleted entries
+        """
+        connection = self.client.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"DELETE FROM {self.table} WHERE last_used_at < CURRENT_TIMESTAMP - make_interval(days => %s)",
+                (unused_days,)
+            )
+            deleted = cursor.rowcount
+            connection.commit()
+        finally:
+            connection.close()
+        logger.info(f"🗑️ Кэш эмбеддингов: удалено {deleted} записей, не использованных {unused_days} дней")
+        return deleted
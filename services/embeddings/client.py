@@ -0,0 +1,138 @@
+"""
+Embedding provider clients
+"""
+
+import math
+import time
+from typing import Dict, List, Optional, Type
+from loguru import logger
+from oneC_etl.config.provider import get_variable
+from oneC_etl.config.settings import get_config
+
+DEFAULT_API_URL = "https://api.openai.com/v1"
+
+# Статусы, при которых запрос повторяется (троттлинг и временная недоступность)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503}
+
+# Без tiktoken число токенов оценивается по длине: в текстах каталога (кириллица) ~2 символа на токен
+CHARS_PER_TOKEN = 2
+
+class EmbeddingProvider:
+    """Base class of embedding providers"""
+
+    name = None
+
+    def __init__(self, model: Optional[str] = None):
+        """
+        Initialize provider
+
+        Args:
+            model (str): Embedding model (default: vector_model from config)
+        """
+        self.model = model or get_config()['vector_model']
+        self._encoding = None
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Count tokens of text for batching (tiktoken if installed, otherwise an estimate)
+
+        Args:
+            text (str): Input text
+
+        Returns:
+            int: Number of tokens
+        """
+        if self._encoding is None:
+            try:
+                import tiktoken
+                self._encoding = tiktoken.encoding_for_model(self.model)
+            except (ImportError, KeyError):
+                self._encoding = False
+        if self._encoding:
+            return len(self._encoding.encode(text))
+        return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed batch of texts
+
+        Args:
+            texts (List[str]): Input texts
+
+        Returns:
+            List[List[float]]: One vector per text, in input order
+        """
+        raise NotImplementedError
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """OpenAI-compatible /embeddings API (OpenAI, Azure OpenAI proxies, local stand-in)"""
+
+    name = "openai"
+
+    def __init__(self, model: Optional[str] = None):
+        """Initialize provider with credentials from Airflow Variables"""
+        super().__init__(model)
+        try:
+            self.api_key = get_variable('embedding_api_key')
+            # Base URL can be overridden to point the client at a local stand-in
+            self.api_url = get_variable('embedding_api_url', default_var=DEFAULT_API_URL).rstrip('/')
+            self.max_retries = int(get_variable('embedding_max_retries', default_var=5))
+            self.timeout = float(get_variable('embedding_timeout', default_var=60))
+
+            if not self.api_key:
+                raise ValueError("Embedding API key not found in Airflow Variables")
+
+        except Exception as e:
+            logger.exception(f"Error initializing embedding provider: {str(e)}")
+            raise
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        import requests
+
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        body = {"model": self.model, "input": texts}
+
+        attempt = 0
+        while True:
+            response = requests.post(f"{self.api_url}/embeddings", headers=headers, json=body, timeout=self.timeout)
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                break
+
+            attempt += 1
+            # Retry-After задаётся в секундах; без заголовка используем экспоненциальную задержку
+            try:
+                delay = float(response.headers.get('Retry-After', 2 ** attempt))
+            except ValueError:
+                delay = 2 ** attempt
+            logger.warning(f"Embedding API responded {response.status_code}, retry {attempt}/{self.max_retries} in {delay}s")
+            time.sleep(delay)
+
+        response.raise_for_status()
+        data = sorted(response.json()['data'], key=lambda item: item['index'])
+        if len(data) != len(texts):
+            raise ValueError(f"Embedding API returned {len(data)} vectors for {len(texts)} texts")
+        return [item['embedding'] for item in data]
+
+# Провайдеры по имени (embedding_provider в powerbi_etl_config)
+PROVIDERS: Dict[str, Type[EmbeddingProvider]] = {
+    OpenAIEmbeddingProvider.name: OpenAIEmbeddingProvider,
+}
+
+def create_provider(name: Optional[str] = None, model: Optional[str] = None) -> EmbeddingProvider:
+    """
+    Create embedding provider
+
+    Args:
+        name (str): Provider name (default: embedding_provider from config)
+        model (str): Embedding model (default: vector_model from config)
+
+    Returns:
+        EmbeddingProvider: Provider instance
+    """
+    name = name or get_config()['embedding_provider']
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {name}")
+    return PROVIDERS[name](model)
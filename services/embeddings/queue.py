@@ -0,0 +1,182 @@
+"""
+Embedding work queue
+
+Products waiting for a vector are queued in a side table
+(database/sql/create_embedding_queue_table.sql) instead of being locked in
+companyproducts, so the MERGE never waits for embedding workers. Workers claim
+batches with FOR UPDATE SKIP LOCKED and take a lease on them; the entries are
+deleted in the transaction that writes the vectors. A worker that crashes leaves
+its lease to expire, after which the batch is claimed again. A batch returned
+after a transport error (API or database unavailable) keeps its attempts and is
+not claimed again before its retry time; only entries the embedding API rejected
+count an attempt, and entries that failed max_attempts times are no longer claimed
+until they are queued again (see enqueue).
+"""
+
+from typing import Any, Dict, List, Optional
+from loguru import logger
+
+class EmbeddingQueue:
+    """Embedding queue table in PostgreSQL with leased batches"""
+
+    def __init__(self, client, table: str = 'embedding_queue', worker_id: Optional[str] = None,
+                 lease_seconds: int = 300, max_attempts: int = 5):
+        """
+        Initialize queue
+
+        Args:
+            client (PostgresClient): Initialized client
+            table (str): Queue table
+            worker_id (str): Name recorded on claimed entries
+            lease_seconds (int): Time after which a claimed batch is given to another worker
+            max_attempts (int): Rejected embedding attempts per entry before it is left for inspection
+        """
+        self.client = client
+        self.table = table
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def _execute(self, query: str, params: Optional[Dict[str, Any]] = None, fetch: bool = False):
+        connection = self.client.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            result = cursor.fetchall() if fetch else cursor.rowcount
+            connection.commit()
+            return result
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def enqueue(self, dirty_sql: str, retry_exhausted: bool = False) -> int:
+        """
+        Queue products without up-to-date vectors
+
+        Entries that exhausted max_attempts get their attempts reset when the product
+        changed since it was queued, or always with retry_exhausted (once per run,
+        so a product the API keeps rejecting is not retried in a loop).
+
+        Args:
+            dirty_sql (str): FROM / WHERE clause of the products (aliased p), see tasks.embed.dirty_products_sql
+            retry_exhausted (bool): Reset all exhausted entries
+
+        Returns:
+            int: Number of newly queued or reset products (other queued ones are kept with their lease)
+        """
+        queued = self._execute(f"""
+            WITH dirty AS (SELECT p.id, p.updated_at {dirty_sql})
+            INSERT INTO {self.table} AS q (product_id)
+            SELECT id FROM dirty
+            ON CONFLICT (product_id) DO UPDATE
+            SET attempts = 0, enqueued_at = clock_timestamp(), claimed_by = NULL, lease_until = NULL
+            WHERE q.attempts >= %(max_attempts)s
+            AND (%(retry_exhausted)s OR EXISTS (
+                SELECT 1 FROM dirty d WHERE d.id = q.product_id AND d.updated_at > q.enqueued_at
+            ))
+        """, {'max_attempts': self.max_attempts, 'retry_exhausted': retry_exhausted})
+        if queued:
+            logger.info(f"📥 В очередь {self.table} добавлено товаров: {queued}")
+        return queued
+
+    def claim(self, batch_rows: int) -> List[str]:
+        """
+        Lease a batch of unclaimed or expired entries, oldest first
+
+        Rows locked by a concurrent claim are skipped, so workers never wait for each other.
+        Claiming does not count an attempt (see fail).
+
+        Args:
+            batch_rows (int): Maximum entries to claim
+
+        Returns:
+            List[str]: Claimed product ids
+        """
+        rows = self._execute(f"""
+            UPDATE {self.table} q
+            SET claimed_by = %(worker_id)s,
+                lease_until = clock_timestamp() + make_interval(secs => %(lease_seconds)s)
+            FROM (
+                SELECT product_id FROM {self.table}
+                WHERE (lease_until IS NULL OR lease_until < clock_timestamp())
+                AND attempts < %(max_attempts)s
+                ORDER BY enqueued_at
+                LIMIT %(batch_rows)s
+                FOR UPDATE SKIP LOCKED
+            ) c
+            WHERE q.product_id = c.product_id
+            RETURNING q.product_id::text
+        """, {'worker_id': self.worker_id, 'lease_seconds': self.lease_seconds,
+              'max_attempts': self.max_attempts, 'batch_rows': batch_rows}, fetch=True)
+        return [row[0] for row in rows]
+
+    def release(self, product_ids: List[str], retry_seconds: float = 0) -> int:
+        """
+        Return claimed entries to the queue without counting an attempt (e.g. after a transport error)
+
+        Args:
+            product_ids (List[str]): Claimed product ids
+            retry_seconds (float): Entries are not claimed again before this delay
+
+        Returns:
+            int: Number of returned entries
+        """
+        return self._return(product_ids, retry_seconds, 0)
+
+    def fail(self, product_ids: List[str], retry_seconds: float = 0) -> int:
+        """
+        Return claimed entries the embedding API rejected, counting an attempt
+
+        Args:
+            product_ids (List[str]): Claimed product ids
+            retry_seconds (float): Entries are not claimed again before this delay
+
+        Returns:
+            int: Number of returned entries
+        """
+        return self._return(product_ids, retry_seconds, 1)
+
+    def _return(self, product_ids: List[str], retry_seconds: float, attempts: int) -> int:
+        # Неистёкший lease_until без claimed_by - время, до которого запись не забирают
+        return self._execute(f"""
+            UPDATE {self.table}
+            SET claimed_by = NULL,
+                lease_until = CASE WHEN %(retry_seconds)s > 0
+                              THEN clock_timestamp() + make_interval(secs => %(retry_seconds)s) END,
+                attempts = attempts + %(attempts)s
+            WHERE product_id = ANY(%(ids)s::uuid[]) AND claimed_by = %(worker_id)s
+        """, {'ids': list(product_ids), 'worker_id': self.worker_id, 'retry_seconds': retry_seconds,
+              'attempts': attempts})
+
+    def complete(self, cursor, source_table: str) -> None:
+        """
+        Delete this worker's entries for the products of a staging table
+
+        Runs on the caller's cursor, so entries disappear in the same transaction
+        that writes the vectors. An entry re-claimed by another worker after this
+        worker's lease expired is left to that worker.
+
+        Args:
+            cursor: DBAPI cursor of an open transaction
+            source_table (str): Staging table with an id column
+        """
+        cursor.execute(f"""
+            DELETE FROM {self.table} q
+            USING {source_table} s
+            WHERE q.product_id = s.id AND q.claimed_by = %s
+        """, (self.worker_id,))
+
+    def stats(self) -> Dict[str, int]:
+        """Queued, leased, delayed (waiting for retry), expired and exhausted (max_attempts reached) entries"""
+        rows = self._execute(f"""
+            SELECT COUNT(*),
+                   COUNT(*) FILTER (WHERE lease_until >= clock_timestamp() AND claimed_by IS NOT NULL),
+                   COUNT(*) FILTER (WHERE lease_until >= clock_timestamp() AND claimed_by IS NULL),
+                   COUNT(*) FILTER (WHERE lease_until < clock_timestamp() AND claimed_by IS NOT NULL),
+                   COUNT(*) FILTER (WHERE attempts >= %(max_attempts)s)
+            FROM {self.table}
+        """, {'max_attempts': self.max_attempts}, fetch=True)
+        queued, leased, delayed, expired, exhausted = rows[0]
+        return {'queued': queued, 'leased': leased, 'delayed': delayed, 'expired': expired, 'exhausted': exhausted}
@@ -2,11 +2,12 @@
 PostgreSQL client for data loading
 """
 
+import io
 import pandas as pd
 import re
 from loguru import logger
 from sqlalchemy import create_engine, text
-from airflow.models import Variable
+from oneC_etl.config.provider import get_variable
 from typing import List, Dict
 
 def normalize_column_name(col):
@@ -15,6 +16,18 @@ def normalize_column_name(col):
     normalized = ''.join(c for c in normalized if c.isalnum() or c == '_')
     return normalized
 
+def copy_value(value) -> str:
+    """Format value for PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
 class PostgresClient:
     """PostgreSQL client for data loading"""
     
@@ -22,7 +35,7 @@ class PostgresClient:
         """Initialize PostgreSQL client with connection from Airflow Variables"""
         try:
             # Get connection details from Airflow Variables
-            conn = Variable.get('postgres_connection', deserialize_json=True)
+            conn = get_variable('postgres_connection', deserialize_json=True)
             
             if not conn:
                 raise ValueError("PostgreSQL connection not found in Airflow Variables")
@@ -399,6 +412,43 @@ class PostgresClient:
             logger.exception(f"Error merging data into PostgreSQL: {str(e)}")
             raise
     
+    def copy_rows(self, cursor, table_name: str, columns: List[str], rows, chunk_size: int = 50000) -> int:
+        """
+        Stream rows into table with COPY FROM STDIN
+
+        Args:
+            cursor: DBAPI (psycopg2) cursor of a raw connection, e.g. engine.raw_connection().cursor()
+            table_name (str): Target table
+            columns (List[str]): Column names in row order
+            rows (Iterable[tuple]): Row values; None is written as NULL
+            chunk_size (int): Rows per COPY buffer
+
+        Returns:
+            int: Number of rows copied
+        """
+        copy_sql = f"COPY {table_name} ({', '.join(self._quote_identifier(col) for col in columns)}) FROM STDIN"
+        copied = 0
+        buffer = io.StringIO()
+        buffered = 0
+
+        for row in rows:
+            buffer.write('\t'.join(copy_value(value) for value in row))
+            buffer.write('\n')
+            buffered += 1
+            if buffered >= chunk_size:
+                buffer.seek(0)
+                cursor.copy_expert(copy_sql, buffer)
+                copied += buffered
+                buffer = io.StringIO()
+                buffered = 0
+
+        if buffered:
+            buffer.seek(0)
+            cursor.copy_expert(copy_sql, buffer)
+            copied += buffered
+
+        return copied
+
     def execute_query(self, query: str) -> List[Dict]:
         """
         Execute a SQL query and return results
@@ -4,9 +4,16 @@ PowerBI API client
 
 import os
 import json
+import time
 from loguru import logger
 from msal import ConfidentialClientApplication
-from airflow.models import Variable
+from oneC_etl.config.provider import get_variable
+
+DEFAULT_API_URL = "https://api.powerbi.com/v1.0/myorg"
+POWERBI_SCOPE = "https://analysis.windows.net/powerbi/api/.default"
+
+# Статусы, при которых запрос повторяется (троттлинг и временная недоступность)
+RETRYABLE_STATUS_CODES = {429, 503}
 
 class PowerBIClient:
     """PowerBI API client for data extraction"""
@@ -15,20 +22,27 @@ class PowerBIClient:
         """Initialize PowerBI client with credentials from Airflow Variables"""
         try:
             # Get credentials from separate Airflow Variables
-            self.client_id = Variable.get('powerbi_client_id')
-            self.client_secret = Variable.get('powerbi_client_secret')
-            self.tenant_id = Variable.get('powerbi_tenant_id')
-            self.workspace_id = Variable.get('powerbi_workspace_id')
+            self.client_id = get_variable('powerbi_client_id')
+            self.client_secret = get_variable('powerbi_client_secret')
+            self.tenant_id = get_variable('powerbi_tenant_id')
+            self.workspace_id = get_variable('powerbi_workspace_id')
+            # Base REST URL can be overridden to point the client at a local stand-in
+            self.api_url = get_variable('powerbi_api_url', default_var=DEFAULT_API_URL).rstrip('/')
+            # Plain OAuth2 token endpoint (e.g. local stand-in); MSAL is used when not set
+            self.token_url = get_variable('powerbi_token_url', default_var=None)
+            self.max_retries = int(get_variable('powerbi_max_retries', default_var=3))
             
             if not all([self.client_id, self.client_secret, self.tenant_id, self.workspace_id]):
                 raise ValueError("PowerBI credentials not found in Airflow Variables")
             
             # Initialize MSAL client
-            self.client = ConfidentialClientApplication(
-                client_id=self.client_id,
-                client_credential=self.client_secret,
-                authority=f"https://login.microsoftonline.com/{self.tenant_id}"
-            )
+            self.client = None
+            if not self.token_url:
+                self.client = ConfidentialClientApplication(
+                    client_id=self.client_id,
+                    client_credential=self.client_secret,
+                    authority=f"https://login.microsoftonline.com/{self.tenant_id}"
+                )
             
             # Get access token
             self.token = self._get_access_token()
@@ -40,9 +54,24 @@ class PowerBIClient:
     def _get_access_token(self):
         """Get PowerBI API access token"""
         try:
-            result = self.client.acquire_token_for_client(
-                scopes=["https://analysis.windows.net/powerbi/api/.default"]
-            )
+            if self.token_url:
+                import requests
+                
+                response = requests.post(
+                    self.token_url.format(tenant_id=self.tenant_id),
+                    data={
+                        "grant_type": "client_credentials",
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "scope": POWERBI_SCOPE
+                    }
+                )
+                response.raise_for_status()
+                result = response.json()
+            else:
+                result = self.client.acquire_token_for_client(
+                    scopes=[POWERBI_SCOPE]
+                )
             
             if "access_token" not in result:
                 error_msg = f"Failed to acquire access token. Response: {json.dumps(result)}"
@@ -55,6 +84,33 @@ class PowerBIClient:
             logger.exception(f"Error getting access token: {str(e)}")
             raise
     
+    def _request_with_retry(self, method, url, **kwargs):
+        """
+        Send request, retrying throttled and temporarily unavailable responses
+        
+        Args:
+            method (callable): requests.get / requests.post
+            url (str): Request URL
+            **kwargs: Request arguments
+            
+        Returns:
+            requests.Response: Last response received
+        """
+        attempt = 0
+        while True:
+            response = method(url, **kwargs)
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            
+            attempt += 1
+            # Retry-After задаётся в секундах; без заголовка используем экспоненциальную задержку
+            try:
+                delay = float(response.headers.get('Retry-After', 2 ** attempt))
+            except ValueError:
+                delay = 2 ** attempt
+            logger.warning(f"PowerBI responded {response.status_code}, retry {attempt}/{self.max_retries} in {delay}s")
+            time.sleep(delay)
+    
     def execute_query(self, dataset_id, query):
         """
         Execute DAX query against PowerBI dataset
@@ -70,7 +126,7 @@ class PowerBIClient:
             import requests
             
             # Prepare request
-            url = f"https://api.powerbi.com/v1.0/myorg/groups/{self.workspace_id}/datasets/{dataset_id}/executeQueries"
+            url = f"{self.api_url}/groups/{self.workspace_id}/datasets/{dataset_id}/executeQueries"
             headers = {
                 "Authorization": f"Bearer {self.token}",
                 "Content-Type": "application/json"
@@ -91,7 +147,7 @@ class PowerBIClient:
             # logger.info(f"Request body: {json.dumps(body, indent=2, ensure_ascii=False)}")  # Убрано по требованию
             
             # Execute request
-            response = requests.post(url, headers=headers, json=body)
+            response = self._request_with_retry(requests.post, url, headers=headers, json=body)
             
             if response.status_code != 200:
                 error_msg = f"Error response: {response.text}"
@@ -119,4 +175,49 @@ class PowerBIClient:
             raise
         except Exception as e:
             logger.exception(f"Error executing PowerBI query: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+    
+    def get_refresh_history(self, dataset_id, top=10):
+        """
+        Get refresh history of PowerBI dataset
+        
+        Args:
+            dataset_id (str): PowerBI dataset ID
+            top (int): Number of most recent refreshes to request
+            
+        Returns:
+            list: Refresh entries, most recent first
+        """
+        try:
+            import requests
+            
+            url = f"{self.api_url}/groups/{self.workspace_id}/datasets/{dataset_id}/refreshes"
+            headers = {"Authorization": f"Bearer {self.token}"}
+            
+            response = self._request_with_retry(requests.get, url, headers=headers, params={"$top": top})
+            
+            if response.status_code != 200:
+                logger.error(f"Error response: {response.text}")
+                response.raise_for_status()
+            
+            return response.json().get('value', [])
+            
+        except Exception as e:
+            logger.exception(f"Error getting PowerBI refresh history: {str(e)}")
+            raise
+    
+    def get_last_successful_refresh(self, dataset_id):
+        """
+        Get the most recent completed refresh of PowerBI dataset
+        
+        Args:
+            dataset_id (str): PowerBI dataset ID
+            
+        Returns:
+            dict: Refresh entry with 'requestId', 'startTime', 'endTime', or None
+                if the dataset has no completed refreshes in recent history
+        """
+        for refresh in self.get_refresh_history(dataset_id):
+            if refresh.get('status') == 'Completed' and refresh.get('endTime'):
+                return refresh
+        return None
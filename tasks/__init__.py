@@ -4,6 +4,12 @@ ETL tasks package
 
 from .extract import extract_powerbi_data
 from .load import execute_etl_task
+from .properties import load_product_properties
 from .cleanup import cleanup_orphaned_records
+from .validate import validate_products
+from .embed import generate_embeddings
+from .similarities import compute_product_similarities
+from .import_embeddings import import_embeddings
+from .duplicates import find_duplicate_products
 
-__all__ = ['extract_powerbi_data', 'execute_etl_task', 'cleanup_orphaned_records']
+__all__ = ['extract_powerbi_data', 'execute_etl_task', 'load_product_properties', 'cleanup_orphaned_records', 'validate_products', 'generate_embeddings', 'compute_product_similarities', 'import_embeddings', 'find_duplicate_products']
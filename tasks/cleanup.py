@@ -6,13 +6,42 @@ import pandas as pd
 from loguru import logger
 from oneC_etl.services.postgres.client import PostgresClient
 from oneC_etl.config.settings import get_config
+from oneC_etl.tasks.extract import iter_extracted_rows
+
+def _extracted_ids(data, key_column):
+    """
+    Key values of the PowerBI export
+
+    Args:
+        data: DataFrame, list of dicts or extract_powerbi_data spill result (streamed from the file)
+        key_column (str): Key column name
+
+    Returns:
+        tuple: (set of key values as str, number of export rows)
+    """
+    if isinstance(data, pd.DataFrame):
+        if key_column not in data.columns:
+            raise ValueError(f"Required key column '{key_column}' not found in data")
+        return set(data[key_column].dropna().astype(str)), len(data)
+
+    ids = set()
+    rows = 0
+    has_key = False
+    for row in iter_extracted_rows(data):
+        rows += 1
+        has_key = has_key or key_column in row
+        if row.get(key_column) is not None:
+            ids.add(str(row[key_column]))
+    if not has_key:
+        raise ValueError(f"Required key column '{key_column}' not found in data")
+    return ids, rows
 
 def cleanup_orphaned_records(data, task_config):
     """
     Remove records from target table that are not present in the new PowerBI export
     
     Args:
-        data (list): List of dictionaries from PowerBI export
+        data: List of dictionaries from PowerBI export, DataFrame or spill result of extract_powerbi_data
         task_config (dict): Task configuration containing:
             - target_table: Target table name to clean
             - key_column: Primary key column name (usually 'id')
@@ -27,23 +56,17 @@ def cleanup_orphaned_records(data, task_config):
         # Initialize PostgreSQL client
         client = PostgresClient()
         
-        # Convert data to DataFrame if it's a list
-        if isinstance(data, list):
-            df = pd.DataFrame(data)
-        else:
-            df = data
-        
         # Get the key column values from new data
         key_column = task_config['key_column']
         target_table = task_config['target_table']
         
-        if key_column not in df.columns:
-            raise ValueError(f"Required key column '{key_column}' not found in data")
+        # Из выгрузки нужны только ключи - файл spill читается построчно
+        new_ids, new_rows = _extracted_ids(data, key_column)
         
         logger.info(f"🔍 Анализируем данные:")
         logger.info(f"   - Колонка ключа: {key_column}")
         logger.info(f"   - Целевая таблица: {target_table}")
-        logger.info(f"   - Новых записей из PowerBI: {len(df)}")
+        logger.info(f"   - Новых записей из PowerBI: {new_rows}")
         
         # Get all existing IDs from the target table
         existing_ids_query = f"""
@@ -56,9 +79,6 @@ def cleanup_orphaned_records(data, task_config):
         
         logger.info(f"   - Существующих записей в БД: {len(existing_ids)}")
         
-        # Get IDs from new PowerBI export
-        new_ids = set(df[key_column].dropna().astype(str))
-        
         logger.info(f"   - Уникальных ID в новой выгрузке: {len(new_ids)}")
         
         # Debug: показываем несколько примеров ID
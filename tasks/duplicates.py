@@ -0,0 +1,403 @@
+"""
+Near-duplicate products module
+
+Finds groups of near-identical products (the same item in several finishes,
+re-imported SKUs) over the memory-mapped vector matrix (vector_search/memmap.py)
+and writes them to product_duplicates (database/sql/create_product_duplicates_table.sql).
+
+An exact all-pairs pass is N x N; instead the vectors are split into partitions by
+spherical k-means on a sample, and every product is compared only with the products
+of its nearest partitions (probes). Each partition is one blocked top-k
+(MemmapVectorIndex.top_k with candidate_rows), so the whole neighbour graph costs
+about N * probes * N / partitions dot products. Pairs with similarity at or above
+the threshold are graph edges; connected components (union-find, vectorised over
+the edge arrays) of two or more products are the duplicate groups.
+
+Components are transitive: A ~ B and B ~ C put A and C in one group even when
+A and C are below the threshold, so the threshold should stay close to 1.
+
+Example:
+    python -m oneC_etl.tasks.duplicates --threshold 0.96
+"""
+
+import argparse
+from datetime import datetime
+import numpy as np
+from loguru import logger
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.vector_search.memmap import DEFAULT_INDEX_DIR, MemmapVectorIndex
+from oneC_etl.vector_search.storage import VectorSource
+
+DUPLICATE_COLUMNS = ['product_id', 'group_id', 'group_size', 'similarity', 'is_representative', 'computed_at']
+
+# Выборка для k-means: строк на раздел (больше - точнее центры, дольше обучение)
+SAMPLE_ROWS_PER_PARTITION = 64
+
+def default_partitions(rows):
+    """Number of partitions for rows vectors: ~sqrt(rows), so partition size and count are balanced"""
+    return max(1, int(np.sqrt(rows)))
+
+def train_partitions(index, rows, partitions, iterations=10, seed=42, tile_rows=4096):
+    """
+    Spherical k-means centres on a sample of rows
+
+    Args:
+        index (MemmapVectorIndex): Refreshed vector matrix (rows are unit length)
+        rows (np.ndarray): Matrix rows to partition
+        partitions (int): Number of centres
+        iterations (int): k-means iterations
+        seed (int): Sampling seed
+        tile_rows (int): Rows per assignment multiplication
+
+    Returns:
+        np.ndarray: partitions x dim unit-length centres
+    """
+    rng = np.random.default_rng(seed)
+    partitions = max(1, min(partitions, len(rows)))
+    sample_size = min(len(rows), partitions * SAMPLE_ROWS_PER_PARTITION)
+    # Строки выборки по порядку файла - чтение memmap последовательнее
+    sample = np.asarray(index.vectors[np.sort(rng.choice(rows, sample_size, replace=False))], dtype=np.float32)
+    centres = sample[rng.choice(sample_size, partitions, replace=False)].copy()
+
+    for _ in range(iterations):
+        nearest = np.concatenate([np.argmax(sample[start:start + tile_rows] @ centres.T, axis=1)
+                                  for start in range(0, sample_size, tile_rows)])
+        # Суммы по разделам: строки выборки, отсортированные по разделу, складываются отрезками
+        order = np.argsort(nearest, kind='stable')
+        sizes = np.bincount(nearest, minlength=partitions)
+        sums = np.zeros_like(centres)
+        filled = np.flatnonzero(sizes)
+        sums[filled] = np.add.reduceat(sample[order], np.concatenate([[0], np.cumsum(sizes)[:-1]])[filled], axis=0)
+        # Пустой раздел получает случайную строку выборки, иначе центр выпадает навсегда
+        empty = np.flatnonzero(sizes == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centres = sums / norms
+    return centres.astype(np.float32)
+
+def assign_partitions(index, rows, centres, probes, tile_rows=4096):
+    """
+    Nearest centres of rows
+
+    Args:
+        index (MemmapVectorIndex): Refreshed vector matrix
+        rows (np.ndarray): Matrix rows
+        centres (np.ndarray): Partition centres
+        probes (int): Nearest centres to return per row
+        tile_rows (int): Rows per multiplication
+
+    Returns:
+        np.ndarray: len(rows) x probes partition numbers, nearest first (column 0 is the home partition)
+    """
+    probes = max(1, min(probes, len(centres)))
+    assigned = np.zeros((len(rows), probes), dtype=np.int32)
+    for start in range(0, len(rows), tile_rows):
+        scores = np.asarray(index.vectors[rows[start:start + tile_rows]]) @ centres.T
+        nearest = np.argpartition(-scores, probes - 1, axis=1)[:, :probes]
+        order = np.argsort(-np.take_along_axis(scores, nearest, axis=1), axis=1)
+        assigned[start:start + tile_rows] = np.take_along_axis(nearest, order, axis=1)
+    return assigned
+
+def neighbour_edges(index, rows, assigned, threshold, max_neighbours=10, same_category=True,
+                    tile_rows=1024, block_rows=16384):
+    """
+    Edges of the neighbour graph: pairs with similarity >= threshold
+
+    Every row is compared with the rows whose home partition is one of its probes.
+
+    Args:
+        index (MemmapVectorIndex): Refreshed vector matrix
+        rows (np.ndarray): Matrix rows
+        assigned (np.ndarray): Partitions per row from assign_partitions
+        threshold (float): Minimum similarity (1 - cosine distance)
+        max_neighbours (int): Neighbours per row and partition (enough to connect a group)
+        same_category (bool): Only connect products of the same category
+        tile_rows (int): Query rows per multiplication tile
+        block_rows (int): Partition rows per multiplication block
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Edge ends (matrix rows) and similarities
+    """
+    partitions = int(assigned.max()) + 1
+    home = assigned[:, 0]
+    members_order = np.argsort(home, kind='stable')
+    members_bounds = np.searchsorted(home[members_order], np.arange(partitions + 1))
+
+    probe_partitions = assigned.ravel()
+    probe_rows = np.repeat(np.arange(len(rows)), assigned.shape[1])
+    probes_order = np.argsort(probe_partitions, kind='stable')
+    probes_bounds = np.searchsorted(probe_partitions[probes_order], np.arange(partitions + 1))
+
+    left, right, similarities = [], [], []
+    for partition in range(partitions):
+        members = rows[members_order[members_bounds[partition]:members_bounds[partition + 1]]]
+        queries = rows[probe_rows[probes_order[probes_bounds[partition]:probes_bounds[partition + 1]]]]
+        if not len(members) or not len(queries):
+            continue
+        k = min(max_neighbours, len(members))
+        for start in range(0, len(queries), tile_rows):
+            tile = queries[start:start + tile_rows]
+            # С весом категории 0.5 товар своей категории выше порога всегда опережает чужую категорию
+            best_rows, _, best_similarity = index.top_k(
+                np.asarray(index.vectors[tile]), k,
+                query_categories=[index.categories[row] for row in tile] if same_category else None,
+                exclude_rows=tile,
+                category_weight=0.5 if same_category else 0.0,
+                block_rows=block_rows,
+                candidate_rows=members
+            )
+            hit = (best_rows >= 0) & (best_similarity >= threshold)
+            query_rows = np.broadcast_to(tile[:, None], hit.shape)[hit]
+            neighbour_rows = best_rows[hit]
+            similarity = best_similarity[hit]
+            if same_category and len(query_rows):
+                match = np.array([index.categories[a] == index.categories[b]
+                                  for a, b in zip(query_rows, neighbour_rows)], dtype=bool)
+                query_rows, neighbour_rows, similarity = query_rows[match], neighbour_rows[match], similarity[match]
+            left.append(query_rows)
+            right.append(neighbour_rows)
+            similarities.append(similarity)
+
+    if not left:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(left), np.concatenate(right), np.concatenate(similarities).astype(np.float32)
+
+def union_find(count, left, right):
+    """
+    Connected components of a graph given as edge arrays
+
+    Vectorised union-find: every pass hooks the larger root of each edge under the
+    smaller one, then compresses paths until every node points at its root.
+
+    Args:
+        count (int): Number of nodes (0..count-1)
+        left (np.ndarray): Edge ends
+        right (np.ndarray): Edge ends
+
+    Returns:
+        np.ndarray: Root (smallest node of the component) per node
+    """
+    parent = np.arange(count, dtype=np.int64)
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    while True:
+        left_roots, right_roots = parent[left], parent[right]
+        linked = left_roots != right_roots
+        if not linked.any():
+            return parent
+        # Корень всегда подвешивается к меньшему номеру - циклов нет
+        np.minimum.at(parent, np.maximum(left_roots, right_roots)[linked], np.minimum(left_roots, right_roots)[linked])
+        while True:
+            compressed = parent[parent]
+            if np.array_equal(compressed, parent):
+                break
+            parent = compressed
+
+def duplicate_groups(rows, left, right, similarity):
+    """
+    Duplicate groups from the edges of the neighbour graph
+
+    Args:
+        rows (np.ndarray): Matrix rows the edges refer to
+        left (np.ndarray): Edge ends (matrix rows)
+        right (np.ndarray): Edge ends (matrix rows)
+        similarity (np.ndarray): Edge similarities
+
+    Returns:
+        dict: Arrays over grouped rows: row, group (representative row), size, similarity
+            (best edge of the row) and representative flag; the representative of a group
+            is its member with the most edges
+    """
+    position = np.full(int(rows.max()) + 1 if len(rows) else 0, -1, dtype=np.int64)
+    position[rows] = np.arange(len(rows))
+    left_positions, right_positions = position[left], position[right]
+
+    roots = union_find(len(rows), left_positions, right_positions)
+    sizes = np.bincount(roots, minlength=len(rows))
+    degree = np.bincount(np.concatenate([left_positions, right_positions]), minlength=len(rows))
+    best = np.zeros(len(rows), dtype=np.float32)
+    np.maximum.at(best, left_positions, similarity)
+    np.maximum.at(best, right_positions, similarity)
+
+    grouped = np.flatnonzero(sizes[roots] > 1)
+    # Представитель: больше всего рёбер, при равенстве - меньшая строка
+    order = np.lexsort((grouped, -degree[grouped], roots[grouped]))
+    ordered = grouped[order]
+    first = np.ones(len(ordered), dtype=bool)
+    first[1:] = roots[ordered][1:] != roots[ordered][:-1]
+    representative_of = np.zeros(len(rows), dtype=np.int64)
+    representative_of[roots[ordered[first]]] = ordered[first]
+
+    return {
+        'row': rows[ordered],
+        'group': rows[representative_of[roots[ordered]]],
+        'size': sizes[roots[ordered]],
+        'similarity': best[ordered],
+        'representative': first,
+    }
+
+def write_duplicates(client, target_table, products_table, rows):
+    """
+    Replace all groups with COPY into a temp table, DELETE and INSERT in one transaction
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Duplicates table
+        products_table (str): Products table
+        rows (Iterable[tuple]): Rows in DUPLICATE_COLUMNS order
+
+    Returns:
+        int: Number of written rows
+    """
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"CREATE TEMP TABLE tmp_duplicates (LIKE {target_table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        written = client.copy_rows(cursor, 'tmp_duplicates', DUPLICATE_COLUMNS, rows)
+
+        cursor.execute(f"DELETE FROM {target_table}")
+        # Товар мог быть удалён из таблицы товаров во время расчёта
+        cursor.execute(f"""
+            INSERT INTO {target_table} ({', '.join(DUPLICATE_COLUMNS)})
+            SELECT {', '.join('d.' + column for column in DUPLICATE_COLUMNS)}
+            FROM tmp_duplicates d
+            WHERE EXISTS (SELECT 1 FROM {products_table} p WHERE p.id = d.product_id)
+        """)
+        connection.commit()
+        return written
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def detect_duplicates(index, task_config):
+    """
+    Duplicate groups of all live rows of a matrix (no database access)
+
+    Args:
+        index (MemmapVectorIndex): Refreshed vector matrix
+        task_config (dict): threshold, partitions, probes, max_neighbours, same_category,
+            kmeans_iterations, tile_rows, block_rows, seed (see find_duplicate_products)
+
+    Returns:
+        Tuple[dict, dict]: Groups from duplicate_groups and statistics (edges, partitions, timings)
+    """
+    threshold = task_config.get('threshold', 0.96)
+    probes = task_config.get('probes', 2)
+    tile_rows = task_config.get('tile_rows', 1024)
+    live_rows = np.flatnonzero(index.valid[:index.count])
+    partitions = task_config.get('partitions') or default_partitions(len(live_rows))
+    stats = {'products': len(live_rows), 'partitions': 0, 'probes': probes, 'threshold': threshold}
+
+    started = datetime.utcnow()
+    centres = train_partitions(index, live_rows, partitions, task_config.get('kmeans_iterations', 10),
+                               task_config.get('seed', 42))
+    assigned = assign_partitions(index, live_rows, centres, probes)
+    stats['partitions'] = len(centres)
+    stats['largest_partition'] = int(np.bincount(assigned[:, 0]).max())
+    stats['partition_s'] = round((datetime.utcnow() - started).total_seconds(), 3)
+
+    started = datetime.utcnow()
+    left, right, similarity = neighbour_edges(
+        index, live_rows, assigned, threshold, task_config.get('max_neighbours', 10),
+        task_config.get('same_category', True), tile_rows, task_config.get('block_rows', 16384)
+    )
+    stats['edges'] = len(left)
+    stats['graph_s'] = round((datetime.utcnow() - started).total_seconds(), 3)
+
+    groups = duplicate_groups(live_rows, left, right, similarity)
+    stats['groups'] = int(groups['representative'].sum())
+    stats['grouped_products'] = len(groups['row'])
+    return groups, stats
+
+def find_duplicate_products(task_config, client=None, index=None):
+    """
+    Find near-duplicate product groups and write them to the duplicates table
+
+    Args:
+        task_config (dict): Task configuration containing:
+            - target_table: Duplicates table (product_duplicates)
+            - products_table: Products table (companyproducts)
+            - index_path: Memory-mapped matrix directory (None - data/vector_index)
+            - threshold: Minimum similarity of a duplicate pair
+            - partitions: k-means partitions (None - sqrt of the number of products)
+            - probes: Nearest partitions searched per product
+            - max_neighbours: Neighbours per product and partition
+            - same_category: Only group products of the same category
+            - kmeans_iterations: k-means iterations on the sample
+            - tile_rows: Query products per multiplication tile
+            - block_rows: Partition rows per multiplication block
+        client (PostgresClient): Optional initialized client
+        index (MemmapVectorIndex): Optional opened matrix (refreshed by the task)
+
+    Returns:
+        dict: Statistics with 'status' (success, failed)
+    """
+    target_table = task_config.get('target_table', 'product_duplicates')
+    products_table = task_config.get('products_table', 'companyproducts')
+    started = datetime.utcnow()
+
+    try:
+        if client is None:
+            client = PostgresClient()
+
+        computed_at = client.execute_query("SELECT LOCALTIMESTAMP AS now")[0]['now']
+        if index is None:
+            index = MemmapVectorIndex(task_config.get('index_path') or DEFAULT_INDEX_DIR, products_table)
+        index.refresh(client, source=VectorSource(products_table))
+
+        if not index.valid[:index.count].any():
+            logger.info("ℹ️ Нет векторизованных товаров для поиска дубликатов")
+            return {'target': target_table, 'products': 0, 'groups': 0, 'written_rows': 0, 'status': 'success'}
+
+        groups, stats = detect_duplicates(index, task_config)
+        stats['target'] = target_table
+        logger.info(f"🧮 Дубликаты: {stats['products']} товаров в {stats['partitions']} разделах "
+                    f"(обучение {stats['partition_s']} с), {stats['edges']} пар выше порога {stats['threshold']} "
+                    f"(граф {stats['graph_s']} с), {stats['groups']} групп")
+
+        stats['written_rows'] = write_duplicates(client, target_table, products_table, (
+            (index.ids[row], index.ids[group], int(size), float(similarity), bool(representative), computed_at)
+            for row, group, size, similarity, representative in zip(
+                groups['row'], groups['group'], groups['size'], groups['similarity'], groups['representative'])
+        ))
+
+        stats['duration_s'] = round((datetime.utcnow() - started).total_seconds(), 3)
+        stats['status'] = 'success'
+        logger.info(f"✅ Дубликаты записаны: {stats['groups']} групп, {stats['written_rows']} товаров "
+                    f"за {stats['duration_s']} с")
+        return stats
+
+    except Exception as e:
+        logger.exception(f"❌ Ошибка поиска дубликатов товаров: {str(e)}")
+        return {
+            'target': target_table,
+            'error': str(e),
+            'status': 'failed'
+        }
+
+def main():
+    """Run duplicate detection from command line"""
+    from oneC_etl.config.pipelines import get_pipeline
+
+    parser = argparse.ArgumentParser(description="Near-duplicate product groups over embeddings")
+    parser.add_argument("--threshold", type=float, default=None, help="Minimum similarity of a duplicate pair")
+    parser.add_argument("--partitions", type=int, default=None)
+    parser.add_argument("--probes", type=int, default=None)
+    parser.add_argument("--any-category", action='store_true', help="Also group products of different categories")
+    args = parser.parse_args()
+
+    task_config = dict(get_pipeline('company_products')['duplicates'])
+    for key in ('threshold', 'partitions', 'probes'):
+        if getattr(args, key) is not None:
+            task_config[key] = getattr(args, key)
+    if args.any_category:
+        task_config['same_category'] = False
+
+    print(find_duplicate_products(task_config))
+
+if __name__ == '__main__':
+    main()
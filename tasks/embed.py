@@ -0,0 +1,330 @@
+"""
+Embedding generation module
+
+Selects products with is_vector = FALSE (new rows and rows whose business columns
+changed, see PostgresClient.merge_data), builds the merged text
+(description | Brand | Category), embeds it in token-budgeted batches with bounded
+concurrency and writes vectors back with COPY + UPDATE, setting is_vector = TRUE.
+A row is only updated if its updated_at did not change while it was being embedded.
+With cache_table set, vectors are first looked up in the content-addressed cache
+(services/embeddings/cache.py) and only new texts are sent to the provider.
+
+With vector_storage = side_table the vectors go to product_embeddings instead
+(vector_search/storage.py): products without a row for the model or whose merged
+text no longer matches text_hash are selected, and vectors are upserted there
+without rewriting the product rows.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from loguru import logger
+from oneC_etl.config.settings import get_config
+from oneC_etl.services.embeddings.cache import PostgresEmbeddingCache, embedding_key, embedding_key_sql
+from oneC_etl.services.embeddings.client import create_provider
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.vector_search.prefilter import ensure_partial_indexes
+from oneC_etl.vector_search.storage import VectorSource
+
+EMBEDDING_COLUMNS = ['id', 'updated_at', 'merged', 'key', 'model', 'vector']
+
+def build_merged_text(row):
+    """
+    Text used for embeddings, in the format of companyproducts.merged
+
+    Args:
+        row (dict): Product row with description, brand and category
+
+    Returns:
+        str: "description | Brand: brand | Category: category"
+    """
+    return f"{row.get('description') or ''} | Brand: {row.get('brand') or ''} | Category: {row.get('category') or ''}"
+
+# То же, что build_merged_text, в SQL: text_hash боковой таблицы сверяется без выгрузки текстов
+MERGED_TEXT_SQL = ("coalesce(p.description, '') || ' | Brand: ' || coalesce(p.brand, '') "
+                   "|| ' | Category: ' || coalesce(p.category, '')")
+
+def vector_literal(vector):
+    """Format vector as pgvector text input ('[x,y,...]')"""
+    return '[' + ','.join(repr(float(x)) for x in vector) + ']'
+
+def batch_by_tokens(items, count_tokens, max_tokens, max_inputs):
+    """
+    Split items into batches limited by total tokens and number of inputs
+
+    Args:
+        items (list): Dicts with 'merged' text
+        count_tokens (callable): Token counter for a text
+        max_tokens (int): Token budget per batch (a longer single text gets its own batch)
+        max_inputs (int): Maximum texts per batch
+
+    Yields:
+        list: Batch of items
+    """
+    batch = []
+    batch_tokens = 0
+    for item in items:
+        tokens = count_tokens(item['merged'])
+        if batch and (batch_tokens + tokens > max_tokens or len(batch) >= max_inputs):
+            yield batch
+            batch = []
+            batch_tokens = 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+def dirty_products_sql(target_table, source):
+    """
+    FROM / WHERE clause selecting products without up-to-date vectors (products aliased p)
+
+    Args:
+        target_table (str): Products table
+        source (VectorSource): Vector storage
+
+    Returns:
+        str: SQL fragment
+    """
+    if source.side_table:
+        return f"""
+            FROM {target_table} p
+            LEFT JOIN {source.embeddings_table} e ON e.product_id = p.id AND e.{source.model_filter}
+            WHERE e.product_id IS NULL OR e.text_hash <> {embedding_key_sql(source.model_literal, MERGED_TEXT_SQL)}
+        """
+    return f"FROM {target_table} p WHERE p.is_vector = false"
+
+def select_dirty_rows(client, target_table, limit=None, source=None):
+    """
+    Select products without up-to-date vectors
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Products table
+        limit (int): Maximum rows per run (None - all)
+        source (VectorSource): Vector storage (default: vector_storage from config)
+
+    Returns:
+        list: Dicts with id, updated_at and merged text
+    """
+    source = source or VectorSource(target_table)
+    rows = client.execute_query(f"""
+        SELECT p.id, p.description, p.brand, p.category, p.updated_at
+        {dirty_products_sql(target_table, source)}
+        ORDER BY p.updated_at NULLS FIRST
+        {f'LIMIT {int(limit)}' if limit else ''}
+    """)
+    return [
+        {'id': row['id'], 'updated_at': row['updated_at'], 'merged': build_merged_text(row)}
+        for row in rows
+    ]
+
+def write_embeddings(client, target_table, rows, cache=None, source=None, queue=None):
+    """
+    Write vectors with COPY into a temp table and UPDATE the products in one transaction
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Products table
+        rows (list): Tuples (id, updated_at, merged, cache key, model, vector literal)
+        cache (PostgresEmbeddingCache): Cache to store the vectors in (None - no cache)
+        source (VectorSource): Vector storage (default: vector_storage from config)
+        queue (EmbeddingQueue): Queue whose claimed entries for the rows are completed in the same transaction
+
+    Returns:
+        int: Number of updated products
+    """
+    source = source or VectorSource(target_table)
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE tmp_embeddings (
+                id UUID,
+                updated_at TIMESTAMP,
+                merged TEXT,
+                key CHAR(64),
+                model VARCHAR(255),
+                vector TEXT
+            ) ON COMMIT DROP
+        """)
+        client.copy_rows(cursor, 'tmp_embeddings', EMBEDDING_COLUMNS, rows)
+
+        if source.side_table:
+            # text_hash - ключ посчитанного текста: если текст изменился во время расчёта,
+            # хэш не совпадёт и товар будет выбран снова. Строки товаров не переписываются
+            cursor.execute(f"""
+                INSERT INTO {source.embeddings_table} (product_id, model, vector, text_hash)
+                SELECT s.id, s.model, s.vector::vector, s.key
+                FROM tmp_embeddings s
+                JOIN {target_table} t ON t.id = s.id
+                ON CONFLICT (product_id, model) DO UPDATE
+                SET vector = EXCLUDED.vector, text_hash = EXCLUDED.text_hash, updated_at = CURRENT_TIMESTAMP
+                WHERE {source.embeddings_table}.text_hash IS DISTINCT FROM EXCLUDED.text_hash
+            """)
+        else:
+            # updated_at не меняется: строка, изменённая во время расчёта, остаётся is_vector = false
+            cursor.execute(f"""
+                UPDATE {target_table} t
+                SET vector = s.vector::vector, merged = s.merged, is_vector = true
+                FROM tmp_embeddings s
+                WHERE t.id = s.id
+                AND t.updated_at IS NOT DISTINCT FROM s.updated_at
+                AND t.is_vector = false
+            """)
+        updated = cursor.rowcount
+        if cache is not None:
+            cache.store(cursor, 'tmp_embeddings')
+        if queue is not None:
+            queue.complete(cursor, 'tmp_embeddings')
+        connection.commit()
+        return updated
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def generate_embeddings(task_config, client=None, provider=None):
+    """
+    Embed products without up-to-date vectors and write the vectors back
+
+    Args:
+        task_config (dict): Task configuration containing:
+            - target_table: Products table (companyproducts)
+            - batch_tokens: Token budget per embedding request
+            - batch_inputs: Maximum texts per embedding request
+            - concurrency: Parallel embedding requests
+            - write_rows: Vectors written per COPY + UPDATE transaction
+            - max_rows: Maximum rows per run (None - all)
+            - ensure_index: Create/maintain the ANN index after writing vectors
+            - partial_indexes: Also maintain partial ANN indexes of the largest categories (vector_search/prefilter.py)
+            - cache_table: Embedding cache table (None - no cache)
+            - workers: With more than 1, embed through the embedding queue (tasks/embed_queue.py)
+        client (PostgresClient): Optional initialized client
+        provider (EmbeddingProvider): Optional provider (default: create_provider())
+
+    Returns:
+        dict: Statistics with 'status' (success, warning if some batches failed, failed, skipped)
+            and cache_hits / cache_hit_rate / saved_requests when the cache is enabled
+    """
+    target_table = task_config.get('target_table', 'companyproducts')
+    config = get_config()
+
+    if not config['enable_vector_updates']:
+        logger.info("ℹ️ Обновление векторов отключено (enable_vector_updates = false)")
+        return {'target': target_table, 'status': 'skipped'}
+
+    if task_config.get('workers', 1) > 1:
+        from oneC_etl.tasks.embed_queue import run_embedding_workers
+        return run_embedding_workers(task_config, client, provider)
+
+    try:
+        if client is None:
+            client = PostgresClient()
+
+        source = VectorSource(target_table, model=provider.model if provider is not None else None)
+        items = select_dirty_rows(client, target_table, task_config.get('max_rows'), source)
+        if not items:
+            logger.info("✅ Все товары векторизованы")
+            return {'target': target_table, 'dirty_rows': 0, 'embedded_rows': 0, 'updated_rows': 0, 'status': 'success'}
+
+        if provider is None:
+            provider = create_provider()
+        model = provider.model
+        for item in items:
+            item['key'] = embedding_key(model, item['merged'])
+
+        batch_tokens = task_config.get('batch_tokens', 50000)
+        batch_inputs = task_config.get('batch_inputs', 500)
+        concurrency = task_config.get('concurrency', 4)
+        write_rows = task_config.get('write_rows', 5000)
+
+        cache = None
+        cached = {}
+        if task_config.get('cache_table'):
+            cache = PostgresEmbeddingCache(client, task_config['cache_table'])
+            cached = cache.get_many(item['key'] for item in items)
+
+        # Одинаковые тексты (в том числе у разных товаров) отправляются в API один раз
+        misses = {}
+        for item in items:
+            if item['key'] not in cached:
+                misses.setdefault(item['key'], []).append(item)
+        texts = [group[0] for group in misses.values()]
+        batches = list(batch_by_tokens(texts, provider.count_tokens, batch_tokens, batch_inputs))
+
+        stats = {'target': target_table, 'model': model, 'dirty_rows': len(items),
+                 'cache_hits': len(items) - sum(len(group) for group in misses.values()),
+                 'api_inputs': len(texts), 'requests': len(batches),
+                 'embedded_rows': 0, 'updated_rows': 0, 'failed_rows': 0}
+        if cache is not None:
+            requests_without_cache = sum(1 for _ in batch_by_tokens(items, provider.count_tokens, batch_tokens, batch_inputs))
+            stats['cache_hit_rate'] = round(stats['cache_hits'] / len(items), 4)
+            stats['saved_requests'] = requests_without_cache - len(batches)
+            stats['saved_inputs'] = len(items) - len(texts)
+            logger.info(f"🗃️ Кэш эмбеддингов: {stats['cache_hits']}/{len(items)} попаданий "
+                        f"({stats['cache_hit_rate']:.1%}), сэкономлено запросов к API: {stats['saved_requests']}, "
+                        f"текстов: {stats['saved_inputs']}")
+        logger.info(f"🧮 Векторизация {len(texts)} текстов моделью {model}: "
+                    f"{len(batches)} запросов, до {concurrency} параллельно")
+
+        pending = [
+            (item['id'], item['updated_at'], item['merged'], item['key'], model, cached[item['key']])
+            for item in items if item['key'] in cached
+        ]
+        stats['embedded_rows'] += len(pending)
+
+        def flush(force=False):
+            # Пишем по мере готовности, чтобы не держать все векторы в памяти и не терять готовые при сбое
+            nonlocal pending
+            while pending and (force or len(pending) >= write_rows):
+                chunk, pending = pending[:write_rows], pending[write_rows:]
+                stats['updated_rows'] += write_embeddings(client, target_table, chunk, cache, source)
+
+        flush()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {executor.submit(provider.embed, [item['merged'] for item in batch]): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                group_rows = sum(len(misses[item['key']]) for item in batch)
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка векторизации пакета из {len(batch)} текстов: {str(e)}")
+                    stats['failed_rows'] += group_rows
+                    continue
+
+                stats['embedded_rows'] += group_rows
+                for text_item, vector in zip(batch, vectors):
+                    literal = vector_literal(vector)
+                    pending.extend(
+                        (item['id'], item['updated_at'], item['merged'], item['key'], model, literal)
+                        for item in misses[text_item['key']]
+                    )
+                flush()
+
+        flush(force=True)
+
+        logger.info(f"✅ Векторы записаны: {stats['updated_rows']} товаров, "
+                    f"изменились во время расчёта: {stats['embedded_rows'] - stats['updated_rows']}, "
+                    f"ошибок: {stats['failed_rows']}")
+
+        # Индекс поддерживается после записи векторов: создаётся при достаточном числе строк, IVFFlat перестраивается при росте
+        if task_config.get('ensure_index') and stats['updated_rows']:
+            stats['index'] = source.index_manager(client).ensure_index()['status']
+            if task_config.get('partial_indexes'):
+                stats['partial_indexes'] = ensure_partial_indexes(client, source)['status']
+
+        if stats['failed_rows'] == len(items):
+            stats['status'] = 'failed'
+        elif stats['failed_rows']:
+            stats['status'] = 'warning'
+        else:
+            stats['status'] = 'success'
+        return stats
+
+    except Exception as e:
+        logger.exception(f"❌ Ошибка генерации векторов: {str(e)}")
+        return {
+            'target': target_table,
+            'error': str(e),
+            'status': 'failed'
+        }
@@ -0,0 +1,341 @@
+"""
+Multi-worker embedding over the embedding queue
+
+After a large catalogue change one embedding process is limited by the latency of
+the embedding API. Here N workers (threads of one process, or processes on several
+hosts started with this module) share the work through the embedding_queue table
+(services/embeddings/queue.py): each worker claims a batch of products with
+FOR UPDATE SKIP LOCKED, embeds it, writes the vectors and deletes its queue entries
+in one transaction, and claims the next batch. Workers never wait on each other's
+locks, so throughput grows with the number of workers until the API or the
+database saturates. A batch of a crashed worker is claimed again once its lease
+expires. A worker whose batch fails on a transport error (API or database
+unavailable) returns it without counting an attempt and backs off exponentially
+(retry_seconds .. max_retry_seconds), the batch itself waiting as long before it is
+claimed again. When the API rejects a batch, its products are embedded one by one
+and only the rejected ones count an attempt.
+
+The queue is filled from the same dirty-row query as tasks/embed.py; a worker that
+finds the queue empty re-runs it once and stops when nothing new was queued
+(or keeps polling with poll_seconds).
+
+Example:
+    python -m oneC_etl.tasks.embed_queue --workers 8
+"""
+
+import os
+import time
+import socket
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from oneC_etl.config.settings import get_config
+from oneC_etl.services.embeddings.cache import PostgresEmbeddingCache, embedding_key
+from oneC_etl.services.embeddings.client import create_provider
+from oneC_etl.services.embeddings.queue import EmbeddingQueue
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.tasks.embed import (batch_by_tokens, build_merged_text, dirty_products_sql, vector_literal,
+                                  write_embeddings)
+from oneC_etl.vector_search.prefilter import ensure_partial_indexes
+from oneC_etl.vector_search.storage import VectorSource
+
+def load_claimed_rows(client, target_table, product_ids):
+    """
+    Products of a claimed batch
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Products table
+        product_ids (list): Claimed product ids
+
+    Returns:
+        list: Dicts with id, updated_at and merged text (deleted products are missing)
+    """
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT id::text, description, brand, category, updated_at
+            FROM {target_table}
+            WHERE id = ANY(%s::uuid[])
+        """, (list(product_ids),))
+        rows = [dict(zip(['id', 'description', 'brand', 'category', 'updated_at'], row)) for row in cursor.fetchall()]
+        connection.commit()
+    finally:
+        connection.close()
+    return [{'id': row['id'], 'updated_at': row['updated_at'], 'merged': build_merged_text(row)} for row in rows]
+
+def embed_batch(items, provider, cache, batch_tokens, batch_inputs):
+    """
+    Vectors for a batch of products: cache hits first, one API input per distinct text
+
+    Args:
+        items (list): Dicts with id, updated_at and merged text
+        provider (EmbeddingProvider): Embedding provider
+        cache (PostgresEmbeddingCache): Cache to look vectors up in (None - no cache)
+        batch_tokens (int): Token budget per embedding request
+        batch_inputs (int): Maximum texts per embedding request
+
+    Returns:
+        Tuple[list, int]: Rows for write_embeddings and number of cache hits
+    """
+    model = provider.model
+    for item in items:
+        item['key'] = embedding_key(model, item['merged'])
+    cached = cache.get_many(item['key'] for item in items) if cache is not None else {}
+
+    vectors = dict(cached)
+    texts = {}
+    for item in items:
+        if item['key'] not in vectors:
+            texts.setdefault(item['key'], item)
+    for batch in batch_by_tokens(list(texts.values()), provider.count_tokens, batch_tokens, batch_inputs):
+        for item, vector in zip(batch, provider.embed([item['merged'] for item in batch])):
+            vectors[item['key']] = vector_literal(vector)
+
+    rows = [(item['id'], item['updated_at'], item['merged'], item['key'], model, vectors[item['key']]) for item in items]
+    return rows, sum(1 for item in items if item['key'] in cached)
+
+# Ответы API, отклоняющие содержимое запроса (а не сбой транспорта или авторизации)
+ITEM_ERROR_STATUS_CODES = {400, 413, 422}
+
+def is_item_error(error):
+    """Embedding API rejected the request content; other errors are transport failures"""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None) in ITEM_ERROR_STATUS_CODES
+
+def embed_items_separately(items, provider, cache, batch_tokens, batch_inputs):
+    """
+    Embed a rejected batch item by item to find the items the API rejects
+
+    Args:
+        items (list): Dicts with id, updated_at and merged text
+        provider (EmbeddingProvider): Embedding provider
+        cache (PostgresEmbeddingCache): Cache to look vectors up in (None - no cache)
+        batch_tokens (int): Token budget per embedding request
+        batch_inputs (int): Maximum texts per embedding request
+
+    Returns:
+        Tuple[list, int, list]: Rows for write_embeddings, number of cache hits and rejected product ids
+
+    Raises:
+        Exception: Transport errors are raised as is
+    """
+    rows, cache_hits, rejected = [], 0, []
+    for item in items:
+        try:
+            item_rows, item_hits = embed_batch([item], provider, cache, batch_tokens, batch_inputs)
+        except Exception as e:
+            if not is_item_error(e):
+                raise
+            rejected.append(item['id'])
+            continue
+        rows.extend(item_rows)
+        cache_hits += item_hits
+    return rows, cache_hits, rejected
+
+def run_embedding_worker(task_config, worker_id, client, provider, source, stop=None):
+    """
+    Claim, embed and write batches until the queue is drained
+
+    Args:
+        task_config (dict): 'embed' stage configuration (see run_embedding_workers)
+        worker_id (str): Worker name recorded on claimed entries
+        client (PostgresClient): Initialized client (its engine pool is shared between workers)
+        provider (EmbeddingProvider): Embedding provider
+        source (VectorSource): Vector storage
+        stop (threading.Event): Stop after the current batch when set
+
+    Returns:
+        dict: Worker statistics ('error' is set when the worker gave up after max_failures
+            consecutive failed batches)
+    """
+    target_table = task_config.get('target_table', 'companyproducts')
+    claim_rows = task_config.get('claim_rows', 500)
+    poll_seconds = task_config.get('poll_seconds')
+    retry_seconds = task_config.get('retry_seconds', 5)
+    max_retry_seconds = task_config.get('max_retry_seconds', 300)
+    max_failures = task_config.get('max_failures', 10)
+    batch_tokens = task_config.get('batch_tokens', 50000)
+    batch_inputs = task_config.get('batch_inputs', 500)
+    queue = EmbeddingQueue(client, task_config.get('queue_table', 'embedding_queue'), worker_id,
+                           task_config.get('lease_seconds', 300), task_config.get('max_attempts', 5))
+    cache = PostgresEmbeddingCache(client, task_config['cache_table']) if task_config.get('cache_table') else None
+    dirty_sql = dirty_products_sql(target_table, source)
+    stats = {'worker': worker_id, 'batches': 0, 'claimed_rows': 0, 'embedded_rows': 0, 'updated_rows': 0,
+             'failed_rows': 0, 'rejected_rows': 0, 'cache_hits': 0}
+    # Сбоев транспорта подряд: задержка перед следующим пакетом растёт экспоненциально
+    failures = 0
+
+    def wait(seconds):
+        if stop is not None:
+            stop.wait(seconds)
+        else:
+            time.sleep(seconds)
+
+    while not (stop is not None and stop.is_set()):
+        product_ids = queue.claim(claim_rows)
+        if not product_ids:
+            # Очередь пуста: добираем товары, изменённые после заполнения очереди
+            if queue.enqueue(dirty_sql):
+                continue
+            if poll_seconds is None:
+                break
+            wait(poll_seconds)
+            continue
+
+        stats['batches'] += 1
+        stats['claimed_rows'] += len(product_ids)
+        try:
+            items = load_claimed_rows(client, target_table, product_ids)
+            rejected = []
+            try:
+                rows, cache_hits = embed_batch(items, provider, cache, batch_tokens, batch_inputs)
+            except Exception as e:
+                if not is_item_error(e):
+                    raise
+                logger.warning(f"⚠️ Воркер {worker_id}: API отклонил пакет ({str(e)}), векторизуем товары по одному")
+                rows, cache_hits, rejected = embed_items_separately(items, provider, cache, batch_tokens, batch_inputs)
+            stats['updated_rows'] += write_embeddings(client, target_table, rows, cache, source, queue)
+        except Exception as e:
+            # Товары не виноваты: возвращаем пакет без попытки, он и воркер ждут
+            failures += 1
+            delay = min(retry_seconds * 2 ** (failures - 1), max_retry_seconds)
+            logger.error(f"❌ Воркер {worker_id}: ошибка пакета из {len(product_ids)} товаров: {str(e)}, "
+                         f"повтор через {delay} с")
+            stats['failed_rows'] += len(product_ids)
+            queue.release(product_ids, delay)
+            if max_failures and failures >= max_failures:
+                # Сбой не проходит: воркер останавливается, чтобы запуск завершился с ошибкой, а не ждал бесконечно
+                stats['error'] = f"{failures} ошибок пакетов подряд, последняя: {str(e)}"
+                logger.error(f"❌ Воркер {worker_id} остановлен: {stats['error']}")
+                break
+            wait(delay)
+            continue
+        failures = 0
+        if rejected:
+            # Попытку считаем только отклонённым товарам
+            logger.warning(f"⚠️ Воркер {worker_id}: API отклонил товаров: {len(rejected)}")
+            stats['rejected_rows'] += len(rejected)
+            queue.fail(rejected, retry_seconds)
+        stats['embedded_rows'] += len(rows)
+        stats['cache_hits'] += cache_hits
+
+    return stats
+
+def run_embedding_workers(task_config, client=None, provider=None, stop=None):
+    """
+    Fill the embedding queue and drain it with parallel workers
+
+    Args:
+        task_config (dict): 'embed' stage configuration containing:
+            - target_table: Products table (companyproducts)
+            - workers: Worker threads in this process
+            - worker_prefix: Worker name prefix (default: host name and process id)
+            - queue_table: Queue table (database/sql/create_embedding_queue_table.sql)
+            - claim_rows: Products per claimed batch
+            - lease_seconds: Lease of a claimed batch
+            - max_attempts: Rejected embedding attempts per product before it is left in the queue
+            - retry_seconds / max_retry_seconds: Backoff after a failed batch, doubled per consecutive failure
+            - max_failures: Consecutive failed batches after which a worker stops and the run fails
+              (None - retry forever)
+            - poll_seconds: Keep polling an empty queue with this interval (None - stop when drained)
+            - batch_tokens / batch_inputs: Embedding request limits
+            - cache_table: Embedding cache table (None - no cache)
+            - ensure_index: Create/maintain the ANN index after writing vectors
+            - partial_indexes: Also maintain partial ANN indexes of the largest categories (vector_search/prefilter.py)
+        client (PostgresClient): Optional initialized client
+        provider (EmbeddingProvider): Optional provider (default: create_provider())
+        stop (threading.Event): Stop workers after their current batch when set
+
+    Returns:
+        dict: Statistics with 'status', rows_per_s and per-worker statistics
+    """
+    target_table = task_config.get('target_table', 'companyproducts')
+    workers = task_config.get('workers', 4)
+    prefix = task_config.get('worker_prefix') or f"{socket.gethostname()}-{os.getpid()}"
+    started = time.perf_counter()
+
+    try:
+        if client is None:
+            client = PostgresClient()
+        if provider is None:
+            provider = create_provider()
+        source = VectorSource(target_table, model=provider.model)
+
+        queue = EmbeddingQueue(client, task_config.get('queue_table', 'embedding_queue'),
+                               max_attempts=task_config.get('max_attempts', 5))
+        # Исчерпавшие попытки товары получают новые попытки раз за запуск
+        queued = queue.enqueue(dirty_products_sql(target_table, source), retry_exhausted=True)
+        logger.info(f"🧮 Векторизация из очереди: {workers} воркеров, моделью {provider.model}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(run_embedding_worker, task_config, f"{prefix}-{number}", client, provider, source, stop)
+                for number in range(workers)
+            ]
+            worker_stats = [future.result() for future in futures]
+
+        duration = time.perf_counter() - started
+        stats = {'target': target_table, 'model': provider.model, 'workers': workers, 'queued_rows': queued}
+        for key in ('batches', 'claimed_rows', 'embedded_rows', 'updated_rows', 'failed_rows', 'rejected_rows', 'cache_hits'):
+            stats[key] = sum(worker[key] for worker in worker_stats)
+        stats.update({
+            'queue': queue.stats(),
+            'duration_s': round(duration, 3),
+            'rows_per_s': round(stats['embedded_rows'] / duration, 1) if duration else None,
+            'per_worker': worker_stats,
+        })
+        logger.info(f"✅ Векторы записаны: {stats['updated_rows']} товаров за {stats['duration_s']} с "
+                    f"({stats['rows_per_s']} строк/с), ошибок: {stats['failed_rows']}, отклонено: {stats['rejected_rows']}, "
+                    f"осталось в очереди: {stats['queue']['queued']}")
+
+        if task_config.get('ensure_index') and stats['updated_rows']:
+            stats['index'] = source.index_manager(client).ensure_index()['status']
+            if task_config.get('partial_indexes'):
+                stats['partial_indexes'] = ensure_partial_indexes(client, source)['status']
+
+        errors = [f"{worker['worker']}: {worker['error']}" for worker in worker_stats if worker.get('error')]
+        if errors:
+            stats['error'] = '; '.join(errors)
+        if errors or stats['failed_rows'] and not stats['updated_rows']:
+            stats['status'] = 'failed'
+        elif stats['failed_rows'] or stats['rejected_rows'] or stats['queue']['exhausted']:
+            stats['status'] = 'warning'
+        else:
+            stats['status'] = 'success'
+        return stats
+
+    except Exception as e:
+        logger.exception(f"❌ Ошибка векторизации из очереди: {str(e)}")
+        return {
+            'target': target_table,
+            'error': str(e),
+            'status': 'failed'
+        }
+
+def main():
+    """Run embedding workers from command line"""
+    from oneC_etl.config.pipelines import get_pipeline
+
+    parser = argparse.ArgumentParser(description="Embedding workers over the embedding queue")
+    parser.add_argument("--workers", type=int, default=4, help="Worker threads in this process")
+    parser.add_argument("--worker-prefix", default=None, help="Worker name prefix (default: host-pid)")
+    parser.add_argument("--poll-seconds", type=float, default=None, help="Keep polling an empty queue")
+    parser.add_argument("--claim-rows", type=int, default=None)
+    args = parser.parse_args()
+
+    if not get_config()['enable_vector_updates']:
+        logger.info("ℹ️ Обновление векторов отключено (enable_vector_updates = false)")
+        return
+
+    task_config = dict(get_pipeline('company_products')['embed'], workers=args.workers,
+                       worker_prefix=args.worker_prefix, poll_seconds=args.poll_seconds)
+    if args.claim_rows:
+        task_config['claim_rows'] = args.claim_rows
+
+    stats = run_embedding_workers(task_config)
+    print({key: value for key, value in stats.items() if key != 'per_worker'})
+
+if __name__ == '__main__':
+    main()
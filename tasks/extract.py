@@ -5,8 +5,12 @@
 
 import sys
 import os
+import re
 import json
-from typing import Dict, List, Any
+import math
+import shutil
+import uuid
+from typing import Dict, Iterator, List, Any, Optional, Tuple
 from datetime import datetime
 
 # 🎯 КРИТИЧЕСКИ ВАЖНО: Настройка путей для utils.logger
@@ -32,16 +36,301 @@ logger.add(
 )
 
 
+# Каталог для выгрузок, сохраняемых на диск (режим spill). Задачи DAG могут выполняться
+# на разных воркерах, поэтому extract_spill_dir должен быть на общем для них хранилище
+DEFAULT_SPILL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "extract_spill")
+# Доля лимитов executeQueries, которую занимает одна часть выгрузки (запас на неточность оценки)
+PARTITION_FILL = 0.8
 
-def extract_powerbi_data(task_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+def plan_extraction(client, dataset_id: str, dax_query: str, columns: int, partition_keys: List[str],
+                    prepared: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Оценивает размер выгрузки пробным запросом COUNTROWS/DISTINCTCOUNT и выбирает стратегию
+    
+    Args:
+        client: PowerBIClient
+        dataset_id: ID датасета
+        dax_query: Запрос выгрузки
+        columns: Число колонок результата
+        partition_keys: Колонки 'Table[Column]' для разбиения, в порядке предпочтения
+        prepared: Запросы плана из пакета dax_queries (plan/extraction_plan), None - собрать по запросу
+        
+    Returns:
+        План: estimated_rows, estimated_values, partitions (оценка числа частей), partition_keys
+        (ключи в порядке применения, первый - самый разнообразный из достаточных), key_cardinality,
+        prefix_keys (ключи, значений которых больше, чем помещается в один ответ: делятся по префиксам),
+        part_rows (строк в одной части), mode (memory/spill)
+    """
+    from oneC_etl.config.settings import get_config
+    from oneC_etl.utils.dax_rewrite import build_probe_query
+    
+    config = get_config()
+    if prepared and prepared.get('probe_query') and prepared.get('partition_keys') == list(partition_keys):
+        probe_query = prepared['probe_query']
+    else:
+        probe_query = build_probe_query(dax_query, partition_keys)
+    probe = client.execute_query(dataset_id, probe_query)[0]
+    rows = int(probe.get('[Rows]') or 0)
+    values = rows * max(columns, 1)
+    # Часть должна уложиться и в лимит строк, и в лимит значений executeQueries
+    part_rows = max(1, int(min(config['extract_max_rows'], config['extract_max_values'] / max(columns, 1)) * PARTITION_FILL))
+    partitions = max(1, math.ceil(rows / part_rows))
+    
+    # Первым берём ключ, у которого достаточно различных значений, иначе - самый разнообразный;
+    # остальные ключи делят значения первого, которые не помещаются в одну часть.
+    # Число строк по значениям ключа само должно уложиться в один ответ (ключ и [Rows]),
+    # поэтому ключи с большим числом значений (артикул) делятся по префиксам значений
+    cardinality = {key: int(probe.get(f'[Keys{i}]') or 0) for i, key in enumerate(partition_keys)}
+    key_limit = min(config['extract_max_rows'], config['extract_max_values'] // 2)
+    prefix_keys = [key for key in partition_keys if cardinality[key] >= key_limit]
+    eligible = [key for key in partition_keys if key not in prefix_keys]
+    keys = []
+    if partitions > 1 and partition_keys:
+        first = partition_keys[0]
+        if eligible:
+            first = next((key for key in eligible if cardinality[key] >= partitions),
+                         max(eligible, key=cardinality.get))
+        keys = [first] + [key for key in partition_keys if key != first]
+    
+    plan = {
+        'estimated_rows': rows,
+        'estimated_values': values,
+        'partitions': partitions if keys else 1,
+        'partition_keys': keys,
+        'key_cardinality': cardinality,
+        'prefix_keys': [key for key in keys if key in prefix_keys],
+        'part_rows': part_rows,
+        'mode': 'spill' if rows >= config['extract_spill_rows'] else 'memory',
+        'spill_dir': config['extract_spill_dir'] or DEFAULT_SPILL_DIR,
+    }
+    if partitions > 1 and not keys:
+        logger.warning(f"⚠️ Оценка {rows} строк превышает лимиты executeQueries, но подходящие ключи разбиения не заданы")
+    logger.info(f"📐 План выгрузки: ~{rows} строк, ~{values} значений, частей: ~{plan['partitions']}"
+                f"{' по ' + ', '.join(keys) if keys else ''} (до {part_rows} строк), режим: {plan['mode']} "
+                f"(кардинальность ключей: {cardinality}"
+                f"{', по префиксам: ' + ', '.join(plan['prefix_keys']) if plan['prefix_keys'] else ''})")
+    return plan
+
+def partition_queries(client, dataset_id: str, dax_query: str, partition_keys: List[str], part_rows: int,
+                      total_rows: int, prefix_keys: List[str] = (), prefix: str = '',
+                      prepared: Optional[Dict[str, Any]] = None) -> List[Tuple[str, int]]:
+    """
+    Разбивает выгрузку на части не больше part_rows строк по значениям ключей (TREATAS)
+    
+    Значения первого ключа упаковываются в части; значение, строк которого больше part_rows,
+    выделяется в отдельный запрос и делится по следующему ключу. Ключ из prefix_keys делится
+    по префиксам значений (LEFT): префикс, строк которого больше part_rows, делится по префиксам
+    на символ длиннее, а значение целиком - по следующему ключу.
+    
+    Args:
+        client: PowerBIClient
+        dataset_id: ID датасета
+        dax_query: Запрос выгрузки
+        partition_keys: Колонки 'Table[Column]' в порядке применения
+        part_rows: Наибольшее число строк в части
+        total_rows: Число строк запроса (сверяется с суммой по значениям ключа)
+        prefix_keys: Ключи, которые делятся по префиксам значений
+        prefix: Общий префикс значений первого ключа в dax_query (для ключей из prefix_keys)
+        prepared: Запросы плана из пакета dax_queries: key_counts_queries (для dax_query без фильтров)
+            и filter_position (место фильтра, одно для всех частей); None - собрать по запросу
+        
+    Returns:
+        Запросы частей и ожидаемое число строк в каждой
+        
+    Raises:
+        ValueError: Если значение последнего ключа не помещается в одну часть
+            или ответ с числом строк по значениям ключа неполный
+    """
+    from oneC_etl.utils.dax_rewrite import (add_partition_filter, add_prefix_filter, build_key_counts_query,
+                                            build_prefix_counts_query)
+    
+    partition_key = partition_keys[0]
+    by_prefix = partition_key in prefix_keys
+    length = len(prefix) + 1
+    prepared = prepared or {}
+    position = prepared.get('filter_position')
+    # Вложенные части получают только место фильтра: их запросы уже с фильтрами
+    nested = {'filter_position': position}
+    if by_prefix:
+        counts = client.execute_query(dataset_id, build_prefix_counts_query(dax_query, partition_key, length))
+        value_column = '[Bucket]'
+    else:
+        counts_query = (prepared.get('key_counts_queries') or {}).get(partition_key) \
+            or build_key_counts_query(dax_query, partition_key)
+        counts = client.execute_query(dataset_id, counts_query)
+        value_column = partition_key
+    counted = sum(int(row.get('[Rows]') or 0) for row in counts)
+    if counted != total_rows:
+        raise ValueError(f"По {len(counts)} {'префиксам' if by_prefix else 'значениям'} ключа {partition_key} "
+                         f"{counted} строк вместо {total_rows}: ответ обрезан по лимиту или данные изменились")
+    
+    queries = []
+    bins = []
+    # Первая подходящая часть для значений по убыванию числа строк
+    for row in sorted(counts, key=lambda r: -int(r.get('[Rows]') or 0)):
+        rows = int(row.get('[Rows]') or 0)
+        value = row.get(value_column)
+        if by_prefix and value == '':
+            value = None
+        if rows > part_rows:
+            # Префикс короче длины LEFT - это значение целиком, его дальше делит только следующий ключ
+            if by_prefix and value is not None and len(str(value)) == length:
+                logger.info(f"🧩 Префикс {value!r} ключа {partition_key} ({rows} строк) делится по префиксам "
+                            f"длины {length + 1}")
+                queries.extend(partition_queries(client, dataset_id,
+                                                 add_prefix_filter(dax_query, partition_key, length, [value], position),
+                                                 partition_keys, part_rows, rows, prefix_keys, str(value), nested))
+                continue
+            if len(partition_keys) < 2:
+                raise ValueError(f"Значение {value!r} ключа {partition_key} даёт {rows} строк, "
+                                 f"больше части ({part_rows}), а других ключей разбиения нет")
+            logger.info(f"🧩 Значение {value!r} ключа {partition_key} ({rows} строк) делится по {partition_keys[1]}")
+            queries.extend(partition_queries(client, dataset_id,
+                                             add_partition_filter(dax_query, partition_key, [value], position),
+                                             partition_keys[1:], part_rows, rows, prefix_keys, prepared=nested))
+            continue
+        target = next((b for b in bins if b[0] + rows <= part_rows), None)
+        if target is None:
+            target = [0, []]
+            bins.append(target)
+        target[0] += rows
+        target[1].append(value)
+    
+    logger.info(f"🧩 Части выгрузки по {partition_key}{f' (префиксы длины {length})' if by_prefix else ''}: "
+                f"{[b[0] for b in bins]} строк")
+    if by_prefix:
+        queries.extend((add_prefix_filter(dax_query, partition_key, length, values, position), rows)
+                       for rows, values in bins)
+    else:
+        queries.extend((add_partition_filter(dax_query, partition_key, values, position), rows) for rows, values in bins)
+    return queries
+
+def _result_columns(dax_query: str, columns_mapping: Dict[str, str], prepared: Optional[Dict[str, Any]] = None) -> int:
+    """Число колонок результата запроса (из пакета dax_queries, по SUMMARIZECOLUMNS, иначе по маппингу)"""
+    from oneC_etl.utils.dax_utils import get_query_columns
+    if prepared and prepared.get('result_columns'):
+        return prepared['result_columns']
+    try:
+        return len(get_query_columns(dax_query))
+    except ValueError:
+        return len(columns_mapping)
+
+def spill_run_dir(run_id: str, spill_dir: Optional[str] = None) -> str:
+    """
+    Каталог выгрузок spill одного запуска: <extract_spill_dir>/<run_id>
+    
+    Args:
+        run_id: ID запуска DAG (или запуска run_pipeline)
+        spill_dir: Каталог выгрузок, по умолчанию из extract_spill_dir
+        
+    Returns:
+        Путь к каталогу запуска
+    """
+    if spill_dir is None:
+        from oneC_etl.config.settings import get_config
+        spill_dir = get_config()['extract_spill_dir'] or DEFAULT_SPILL_DIR
+    # run_id Airflow содержит ':' и '+' (scheduled__2024-01-01T04:35:00+00:00)
+    return os.path.join(spill_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', run_id))
+
+def remove_spill(run_id: str) -> int:
+    """
+    Удаляет выгрузки spill запуска (вызывается по завершении запуска DAG)
+    
+    Args:
+        run_id: ID запуска
+        
+    Returns:
+        Число удалённых файлов
+    """
+    run_dir = spill_run_dir(run_id)
+    if not os.path.isdir(run_dir):
+        return 0
+    files = len(os.listdir(run_dir))
+    shutil.rmtree(run_dir, ignore_errors=True)
+    logger.info(f"🧹 Удалены выгрузки запуска {run_id}: {files} файлов")
+    return files
+
+def remove_spill_file(data) -> None:
+    """Удаляет файл выгрузки spill, если результат extract_powerbi_data записан на диск"""
+    if isinstance(data, dict) and 'spill_file' in data and os.path.exists(data['spill_file']):
+        os.remove(data['spill_file'])
+
+def extracted_row_count(data) -> int:
+    """Число строк результата extract_powerbi_data без чтения файла spill"""
+    if isinstance(data, dict) and 'spill_file' in data:
+        return data['rows']
+    return len(data or [])
+
+def iter_extracted_rows(data) -> Iterator[Dict[str, Any]]:
+    """
+    Строки выгрузки по одной: из списка или построчно из файла режима spill
+    
+    Args:
+        data: Результат extract_powerbi_data
+        
+    Yields:
+        Словари с данными
+    """
+    if isinstance(data, dict) and 'spill_file' in data:
+        with open(data['spill_file'], 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+    else:
+        yield from data or []
+
+def iter_extracted_chunks(data, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Строки выгрузки пакетами до chunk_size строк (файл spill не читается в память целиком)
+    
+    Args:
+        data: Результат extract_powerbi_data
+        chunk_size: Строк в пакете
+        
+    Yields:
+        Списки словарей с данными
+    """
+    chunk = []
+    for row in iter_extracted_rows(data):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def read_extracted_rows(data) -> List[Dict[str, Any]]:
+    """
+    Возвращает строки выгрузки: список как есть или строки из файла режима spill
+    
+    Файл spill читается в память целиком - для больших выгрузок используйте
+    iter_extracted_rows / iter_extracted_chunks.
+    
+    Args:
+        data: Результат extract_powerbi_data
+        
+    Returns:
+        Список словарей с данными
+    """
+    if isinstance(data, dict) and 'spill_file' in data:
+        return list(iter_extracted_rows(data))
+    return data
+
+def extract_powerbi_data(task_config: Dict[str, Any], report: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
     """
     Извлекает данные из Power BI через DAX запрос
     
     Args:
         task_config: Конфигурация задачи с dataset_id, dax_query и columns
+            (pushdown_columns=True — запрашивать только колонки из columns,
+            plan_extraction=True — оценить размер и при необходимости разбить выгрузку на части,
+            partition_keys — ключи разбиения, по умолчанию из пакета dax_queries,
+            run_id — ID запуска DAG: файлы spill пишутся в каталог запуска, см. remove_spill)
+        report: Словарь, в который записываются rows, estimated_rows, partitions и complete
+            (True, только если число строк сверено с пробным запросом и ни один ответ не обрезан)
         
     Returns:
-        Список словарей с данными
+        Список словарей с данными, а в режиме spill - {'spill_file': путь к JSONL, 'rows': число строк}
+        (см. read_extracted_rows)
     """
     try:
         # Получаем параметры из конфигурации
@@ -54,6 +343,7 @@ def extract_powerbi_data(task_config: Dict[str, Any]) -> List[Dict[str, Any]]:
         
         # Определяем, что передано: ключ или готовый DAX запрос
         actual_dax_query = None
+        bundle_entry = {}
         
         # Проверяем, похоже ли это на DAX запрос (начинается с EVALUATE, DEFINE VAR и т.д.)
         if isinstance(dax_query_input, str) and any(dax_query_input.strip().upper().startswith(prefix) for prefix in ['EVALUATE', 'DEFINE VAR', 'SUMMARIZECOLUMNS']):
@@ -61,42 +351,121 @@ def extract_powerbi_data(task_config: Dict[str, Any]) -> List[Dict[str, Any]]:
             actual_dax_query = dax_query_input
         else:
             # Это ключ, нужно получить DAX запрос из переменных
-            from airflow.models import Variable
-            dax_queries = Variable.get('dax_queries')
-            dax_queries_dict = json.loads(dax_queries) if isinstance(dax_queries, str) else dax_queries
+            from oneC_etl.config.provider import get_variable
+            # Переменная декодируется один раз и кэшируется слоем конфигурации
+            dax_queries_dict = get_variable('dax_queries', deserialize_json=True)
             
             if dax_query_input not in dax_queries_dict:
                 raise ValueError(f"DAX запрос '{dax_query_input}' не найден в переменной dax_queries")
             
-            actual_dax_query = dax_queries_dict[dax_query_input]['query']
+            bundle_entry = dax_queries_dict[dax_query_input]
+            actual_dax_query = bundle_entry['query']
+        
+        # Оставляем в запросе только колонки из маппинга и убираем обёртки визуала отчёта
+        if task_config.get('pushdown_columns') and columns_mapping:
+            from oneC_etl.utils.dax_rewrite import build_extraction_query, columns_mapping_hash
+            if bundle_entry.get('mapping_hash') == columns_mapping_hash(columns_mapping):
+                # Запрос уже собран в dax_prepare под этот маппинг - разбор не нужен
+                actual_dax_query = bundle_entry['extraction_query']
+            else:
+                try:
+                    minimal_query = build_extraction_query(actual_dax_query, columns_mapping)
+                    logger.info(f"✂️ DAX запрос сокращён: {len(actual_dax_query)} -> {len(minimal_query)} символов")
+                    actual_dax_query = minimal_query
+                except ValueError as e:
+                    logger.warning(f"⚠️ Не удалось сократить DAX запрос, используется исходный: {str(e)}")
+        
+        # Запросы плана выгрузки собраны в dax_prepare для запроса пакета и для сокращённого запроса маппинга
+        prepared = None
+        if bundle_entry and actual_dax_query == bundle_entry.get('extraction_query'):
+            prepared = bundle_entry.get('extraction_plan')
+        elif bundle_entry and actual_dax_query == bundle_entry.get('query'):
+            prepared = bundle_entry.get('plan')
         
         # Используем готовый PowerBI клиент (как в suppliers_etl)
         from oneC_etl.services.powerbi.client import PowerBIClient
+        from oneC_etl.config.settings import get_config
+        
+        config = get_config()
         
         # Инициализируем клиент (он автоматически получит все переменные)
         client = PowerBIClient()
         
-        # Выполняем DAX запрос
-        raw_data = client.execute_query(dataset_id, actual_dax_query)
+        plan = None
+        if task_config.get('plan_extraction'):
+            partition_keys = task_config.get('partition_keys') or bundle_entry.get('partition_keys') or []
+            try:
+                plan = plan_extraction(client, dataset_id, actual_dax_query,
+                                       _result_columns(actual_dax_query, columns_mapping, prepared), partition_keys, prepared)
+            except Exception as e:
+                logger.warning(f"⚠️ Пробный запрос не выполнен, выгружаем одним запросом: {str(e)}")
         
-        if not raw_data:
+        queries = [(actual_dax_query, plan['estimated_rows'] if plan else None)]
+        if plan and plan['partition_keys'] and plan['partitions'] > 1:
+            queries = partition_queries(client, dataset_id, actual_dax_query, plan['partition_keys'], plan['part_rows'],
+                                        plan['estimated_rows'], plan['prefix_keys'], prepared=prepared)
+        
+        spill_file = None
+        if plan and plan['mode'] == 'spill':
+            run_dir = spill_run_dir(task_config.get('run_id') or f"manual_{uuid.uuid4().hex}", plan['spill_dir'])
+            os.makedirs(run_dir, exist_ok=True)
+            spill_name = dax_query_input if bundle_entry else dataset_id
+            spill_file = os.path.join(run_dir, f"{spill_name}.jsonl")
+            output = open(spill_file, 'w', encoding='utf-8')
+        
+        transformed_data = []
+        total_rows = 0
+        try:
+            for query, expected_rows in queries:
+                # Выполняем DAX запрос
+                raw_data = client.execute_query(dataset_id, query)
+                extracted_at = datetime.utcnow().isoformat()
+                
+                # executeQueries молча обрезает ответ по лимитам - такой ответ неполный
+                if raw_data and len(raw_data) >= min(config['extract_max_rows'], config['extract_max_values'] // len(raw_data[0])):
+                    raise ValueError(f"Ответ executeQueries обрезан по лимиту: {len(raw_data)} строк"
+                                     f"{f' при ожидаемых {expected_rows}' if expected_rows is not None else ''}; "
+                                     f"включите plan_extraction или задайте partition_keys")
+                
+                # Трансформируем данные согласно маппингу колонок
+                for row in raw_data:
+                    transformed_row = {target_column: row.get(powerbi_column) for powerbi_column, target_column in columns_mapping.items()}
+                    
+                    # Добавляем timestamp
+                    transformed_row['extracted_at'] = extracted_at
+                    if spill_file:
+                        output.write(json.dumps(transformed_row, ensure_ascii=False))
+                        output.write('\n')
+                    else:
+                        transformed_data.append(transformed_row)
+                
+                total_rows += len(raw_data)
+                if len(queries) > 1:
+                    logger.info(f"📦 Часть выгрузки: {len(raw_data)} строк (всего {total_rows})")
+        finally:
+            if spill_file:
+                output.close()
+        
+        if plan and total_rows != plan['estimated_rows']:
+            raise ValueError(f"Получено {total_rows} строк при {plan['estimated_rows']} по пробному запросу: "
+                             f"выгрузка неполная или данные изменились во время выгрузки")
+        
+        if report is not None:
+            report.update({
+                'rows': total_rows,
+                'estimated_rows': plan['estimated_rows'] if plan else None,
+                'partitions': len(queries),
+                # Обрезанный ответ и расхождение с пробой останавливают выгрузку выше
+                'complete': plan is not None,
+            })
+        
+        if not total_rows:
             logger.warning("⚠️ Данные не получены из Power BI")
             return []
         
-        # Трансформируем данные согласно маппингу колонок
-        transformed_data = []
-        for row in raw_data:
-            transformed_row = {}
-            
-            for powerbi_column, target_column in columns_mapping.items():
-                if powerbi_column in row:
-                    transformed_row[target_column] = row[powerbi_column]
-                else:
-                    transformed_row[target_column] = None
-            
-            # Добавляем timestamp
-            transformed_row['extracted_at'] = datetime.utcnow().isoformat()
-            transformed_data.append(transformed_row)
+        if spill_file:
+            logger.info(f"💾 Выгрузка сохранена на диск: {spill_file} ({total_rows} строк)")
+            return {'spill_file': spill_file, 'rows': total_rows}
         
         return transformed_data
         
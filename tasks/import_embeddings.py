@@ -0,0 +1,337 @@
+"""
+Bulk import of precomputed embeddings from CSV
+
+data/embeddings/CompanyProducts_embeddings.csv keeps each vector as a text list
+("[-0.0033, 0.0087, ...]") next to id and merged text. The CSV is streamed with the
+csv module, the vector texts of a chunk are parsed at once by NumPy's C float parser
+into a contiguous float32 array and appended to a .npy sidecar (labels - ids and
+merged texts - in a JSON file next to it), so later imports skip parsing. Optionally
+a Parquet sidecar with a fixed-size float32 list column is written for other tools.
+
+Vectors are loaded with binary COPY (pgvector binary format: dimensions, then
+big-endian float4 values) into a temp table and applied per vector_storage:
+    inline     - companyproducts.vector / merged, is_vector = true only where the
+                 merged text still matches the product (stale vectors stay dirty)
+    side_table - upsert into product_embeddings with text_hash (vector_search/storage.py)
+
+Example:
+    python -m oneC_etl.tasks.import_embeddings --parquet
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import uuid
+import struct
+import argparse
+import numpy as np
+from loguru import logger
+from oneC_etl.config.settings import get_config
+from oneC_etl.services.embeddings.cache import embedding_key, embedding_key_sql
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.tasks.embed import MERGED_TEXT_SQL
+from oneC_etl.vector_search.storage import VectorSource
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "data", "embeddings", "CompanyProducts_embeddings.csv")
+
+IMPORT_COLUMNS = ['id', 'merged', 'key', 'vector']
+
+# Заголовок и окончание файла COPY BINARY (сигнатура, флаги, длина расширения заголовка)
+PGCOPY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('>ii', 0, 0)
+PGCOPY_TRAILER = struct.pack('>h', -1)
+
+# Заголовок .npy фиксированной длины: число строк записывается после разбора всего CSV
+NPY_HEADER_BYTES = 128
+
+def parse_vectors(texts, dim=None) -> np.ndarray:
+    """
+    Parse pgvector-style text lists into a float32 matrix in one C parser call
+
+    Args:
+        texts (list): Strings like "[x, y, ...]"
+        dim (int): Expected dimensions (None - taken from the first text)
+
+    Returns:
+        np.ndarray: Matrix len(texts) x dim
+
+    Raises:
+        ValueError: If a text has a different number of values
+    """
+    if dim is None:
+        dim = texts[0].count(',') + 1
+    values = np.fromstring(','.join(text.strip()[1:-1] for text in texts), dtype=np.float32, sep=',')
+    if values.size != len(texts) * dim:
+        for position, text in enumerate(texts):
+            if text.count(',') + 1 != dim:
+                raise ValueError(f"Vector {position} of the chunk has {text.count(',') + 1} values, expected {dim}")
+        raise ValueError("Vector texts contain values that are not numbers")
+    return values.reshape(len(texts), dim)
+
+def _npy_header(rows: int, dim: int) -> bytes:
+    header = repr({'descr': '<f4', 'fortran_order': False, 'shape': (rows, dim)})
+    header = header.ljust(NPY_HEADER_BYTES - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+def sidecar_paths(csv_path: str):
+    """.npy matrix and labels JSON stored next to the CSV"""
+    base = os.path.splitext(csv_path)[0]
+    return f"{base}.npy", f"{base}.labels.json"
+
+def convert_csv(csv_path: str, chunk_rows: int = 10000):
+    """
+    Stream the CSV into the .npy sidecar and labels file
+
+    Args:
+        csv_path (str): Embeddings CSV (id, merged and embedding columns)
+        chunk_rows (int): Rows parsed per NumPy call
+
+    Returns:
+        dict: {'rows', 'dim', 'parse_s', 'parse_rows_per_s'}
+    """
+    npy_path, labels_path = sidecar_paths(csv_path)
+    csv.field_size_limit(2 ** 31 - 1)
+    started = time.perf_counter()
+    labels = {'ids': [], 'merged': [], 'source_size': os.path.getsize(csv_path),
+              'source_mtime': os.path.getmtime(csv_path)}
+    rows, dim = 0, None
+
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f, open(f"{npy_path}.tmp", 'wb') as out:
+        out.write(b'\0' * NPY_HEADER_BYTES)
+        reader = csv.DictReader(f)
+        texts = []
+
+        def flush():
+            nonlocal rows, dim
+            matrix = parse_vectors(texts, dim)
+            dim = matrix.shape[1]
+            out.write(matrix.tobytes())
+            rows += len(texts)
+            texts.clear()
+
+        for record in reader:
+            labels['ids'].append(record['id'])
+            labels['merged'].append(record['merged'])
+            texts.append(record['embedding'])
+            if len(texts) >= chunk_rows:
+                flush()
+        if texts:
+            flush()
+        if dim is None:
+            raise ValueError(f"No embeddings in {csv_path}")
+        out.seek(0)
+        out.write(_npy_header(rows, dim))
+
+    os.replace(f"{npy_path}.tmp", npy_path)
+    with open(f"{labels_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(labels, f, ensure_ascii=False)
+    os.replace(f"{labels_path}.tmp", labels_path)
+
+    parse_s = time.perf_counter() - started
+    logger.info(f"📄 {csv_path}: {rows} векторов размерности {dim} разобрано за {parse_s:.2f} с "
+                f"({rows / parse_s:.0f} строк/с)")
+    return {'rows': rows, 'dim': dim, 'parse_s': round(parse_s, 3), 'parse_rows_per_s': round(rows / parse_s, 1)}
+
+def load_sidecar(csv_path: str):
+    """
+    Sidecar matrix (memory-mapped) and labels if they were written from the current CSV
+
+    Returns:
+        Tuple[np.ndarray, dict]: Matrix and labels, or (None, None) if missing or outdated
+    """
+    npy_path, labels_path = sidecar_paths(csv_path)
+    if not (os.path.exists(npy_path) and os.path.exists(labels_path)):
+        return None, None
+    with open(labels_path, 'r', encoding='utf-8') as f:
+        labels = json.load(f)
+    if (labels.get('source_size') != os.path.getsize(csv_path)
+            or labels.get('source_mtime') != os.path.getmtime(csv_path)):
+        return None, None
+    return np.load(npy_path, mmap_mode='r'), labels
+
+def write_parquet(path: str, matrix: np.ndarray, labels: dict) -> None:
+    """Parquet sidecar: id, merged and a fixed-size float32 list column"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    embedding = pa.FixedSizeListArray.from_arrays(pa.array(np.ascontiguousarray(matrix).reshape(-1)), matrix.shape[1])
+    pq.write_table(pa.table({'id': labels['ids'], 'merged': labels['merged'], 'embedding': embedding}), path)
+
+def encode_binary_rows(ids, merged, keys, matrix: np.ndarray) -> bytes:
+    """
+    COPY BINARY payload of (id UUID, merged TEXT, key TEXT, vector) rows
+
+    Args:
+        ids (list): Product UUIDs
+        merged (list): Merged texts (None - NULL)
+        keys (list): Embedding keys (sha256 hex)
+        matrix (np.ndarray): float32 vectors, one row per product
+
+    Returns:
+        bytes: Header, tuples and trailer
+    """
+    dim = matrix.shape[1]
+    # pgvector vector_recv: int16 размерность, int16 (не используется), затем float4 в сетевом порядке байт
+    vectors = np.ascontiguousarray(matrix, dtype='>f4')
+    vector_prefix = struct.pack('>ihh', 4 + 4 * dim, dim, 0)
+    tuple_prefix = struct.pack('>hi', len(IMPORT_COLUMNS), 16)
+    parts = [PGCOPY_HEADER]
+    for row, product_id in enumerate(ids):
+        parts.append(tuple_prefix)
+        parts.append(uuid.UUID(product_id).bytes)
+        if merged[row] is None:
+            parts.append(struct.pack('>i', -1))
+        else:
+            text = merged[row].encode('utf-8')
+            parts.append(struct.pack('>i', len(text)))
+            parts.append(text)
+        key = keys[row].encode('ascii')
+        parts.append(struct.pack('>i', len(key)))
+        parts.append(key)
+        parts.append(vector_prefix)
+        parts.append(vectors[row].tobytes())
+    parts.append(PGCOPY_TRAILER)
+    return b''.join(parts)
+
+def apply_import(cursor, source: VectorSource) -> int:
+    """Move vectors from tmp_embedding_import into the configured storage"""
+    if source.side_table:
+        cursor.execute(f"""
+            INSERT INTO {source.embeddings_table} (product_id, model, vector, text_hash)
+            SELECT s.id, {source.model_literal}, s.vector, s.key
+            FROM tmp_embedding_import s
+            JOIN {source.products_table} t ON t.id = s.id
+            ON CONFLICT (product_id, model) DO UPDATE
+            SET vector = EXCLUDED.vector, text_hash = EXCLUDED.text_hash, updated_at = CURRENT_TIMESTAMP
+            WHERE {source.embeddings_table}.text_hash IS DISTINCT FROM EXCLUDED.text_hash
+        """)
+    else:
+        # Вектор из файла актуален, только если текст товара не изменился с момента расчёта
+        cursor.execute(f"""
+            UPDATE {source.products_table} p
+            SET vector = s.vector, merged = s.merged, is_vector = true
+            FROM tmp_embedding_import s
+            WHERE p.id = s.id
+            AND s.key = {embedding_key_sql(source.model_literal, MERGED_TEXT_SQL)}
+        """)
+    return cursor.rowcount
+
+def import_embeddings(task_config, client=None):
+    """
+    Import precomputed embeddings from CSV with binary COPY
+
+    Args:
+        task_config (dict): Task configuration containing:
+            - csv_path: Embeddings CSV (default: data/embeddings/CompanyProducts_embeddings.csv)
+            - target_table: Products table (companyproducts)
+            - model: Model the vectors were computed with (default: vector_model from config)
+            - chunk_rows: Rows per parse chunk and per COPY
+            - reparse: Parse the CSV even if the .npy sidecar is up to date
+            - parquet: Also write a Parquet sidecar
+        client (PostgresClient): Optional initialized client
+
+    Returns:
+        dict: Statistics with 'status' and rows/s of parsing, COPY and the whole import
+    """
+    csv_path = task_config.get('csv_path') or DEFAULT_CSV_PATH
+    target_table = task_config.get('target_table', 'companyproducts')
+    chunk_rows = task_config.get('chunk_rows', 10000)
+    started = time.perf_counter()
+
+    try:
+        stats = {'source': csv_path, 'target': target_table}
+        matrix, labels = (None, None) if task_config.get('reparse') else load_sidecar(csv_path)
+        if matrix is None:
+            stats.update(convert_csv(csv_path, chunk_rows))
+            matrix, labels = load_sidecar(csv_path)
+            stats['sidecar'] = 'written'
+        else:
+            stats.update({'rows': matrix.shape[0], 'dim': matrix.shape[1], 'sidecar': 'reused'})
+            logger.info(f"♻️ Используется разобранный файл {sidecar_paths(csv_path)[0]}")
+
+        if task_config.get('parquet'):
+            parquet_path = os.path.splitext(csv_path)[0] + '.parquet'
+            write_parquet(parquet_path, matrix, labels)
+            stats['parquet'] = parquet_path
+
+        if client is None:
+            client = PostgresClient()
+        model = task_config.get('model') or get_config()['vector_model']
+        source = VectorSource(target_table, model=model)
+        stats.update({'model': model, 'storage': source.storage})
+
+        copy_started = time.perf_counter()
+        connection = client.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                CREATE TEMP TABLE tmp_embedding_import (
+                    id UUID,
+                    merged TEXT,
+                    key TEXT,
+                    vector vector
+                ) ON COMMIT DROP
+            """)
+            copy_sql = f"COPY tmp_embedding_import ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT binary)"
+            for start in range(0, matrix.shape[0], chunk_rows):
+                ids = labels['ids'][start:start + chunk_rows]
+                merged = labels['merged'][start:start + chunk_rows]
+                keys = [embedding_key(model, text or '') for text in merged]
+                payload = encode_binary_rows(ids, merged, keys, matrix[start:start + chunk_rows])
+                cursor.copy_expert(copy_sql, io.BytesIO(payload))
+            copy_s = time.perf_counter() - copy_started
+            stats['updated_rows'] = apply_import(cursor, source)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        total_s = time.perf_counter() - started
+        stats.update({
+            'copy_s': round(copy_s, 3),
+            'copy_rows_per_s': round(stats['rows'] / copy_s, 1) if copy_s else None,
+            'total_s': round(total_s, 3),
+            'rows_per_s': round(stats['rows'] / total_s, 1) if total_s else None,
+            'status': 'success',
+        })
+        logger.info(f"✅ Импорт векторов: {stats['rows']} строк, обновлено {stats['updated_rows']} товаров, "
+                    f"COPY {stats['copy_rows_per_s']} строк/с, всего {stats['rows_per_s']} строк/с")
+        return stats
+
+    except Exception as e:
+        logger.exception(f"❌ Ошибка импорта векторов из {csv_path}: {str(e)}")
+        return {
+            'source': csv_path,
+            'target': target_table,
+            'error': str(e),
+            'status': 'failed'
+        }
+
+def main():
+    """Run import from command line"""
+    parser = argparse.ArgumentParser(description="Bulk import of precomputed embeddings from CSV")
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--table", default='companyproducts')
+    parser.add_argument("--model", default=None, help="Model of the vectors (default: vector_model from config)")
+    parser.add_argument("--chunk-rows", type=int, default=10000)
+    parser.add_argument("--reparse", action='store_true', help="Ignore an up-to-date .npy sidecar")
+    parser.add_argument("--parquet", action='store_true', help="Also write a Parquet sidecar")
+    parser.add_argument("--parse-only", action='store_true', help="Only write the sidecar, no database")
+    args = parser.parse_args()
+
+    if args.parse_only:
+        stats = convert_csv(args.csv, args.chunk_rows)
+        if args.parquet:
+            matrix, labels = load_sidecar(args.csv)
+            write_parquet(os.path.splitext(args.csv)[0] + '.parquet', matrix, labels)
+    else:
+        stats = import_embeddings({'csv_path': args.csv, 'target_table': args.table, 'model': args.model,
+                                   'chunk_rows': args.chunk_rows, 'reparse': args.reparse, 'parquet': args.parquet})
+    print(json.dumps(stats, ensure_ascii=False, indent=2, default=str))
+
+if __name__ == '__main__':
+    main()
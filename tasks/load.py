@@ -6,8 +6,13 @@ import pandas as pd
 from loguru import logger
 from oneC_etl.services.postgres.client import PostgresClient
 from oneC_etl.config.settings import get_config
-from oneC_etl.config.dax_mappings import get_dax_mapping
-from oneC_etl.utils.dax_utils import get_business_columns_from_dax
+from oneC_etl.config.dax_mappings import get_dax_mapping, get_column_type
+from oneC_etl.config.provider import get_variable
+from oneC_etl.utils.dax_utils import get_business_columns_from_dax, DAX_BUNDLE_VERSION
+from oneC_etl.tasks.extract import iter_extracted_chunks
+
+# Строк выгрузки в одном DataFrame при загрузке результата extract_powerbi_data
+LOAD_CHUNK_ROWS = 50000
 
 def execute_etl_task(data, task):
     """
@@ -45,8 +50,15 @@ def execute_etl_task(data, task):
         if 'id' not in data.columns:
             raise ValueError(f"Required column 'id' not found in data for table {task['target_table']}")
         
-        # Получаем бизнес-колонки из DAX (для анализа изменений)
-        business_columns = get_business_columns_from_dax(mapping['query'])
+        # Получаем бизнес-колонки из DAX (для анализа изменений): из пакета dax_prepare,
+        # а при его отсутствии - разбором запроса маппинга
+        bundle_entry = get_variable('dax_queries', default_var={}, deserialize_json=True).get(task['mapping_name']) or {}
+        if bundle_entry.get('version') == DAX_BUNDLE_VERSION:
+            business_columns = bundle_entry['business_columns']
+            column_types = {column['column']: column['type'] for column in bundle_entry['columns'] if column['column']}
+        else:
+            business_columns = get_business_columns_from_dax(mapping['query'])
+            column_types = {}
         # Исключаем технические поля и идентификаторы (оставляем только бизнес-характеристики)
         technical_fields = {'id', 'item_number', 'is_vector', 'upload_timestamp', 'updated_at', 'vector'}
         columns_for_change_analysis = [col for col in business_columns if col not in technical_fields]
@@ -60,15 +72,6 @@ def execute_etl_task(data, task):
         for i in range(0, total_rows, batch_size):
             batch = data.iloc[i:i + batch_size]
             
-            # Определяем правильные типы колонок
-            def get_column_type(col_name):
-                if col_name == 'id':
-                    return 'UUID'
-                elif col_name in ['withdrawn_from_range', 'on_order', 'is_vector']:
-                    return 'BOOLEAN'
-                else:
-                    return 'TEXT'
-            
             # Merge data (upsert)
             result = client.merge_data(
                 table_name=task['target_table'],
@@ -76,7 +79,7 @@ def execute_etl_task(data, task):
                 key_columns=key_columns,
                 columns=[{
                     'name': col,
-                    'dataType': get_column_type(col)
+                    'dataType': column_types.get(col) or get_column_type(col)
                 } for col in batch.columns],
                 template_name=mapping['table_template'],
                 columns_for_change_analysis=columns_for_change_analysis
@@ -105,4 +108,33 @@ def execute_etl_task(data, task):
             'target': task['target_table'],
             'error': str(e),
             'status': 'failed'
-        } 
\ No newline at end of file
+        }
+
+def load_extracted_rows(data, task):
+    """
+    Load extract_powerbi_data result to PostgreSQL in chunks of LOAD_CHUNK_ROWS rows
+
+    Spilled extracts are streamed from the file instead of being read into memory.
+
+    Args:
+        data: Result of extract_powerbi_data (list of dicts or spill file descriptor)
+        task (dict): Task configuration as for execute_etl_task
+
+    Returns:
+        dict: Operation statistics summed over chunks
+    """
+    stats = {
+        'source': task['source_table'],
+        'target': task['target_table'],
+        'total_rows': 0,
+        'processed_rows': 0,
+        'updated_rows': 0,
+        'status': 'success'
+    }
+    for chunk in iter_extracted_chunks(data, LOAD_CHUNK_ROWS):
+        result = execute_etl_task(pd.DataFrame(chunk), task)
+        if result.get('status') != 'success':
+            return result
+        for key in ('total_rows', 'processed_rows', 'updated_rows'):
+            stats[key] += result[key]
+    return stats
@@ -0,0 +1,101 @@
+"""
+In-process pipeline runner
+
+Executes the same tasks as the Airflow DAG (refresh check -> extract -> load ->
+properties -> validate -> cleanup -> mark refresh -> embed -> similarities) without Airflow, for ad hoc reloads and benchmarks.
+As in the DAG, embed and similarities also run when the dataset was not refreshed.
+"""
+
+import time
+import uuid
+from loguru import logger
+from oneC_etl.config.pipelines import get_pipeline
+from oneC_etl.config.provider import get_cache_stats
+from oneC_etl.tasks.refresh_check import check_dataset_refresh, mark_refresh_processed
+from oneC_etl.tasks.extract import extract_powerbi_data, extracted_row_count, remove_spill
+from oneC_etl.tasks.load import load_extracted_rows
+from oneC_etl.tasks.properties import load_product_properties
+from oneC_etl.tasks.validate import validate_products
+from oneC_etl.tasks.cleanup import cleanup_orphaned_records
+from oneC_etl.tasks.embed import generate_embeddings
+from oneC_etl.tasks.similarities import compute_product_similarities
+
+def run_pipeline(pipeline_name, force=False):
+    """
+    Run pipeline stages in-process
+
+    Args:
+        pipeline_name (str): Name of the pipeline in config/pipelines.py
+        force (bool): Run even if the PowerBI dataset was not refreshed
+
+    Returns:
+        dict: Pipeline summary with 'status', stage results and durations
+    """
+    pipeline = get_pipeline(pipeline_name)
+    summary = {'pipeline': pipeline_name, 'status': 'success', 'stages': {}, 'durations': {}}
+
+    def run_stage(name, func):
+        started = time.perf_counter()
+        result = func()
+        summary['durations'][name] = round(time.perf_counter() - started, 3)
+        logger.info(f"⏱️ Этап {name}: {summary['durations'][name]} с")
+        return result
+
+    def run_vector_stages():
+        # Векторы досчитываются в каждом запуске: строки, не векторизованные прошлым запуском
+        # (сбой API эмбеддингов), не ждут следующего обновления датасета
+        for name, func in (('embed', generate_embeddings), ('similarities', compute_product_similarities)):
+            if name in pipeline:
+                summary['stages'][name] = run_stage(name, lambda: func(pipeline[name]))
+                if summary['stages'][name].get('status') == 'failed':
+                    summary['status'] = 'failed'
+                    return
+
+    refresh_check = None
+    if 'refresh_check' in pipeline:
+        refresh_check = run_stage('refresh_check', lambda: check_dataset_refresh(dict(pipeline['refresh_check'], force=force)))
+        summary['stages']['refresh_check'] = refresh_check
+        if not refresh_check['changed']:
+            summary['status'] = 'skipped'
+            run_vector_stages()
+            return summary
+
+    # Файлы spill запуска удаляются по его завершении, в том числе после сбоя
+    run_id = f"run_pipeline_{uuid.uuid4().hex}"
+    try:
+        data = run_stage('extract', lambda: extract_powerbi_data(dict(pipeline['extract'], run_id=run_id)))
+        summary['stages']['extract'] = {'rows': extracted_row_count(data)}
+
+        load_result = run_stage('load', lambda: load_extracted_rows(data, pipeline['load']))
+        summary['stages']['load'] = load_result
+        if load_result.get('status') != 'success':
+            summary['status'] = 'failed'
+            return summary
+
+        if 'properties' in pipeline:
+            summary['stages']['properties'] = run_stage(
+                'properties', lambda: load_product_properties(data, dict(pipeline['properties'], run_id=run_id))
+            )
+            if summary['stages']['properties'].get('status') != 'success':
+                summary['status'] = 'failed'
+                return summary
+
+        summary['stages']['validate'] = run_stage('validate', lambda: validate_products(pipeline['validate']['target_table']))
+        summary['stages']['cleanup'] = run_stage('cleanup', lambda: cleanup_orphaned_records(data, pipeline['cleanup']))
+        if summary['stages']['cleanup'].get('status') != 'success':
+            summary['status'] = 'failed'
+            return summary
+
+        if refresh_check is not None:
+            mark_refresh_processed(refresh_check, pipeline['refresh_check'])
+
+        run_vector_stages()
+        if summary['status'] == 'failed':
+            return summary
+    finally:
+        remove_spill(run_id)
+
+    summary['config_cache'] = get_cache_stats()
+    logger.info(f"🗄️ Кэш конфигурации: {summary['config_cache']['hits']} попаданий, "
+                f"{summary['config_cache']['backend_reads']} обращений к хранилищу")
+    return summary
@@ -0,0 +1,188 @@
+"""
+Product properties loading module
+
+Char_table is extracted once as a long (артикул, key, value, sort order) table,
+joined to the extracted products locally by article and synchronised into
+product_properties with COPY, without building or parsing property strings.
+"""
+
+from loguru import logger
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.tasks.extract import extract_powerbi_data, iter_extracted_rows, remove_spill_file
+
+PROPERTY_COLUMNS = ['product_id', 'prop_key', 'prop_value', 'sort_order']
+
+def _sort_order(value):
+    """Convert PowerBI SortOrder value to int (None if missing)"""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def build_product_properties(products, char_rows, product_key='item_number'):
+    """
+    Join Char_table rows to products by article
+
+    Args:
+        products (iterable): Extracted products (dicts with 'id' and product_key)
+        char_rows (iterable): Char_table rows with 'article', 'prop_key', 'prop_value', 'sort_order'
+        product_key (str): Product column holding the article
+
+    Returns:
+        tuple: (rows as (product_id, prop_key, prop_value, sort_order) tuples,
+                number of Char_table rows without a matching product)
+    """
+    products_by_article = {}
+    for product in products:
+        article = product.get(product_key)
+        if article and product.get('id'):
+            products_by_article.setdefault(str(article).strip(), []).append(product['id'])
+
+    # (product_id, prop_key) -> (sort_order, prop_value): уникальный индекс допускает один ключ на товар
+    properties = {}
+    unmatched = 0
+    for row in char_rows:
+        key = (row.get('prop_key') or '').strip()
+        value = row.get('prop_value')
+        value = str(value).strip() if value is not None else ''
+        if not key or not value:
+            continue
+
+        product_ids = products_by_article.get(str(row.get('article') or '').strip())
+        if not product_ids:
+            unmatched += 1
+            continue
+
+        sort_order = _sort_order(row.get('sort_order'))
+        for product_id in product_ids:
+            current = properties.get((product_id, key))
+            if current is None or (sort_order is not None and (current[0] is None or sort_order < current[0])):
+                properties[(product_id, key)] = (sort_order, value)
+
+    rows = [
+        (product_id, key[:255], value, sort_order)
+        for (product_id, key), (sort_order, value) in properties.items()
+    ]
+    return rows, unmatched
+
+def load_product_properties(products, task_config, client=None):
+    """
+    Extract Char_table and synchronise product_properties for extracted products
+
+    Properties of every extracted product are replaced by the Char_table snapshot:
+    new keys are inserted, changed values updated, keys missing from the snapshot deleted.
+    Deletion only runs when the extract reports itself complete (row count checked
+    against the size probe, no truncated response); otherwise properties are only upserted.
+
+    Spilled extracts (products and Char_table) are streamed from their files; the
+    Char_table spill file is removed once the properties are built.
+
+    Args:
+        products: Product extract (extract_powerbi_data result: list of dicts with 'id'
+            and product_key, or spill file descriptor)
+        task_config (dict): Task configuration containing:
+            - dataset_id, dax_query, columns, run_id: Char_table extraction (see extract_powerbi_data)
+            - target_table: Properties table (product_properties)
+            - products_table: Products table referenced by product_id
+            - product_key: Product column holding the article (item_number)
+        client (PostgresClient): Optional initialized client
+
+    Returns:
+        dict: Load statistics with 'status'
+    """
+    target_table = task_config.get('target_table', 'product_properties')
+    products_table = task_config.get('products_table', 'companyproducts')
+
+    try:
+        # От товаров нужны только ID и артикул
+        product_key = task_config.get('product_key', 'item_number')
+        products = [{'id': product.get('id'), product_key: product.get(product_key)}
+                    for product in iter_extracted_rows(products)]
+
+        report = {}
+        char_data = extract_powerbi_data(task_config, report)
+        try:
+            rows, unmatched = build_product_properties(products, iter_extracted_rows(char_data), product_key)
+        finally:
+            remove_spill_file(char_data)
+        char_rows = report.get('rows', 0)
+        logger.info(f"📥 Получено {char_rows} строк Char_table")
+        complete = bool(report.get('complete'))
+
+        product_ids = sorted({product['id'] for product in products if product.get('id')})
+        logger.info(f"🔗 Сопоставлено {len(rows)} характеристик для {len(product_ids)} товаров "
+                    f"({unmatched} строк без товара)")
+
+        if client is None:
+            client = PostgresClient()
+
+        connection = client.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                CREATE TEMP TABLE tmp_property_products (product_id UUID) ON COMMIT DROP;
+                CREATE TEMP TABLE tmp_product_properties (
+                    product_id UUID,
+                    prop_key VARCHAR(255),
+                    prop_value TEXT,
+                    sort_order INTEGER
+                ) ON COMMIT DROP;
+            """)
+            client.copy_rows(cursor, 'tmp_property_products', ['product_id'], ((product_id,) for product_id in product_ids))
+            client.copy_rows(cursor, 'tmp_product_properties', PROPERTY_COLUMNS, rows)
+
+            # Удаляем характеристики, которых больше нет в Char_table - только по полному снимку
+            deleted = 0
+            if complete:
+                cursor.execute(f"""
+                    DELETE FROM {target_table} p
+                    USING tmp_property_products s
+                    WHERE p.product_id = s.product_id
+                    AND NOT EXISTS (
+                        SELECT 1 FROM tmp_product_properties t
+                        WHERE t.product_id = p.product_id AND t.prop_key = p.prop_key
+                    )
+                """)
+                deleted = cursor.rowcount
+            else:
+                logger.warning("⚠️ Полнота выгрузки Char_table не подтверждена пробным запросом - удаление характеристик пропущено")
+
+            # Вставляем новые и обновляем только изменившиеся значения
+            cursor.execute(f"""
+                INSERT INTO {target_table} (product_id, prop_key, prop_value, sort_order)
+                SELECT t.product_id, t.prop_key, t.prop_value, t.sort_order
+                FROM tmp_product_properties t
+                WHERE EXISTS (SELECT 1 FROM {products_table} c WHERE c.id = t.product_id)
+                ON CONFLICT (product_id, prop_key) DO UPDATE
+                SET prop_value = EXCLUDED.prop_value, sort_order = EXCLUDED.sort_order
+                WHERE {target_table}.prop_value IS DISTINCT FROM EXCLUDED.prop_value
+                   OR {target_table}.sort_order IS DISTINCT FROM EXCLUDED.sort_order
+            """)
+            upserted = cursor.rowcount
+
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+        logger.info(f"✅ Характеристики: {upserted} вставлено/обновлено, {deleted} удалено")
+        return {
+            'target': target_table,
+            'char_rows': char_rows,
+            'properties': len(rows),
+            'unmatched_rows': unmatched,
+            'upserted_rows': upserted,
+            'deleted_rows': deleted,
+            'snapshot_complete': complete,
+            'status': 'success'
+        }
+
+    except Exception as e:
+        logger.exception(f"❌ Ошибка загрузки характеристик товаров: {str(e)}")
+        return {
+            'target': target_table,
+            'error': str(e),
+            'status': 'failed'
+        }
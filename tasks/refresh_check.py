@@ -0,0 +1,158 @@
+"""
+PowerBI dataset refresh check module
+
+Compares the last successful refresh of a PowerBI dataset with the last refresh
+already processed by the ETL, so runs over an unchanged dataset can be skipped.
+"""
+
+from datetime import datetime
+from loguru import logger
+
+# Состояние хранится в PostgreSQL (database/sql/create_etl_refresh_state_table.sql): задачи проверки
+# и отметки обновления могут выполняться на разных воркерах Airflow
+DEFAULT_STATE_TABLE = 'etl_refresh_state'
+
+def _load_state(client, state_table, dataset_id):
+    """
+    Load processed refresh of a dataset
+
+    Args:
+        client (PostgresClient): Initialized client
+        state_table (str): Refresh state table
+        dataset_id (str): PowerBI dataset ID
+
+    Returns:
+        dict: request_id, end_time and processed_at or None if no refresh was processed
+    """
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT request_id, end_time, processed_at FROM {state_table} WHERE dataset_id = %s",
+                       (dataset_id,))
+        row = cursor.fetchone()
+        connection.commit()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    return {'request_id': row[0], 'end_time': row[1], 'processed_at': row[2].isoformat() if row[2] else None}
+
+def _save_state(client, state_table, dataset_id, entry):
+    """
+    Store processed refresh of a dataset
+
+    Args:
+        client (PostgresClient): Initialized client
+        state_table (str): Refresh state table
+        dataset_id (str): PowerBI dataset ID
+        entry (dict): request_id and end_time of the refresh
+    """
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            INSERT INTO {state_table} (dataset_id, request_id, end_time, processed_at)
+            VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+            ON CONFLICT (dataset_id) DO UPDATE SET
+                request_id = EXCLUDED.request_id,
+                end_time = EXCLUDED.end_time,
+                processed_at = EXCLUDED.processed_at
+        """, (dataset_id, entry.get('request_id'), entry['end_time']))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def check_dataset_refresh(task_config, client=None, postgres_client=None):
+    """
+    Check whether PowerBI dataset was refreshed since the last processed run
+
+    Args:
+        task_config (dict): Task configuration containing:
+            - dataset_id: PowerBI dataset ID
+            - state_table: Optional processed refresh state table (etl_refresh_state)
+            - force: Optional flag to run regardless of refresh state
+        client (PowerBIClient): Optional initialized client
+        postgres_client (PostgresClient): Optional initialized client of the state table
+
+    Returns:
+        dict: Check result with 'changed' flag, 'last_refresh' and 'processed_refresh'
+    """
+    dataset_id = task_config['dataset_id']
+    result = {
+        'dataset_id': dataset_id,
+        'changed': True,
+        'last_refresh': None,
+        'processed_refresh': None
+    }
+
+    if task_config.get('force'):
+        logger.info("🔁 Принудительный запуск: проверка обновления датасета пропущена")
+        return result
+
+    try:
+        if postgres_client is None:
+            from oneC_etl.services.postgres.client import PostgresClient
+            postgres_client = PostgresClient()
+        processed_refresh = _load_state(postgres_client, task_config.get('state_table', DEFAULT_STATE_TABLE), dataset_id)
+    except Exception as e:
+        # Без состояния загрузка выполняется, как при первом запуске
+        logger.warning(f"⚠️ Не удалось прочитать состояние обновлений, продолжаем загрузку: {str(e)}")
+        return result
+    result['processed_refresh'] = processed_refresh
+
+    try:
+        if client is None:
+            from oneC_etl.services.powerbi.client import PowerBIClient
+            client = PowerBIClient()
+
+        last_refresh = client.get_last_successful_refresh(dataset_id)
+    except Exception as e:
+        # Не блокируем ETL, если история обновлений недоступна
+        logger.warning(f"⚠️ Не удалось получить историю обновлений датасета, продолжаем загрузку: {str(e)}")
+        return result
+
+    if not last_refresh:
+        logger.warning("⚠️ Успешных обновлений датасета не найдено, продолжаем загрузку")
+        return result
+
+    result['last_refresh'] = {
+        'request_id': last_refresh.get('requestId'),
+        'end_time': last_refresh.get('endTime')
+    }
+
+    logger.info(f"🔍 Последнее обновление датасета {dataset_id}: {result['last_refresh']['end_time']}")
+    logger.info(f"🔍 Последнее обработанное обновление: {processed_refresh['end_time'] if processed_refresh else 'нет'}")
+
+    if processed_refresh and processed_refresh.get('end_time') == result['last_refresh']['end_time']:
+        result['changed'] = False
+        logger.info("⏭️ Датасет не обновлялся с прошлой загрузки, дальнейшие задачи будут пропущены")
+
+    return result
+
+def mark_refresh_processed(refresh_check, task_config, postgres_client=None):
+    """
+    Store refresh of PowerBI dataset as processed
+
+    Args:
+        refresh_check (dict): Result of check_dataset_refresh
+        task_config (dict): Task configuration (see check_dataset_refresh)
+        postgres_client (PostgresClient): Optional initialized client of the state table
+
+    Returns:
+        dict: Stored state entry or None if there was nothing to store
+    """
+    if not refresh_check or not refresh_check.get('last_refresh'):
+        logger.info("ℹ️ Нет сведений об обновлении датасета, состояние не сохранено")
+        return None
+
+    if postgres_client is None:
+        from oneC_etl.services.postgres.client import PostgresClient
+        postgres_client = PostgresClient()
+    entry = dict(refresh_check['last_refresh'], processed_at=datetime.utcnow().isoformat())
+    _save_state(postgres_client, task_config.get('state_table', DEFAULT_STATE_TABLE), refresh_check['dataset_id'], entry)
+
+    logger.info(f"💾 Обновление датасета {refresh_check['dataset_id']} от {entry['end_time']} отмечено как обработанное")
+    return entry
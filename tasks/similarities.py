@@ -0,0 +1,312 @@
+"""
+Precomputed similar products module
+
+Computes the top-k similar products of every vectorised product in one vectorised
+pass over the memory-mapped vector matrix (vector_search/memmap.py): query tiles
+are multiplied against the matrix in blocks, with the same category weighting and
+brand exclusion as vector_search.find_similar_products, and the lists are written
+to product_similarities (database/sql/create_product_similarities_table.sql) with COPY.
+
+Incremental runs only recompute:
+    - products whose row or vector changed since their list was computed
+      (updated_at > computed_at) and new products without a list;
+    - products whose list references a changed or deleted product;
+    - products for which a changed product now scores above their current k-th neighbour.
+"""
+
+from datetime import datetime
+import numpy as np
+from loguru import logger
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.vector_search.memmap import DEFAULT_INDEX_DIR, MemmapVectorIndex
+from oneC_etl.vector_search.storage import VectorSource
+
+SIMILARITY_COLUMNS = ['product_id', 'similar_id', 'rank', 'score', 'vector_distance', 'category_match', 'computed_at']
+
+# Доля изменённых товаров, начиная с которой дешевле пересчитать все списки
+FULL_RECOMPUTE_RATIO = 0.5
+
+def load_similarity_state(client, target_table, products_table, source=None):
+    """
+    Current list state per product
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Similarities table
+        products_table (str): Products table
+        source (VectorSource): Vector storage (default: vector_storage from config)
+
+    Returns:
+        dict: Product id -> dict with updated_at (product or vector change), computed_at
+            (None - no list), neighbours (list length) and kth_score (lowest score in the list)
+    """
+    source = source or VectorSource(products_table)
+    rows = client.execute_query(f"""
+        SELECT p.id::text AS id, {source.updated_at} AS updated_at, s.computed_at,
+               COALESCE(s.neighbours, 0) AS neighbours, s.kth_score
+        FROM {source.from_clause}
+        LEFT JOIN (
+            SELECT product_id, MAX(computed_at) AS computed_at, COUNT(*) AS neighbours, MIN(score) AS kth_score
+            FROM {target_table}
+            GROUP BY product_id
+        ) s ON s.product_id = p.id
+    """)
+    return {row['id']: row for row in rows}
+
+def referencing_products(client, target_table, products_table, product_ids):
+    """
+    Products whose list contains one of product_ids or a product that no longer exists
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Similarities table
+        products_table (str): Products table
+        product_ids (list): Changed product ids
+
+    Returns:
+        set: Product ids (text)
+    """
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("CREATE TEMP TABLE tmp_changed_products (id UUID) ON COMMIT DROP")
+        client.copy_rows(cursor, 'tmp_changed_products', ['id'], ((product_id,) for product_id in product_ids))
+        cursor.execute(f"""
+            SELECT DISTINCT s.product_id::text
+            FROM {target_table} s
+            JOIN tmp_changed_products c ON c.id = s.similar_id
+            UNION
+            SELECT DISTINCT s.product_id::text
+            FROM {target_table} s
+            LEFT JOIN {products_table} p ON p.id = s.similar_id
+            WHERE p.id IS NULL
+        """)
+        found = {row[0] for row in cursor.fetchall()}
+        connection.commit()
+        return found
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def displaced_products(index, rows, changed_rows, kth_scores, k, category_weight, exclude_same_brand, tile_rows):
+    """
+    Products for which a changed product now belongs to the top-k
+
+    Scores every product only against the changed rows (N x changed instead of N x N)
+    and compares the best score with the product's current k-th score.
+
+    Args:
+        index (MemmapVectorIndex): Refreshed vector matrix
+        rows (np.ndarray): Matrix rows of products to check
+        changed_rows (np.ndarray): Matrix rows of changed products
+        kth_scores (np.ndarray): Current k-th score per row in rows (-inf - list shorter than k)
+        k (int): List length
+        category_weight (float): Weight of category match
+        exclude_same_brand (bool): Exclude products of the same brand
+        tile_rows (int): Query products per multiplication tile
+
+    Returns:
+        np.ndarray: Rows of displaced products
+    """
+    displaced = []
+    for start in range(0, len(rows), tile_rows):
+        tile = rows[start:start + tile_rows]
+        best_rows, best_scores, _ = index.top_k(
+            np.asarray(index.vectors[tile]), 1,
+            query_brands=[index.brands[row] for row in tile] if exclude_same_brand else None,
+            query_categories=[index.categories[row] for row in tile],
+            exclude_rows=tile,
+            category_weight=category_weight,
+            candidate_rows=changed_rows
+        )
+        hit = (best_rows[:, 0] >= 0) & (best_scores[:, 0] > kth_scores[start:start + tile_rows])
+        displaced.append(tile[hit])
+    return np.concatenate(displaced) if displaced else np.zeros(0, dtype=np.int64)
+
+def similarity_rows(index, rows, k, category_weight, exclude_same_brand, tile_rows, computed_at):
+    """
+    Top-k lists of products as rows of the similarities table
+
+    Args:
+        index (MemmapVectorIndex): Refreshed vector matrix
+        rows (np.ndarray): Matrix rows of products to compute
+        k (int): List length
+        category_weight (float): Weight of category match
+        exclude_same_brand (bool): Exclude products of the same brand
+        tile_rows (int): Query products per multiplication tile
+        computed_at (datetime): Value of computed_at
+
+    Yields:
+        tuple: Values in SIMILARITY_COLUMNS order
+    """
+    for start in range(0, len(rows), tile_rows):
+        tile = rows[start:start + tile_rows]
+        best_rows, best_scores, best_similarity = index.top_k(
+            np.asarray(index.vectors[tile]), k,
+            query_brands=[index.brands[row] for row in tile] if exclude_same_brand else None,
+            query_categories=[index.categories[row] for row in tile],
+            exclude_rows=tile,
+            category_weight=category_weight
+        )
+        for query_row, neighbours, scores, similarity in zip(tile, best_rows, best_scores, best_similarity):
+            category = index.categories[query_row]
+            rank = 0
+            for row, score, sim in zip(neighbours, scores, similarity):
+                if row < 0:
+                    continue
+                rank += 1
+                yield (index.ids[query_row], index.ids[row], rank, float(score), float(1 - sim),
+                       index.categories[row] == category, computed_at)
+
+def write_similarities(client, target_table, products_table, product_ids, rows):
+    """
+    Replace lists of products with COPY into a temp table, DELETE and INSERT in one transaction
+
+    Args:
+        client (PostgresClient): Initialized client
+        target_table (str): Similarities table
+        products_table (str): Products table
+        product_ids (list): Products whose lists are replaced (also those left without neighbours)
+        rows (Iterable[tuple]): New list rows in SIMILARITY_COLUMNS order
+
+    Returns:
+        int: Number of written rows
+    """
+    connection = client.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute("CREATE TEMP TABLE tmp_similarity_products (id UUID) ON COMMIT DROP")
+        cursor.execute(f"CREATE TEMP TABLE tmp_similarities (LIKE {target_table} INCLUDING DEFAULTS) ON COMMIT DROP")
+        client.copy_rows(cursor, 'tmp_similarity_products', ['id'], ((product_id,) for product_id in product_ids))
+        written = client.copy_rows(cursor, 'tmp_similarities', SIMILARITY_COLUMNS, rows)
+
+        cursor.execute(f"DELETE FROM {target_table} s USING tmp_similarity_products t WHERE s.product_id = t.id")
+        # Товар мог быть удалён из таблицы товаров во время расчёта
+        cursor.execute(f"""
+            INSERT INTO {target_table} ({', '.join(SIMILARITY_COLUMNS)})
+            SELECT {', '.join('s.' + column for column in SIMILARITY_COLUMNS)}
+            FROM tmp_similarities s
+            WHERE EXISTS (SELECT 1 FROM {products_table} p WHERE p.id = s.product_id)
+        """)
+        connection.commit()
+        return written
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def compute_product_similarities(task_config, client=None, index=None):
+    """
+    Compute top-k similar products and write them to the similarities table
+
+    Args:
+        task_config (dict): Task configuration containing:
+            - target_table: Similarities table (product_similarities)
+            - products_table: Products table (companyproducts)
+            - index_path: Memory-mapped matrix directory (None - data/vector_index)
+            - k: Similar products per product
+            - category_weight: Weight of category match in the score
+            - exclude_same_brand: Exclude products of the same brand
+            - tile_rows: Query products per multiplication tile
+            - write_products: Products per COPY + DELETE/INSERT transaction
+            - full: Recompute all lists
+        client (PostgresClient): Optional initialized client
+        index (MemmapVectorIndex): Optional opened matrix (refreshed by the task)
+
+    Returns:
+        dict: Statistics with 'status' (success, failed)
+    """
+    target_table = task_config.get('target_table', 'product_similarities')
+    products_table = task_config.get('products_table', 'companyproducts')
+    k = task_config.get('k', 20)
+    category_weight = task_config.get('category_weight', 0.3)
+    exclude_same_brand = task_config.get('exclude_same_brand', False)
+    tile_rows = task_config.get('tile_rows', 1024)
+    write_products = task_config.get('write_products', 50000)
+    started = datetime.utcnow()
+
+    try:
+        if client is None:
+            client = PostgresClient()
+
+        # Время базы до чтения векторов: товар, изменённый во время расчёта, попадёт в следующий запуск
+        computed_at = client.execute_query("SELECT LOCALTIMESTAMP AS now")[0]['now']
+        if index is None:
+            index = MemmapVectorIndex(task_config.get('index_path') or DEFAULT_INDEX_DIR, products_table)
+        source = VectorSource(products_table)
+        index.refresh(client, source=source)
+
+        live_rows = np.flatnonzero(index.valid[:index.count])
+        stats = {'target': target_table, 'products': len(live_rows), 'k': k, 'changed': 0,
+                 'referencing': 0, 'displaced': 0, 'recomputed': 0, 'written_rows': 0}
+        if not len(live_rows):
+            logger.info("ℹ️ Нет векторизованных товаров для расчёта похожих")
+            stats.update({'mode': 'skipped', 'status': 'success'})
+            return stats
+
+        state = load_similarity_state(client, target_table, products_table, source)
+        has_lists = any(row['computed_at'] is not None for row in state.values())
+        def is_changed(row):
+            product = state.get(index.ids[row])
+            if product is None or product['computed_at'] is None:
+                return True
+            return product['updated_at'] is not None and product['updated_at'] > product['computed_at']
+
+        changed = np.array([row for row in live_rows if is_changed(row)], dtype=np.int64)
+        stats['changed'] = len(changed)
+
+        if task_config.get('full') or not has_lists or len(changed) >= FULL_RECOMPUTE_RATIO * len(live_rows):
+            stats['mode'] = 'full'
+            recompute = live_rows
+        else:
+            stats['mode'] = 'incremental'
+            changed_ids = [index.ids[row] for row in changed]
+            referencing = referencing_products(client, target_table, products_table, changed_ids)
+            referencing_rows = np.array([index.row_by_id[product_id] for product_id in referencing
+                                         if product_id in index.row_by_id and index.valid[index.row_by_id[product_id]]],
+                                        dtype=np.int64)
+            rest = np.setdiff1d(live_rows, np.concatenate([changed, referencing_rows]))
+
+            displaced = np.zeros(0, dtype=np.int64)
+            if len(changed) and len(rest):
+                kth_scores = np.array([
+                    state[index.ids[row]]['kth_score'] if state[index.ids[row]]['neighbours'] >= k else -np.inf
+                    for row in rest
+                ], dtype=np.float32)
+                displaced = displaced_products(index, rest, changed, kth_scores, k, category_weight,
+                                               exclude_same_brand, tile_rows)
+            stats['referencing'] = len(referencing_rows)
+            stats['displaced'] = len(displaced)
+
+            # Сначала чужие списки, затем изменённые товары: при сбое изменённые остаются
+            # updated_at > computed_at, и следующий запуск снова найдёт зависящие от них списки
+            recompute = np.concatenate([np.setdiff1d(np.concatenate([referencing_rows, displaced]), changed), changed])
+
+        logger.info(f"🧮 Похожие товары ({stats['mode']}): пересчёт {len(recompute)} из {len(live_rows)} списков, "
+                    f"изменено {stats['changed']}, ссылаются на изменённые {stats['referencing']}, "
+                    f"вытеснено {stats['displaced']}")
+
+        for start in range(0, len(recompute), write_products):
+            chunk = recompute[start:start + write_products]
+            stats['written_rows'] += write_similarities(
+                client, target_table, products_table, [index.ids[row] for row in chunk],
+                similarity_rows(index, chunk, k, category_weight, exclude_same_brand, tile_rows, computed_at)
+            )
+            stats['recomputed'] += len(chunk)
+
+        stats['duration_s'] = round((datetime.utcnow() - started).total_seconds(), 3)
+        stats['status'] = 'success'
+        logger.info(f"✅ Похожие товары записаны: {stats['recomputed']} списков, {stats['written_rows']} строк "
+                    f"за {stats['duration_s']} с")
+        return stats
+
+    except Exception as e:
+        logger.exception(f"❌ Ошибка расчёта похожих товаров: {str(e)}")
+        return {
+            'target': target_table,
+            'error': str(e),
+            'status': 'failed'
+        }
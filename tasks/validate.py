@@ -0,0 +1,58 @@
+"""
+Loaded data validation module
+"""
+
+from loguru import logger
+from oneC_etl.services.postgres.client import PostgresClient
+
+def validate_products(target_table='companyproducts', client=None):
+    """
+    Validate loaded products data quality
+
+    Args:
+        target_table (str): Products table to validate
+        client (PostgresClient): Optional initialized client
+
+    Returns:
+        dict: Validation result with 'status' and 'products' statistics
+    """
+    if client is None:
+        client = PostgresClient()
+
+    # Проверяем количество загруженных товаров
+    products_query = f"""
+    SELECT
+        COUNT(*) as total_products,
+        COUNT(CASE WHEN description IS NOT NULL THEN 1 END) as products_with_description,
+        COUNT(CASE WHEN brand IS NOT NULL THEN 1 END) as products_with_brand,
+        COUNT(CASE WHEN category IS NOT NULL THEN 1 END) as products_with_category,
+        COUNT(CASE WHEN item_number IS NOT NULL THEN 1 END) as products_with_item_number
+    FROM {target_table}
+    """
+
+    products_result = client.execute_query(products_query)
+
+    if not products_result:
+        logger.warning("⚠️ Не удалось получить результаты валидации")
+        return {"status": "error", "message": "Validation failed"}
+
+    products_stats = products_result[0]
+
+    # Проверяем качество данных
+    validation_status = "success"
+    if products_stats['total_products'] == 0:
+        validation_status = "error"
+        logger.error("❌ В таблице нет товаров")
+    elif products_stats['products_with_description'] == 0:
+        validation_status = "warning"
+        logger.warning("⚠️ У товаров нет описаний")
+    elif products_stats['products_with_brand'] == 0:
+        logger.warning("⚠️ У товаров нет брендов")
+    else:
+        logger.info("✅ Данные о товарах загружены корректно")
+
+    return {
+        "status": validation_status,
+        "products": products_stats,
+        "message": f"Проверено {products_stats['total_products']} товаров"
+    }
@@ -0,0 +1,10 @@
+"""
+pytest setup: the repository is imported as the oneC_etl package from docker/dags/
+"""
+
+import os
+import sys
+
+dags_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if dags_root not in sys.path:
+    sys.path.insert(0, dags_root)
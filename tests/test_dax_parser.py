@@ -0,0 +1,88 @@
+"""
+DAX tokenizer, parser, minify and projection pushdown
+"""
+
+import pytest
+
+from oneC_etl.dax_prepare.raw_queries import COMPANY_PRODUCTS_QUERY
+from oneC_etl.utils.dax_parser import minify, parse_query, summarize_columns_args, tokenize
+from oneC_etl.utils.dax_rewrite import build_extraction_query
+
+def kinds(query):
+    return [(token.kind, token.value) for token in tokenize(query)]
+
+def test_string_literals_keep_escaped_quotes_and_keywords():
+    tokens = kinds('EVALUATE ROW("a ""b"" // c", 1)')
+    assert ('string', 'a "b" // c') in tokens
+    assert ('ident', 'EVALUATE') in tokens
+
+def test_table_names_and_columns_unescape():
+    assert kinds("'It''s'[Col]]x]") == [('table', "It's"), ('column', 'Col]x')]
+
+@pytest.mark.parametrize('comment', ['// line', '-- line', '/* block\n comment */'])
+def test_comments_are_dropped(comment):
+    assert kinds(f"EVALUATE {comment}\n'T'") == [('ident', 'EVALUATE'), ('table', 'T')]
+
+def test_unterminated_string_raises():
+    with pytest.raises(ValueError):
+        tokenize('EVALUATE ROW("a')
+
+def test_nested_calls():
+    query = parse_query("EVALUATE TOPN(10, SUMMARIZECOLUMNS('T'[a], FILTER('T', 'T'[b] = 1), \"M\", SUM('T'[c])))")
+    topn = query.evaluates[0].children[0]
+    assert topn.kind == 'call' and topn.value == 'TOPN'
+    summarize = query.find_calls('SUMMARIZECOLUMNS')[0]
+    args = summarize_columns_args(summarize)
+    assert [column.qualified_name for column in args['group_by']] == ["T[a]"]
+    assert len(args['filters']) == 1
+    assert [name for name, _ in args['extensions']] == ['M']
+
+def test_define_var_and_inline_var_return():
+    query = parse_query(
+        "DEFINE VAR __x = VAR y = 1 RETURN y + 1\n"
+        "VAR __t = SUMMARIZECOLUMNS('T'[a])\n"
+        "EVALUATE __t ORDER BY 'T'[a]"
+    )
+    assert list(query.variables) == ['__x', '__t']
+    assert [item.value for item in query.variables['__x'].children[:2]] == ['VAR', 'y']
+    assert len(query.evaluates) == 1
+    assert len(query.order_by) == 1
+
+@pytest.mark.parametrize('keyword', ['RETURN', 'IN', 'NOT', 'AND', 'OR'])
+def test_keyword_before_column_is_not_a_table(keyword):
+    items = parse_query(f"DEFINE VAR x = 1 {keyword} [M] EVALUATE {{1}}").variables['x'].children
+    column = items[-1]
+    assert column.kind == 'column' and column.value == 'M' and column.table is None
+    assert items[-2].kind == 'ident' and items[-2].value == keyword
+
+def test_ident_before_column_is_a_table():
+    column = parse_query("EVALUATE ROW(\"a\", SUM(Sales[Amount]))").find_calls('SUM')[0].children[0].children[0]
+    assert column.kind == 'column' and column.table == 'Sales' and column.value == 'Amount'
+
+@pytest.mark.parametrize('query', [
+    COMPANY_PRODUCTS_QUERY,
+    'EVALUATE ROW("a", 1 - -1)',
+    'EVALUATE ROW("a", 4 / /* x */ 2, "b", 4 - --1\n 2)',
+    'DEFINE VAR x = 1 RETURN [M] EVALUATE FILTER(T, [a] IN {1} && NOT [b])',
+    "EVALUATE ROW(\"a\", 1 < = 2)",
+])
+def test_minify_round_trip(query):
+    minified = minify(query)
+    assert kinds(minified) == kinds(query)
+    assert minify(minified) == minified
+
+def test_minify_separates_keywords():
+    assert 'RETURN [M]' in minify('DEFINE VAR x = 1 RETURN\n  [M] EVALUATE {1}')
+    assert '1- -1' in minify('EVALUATE ROW("a", 1 - -1)')
+
+def test_pushdown_keeps_mapped_columns_only():
+    mapping = {
+        'CompanyProducts[ID]': 'id',
+        'CompanyProducts[Description]': 'description',
+        'CompanyProducts[Brand]': 'brand',
+    }
+    query = build_extraction_query(COMPANY_PRODUCTS_QUERY, mapping)
+    assert 'TOPN' not in query and 'Product_Properties' not in query
+    args = summarize_columns_args(parse_query(query).find_calls('SUMMARIZECOLUMNS')[0])
+    assert [column.qualified_name for column in args['group_by']] == list(mapping)
+    assert not args['extensions']
@@ -0,0 +1,98 @@
+"""
+Partitioned extraction against the PowerBI stand-in with executeQueries limits
+"""
+
+import json
+
+import pytest
+
+from oneC_etl.benchmarks.catalogue import CHAR_TABLE_COLUMNS
+from oneC_etl.benchmarks.powerbi_standin import PowerBIStandin, synthetic_rows
+from oneC_etl.config.provider import FileConfigProvider, set_provider
+from oneC_etl.dax_prepare.raw_queries import CHAR_TABLE_QUERY
+from oneC_etl.tasks.extract import partition_queries, plan_extraction
+from oneC_etl.utils import dax_rewrite
+from oneC_etl.utils.dax_utils import build_bundle_entry
+
+MAX_ROWS = 1000
+MAX_VALUES = 10000
+# Ключи разбиения Char_table в виде записи пакета (dax_queries.json)
+CHAR_TABLE_KEYS = ['Char_table[_description]', 'Char_table[Артикул]']
+
+class StandinClient:
+    """PowerBIClient.execute_query over the stand-in without HTTP"""
+
+    def __init__(self, standin: PowerBIStandin):
+        self.standin = standin
+        self.queries = []
+
+    def execute_query(self, dataset_id, query):
+        self.queries.append(query)
+        body, _ = self.standin.execute_queries_payload(query)
+        return json.loads(body)['results'][0]['tables'][0]['rows']
+
+@pytest.fixture
+def client(tmp_path):
+    config_path = tmp_path / "variables.json"
+    config_path.write_text(json.dumps({'powerbi_etl_config': {
+        'extract_max_rows': MAX_ROWS, 'extract_max_values': MAX_VALUES, 'extract_spill_rows': 10 ** 9,
+    }}))
+    set_provider(FileConfigProvider(str(config_path)))
+    standin = PowerBIStandin({'max_rows': MAX_ROWS, 'max_values': MAX_VALUES})
+    standin.set_rows(synthetic_rows(3000))
+    return StandinClient(standin)
+
+def test_article_key_split_by_prefixes(client):
+    """Артикул has more values than one response holds: oversized _description values split by article prefixes"""
+    plan = plan_extraction(client, 'standin', CHAR_TABLE_QUERY, len(CHAR_TABLE_COLUMNS), CHAR_TABLE_KEYS)
+    article = 'Char_table[Артикул]'
+    assert plan['key_cardinality'][article] >= MAX_ROWS
+    assert plan['prefix_keys'] == [article]
+    assert plan['partitions'] > 1
+
+    queries = partition_queries(client, 'standin', CHAR_TABLE_QUERY, plan['partition_keys'], plan['part_rows'],
+                                plan['estimated_rows'], plan['prefix_keys'])
+    assert any('LEFT(' in query for query, _ in queries)
+
+    extracted = []
+    for query, expected in queries:
+        rows = client.execute_query('standin', query)
+        assert len(rows) == expected <= plan['part_rows']
+        extracted.extend(tuple(sorted(row.items())) for row in rows)
+    full = StandinClient(PowerBIStandin()).standin
+    full.set_rows(client.standin._rows())
+    expected_rows = json.loads(full.execute_queries_payload(CHAR_TABLE_QUERY)[0])['results'][0]['tables'][0]['rows']
+    assert len(extracted) == plan['estimated_rows'] == len(expected_rows)
+    assert sorted(extracted) == sorted(tuple(sorted(row.items())) for row in expected_rows)
+
+def test_key_counts_never_truncated(client):
+    """No key-count query of the split returns a response cut at the row limit"""
+    plan = plan_extraction(client, 'standin', CHAR_TABLE_QUERY, len(CHAR_TABLE_COLUMNS), CHAR_TABLE_KEYS)
+    client.queries.clear()
+    partition_queries(client, 'standin', CHAR_TABLE_QUERY, plan['partition_keys'], plan['part_rows'],
+                      plan['estimated_rows'], plan['prefix_keys'])
+    for query in list(client.queries):
+        assert len(client.execute_query('standin', query)) < MAX_ROWS
+
+def test_bundled_plan_queries_need_no_parsing(client, monkeypatch):
+    """With plan queries from the bundle entry the split is the same and the query is never parsed"""
+    plan = plan_extraction(client, 'standin', CHAR_TABLE_QUERY, len(CHAR_TABLE_COLUMNS), CHAR_TABLE_KEYS)
+    expected = partition_queries(client, 'standin', CHAR_TABLE_QUERY, plan['partition_keys'], plan['part_rows'],
+                                 plan['estimated_rows'], plan['prefix_keys'])
+
+    entry = build_bundle_entry('char_table', CHAR_TABLE_QUERY, partition_keys=CHAR_TABLE_KEYS)
+    prepared = entry['plan']
+    assert prepared['result_columns'] == len(CHAR_TABLE_COLUMNS)
+
+    def no_parsing(query):
+        raise AssertionError("query parsed at run time")
+
+    monkeypatch.setattr(dax_rewrite, 'parse_query', no_parsing)
+    bundled_plan = plan_extraction(client, 'standin', entry['query'], prepared['result_columns'], CHAR_TABLE_KEYS,
+                                   prepared)
+    queries = partition_queries(client, 'standin', entry['query'], bundled_plan['partition_keys'],
+                                bundled_plan['part_rows'], bundled_plan['estimated_rows'], bundled_plan['prefix_keys'],
+                                prepared=prepared)
+    assert [rows for _, rows in queries] == [rows for _, rows in expected]
+    for query, rows in queries:
+        assert len(client.execute_query('standin', query)) == rows
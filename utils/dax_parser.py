@@ -0,0 +1,449 @@
+"""
+Single-pass DAX tokenizer and light parser
+
+Understands enough DAX to work with extraction queries: string literals,
+quoted table names, [column] references, comments, nested function calls,
+VAR/RETURN blocks, DEFINE/EVALUATE/ORDER BY query structure and
+table-qualified columns. Operator precedence is not modelled: an expression
+is a flat sequence of items, which is all column discovery and rewriting need.
+"""
+
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+class Token(NamedTuple):
+    """DAX token"""
+    kind: str    # string, table, column, ident, number, op
+    value: str   # Unescaped value (without quotes/brackets for string, table, column)
+    pos: int     # Offset in source query
+
+TWO_CHAR_OPERATORS = {'&&', '||', '<=', '>=', '<>', '=='}
+# Ключевые слова уровня запроса, завершающие выражение VAR/EVALUATE
+QUERY_KEYWORDS = {'DEFINE', 'EVALUATE', 'ORDER', 'START', 'MEASURE', 'VAR', 'TABLE', 'COLUMN'}
+# Зарезервированные слова: не бывают именем таблицы перед [Column]
+RESERVED_WORDS = QUERY_KEYWORDS | {'RETURN', 'IN', 'NOT', 'AND', 'OR', 'BY', 'AT', 'ASC', 'DESC'}
+# Пары символов, которые при склейке соседних операторов начинают комментарий или другой оператор
+_OPERATOR_PREFIXES = TWO_CHAR_OPERATORS | {'//', '--', '/*'}
+
+def _read_quoted(query: str, start: int, close: str, kind: str) -> (str, int):
+    """Read quoted token where the closing character is escaped by doubling it"""
+    chars = []
+    i = start + 1
+    length = len(query)
+    while i < length:
+        char = query[i]
+        if char == close:
+            if i + 1 < length and query[i + 1] == close:
+                chars.append(close)
+                i += 2
+                continue
+            return ''.join(chars), i + 1
+        chars.append(char)
+        i += 1
+    raise ValueError(f"Unterminated {kind} at position {start}")
+
+def tokenize(query: str) -> List[Token]:
+    """
+    Split DAX query into tokens in one pass
+
+    Args:
+        query (str): DAX query
+
+    Returns:
+        List[Token]: Tokens without whitespace and comments
+
+    Raises:
+        ValueError: On unterminated string, table name, column or comment
+    """
+    tokens = []
+    i = 0
+    length = len(query)
+    while i < length:
+        char = query[i]
+
+        if char.isspace():
+            i += 1
+        elif char == '/' and query.startswith('//', i) or char == '-' and query.startswith('--', i):
+            end = query.find('\n', i)
+            i = length if end == -1 else end + 1
+        elif char == '/' and query.startswith('/*', i):
+            end = query.find('*/', i + 2)
+            if end == -1:
+                raise ValueError(f"Unterminated comment at position {i}")
+            i = end + 2
+        elif char == '"':
+            value, end = _read_quoted(query, i, '"', 'string')
+            tokens.append(Token('string', value, i))
+            i = end
+        elif char == "'":
+            value, end = _read_quoted(query, i, "'", 'table name')
+            tokens.append(Token('table', value, i))
+            i = end
+        elif char == '[':
+            value, end = _read_quoted(query, i, ']', 'column')
+            tokens.append(Token('column', value, i))
+            i = end
+        elif char.isdigit() or char == '.' and i + 1 < length and query[i + 1].isdigit():
+            start = i
+            while i < length and (query[i].isdigit() or query[i] == '.'):
+                i += 1
+            if i < length and query[i] in 'eE' and i + 1 < length and (query[i + 1].isdigit() or query[i + 1] in '+-'):
+                i += 2
+                while i < length and query[i].isdigit():
+                    i += 1
+            tokens.append(Token('number', query[start:i], start))
+        elif char.isalpha() or char == '_':
+            start = i
+            while i < length and (query[i].isalnum() or query[i] in '_.'):
+                i += 1
+            tokens.append(Token('ident', query[start:i], start))
+        elif query[i:i + 2] in TWO_CHAR_OPERATORS:
+            tokens.append(Token('op', query[i:i + 2], i))
+            i += 2
+        else:
+            tokens.append(Token('op', char, i))
+            i += 1
+    return tokens
+
+def _token_text(token: Token) -> str:
+    """Source text of token with quoting restored"""
+    if token.kind == 'string':
+        return '"' + token.value.replace('"', '""') + '"'
+    if token.kind == 'table':
+        return "'" + token.value.replace("'", "''") + "'"
+    if token.kind == 'column':
+        return '[' + token.value.replace(']', ']]') + ']'
+    return token.value
+
+def _needs_space(previous: Token, token: Token) -> bool:
+    """Whether adjacent tokens must stay separated to keep the same tokens"""
+    if previous.kind in ('ident', 'number') and token.kind in ('ident', 'number', 'table', 'string'):
+        return True
+    if previous.kind == 'ident' and previous.value.upper() in RESERVED_WORDS:
+        # RETURN [M], IN {..}, NOT (..): ключевое слово не склеивается со следующим токеном
+        return not (token.kind == 'op' and token.value in (',', ')', '}'))
+    # 1 - -1 и a / /b не должны превратиться в комментарий, < = - в оператор <=
+    return previous.kind == 'op' and token.kind == 'op' and (previous.value + token.value)[:2] in _OPERATOR_PREFIXES
+
+def minify(query: str) -> str:
+    """
+    Minify DAX query: drop comments and all whitespace that does not separate words
+
+    Args:
+        query (str): DAX query
+
+    Returns:
+        str: Minified query with the same tokens
+    """
+    parts = []
+    previous = None
+    for token in tokenize(query):
+        if previous is not None and _needs_space(previous, token):
+            parts.append(' ')
+        parts.append(_token_text(token))
+        previous = token
+    return ''.join(parts)
+
+class Node:
+    """
+    Parsed DAX node
+
+    Kinds:
+        expr    - flat sequence of items (children)
+        call    - function call: value is the upper-case name, children are argument exprs
+        column  - column reference: table (None for [Column]) and value (column name)
+        table   - quoted table reference 'Table'
+        ident   - bare identifier: table, variable or keyword
+        string, number, op - literals and operators
+        paren   - parenthesised expression (one child expr)
+        braces  - table constructor {...}: children are element exprs
+    """
+
+    def __init__(self, kind: str, value: Optional[str] = None, children: Optional[List['Node']] = None,
+                 table: Optional[str] = None, pos: int = 0):
+        self.kind = kind
+        self.value = value
+        self.children = children or []
+        self.table = table
+        self.pos = pos
+
+    def walk(self) -> Iterator['Node']:
+        """Iterate over node and all descendants in source order"""
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    @property
+    def qualified_name(self) -> Optional[str]:
+        """Column key as returned by executeQueries: Table[Column] or [Column]"""
+        if self.kind != 'column':
+            return None
+        return f"{self.table or ''}[{self.value}]"
+
+    def __repr__(self):
+        if self.kind == 'column':
+            return f"Node(column, {self.qualified_name})"
+        if self.children:
+            return f"Node({self.kind}, {self.value!r}, {len(self.children)} children)"
+        return f"Node({self.kind}, {self.value!r})"
+
+class DaxQuery:
+    """Parsed DAX query: DEFINE VARs, EVALUATE expressions and ORDER BY items"""
+
+    def __init__(self):
+        self.variables: Dict[str, Node] = {}
+        self.evaluates: List[Node] = []
+        self.order_by: List[Node] = []
+
+    def walk(self) -> Iterator[Node]:
+        """Iterate over all nodes of the query in source order"""
+        nodes = list(self.variables.values()) + self.evaluates + self.order_by
+        for node in sorted(nodes, key=lambda n: n.pos):
+            yield from node.walk()
+
+    def find_calls(self, name: str) -> List[Node]:
+        """
+        Find function calls by name
+
+        Args:
+            name (str): Function name, case-insensitive
+
+        Returns:
+            List[Node]: Call nodes in source order
+        """
+        name = name.upper()
+        return [node for node in self.walk() if node.kind == 'call' and node.value == name]
+
+class _Parser:
+    """Recursive descent parser over token list"""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> Optional[Token]:
+        position = self.index + offset
+        return self.tokens[position] if position < len(self.tokens) else None
+
+    def next(self) -> Token:
+        token = self.peek()
+        if token is None:
+            raise ValueError("Unexpected end of DAX query")
+        self.index += 1
+        return token
+
+    def expect_op(self, value: str) -> Token:
+        token = self.next()
+        if token.kind != 'op' or token.value != value:
+            raise ValueError(f"Expected '{value}' at position {token.pos}, got '{token.value}'")
+        return token
+
+    def is_keyword(self, token: Optional[Token], *keywords: str) -> bool:
+        return token is not None and token.kind == 'ident' and token.value.upper() in keywords
+
+    def parse_atom(self) -> Node:
+        token = self.next()
+        following = self.peek()
+
+        if token.kind == 'ident' and following is not None and following.kind == 'op' and following.value == '(':
+            self.next()
+            args = []
+            if not (self.peek() and self.peek().kind == 'op' and self.peek().value == ')'):
+                while True:
+                    args.append(self.parse_expression(stop_ops=(',', ')')))
+                    if self.next().value == ')':
+                        break
+            else:
+                self.next()
+            return Node('call', token.value.upper(), args, pos=token.pos)
+
+        if (token.kind == 'table' or token.kind == 'ident' and token.value.upper() not in RESERVED_WORDS) \
+                and following is not None and following.kind == 'column':
+            self.next()
+            return Node('column', following.value, table=token.value, pos=token.pos)
+
+        if token.kind == 'column':
+            return Node('column', token.value, pos=token.pos)
+
+        if token.kind == 'op' and token.value == '(':
+            inner = self.parse_expression(stop_ops=(')',))
+            self.expect_op(')')
+            return Node('paren', children=[inner], pos=token.pos)
+
+        if token.kind == 'op' and token.value == '{':
+            elements = []
+            if not (self.peek() and self.peek().kind == 'op' and self.peek().value == '}'):
+                while True:
+                    elements.append(self.parse_expression(stop_ops=(',', '}')))
+                    if self.next().value == '}':
+                        break
+            else:
+                self.next()
+            return Node('braces', children=elements, pos=token.pos)
+
+        return Node(token.kind, token.value, pos=token.pos)
+
+    def parse_expression(self, stop_ops=(), top_level: bool = False) -> Node:
+        """
+        Parse flat expression up to a stop operator at this nesting level
+
+        At query top level the expression also ends at DEFINE/EVALUATE/ORDER BY/VAR,
+        except for VARs of an inline VAR ... RETURN block.
+        """
+        start = self.peek()
+        items = []
+        pending_vars = 0
+        while True:
+            token = self.peek()
+            if token is None:
+                break
+            if token.kind == 'op' and token.value in stop_ops:
+                break
+            if top_level and self.is_keyword(token, *QUERY_KEYWORDS):
+                is_inline_var = self.is_keyword(token, 'VAR') and (not items or pending_vars > 0)
+                if not is_inline_var:
+                    break
+            if self.is_keyword(token, 'VAR'):
+                pending_vars += 1
+            elif self.is_keyword(token, 'RETURN') and pending_vars:
+                pending_vars -= 1
+            items.append(self.parse_atom())
+        return Node('expr', children=items, pos=start.pos if start else 0)
+
+    def parse_query(self) -> DaxQuery:
+        query = DaxQuery()
+        while self.peek() is not None:
+            token = self.next()
+            keyword = token.value.upper() if token.kind == 'ident' else None
+
+            if keyword == 'DEFINE':
+                continue
+            if keyword == 'VAR':
+                name = self.next()
+                self.expect_op('=')
+                query.variables[name.value] = self.parse_expression(top_level=True)
+            elif keyword in ('MEASURE', 'COLUMN', 'TABLE'):
+                # Определения мер/колонок запроса: имя и выражение после '='
+                while self.peek() is not None and not (self.peek().kind == 'op' and self.peek().value == '='):
+                    self.next()
+                self.expect_op('=')
+                self.parse_expression(top_level=True)
+            elif keyword == 'EVALUATE':
+                query.evaluates.append(self.parse_expression(top_level=True))
+            elif keyword == 'ORDER' and self.is_keyword(self.peek(), 'BY'):
+                self.next()
+                while True:
+                    query.order_by.append(self.parse_expression(stop_ops=(',',), top_level=True))
+                    if self.peek() is not None and self.peek().kind == 'op' and self.peek().value == ',':
+                        self.next()
+                        continue
+                    break
+            elif keyword == 'START' and self.is_keyword(self.peek(), 'AT'):
+                self.next()
+                self.parse_expression(top_level=True)
+            else:
+                raise ValueError(f"Unexpected '{token.value}' at position {token.pos}")
+        return query
+
+def parse_query(query: str) -> DaxQuery:
+    """
+    Parse DAX query
+
+    Args:
+        query (str): DAX query text
+
+    Returns:
+        DaxQuery: Parsed query
+
+    Raises:
+        ValueError: If the query cannot be tokenized or parsed
+    """
+    return _Parser(tokenize(query)).parse_query()
+
+def summarize_columns_args(call: Node) -> Dict[str, list]:
+    """
+    Classify SUMMARIZECOLUMNS arguments
+
+    Args:
+        call (Node): SUMMARIZECOLUMNS call node
+
+    Returns:
+        Dict[str, list]:
+            - group_by: table-qualified column nodes
+            - filters: filter table argument exprs (variables, TREATAS, ...)
+            - extensions: (name, expression) pairs of "Name", <expression> arguments
+    """
+    result = {'group_by': [], 'filters': [], 'extensions': []}
+    args = call.children
+    i = 0
+    while i < len(args):
+        items = args[i].children
+        if len(items) == 1 and items[0].kind == 'string' and i + 1 < len(args):
+            result['extensions'].append((items[0].value, args[i + 1]))
+            i += 2
+            continue
+        if len(items) == 1 and items[0].kind == 'column' and items[0].table:
+            result['group_by'].append(items[0])
+        else:
+            result['filters'].append(args[i])
+        i += 1
+    return result
+
+def check_summarize_columns(query: DaxQuery) -> None:
+    """
+    Check argument order of every SUMMARIZECOLUMNS call
+
+    Group-by columns and filter tables must precede the "Name", <expression> pairs,
+    and every name must be followed by its expression.
+
+    Args:
+        query (DaxQuery): Parsed query
+
+    Raises:
+        ValueError: If a group-by column or filter table follows a name/expression pair
+            or a name has no expression
+    """
+    for call in query.find_calls('SUMMARIZECOLUMNS'):
+        args = call.children
+        in_extensions = False
+        i = 0
+        while i < len(args):
+            items = args[i].children
+            if len(items) == 1 and items[0].kind == 'string':
+                if i + 1 >= len(args):
+                    raise ValueError(f"SUMMARIZECOLUMNS at position {call.pos}: name \"{items[0].value}\" has no expression")
+                in_extensions = True
+                i += 2
+                continue
+            if in_extensions:
+                raise ValueError(f"SUMMARIZECOLUMNS at position {call.pos}: group-by column or filter table "
+                                 f"at position {args[i].pos} follows a name/expression pair")
+            i += 1
+
+def render(node: Node) -> str:
+    """
+    Render parsed node back to DAX text
+
+    Args:
+        node (Node): Parsed node
+
+    Returns:
+        str: DAX text (table names are always quoted)
+    """
+    if node.kind == 'expr':
+        return ' '.join(render(item) for item in node.children)
+    if node.kind == 'call':
+        return f"{node.value}({', '.join(render(arg) for arg in node.children)})"
+    if node.kind == 'column':
+        column = node.value.replace(']', ']]')
+        if node.table is None:
+            return f"[{column}]"
+        return f"'{node.table.replace(chr(39), chr(39) * 2)}'[{column}]"
+    if node.kind == 'table':
+        return "'" + node.value.replace("'", "''") + "'"
+    if node.kind == 'string':
+        return '"' + node.value.replace('"', '""') + '"'
+    if node.kind == 'paren':
+        return f"({render(node.children[0])})"
+    if node.kind == 'braces':
+        return '{' + ', '.join(render(element) for element in node.children) + '}'
+    return node.value
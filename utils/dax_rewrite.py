@@ -0,0 +1,427 @@
+"""
+DAX projection pushdown
+
+Rewrites queries copied from report visuals into minimal extraction queries:
+only the SUMMARIZECOLUMNS columns present in the task columns mapping (plus
+columns the row filters need) are kept, and report-only wrappers (KEEPFILTERS,
+SELECTCOLUMNS, TOPN windowing, ORDER BY) are stripped.
+
+Also builds the size probe and partitioned variants of extraction queries used
+to plan large extracts (see tasks/extract.py).
+"""
+
+import hashlib
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from oneC_etl.utils.dax_parser import (DaxQuery, Node, check_summarize_columns, parse_query, render,
+                                      summarize_columns_args, tokenize)
+
+# Переписанных запросов в памяти процесса (LRU по запросу и ключам маппинга)
+EXTRACTION_QUERY_CACHE_SIZE = 128
+
+def _mapping_key(column: Node) -> str:
+    """Key of group-by column as used in columns mappings: Table[Column]"""
+    return f"{column.table}[{column.value}]"
+
+def _unwrap(node: Node, query: DaxQuery, predicates: List[Node]) -> Node:
+    """
+    Descend through VAR references and report wrappers to SUMMARIZECOLUMNS
+
+    Args:
+        node (Node): Table expression
+        query (DaxQuery): Parsed query (for VAR lookup)
+        predicates (List[Node]): Collected FILTER predicates, innermost last
+
+    Returns:
+        Node: SUMMARIZECOLUMNS call node
+
+    Raises:
+        ValueError: If the expression contains an unsupported table function
+    """
+    while True:
+        if node.kind == 'expr' and len(node.children) == 1:
+            node = node.children[0]
+        elif node.kind == 'ident' and node.value in query.variables:
+            node = query.variables[node.value]
+        elif node.kind == 'paren':
+            node = node.children[0]
+        elif node.kind == 'call' and node.value == 'SUMMARIZECOLUMNS':
+            return node
+        elif node.kind == 'call' and node.value == 'FILTER' and len(node.children) == 2:
+            predicates.append(node.children[1])
+            node = node.children[0]
+        elif node.kind == 'call' and node.value == 'SELECTCOLUMNS':
+            # Проекция отбрасывается, только если она не вычисляет новые значения
+            for expression in node.children[2::2]:
+                if len(expression.children) != 1 or expression.children[0].kind != 'column':
+                    raise ValueError("SELECTCOLUMNS with computed expressions cannot be stripped")
+            node = node.children[0]
+        elif node.kind == 'call' and node.value == 'TOPN':
+            # Окно визуала отчёта (первые N строк) выгрузке не нужно
+            node = node.children[1]
+        elif node.kind == 'call' and node.value == 'KEEPFILTERS':
+            node = node.children[0]
+        else:
+            raise ValueError(f"Unsupported table expression: {render(node)[:100]}")
+
+def _is_ignored(expression: Node) -> bool:
+    """Extension expression wrapped in IGNORE (does not filter out blank rows)"""
+    while expression.kind in ('expr', 'paren') and len(expression.children) == 1:
+        expression = expression.children[0]
+    return expression.kind == 'call' and expression.value == 'IGNORE'
+
+def _referenced_variables(nodes: List[Node], query: DaxQuery) -> List[str]:
+    """Query VARs referenced by nodes, transitively, in definition order"""
+    found = set()
+    pending = list(nodes)
+    while pending:
+        for item in pending.pop().walk():
+            if item.kind == 'ident' and item.value in query.variables and item.value not in found:
+                found.add(item.value)
+                pending.append(query.variables[item.value])
+    return [name for name in query.variables if name in found]
+
+def columns_mapping_hash(columns_mapping: Dict[str, str]) -> str:
+    """
+    Hash of the PowerBI columns of a mapping (what the extraction query depends on)
+
+    Args:
+        columns_mapping (Dict[str, str]): PowerBI column -> target column
+
+    Returns:
+        str: sha256 hex digest
+    """
+    return hashlib.sha256('\0'.join(sorted(columns_mapping)).encode('utf-8')).hexdigest()
+
+def build_extraction_query(dax_query: str, columns_mapping: Dict[str, str]) -> str:
+    """
+    Build minimal extraction query for columns mapping
+
+    Args:
+        dax_query (str): Query copied from PowerBI (single EVALUATE)
+        columns_mapping (Dict[str, str]): PowerBI column -> target column, as in extract task_config;
+            group-by columns are keyed 'Table[Column]', extension columns '[Name]' or 'Name'
+
+    Returns:
+        str: DEFINE VAR ... EVALUATE FILTER(SUMMARIZECOLUMNS(...), ...) query. When group-by
+            columns come from several tables, the first non-IGNORE'd expression of the query is
+            kept even if unmapped, so blank combinations are still dropped
+
+    Raises:
+        ValueError: If the query structure is not supported, no mapped column is found or
+            group-by columns of several tables have no non-IGNORE'd expression
+    """
+    return _build_extraction_query(dax_query, tuple(sorted(columns_mapping)))
+
+@lru_cache(maxsize=EXTRACTION_QUERY_CACHE_SIZE)
+def _build_extraction_query(dax_query: str, columns_mapping: Tuple[str, ...]) -> str:
+    """build_extraction_query over the sorted PowerBI columns of the mapping"""
+    query = parse_query(dax_query)
+    if len(query.evaluates) != 1:
+        raise ValueError("Expected exactly one EVALUATE in DAX query")
+
+    predicates = []
+    summarize = _unwrap(query.evaluates[0], query, predicates)
+    args = summarize_columns_args(summarize)
+
+    # Колонки и вычисляемые поля, на которые ссылаются фильтры строк, оставляем обязательно
+    referenced_columns = set()
+    referenced_names = set()
+    for predicate in predicates:
+        for item in predicate.walk():
+            if item.kind == 'column' and item.table:
+                referenced_columns.add(_mapping_key(item))
+            elif item.kind == 'column':
+                referenced_names.add(item.value)
+
+    mapped_names = {key[1:-1] if key.startswith('[') and key.endswith(']') else key for key in columns_mapping}
+    group_by = [
+        column for column in args['group_by']
+        if _mapping_key(column) in columns_mapping or _mapping_key(column) in referenced_columns
+    ]
+    extensions = [
+        (name, expression) for name, expression in args['extensions']
+        if name in mapped_names or name in referenced_names
+    ]
+
+    if not any(_mapping_key(column) in columns_mapping for column in group_by) and \
+            not any(name in mapped_names for name, _ in extensions):
+        raise ValueError("No mapped columns found in SUMMARIZECOLUMNS")
+
+    # Без вычисляемого поля без IGNORE SUMMARIZECOLUMNS не отбрасывает пустые сочетания:
+    # колонки разных таблиц дают перекрёстное произведение. Оставляем первую такую меру запроса
+    if len({column.table for column in group_by}) > 1 and \
+            all(_is_ignored(expression) for _, expression in extensions):
+        measure = next(((name, expression) for name, expression in args['extensions']
+                        if not _is_ignored(expression)), None)
+        if measure is None:
+            raise ValueError("Group-by columns span several tables but SUMMARIZECOLUMNS has no "
+                             "non-IGNORE'd expression to drop blank combinations")
+        extensions.append(measure)
+
+    arguments = [render(column) for column in group_by]
+    arguments.extend(render(expression) for expression in args['filters'])
+    for name, expression in extensions:
+        arguments.append(render(Node('string', name)))
+        arguments.append(render(expression))
+
+    table = f"SUMMARIZECOLUMNS({', '.join(arguments)})"
+    # Внутренние фильтры применяются первыми
+    for predicate in reversed(predicates):
+        table = f"FILTER({table}, {render(predicate)})"
+
+    variables = _referenced_variables(args['filters'] + predicates, query)
+    lines = []
+    if variables:
+        lines.append("DEFINE")
+        lines.extend(f"    VAR {name} = {render(query.variables[name])}" for name in variables)
+    lines.append("EVALUATE")
+    lines.append(table)
+
+    result = '\n'.join(lines)
+    check_summarize_columns(parse_query(result))
+    return result
+
+def column_dax(key: str) -> str:
+    """
+    DAX reference for a column key
+
+    Args:
+        key (str): Column key 'Table[Column]' as in mappings and bundle partition keys
+
+    Returns:
+        str: 'Table'[Column]
+    """
+    table, _, column = key.partition('[')
+    return render(Node('column', column[:-1], table=table))
+
+def dax_literal(value) -> str:
+    """
+    DAX literal for a Python value from executeQueries results
+
+    Args:
+        value: str, int, float, bool or None
+
+    Returns:
+        str: DAX literal (None becomes BLANK())
+    """
+    if value is None:
+        return "BLANK()"
+    if isinstance(value, bool):
+        return "TRUE()" if value else "FALSE()"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return render(Node('string', str(value)))
+
+def _split_query(dax_query: str) -> (str, str):
+    """
+    Split single-EVALUATE query into DEFINE part and table expression (ORDER BY dropped)
+
+    Returns:
+        tuple: (text before EVALUATE, table expression text)
+    """
+    depth = 0
+    evaluate = None
+    end = len(dax_query)
+    for token in tokenize(dax_query):
+        if token.kind == 'op' and token.value in ('(', '{'):
+            depth += 1
+        elif token.kind == 'op' and token.value in (')', '}'):
+            depth -= 1
+        elif depth == 0 and token.kind == 'ident' and token.value.upper() == 'EVALUATE':
+            if evaluate is not None:
+                raise ValueError("Expected exactly one EVALUATE in DAX query")
+            evaluate = token
+        elif depth == 0 and evaluate is not None and token.kind == 'ident' and token.value.upper() in ('ORDER', 'START'):
+            end = token.pos
+            break
+    if evaluate is None:
+        raise ValueError("EVALUATE not found in DAX query")
+    return dax_query[:evaluate.pos].strip(), dax_query[evaluate.pos + len(evaluate.value):end].strip()
+
+def _with_extract_variable(dax_query: str, evaluate: str) -> str:
+    """Wrap query table expression into VAR __Extract and evaluate another expression over it"""
+    define, table = _split_query(dax_query)
+    if not define:
+        define = "DEFINE"
+    return f"{define}\n    VAR __Extract = {table}\nEVALUATE\n{evaluate}"
+
+def build_probe_query(dax_query: str, partition_keys: List[str] = ()) -> str:
+    """
+    Build cheap size probe: row count of the extraction and distinct count of partition keys
+
+    Args:
+        dax_query (str): Extraction query (single EVALUATE)
+        partition_keys (List[str]): Column keys 'Table[Column]'
+
+    Returns:
+        str: Query returning one row with [Rows] and [Keys<i>] columns
+    """
+    measures = ['"Rows", COUNTROWS(__Extract)']
+    for i, key in enumerate(partition_keys):
+        measures.append(f'"Keys{i}", COUNTROWS(DISTINCT(SELECTCOLUMNS(__Extract, "Key", {column_dax(key)})))')
+    return _with_extract_variable(dax_query, f"ROW({', '.join(measures)})")
+
+def build_key_counts_query(dax_query: str, partition_key: str) -> str:
+    """
+    Build query returning extraction row count per partition key value
+
+    Args:
+        dax_query (str): Extraction query (single EVALUATE)
+        partition_key (str): Column key 'Table[Column]'
+
+    Returns:
+        str: Query returning Table[Column] and [Rows] columns
+    """
+    return _with_extract_variable(
+        dax_query, f'GROUPBY(__Extract, {column_dax(partition_key)}, "Rows", SUMX(CURRENTGROUP(), 1))'
+    )
+
+def build_prefix_counts_query(dax_query: str, partition_key: str, length: int) -> str:
+    """
+    Build query returning extraction row count per value prefix of a partition key
+
+    Used for keys with too many values to count them in one response: the number
+    of prefixes of a given length is bounded by the alphabet, not by the key.
+
+    Args:
+        dax_query (str): Extraction query (single EVALUATE)
+        partition_key (str): Column key 'Table[Column]'
+        length (int): Prefix length (LEFT)
+
+    Returns:
+        str: Query returning [Bucket] (prefix) and [Rows] columns
+    """
+    return _with_extract_variable(
+        dax_query,
+        f'GROUPBY(ADDCOLUMNS(__Extract, "Bucket", LEFT({column_dax(partition_key)}, {int(length)})), '
+        f'[Bucket], "Rows", SUMX(CURRENTGROUP(), 1))'
+    )
+
+def add_partition_filter(dax_query: str, partition_key: str, values: list, position: Tuple[int, bool] = None) -> str:
+    """
+    Restrict extraction query to partition key values with a TREATAS filter in SUMMARIZECOLUMNS
+
+    Args:
+        dax_query (str): Extraction query
+        partition_key (str): Column key 'Table[Column]'
+        values (list): Partition key values
+        position (tuple): filter_position() of the query from the bundle (None - parse the query)
+
+    Returns:
+        str: Query with TREATAS({values}, 'Table'[Column]) added as a SUMMARIZECOLUMNS filter
+
+    Raises:
+        ValueError: If the query has no SUMMARIZECOLUMNS or the result has invalid argument order
+    """
+    values_dax = ', '.join(dax_literal(value) for value in values)
+    return _add_summarize_filter(dax_query, f"TREATAS({{{values_dax}}}, {column_dax(partition_key)})", position)
+
+def add_prefix_filter(dax_query: str, partition_key: str, length: int, prefixes: list,
+                      position: Tuple[int, bool] = None) -> str:
+    """
+    Restrict extraction query to partition key values starting with one of the prefixes
+
+    Args:
+        dax_query (str): Extraction query
+        partition_key (str): Column key 'Table[Column]'
+        length (int): Prefix length (LEFT)
+        prefixes (list): Prefixes from build_prefix_counts_query ([Bucket] values)
+        position (tuple): filter_position() of the query from the bundle (None - parse the query)
+
+    Returns:
+        str: Query with FILTER(ALL('Table'[Column]), LEFT('Table'[Column], length) IN {prefixes})
+            added as a SUMMARIZECOLUMNS filter
+
+    Raises:
+        ValueError: If the query has no SUMMARIZECOLUMNS or the result has invalid argument order
+    """
+    column = column_dax(partition_key)
+    # LEFT от пустого значения даёт "", поэтому пустой префикс передаётся строкой
+    prefixes_dax = ', '.join(dax_literal('' if prefix is None else str(prefix)) for prefix in prefixes)
+    return _add_summarize_filter(dax_query, f"FILTER(ALL({column}), LEFT({column}, {int(length)}) IN {{{prefixes_dax}}})",
+                                 position)
+
+def filter_position(dax_query: str) -> Tuple[int, bool]:
+    """
+    Where a filter table is added to the first SUMMARIZECOLUMNS of the query
+
+    The filter goes before the first "Name", <expression> pair (filter tables after
+    the pairs are invalid DAX), or becomes the last argument if there are no pairs.
+    Filters added at the same position one after another stay valid, so the position
+    of the unfiltered query is kept in the bundle and reused for every partition.
+
+    Args:
+        dax_query (str): Extraction query
+
+    Returns:
+        Tuple[int, bool]: Offset in the query and whether the filter goes before an argument
+            (followed by ', ') rather than after the last one (preceded by ', ')
+
+    Raises:
+        ValueError: If the query has no SUMMARIZECOLUMNS
+    """
+    calls = parse_query(dax_query).find_calls('SUMMARIZECOLUMNS')
+    if not calls:
+        raise ValueError("SUMMARIZECOLUMNS not found in DAX query")
+    call = min(calls, key=lambda node: node.pos)
+    if not call.children:
+        raise ValueError("SUMMARIZECOLUMNS without arguments in DAX query")
+
+    extension = next((arg for arg in call.children
+                      if len(arg.children) == 1 and arg.children[0].kind == 'string'), None)
+    if extension is not None:
+        return extension.pos, True
+    # Без вычисляемых полей фильтр становится последним аргументом
+    return _argument_end(dax_query, call.children[-1].pos), False
+
+def _add_summarize_filter(dax_query: str, filter_table: str, position: Tuple[int, bool] = None) -> str:
+    """Add filter table argument to the first SUMMARIZECOLUMNS of the query"""
+    checked = position is None
+    offset, before = filter_position(dax_query) if checked else position
+    if before:
+        result = f"{dax_query[:offset]}{filter_table}, {dax_query[offset:]}"
+    else:
+        result = f"{dax_query[:offset]}, {filter_table}{dax_query[offset:]}"
+    if checked:
+        check_summarize_columns(parse_query(result))
+    return result
+
+def build_plan_queries(dax_query: str, partition_keys: List[str], result_columns: int) -> Dict[str, object]:
+    """
+    Extraction plan queries of a bundled query, so tasks/extract.py does not parse it at run time
+
+    Args:
+        dax_query (str): Query as sent by the extract task
+        partition_keys (List[str]): Column keys 'Table[Column]' of the bundle entry
+        result_columns (int): Number of result columns
+
+    Returns:
+        dict: result_columns, probe_query (for partition_keys), key_counts_queries (per key)
+            and filter_position (see filter_position; None without SUMMARIZECOLUMNS)
+    """
+    try:
+        position = list(filter_position(dax_query))
+    except ValueError:
+        position = None
+    return {
+        'result_columns': result_columns,
+        'partition_keys': list(partition_keys),
+        'probe_query': build_probe_query(dax_query, partition_keys),
+        'key_counts_queries': {key: build_key_counts_query(dax_query, key) for key in partition_keys},
+        'filter_position': position,
+    }
+
+def _argument_end(dax_query: str, start: int) -> int:
+    """Position of the ',' or ')' closing the function argument starting at start"""
+    depth = 0
+    for token in tokenize(dax_query[start:]):
+        if token.kind == 'op' and token.value in ('(', '{'):
+            depth += 1
+        elif token.kind == 'op' and token.value in (')', '}'):
+            if depth == 0:
+                return start + token.pos
+            depth -= 1
+        elif token.kind == 'op' and token.value == ',' and depth == 0:
+            return start + token.pos
+    raise ValueError("Unbalanced SUMMARIZECOLUMNS in DAX query")
@@ -1,4 +1,15 @@
-import re
+import hashlib
+from datetime import datetime
+from functools import lru_cache
+from oneC_etl.utils.dax_parser import minify, parse_query, summarize_columns_args, tokenize
+from oneC_etl.utils.dax_rewrite import build_extraction_query, build_plan_queries, columns_mapping_hash
+from oneC_etl.config.dax_mappings import get_column_type
+
+# Версия формата записей переменной dax_queries (см. dax_prepare/prepare_dax.py)
+DAX_BUNDLE_VERSION = 2
+
+# Разобранных запросов в памяти процесса: воркер Airflow живёт долго, кэш не должен расти с каждым запросом
+BUSINESS_COLUMNS_CACHE_SIZE = 128
 
 def normalize_column_name(col):
     """Нормализует имя колонки: нижний регистр, подчёркивания вместо пробелов и дефисов, убирает спецсимволы."""
@@ -9,82 +20,109 @@ def normalize_column_name(col):
 
 def get_business_columns_from_dax(dax_query):
     """
-    Извлекает имена бизнес-колонок из DAX-запроса (только из квадратных скобок SUMMARIZECOLUMNS), с нормализацией.
+    Извлекает имена бизнес-колонок из DAX-запроса (аргументы первого SUMMARIZECOLUMNS), с нормализацией.
     Возвращает список нормализованных имён колонок.
-    
+
     Поддерживает:
-    - Колонки в формате 'Table'[Column]
-    - Вычисляемые поля в двойных кавычках "Field Name"
+    - Колонки группировки в формате 'Table'[Column] и Table[Column]
+    - Вычисляемые поля "Field Name", <выражение> (колонки внутри выражений не попадают в результат)
+    - Фильтр-таблицы (переменные, TREATAS, KEEPFILTERS) пропускаются
     - Автоматически убирает дубликаты, сохраняя порядок первого появления
-    - Исключает VAR-блоки и строковые литералы
+
+    Результат кэшируется (LRU, BUSINESS_COLUMNS_CACHE_SIZE запросов): повторные загрузки не разбирают запрос заново.
     """
-    # Находим SUMMARIZECOLUMNS
-    match = re.search(r'SUMMARIZECOLUMNS\((.*?)\)', dax_query, re.DOTALL)
-    if not match:
+    return list(_parse_business_columns(dax_query))
+
+
+@lru_cache(maxsize=BUSINESS_COLUMNS_CACHE_SIZE)
+def _parse_business_columns(dax_query):
+    """Нормализованные бизнес-колонки запроса (кортеж, чтобы кэшированное значение нельзя было изменить)"""
+    calls = parse_query(dax_query).find_calls('SUMMARIZECOLUMNS')
+    if not calls:
         raise ValueError("Не удалось найти SUMMARIZECOLUMNS в DAX-запросе!")
-    
-    args = match.group(1)
-    
-    # Более точное удаление VAR-блоков
-    # Ищем VAR ... RETURN ... и удаляем весь блок до следующей запятой или конца
-    def remove_var_blocks(text):
-        # Разбиваем на части по запятой
-        parts = []
-        current_part = ""
-        paren_count = 0
-        
-        for char in text:
-            if char == '(':
-                paren_count += 1
-            elif char == ')':
-                paren_count -= 1
-            elif char == ',' and paren_count == 0:
-                parts.append(current_part.strip())
-                current_part = ""
-                continue
-            current_part += char
-        
-        if current_part.strip():
-            parts.append(current_part.strip())
-        
-        # Фильтруем части, исключая VAR-блоки
-        filtered_parts = []
-        for part in parts:
-            if not part.strip().startswith('VAR '):
-                filtered_parts.append(part)
-        
-        return ', '.join(filtered_parts)
-    
-    args_clean = remove_var_blocks(args)
-    
-    columns = []
-    
-    # Ищем все токены в формате 'Table'[Column] - только из основной части
-    table_column_pattern = r"'[^']+'\[([^\]]+)\]"
-    table_columns = re.findall(table_column_pattern, args_clean)
-    columns.extend(table_columns)
-    
-    # Ищем вычисляемые поля в двойных кавычках, но исключаем строковые литералы
-    computed_pattern = r'"([^"]+)"'
-    computed_fields = re.findall(computed_pattern, args_clean)
-    
-    # Фильтруем: оставляем только те, что выглядят как имена полей
-    for field in computed_fields:
-        field_clean = field.strip()
-        # Исключаем строковые литералы и служебные строки
-        if (field_clean and 
-            not field_clean.isupper() and  # Не все заглавные
-            not field_clean.startswith('No ') and  # Не служебные сообщения
-            not field_clean.startswith('Error') and
-            len(field_clean) > 1):  # Не одиночные символы
-            columns.append(field_clean)
-    
+
+    args = summarize_columns_args(calls[0])
+    columns = [column.value for column in args['group_by']]
+    columns.extend(name for name, _ in args['extensions'])
+
     # Убираем дубликаты, сохраняя порядок первого появления
-    seen = set()
     unique_columns = []
-    for col in columns:
-        if col not in seen:
-            seen.add(col)
+    for col in (normalize_column_name(col) for col in columns):
+        if col not in unique_columns:
             unique_columns.append(col)
-    
-    return [normalize_column_name(col) for col in unique_columns] 
\ No newline at end of file
+
+    return tuple(unique_columns)
+
+
+def get_query_columns(dax_query):
+    """
+    Возвращает колонки результата DAX-запроса так, как их называет executeQueries.
+
+    Колонки группировки первого SUMMARIZECOLUMNS - 'Table[Column]', вычисляемые поля - '[Name]'.
+    """
+    calls = parse_query(dax_query).find_calls('SUMMARIZECOLUMNS')
+    if not calls:
+        raise ValueError("Не удалось найти SUMMARIZECOLUMNS в DAX-запросе!")
+    args = summarize_columns_args(calls[0])
+    columns = [f"{column.table}[{column.value}]" for column in args['group_by']]
+    columns.extend(f"[{name}]" for name, _ in args['extensions'])
+    return columns
+
+
+def build_bundle_entry(name, dax_query, columns_mapping=None, partition_keys=None, pushdown_columns=False):
+    """
+    Собирает запись пакета DAX-запросов: всё, что задачи иначе вычисляли бы разбором запроса.
+
+    Args:
+        name: Имя запроса (ключ переменной dax_queries)
+        dax_query: Исходный DAX-запрос
+        columns_mapping: Маппинг колонок задачи извлечения (PowerBI колонка -> колонка БД)
+        partition_keys: Колонки 'Table'[Column] для разбиения выгрузки, в порядке предпочтения
+        pushdown_columns: Предварительно собрать сокращённый запрос для маппинга
+
+    Returns:
+        dict: Запись с минифицированным запросом, хэшем, колонками и типами, ключами разбиения,
+            запросами плана выгрузки (plan, а для сокращённого запроса - extraction_plan)
+    """
+    query = minify(dax_query)
+    columns_mapping = columns_mapping or {}
+    query_columns = get_query_columns(query)
+    group_by = {key for key in query_columns if not key.startswith('[')}
+
+    columns = []
+    for key in query_columns:
+        target = columns_mapping.get(key) or columns_mapping.get(key[1:-1] if key.startswith('[') else key)
+        columns.append({
+            'key': key,
+            'column': target,
+            'type': get_column_type(target) if target else None,
+        })
+
+    keys = []
+    for partition_key in partition_keys or []:
+        tokens = tokenize(partition_key)
+        if len(tokens) != 2 or tokens[0].kind not in ('table', 'ident') or tokens[1].kind != 'column':
+            raise ValueError(f"Ключ разбиения {partition_key} должен быть колонкой 'Table'[Column]")
+        key = f"{tokens[0].value}[{tokens[1].value}]"
+        if key not in group_by:
+            raise ValueError(f"Ключ разбиения {partition_key} не является колонкой группировки запроса {name}")
+        keys.append(key)
+
+    entry = {
+        'description': f"DAX query for {name.upper()}_QUERY",
+        'version': DAX_BUNDLE_VERSION,
+        'hash': hashlib.sha256(query.encode('utf-8')).hexdigest(),
+        'built_at': datetime.utcnow().isoformat(),
+        'query': query,
+        'columns': columns,
+        'business_columns': get_business_columns_from_dax(query),
+        'partition_keys': keys,
+        'plan': build_plan_queries(query, keys, len(query_columns)),
+    }
+    if pushdown_columns and columns_mapping:
+        entry['extraction_query'] = build_extraction_query(query, columns_mapping)
+        entry['mapping_hash'] = columns_mapping_hash(columns_mapping)
+        # План сокращённого запроса действителен только для маппинга с тем же mapping_hash
+        entry['extraction_plan'] = build_plan_queries(entry['extraction_query'], keys,
+                                                      len(get_query_columns(entry['extraction_query'])))
+    return entry
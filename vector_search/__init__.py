@@ -0,0 +1,15 @@
+"""
+Product search over companyproducts: vector similarity (pgvector) and text lookup
+"""
+
+from .index import VectorIndexManager, choose_index_params
+from .search import find_similar_products, nearest_products, nearest_to_vector
+from .memmap import MemmapVectorIndex
+from .prefilter import PrefilterPlanner, ensure_partial_indexes
+from .storage import VectorSource
+from .text_search import TextSearchIndexManager, search_products
+from .hybrid import HybridSearcher, reciprocal_rank_fusion
+
+__all__ = ['VectorIndexManager', 'choose_index_params', 'find_similar_products', 'nearest_products', 'nearest_to_vector',
+           'MemmapVectorIndex', 'PrefilterPlanner', 'ensure_partial_indexes', 'VectorSource',
+           'TextSearchIndexManager', 'search_products', 'HybridSearcher', 'reciprocal_rank_fusion']
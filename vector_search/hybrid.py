@@ -0,0 +1,253 @@
+"""
+Hybrid lexical + vector product search
+
+A search text is run concurrently as a lexical query (text_search.search_products,
+GIN indexed) and as a vector query (the text is embedded and matched against
+the product vectors through the ANN index). The two rankings are fused with
+reciprocal rank fusion:
+
+    score(product) = sum over rankings of weight / (rrf_k + rank)
+
+so a product found by both queries outranks one found by a single query, without
+calibrating trigram similarity against cosine distance. Connections come from the
+PostgresClient engine pool; query embeddings are kept in an in-process LRU cache
+(and, with cache_table, looked up in the embedding cache before calling the API).
+"""
+
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+from loguru import logger
+from oneC_etl.services.embeddings.cache import PostgresEmbeddingCache, embedding_key
+from oneC_etl.services.embeddings.client import create_provider
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.vector_search.memmap import parse_vector
+from oneC_etl.vector_search.search import nearest_to_vector
+from oneC_etl.vector_search.storage import VectorSource
+from oneC_etl.vector_search.text_search import search_products
+
+HYBRID_RESULT_COLUMNS = ['id', 'item_number', 'description', 'brand', 'category', 'score',
+                         'lexical_rank', 'lexical_score', 'vector_rank', 'vector_distance']
+
+# Константа RRF из исходной статьи (Cormack et al., 2009): сглаживает вклад первых мест
+DEFAULT_RRF_K = 60
+
+def reciprocal_rank_fusion(rankings: Dict[str, Sequence[Any]], rrf_k: int = DEFAULT_RRF_K,
+                           weights: Optional[Dict[str, float]] = None) -> List[tuple]:
+    """
+    Fuse rankings with reciprocal rank fusion
+
+    Args:
+        rankings (Dict[str, Sequence]): Ranking name -> ids, best first
+        rrf_k (int): Rank smoothing constant
+        weights (Dict[str, float]): Weight per ranking (default 1.0)
+
+    Returns:
+        List[tuple]: (id, score) ordered by score, ties by best single rank
+    """
+    scores = {}
+    best_rank = {}
+    for name, ids in rankings.items():
+        weight = (weights or {}).get(name, 1.0)
+        for rank, item in enumerate(ids, 1):
+            scores[item] = scores.get(item, 0.0) + weight / (rrf_k + rank)
+            best_rank[item] = min(best_rank.get(item, rank), rank)
+    return sorted(scores.items(), key=lambda pair: (-pair[1], best_rank[pair[0]]))
+
+class QueryEmbeddingCache:
+    """Thread-safe LRU cache of query embeddings"""
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Initialize cache
+
+        Args:
+            maxsize (int): Maximum number of cached embeddings
+        """
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._items.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._items[key] = vector
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'size': len(self._items), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+class HybridSearcher:
+    """Lexical + vector search with rank fusion over pooled connections"""
+
+    def __init__(self, client: Optional[PostgresClient] = None, provider=None, table: str = 'companyproducts',
+                 candidates: int = 50, rrf_k: int = DEFAULT_RRF_K, text_method: Optional[str] = None,
+                 cache_size: int = 1024, cache_table: Optional[str] = None, workers: int = 8):
+        """
+        Initialize searcher
+
+        Args:
+            client (PostgresClient): Optional initialized client (its engine pool is reused)
+            provider (EmbeddingProvider): Optional provider for query embeddings (default: create_provider())
+            table (str): Products table
+            candidates (int): Results taken from each ranking before fusion
+            rrf_k (int): Reciprocal rank fusion constant
+            text_method (str): Lexical method, 'trgm' or 'fts' (default: text_search_method from config)
+            cache_size (int): Query embeddings kept in memory
+            cache_table (str): Embedding cache table consulted on memory misses (None - API only)
+            workers (int): Threads running lexical and vector queries
+        """
+        self.client = client or PostgresClient()
+        self.provider = provider
+        self.table = table
+        self.source = VectorSource(table)
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.text_method = text_method
+        self.cache = QueryEmbeddingCache(cache_size)
+        self.table_cache = PostgresEmbeddingCache(self.client, cache_table) if cache_table else None
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.index = None
+        self._index_checked = 0.0
+
+    def close(self) -> None:
+        """Stop worker threads and close pooled connections"""
+        self.executor.shutdown(wait=True)
+        self.client.engine.dispose()
+
+    def _with_connection(self, func):
+        """Run func with a DBAPI connection borrowed from the engine pool"""
+        connection = self.client.engine.raw_connection()
+        try:
+            return func(connection.connection)
+        finally:
+            connection.close()
+
+    def _current_index(self) -> Optional[Dict[str, Any]]:
+        """ANN index description for search settings, re-read at most once a minute"""
+        if time.monotonic() - self._index_checked > 60:
+            self.index = self.source.index_manager(self.client).get_index()
+            self._index_checked = time.monotonic()
+        return self.index
+
+    def embed_query(self, text: str):
+        """
+        Embedding of a search text: memory cache, then embedding cache table, then provider
+
+        Returns:
+            Tuple[List[float], str]: Vector and its source ('memory', 'table' or 'api')
+        """
+        if self.provider is None:
+            self.provider = create_provider()
+        key = embedding_key(self.provider.model, text)
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector, 'memory'
+
+        source = 'api'
+        if self.table_cache is not None:
+            cached = self.table_cache.get_many([key]).get(key)
+            if cached is not None:
+                vector, source = parse_vector(cached).tolist(), 'table'
+        if vector is None:
+            vector = self.provider.embed([text])[0]
+        self.cache.put(key, vector)
+        return vector, source
+
+    def _lexical(self, text: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        rows = self._with_connection(lambda conn: search_products(
+            conn, text, self.candidates, method=self.text_method, vectorised_only=False, table=self.table))
+        return {'rows': rows, 'ms': (time.perf_counter() - started) * 1000}
+
+    def _vector(self, text: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        vector, source = self.embed_query(text)
+        embedded = time.perf_counter()
+        index = self._current_index()
+        rows = self._with_connection(lambda conn: nearest_to_vector(
+            conn, vector, self.candidates, index=index, source=self.source))
+        return {'rows': rows, 'embedding': source, 'embed_ms': (embedded - started) * 1000,
+                'ms': (time.perf_counter() - started) * 1000}
+
+    def search(self, text: str, limit: int = 10, lexical_weight: float = 1.0,
+               vector_weight: float = 1.0) -> Dict[str, Any]:
+        """
+        Run lexical and vector queries concurrently and fuse their rankings
+
+        A failing branch (e.g. embedding API unavailable) is reported in 'degraded'
+        and the other ranking is returned alone.
+
+        Args:
+            text (str): Search text
+            limit (int): Number of products to return
+            lexical_weight (float): RRF weight of the lexical ranking
+            vector_weight (float): RRF weight of the vector ranking
+
+        Returns:
+            dict: {'query', 'results' (rows with HYBRID_RESULT_COLUMNS), 'degraded', 'embedding',
+                   'lexical_ms', 'vector_ms', 'embed_ms', 'total_ms'}
+        """
+        started = time.perf_counter()
+        text = text.strip()
+        response = {'query': text, 'results': [], 'degraded': [], 'embedding': None,
+                    'lexical_ms': None, 'vector_ms': None, 'embed_ms': None}
+        if not text:
+            response['total_ms'] = 0.0
+            return response
+
+        branches = {}
+        if lexical_weight > 0:
+            branches['lexical'] = self.executor.submit(self._lexical, text)
+        if vector_weight > 0:
+            branches['vector'] = self.executor.submit(self._vector, text)
+
+        results = {}
+        for name, future in branches.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.warning(f"⚠️ Гибридный поиск '{text}': ветка {name} недоступна: {str(e)}")
+                response['degraded'].append(name)
+        if branches and not results:
+            raise RuntimeError(f"Both search branches failed for '{text}'")
+
+        rows = {}
+        rankings = {}
+        for name, result in results.items():
+            response[f"{name}_ms"] = round(result['ms'], 2)
+            rankings[name] = [row['id'] for row in result['rows']]
+            for rank, row in enumerate(result['rows'], 1):
+                merged = rows.setdefault(row['id'], {column: None for column in HYBRID_RESULT_COLUMNS})
+                merged.update({column: row[column] for column in ('id', 'item_number', 'description', 'brand', 'category')})
+                merged[f"{name}_rank"] = rank
+                if name == 'lexical':
+                    merged['lexical_score'] = row['score']
+                else:
+                    merged['vector_distance'] = row['vector_distance']
+        if 'vector' in results:
+            response['embedding'] = results['vector']['embedding']
+            response['embed_ms'] = round(results['vector']['embed_ms'], 2)
+
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k, {'lexical': lexical_weight, 'vector': vector_weight})
+        for product_id, score in fused[:limit]:
+            rows[product_id]['score'] = score
+            response['results'].append(rows[product_id])
+        response['total_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return response
@@ -0,0 +1,375 @@
+"""
+pgvector ANN index management for companyproducts.vector
+
+Creates and maintains an HNSW or IVFFlat index (cosine distance, partial on
+is_vector = true, or on the model for the product_embeddings side table) with build parameters chosen from the number of vectorised rows,
+and provides the per-query search settings (hnsw.ef_search / ivfflat.probes)
+matching the index.
+
+With quantization the index is built on a compact expression of the column instead
+of the full vectors: 'halfvec' (half precision, half the index size) or 'binary'
+(binary_quantize, one bit per dimension, Hamming distance). The table keeps the full
+vectors, so search takes oversampled candidates from the compact index and re-ranks
+them by exact cosine distance (search.py).
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Optional
+from loguru import logger
+from oneC_etl.config.settings import get_config
+from oneC_etl.services.postgres.client import PostgresClient
+
+INDEX_METHODS = ('hnsw', 'ivfflat')
+
+QUANTIZATIONS = ('halfvec', 'binary')
+
+# Кандидатов из квантованного индекса на один итоговый результат: у бинарного квантования
+# порядок по расстоянию Хэмминга сильно отличается от косинусного, нужен больший запас
+QUANTIZATION_OVERSAMPLE = {None: 1, 'halfvec': 1, 'binary': 4}
+
+# Ниже этого числа векторов точный перебор быстрее обслуживания индекса
+MIN_INDEX_ROWS = 5000
+
+# hnsw.ef_search по умолчанию и максимум в pgvector; HNSW не возвращает больше ef_search строк
+DEFAULT_EF_SEARCH = 40
+MAX_EF_SEARCH = 1000
+
+# IVFFlat перестраивается, когда рекомендуемое число списков отличается от текущего больше чем в 2 раза
+IVFFLAT_REBUILD_RATIO = 2.0
+
+# Частичные индексы по значению фильтра (prefilter.py) называются <таблица>_<столбец>_part_<ключ>_...
+PARTIAL_INDEX_MARKER = 'part'
+
+def choose_index_params(row_count: int, method: str = 'hnsw') -> Dict[str, Any]:
+    """
+    Choose index build parameters from table size
+
+    HNSW: m=16 / ef_construction=64 up to 100k rows, larger graphs for bigger tables.
+    IVFFlat: lists = rows / 1000 up to 1M rows, sqrt(rows) above; probes = sqrt(lists).
+
+    Args:
+        row_count (int): Number of rows with vectors
+        method (str): 'hnsw' or 'ivfflat'
+
+    Returns:
+        dict: {'method', 'build': WITH (...) parameters, 'probes' for IVFFlat}
+    """
+    if method not in INDEX_METHODS:
+        raise ValueError(f"Unknown index method: {method}")
+
+    if method == 'hnsw':
+        if row_count < 100000:
+            build = {'m': 16, 'ef_construction': 64}
+        elif row_count < 1000000:
+            build = {'m': 16, 'ef_construction': 128}
+        else:
+            build = {'m': 24, 'ef_construction': 200}
+        return {'method': method, 'build': build}
+
+    lists = max(1, row_count // 1000) if row_count <= 1000000 else int(math.sqrt(row_count))
+    return {'method': method, 'build': {'lists': lists}, 'probes': max(1, int(math.sqrt(lists)))}
+
+def quantized_expression(expression: str, quantization: Optional[str], dimensions: Optional[int]) -> str:
+    """
+    SQL expression of a vector in the representation indexed by a quantized index
+
+    Args:
+        expression (str): Vector expression (column or parameter)
+        quantization (str): None, 'halfvec' or 'binary'
+        dimensions (int): Vector dimensions
+
+    Returns:
+        str: Expression to order candidates by, with the matching distance operator applied by distance_expression
+    """
+    if quantization is None:
+        return expression
+    if quantization == 'halfvec':
+        return f"({expression})::halfvec({dimensions})"
+    if quantization == 'binary':
+        return f"binary_quantize({expression})::bit({dimensions})"
+    raise ValueError(f"Unknown quantization: {quantization}")
+
+def distance_expression(left: str, right: str, index: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Distance between two vector expressions in the form the index can order by
+
+    Args:
+        left (str): Indexed vector expression (column)
+        right (str): Query vector expression
+        index (dict): Index description (None - full vectors)
+
+    Returns:
+        str: Cosine distance, or Hamming distance for binary quantization
+    """
+    quantization = index.get('quantization') if index else None
+    dimensions = index.get('dimensions') if index else None
+    operator = '<~>' if quantization == 'binary' else '<=>'
+    return (f"{quantized_expression(left, quantization, dimensions)} {operator} "
+            f"{quantized_expression(right, quantization, dimensions)}")
+
+def candidate_count(candidates: int, index: Optional[Dict[str, Any]] = None) -> int:
+    """Candidates to take from the index for re-ranking (oversampled for quantized indexes)"""
+    return candidates * QUANTIZATION_OVERSAMPLE[index.get('quantization') if index else None]
+
+def search_settings(candidates: int, index: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Session settings for an index-ordered top-K query
+
+    Args:
+        candidates (int): Number of rows the ANN stage must return
+        index (dict): Index description from VectorIndexManager.get_index (None if unknown)
+
+    Returns:
+        List[str]: SET LOCAL statements to run in the query transaction
+    """
+    settings = [f"SET LOCAL hnsw.ef_search = {min(max(candidates, DEFAULT_EF_SEARCH), MAX_EF_SEARCH)}"]
+    if index and index['method'] == 'ivfflat':
+        probes = max(1, int(math.sqrt(int(index['build'].get('lists', 1)))))
+        settings.append(f"SET LOCAL ivfflat.probes = {probes}")
+    return settings
+
+def _parse_index(name: str, definition: str) -> Optional[Dict[str, Any]]:
+    """Parse pgvector index definition from pg_indexes.indexdef"""
+    method = re.search(r'\bUSING\s+(\w+)', definition)
+    if not method or method.group(1).lower() not in INDEX_METHODS:
+        return None
+    build = {}
+    options = re.search(r'\bWITH\s*\((.*?)\)', definition)
+    if options:
+        for key, value in re.findall(r"(\w+)\s*=\s*'?(\d+)'?", options.group(1)):
+            build[key] = int(value)
+    quantization, dimensions = None, None
+    quantized = re.search(r'\b(halfvec|bit)\((\d+)\)', definition)
+    if quantized:
+        quantization = 'halfvec' if quantized.group(1) == 'halfvec' else 'binary'
+        dimensions = int(quantized.group(2))
+    return {'name': name, 'method': method.group(1).lower(), 'build': build, 'definition': definition,
+            'quantization': quantization, 'dimensions': dimensions}
+
+def execute_autocommit(client: PostgresClient, *statements: str) -> None:
+    """Run statements outside of a transaction (CREATE/DROP INDEX CONCURRENTLY)"""
+    connection = client.engine.raw_connection()
+    # autocommit выставляется на DBAPI соединении и сбрасывается перед возвратом в пул
+    dbapi_connection = connection.connection
+    try:
+        dbapi_connection.autocommit = True
+        cursor = connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+    finally:
+        dbapi_connection.autocommit = False
+        connection.close()
+
+class VectorIndexManager:
+    """Creates and maintains the ANN index on a vector column"""
+
+    def __init__(self, client: Optional[PostgresClient] = None, table: str = 'companyproducts',
+                 column: str = 'vector', opclass: str = 'vector_cosine_ops', predicate: str = 'is_vector = true',
+                 name: Optional[str] = None):
+        """
+        Initialize manager
+
+        Args:
+            client (PostgresClient): Optional initialized client
+            table (str): Table with the vector column
+            column (str): Vector column
+            opclass (str): Operator class matching the distance operator used in search (<=> - cosine)
+            predicate (str): Partial index predicate, implied by the search queries (rows with current vectors)
+            name (str): Index name prefix (default: <table>_<column>); a manager only sees indexes with its prefix,
+                the default one skips the per-value partial indexes of prefilter.py
+        """
+        self.client = client or PostgresClient()
+        self.table = table
+        self.column = column
+        self.opclass = opclass
+        self.predicate = predicate
+        self.name = name or f"{table}_{column}"
+
+    def index_name(self, method: str, quantization: Optional[str] = None) -> str:
+        suffix = f"{method}_{quantization}" if quantization else method
+        return f"{self.name}_{suffix}_idx"
+
+    def _owns(self, index_name: str) -> bool:
+        """Whether an index on the column belongs to this manager (by name prefix)"""
+        partial = f"{self.table}_{self.column}_{PARTIAL_INDEX_MARKER}_"
+        if self.name.startswith(partial):
+            return index_name.startswith(f"{self.name}_")
+        return not index_name.startswith(partial)
+
+    def get_indexes(self, include_leftovers: bool = False) -> List[Dict[str, Any]]:
+        """
+        Get pgvector indexes on the table column
+
+        Args:
+            include_leftovers (bool): Also return invalid indexes left by an interrupted
+                CREATE INDEX CONCURRENTLY and unfinished rebuilds (<name>_new)
+
+        Returns:
+            List[dict]: {'name', 'method', 'build', 'definition', 'quantization', 'dimensions', 'valid'} per index
+        """
+        rows = self.client.execute_query(f"""
+            SELECT i.indexname, i.indexdef, x.indisvalid AS valid
+            FROM pg_indexes i
+            JOIN pg_class c ON c.relname = i.indexname
+            JOIN pg_index x ON x.indexrelid = c.oid
+            WHERE i.tablename = '{self.table}'
+        """)
+        indexes = []
+        for row in rows:
+            index = _parse_index(row['indexname'], row['indexdef'])
+            # Столбец в определении: "(vector vector_cosine_ops)" или в выражении "((vector)::halfvec(1536))"
+            if (index and self._owns(row['indexname'])
+                    and re.search(rf'\(\s*"?{re.escape(self.column)}"?[\s)]', row['indexdef'])):
+                index['valid'] = bool(row['valid'])
+                if include_leftovers or not self._is_leftover(index):
+                    indexes.append(index)
+        return indexes
+
+    @staticmethod
+    def _is_leftover(index: Dict[str, Any]) -> bool:
+        """Invalid index or unfinished rebuild: not used as the current index"""
+        return not index['valid'] or index['name'].endswith('_new')
+
+    def get_index(self) -> Optional[Dict[str, Any]]:
+        """Current ANN index on the column (None if not indexed)"""
+        indexes = self.get_indexes()
+        return indexes[0] if indexes else None
+
+    def drop_leftovers(self) -> List[str]:
+        """
+        Drop invalid indexes and unfinished rebuilds left by failed builds
+
+        Returns:
+            List[str]: Dropped index names
+        """
+        dropped = []
+        for index in self.get_indexes(include_leftovers=True):
+            if self._is_leftover(index):
+                self._execute_autocommit(f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}")
+                logger.warning(f"🧹 Удалён {'невалидный' if not index['valid'] else 'недостроенный'} "
+                               f"индекс {index['name']}")
+                dropped.append(index['name'])
+        return dropped
+
+    def row_count(self) -> int:
+        """Number of rows with vectors"""
+        rows = self.client.execute_query(
+            f"SELECT COUNT(*) AS count FROM {self.table} WHERE {self.predicate} AND {self.column} IS NOT NULL"
+        )
+        return int(rows[0]['count'])
+
+    def dimensions(self) -> Optional[int]:
+        """Declared dimensions of the vector column (None if the column has no typmod)"""
+        rows = self.client.execute_query(f"""
+            SELECT a.atttypmod AS typmod
+            FROM pg_attribute a
+            WHERE a.attrelid = '{self.table}'::regclass AND a.attname = '{self.column}' AND NOT a.attisdropped
+        """)
+        if not rows or rows[0]['typmod'] is None or rows[0]['typmod'] < 0:
+            return None
+        return int(rows[0]['typmod'])
+
+    def _needs_rebuild(self, index: Dict[str, Any], desired: Dict[str, Any]) -> bool:
+        """Whether the existing index should be rebuilt for the desired parameters"""
+        if index['method'] != desired['method'] or index['quantization'] != desired.get('quantization'):
+            return True
+        if index['method'] == 'ivfflat':
+            # Центроиды IVFFlat обучаются на данных при построении - после сильного роста таблицы индекс деградирует
+            current = max(1, index['build'].get('lists', 1))
+            wanted = desired['build']['lists']
+            return max(current, wanted) / min(current, wanted) > IVFFLAT_REBUILD_RATIO
+        # HNSW дополняется вставками и не требует перестроения при росте
+        return False
+
+    def _build(self, name: str, params: Dict[str, Any], maintenance_work_mem: str) -> None:
+        """CREATE INDEX CONCURRENTLY outside of a transaction"""
+        options = ', '.join(f"{key} = {value}" for key, value in params['build'].items())
+        quantization = params.get('quantization')
+        if quantization is None:
+            key = f"{self.column} {self.opclass}"
+        else:
+            opclass = 'halfvec_cosine_ops' if quantization == 'halfvec' else 'bit_hamming_ops'
+            key = f"({quantized_expression(self.column, quantization, params['dimensions'])}) {opclass}"
+        self._execute_autocommit(
+            f"SET maintenance_work_mem = '{maintenance_work_mem}'",
+            f"""
+                CREATE INDEX CONCURRENTLY {name}
+                ON {self.table} USING {params['method']} ({key})
+                WITH ({options})
+                WHERE {self.predicate}
+            """,
+            "RESET maintenance_work_mem"
+        )
+
+    def _execute_autocommit(self, *statements: str) -> None:
+        execute_autocommit(self.client, *statements)
+
+    def ensure_index(self, method: Optional[str] = None, rebuild: bool = False,
+                     maintenance_work_mem: str = '1GB', quantization: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Create the ANN index or rebuild it when its parameters no longer fit the table
+
+        The new index is built concurrently next to the old one and swapped in,
+        so searches keep using an index during a rebuild.
+
+        Args:
+            method (str): 'hnsw' or 'ivfflat' (default: vector_index_method from config)
+            rebuild (bool): Rebuild even if the current index fits
+            maintenance_work_mem (str): Memory for the build (HNSW builds much faster when the graph fits)
+            quantization (str): 'halfvec', 'binary' or 'none' for full vectors (default: vector_quantization from config)
+
+        Returns:
+            dict: {'status': 'created'/'rebuilt'/'unchanged'/'skipped', 'rows', 'index', ...}
+        """
+        method = method or get_config()['vector_index_method']
+        quantization = quantization or get_config()['vector_quantization']
+        if quantization == 'none':
+            quantization = None
+        if quantization is not None and quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        rows = self.row_count()
+        # Невалидный индекс прерванного построения не используется поиском и не считается текущим
+        self.drop_leftovers()
+        current = self.get_index()
+
+        if rows < MIN_INDEX_ROWS and current is None:
+            logger.info(f"ℹ️ {rows} векторов в {self.table}: индекс не нужен (меньше {MIN_INDEX_ROWS})")
+            return {'status': 'skipped', 'rows': rows, 'index': None}
+
+        dimensions = self.dimensions()
+        if dimensions is None:
+            raise ValueError(f"Column {self.table}.{self.column} has no dimensions: "
+                             f"ALTER COLUMN {self.column} TYPE vector(<dim>) is required for an index")
+
+        desired = choose_index_params(rows, method)
+        desired.update({'quantization': quantization, 'dimensions': dimensions})
+        if current is not None and not rebuild and not self._needs_rebuild(current, desired):
+            logger.info(f"✅ Индекс {current['name']} ({current['method']} {current['build']}) актуален для {rows} векторов")
+            return {'status': 'unchanged', 'rows': rows, 'index': current}
+
+        name = self.index_name(method, quantization)
+        build_name = f"{name}_new" if current is not None else name
+        logger.info(f"🏗️ Построение индекса {build_name}: {method} {desired['build']}"
+                    f"{' ' + quantization if quantization else ''} для {rows} векторов")
+        self._build(build_name, desired, maintenance_work_mem)
+
+        if current is not None:
+            self._execute_autocommit(
+                f"DROP INDEX CONCURRENTLY IF EXISTS {current['name']}",
+                f"ALTER INDEX {build_name} RENAME TO {name}"
+            )
+            logger.info(f"🔁 Индекс {current['name']} заменён на {name}")
+
+        return {
+            'status': 'rebuilt' if current is not None else 'created',
+            'rows': rows,
+            'index': self.get_index(),
+            'previous': current,
+        }
+
+    def drop_index(self) -> None:
+        """Drop all ANN indexes on the column"""
+        for index in self.get_indexes(include_leftovers=True):
+            self._execute_autocommit(f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}")
+            logger.info(f"🗑️ Индекс {index['name']} удалён")
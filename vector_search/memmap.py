@@ -0,0 +1,560 @@
+"""
+In-process similarity search over memory-mapped companyproducts vectors
+
+The vectors of vectorised products are exported once to a float32 matrix on disk
+(unit-length rows, so cosine similarity is a dot product) with an id index and
+brand/category labels, and refreshed incrementally from rows whose updated_at has
+advanced. Top-k queries are answered with blocked matrix multiplication and the
+same brand exclusion and category weighting as search.find_similar_products,
+without a database round trip per query. Candidates can be taken from a compact
+float16 / int8 / binary copy kept in memory and re-ranked on the float32 rows.
+
+Files in the index directory:
+    vectors.f32  - float32 matrix, capacity x dim (rows past 'count' are unused)
+    labels.json  - ids, descriptions, brands and categories per row
+    valid.npy    - row is live (False for deleted or not yet re-embedded products)
+    state.json   - dim, count, capacity, updated_at watermark
+"""
+
+import os
+import json
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from loguru import logger
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "vector_index")
+
+# Строк матрицы на один блок умножения: блок 65536 x 1536 float32 - 384 МБ при чтении с диска
+DEFAULT_BLOCK_ROWS = 65536
+
+# Доля удалённых строк, после которой матрица переписывается без них
+COMPACT_RATIO = 0.2
+
+# Компактные копии матрицы для отбора кандидатов и число кандидатов на один результат
+QUANTIZATIONS = ('float16', 'int8', 'binary')
+QUANTIZATION_OVERSAMPLE = {'float16': 2, 'int8': 4, 'binary': 10}
+
+def parse_vector(text: str) -> np.ndarray:
+    """Parse pgvector text output ('[x,y,...]') to float32 array"""
+    return np.array(text.strip()[1:-1].split(','), dtype=np.float32)
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _write_json(path: str, data: Any) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, path)
+
+class MemmapVectorIndex:
+    """Memory-mapped vector matrix with id index and top-k search"""
+
+    def __init__(self, path: str = DEFAULT_INDEX_DIR, table: str = 'companyproducts'):
+        """
+        Open index directory (empty index if it does not exist yet)
+
+        Args:
+            path (str): Index directory
+            table (str): Products table the index is exported from
+        """
+        self.path = path
+        self.table = table
+        self.state = {'dim': None, 'count': 0, 'capacity': 0, 'watermark': None, 'table': table}
+        self.ids: List[str] = []
+        self.descriptions: List[Optional[str]] = []
+        self.brands: List[Optional[str]] = []
+        self.categories: List[Optional[str]] = []
+        self.valid = np.zeros(0, dtype=bool)
+        self.vectors = None
+
+        state_path = os.path.join(path, 'state.json')
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+            with open(os.path.join(path, 'labels.json'), 'r', encoding='utf-8') as f:
+                labels = json.load(f)
+            self.ids, self.descriptions = labels['ids'], labels['descriptions']
+            self.brands, self.categories = labels['brands'], labels['categories']
+            self.valid = np.load(os.path.join(path, 'valid.npy'))
+            self._map()
+        self._build_lookups()
+
+    @property
+    def count(self) -> int:
+        return self.state['count']
+
+    def _map(self) -> None:
+        """(Re)map the matrix file read-write with the current capacity"""
+        if self.state['capacity']:
+            self.vectors = np.memmap(os.path.join(self.path, 'vectors.f32'), dtype=np.float32, mode='r+',
+                                     shape=(self.state['capacity'], self.state['dim']))
+
+    def _build_lookups(self) -> None:
+        """Id -> row index; label codes are rebuilt lazily on the next query"""
+        self.row_by_id = {product_id: row for row, product_id in enumerate(self.ids)}
+        self._codes = None
+        self._quantized = {}
+
+    def _label_codes(self):
+        """Integer brand/category codes per row used for vectorised filtering"""
+        if self._codes is None:
+            brand_codes, brand_code = self._encode(self.brands)
+            category_codes, category_code = self._encode(self.categories)
+            self._codes = (brand_codes, brand_code, category_codes, category_code)
+        return self._codes
+
+    @staticmethod
+    def _encode(values: Sequence[Optional[str]]):
+        codes = {}
+        encoded = np.array([codes.setdefault(value, len(codes)) for value in values], dtype=np.int32)
+        return encoded, codes
+
+    def _grow(self, needed: int) -> None:
+        """Extend the matrix file to hold at least needed rows (capacity doubles)"""
+        if needed <= self.state['capacity']:
+            return
+        capacity = max(needed, self.state['capacity'] * 2, 1024)
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'vectors.f32'), 'ab') as f:
+            f.truncate(capacity * self.state['dim'] * 4)
+        self.state['capacity'] = capacity
+        self.valid = np.concatenate([self.valid, np.zeros(capacity - len(self.valid), dtype=bool)])
+        self._map()
+
+    def save(self) -> None:
+        """Flush matrix and write labels and state"""
+        os.makedirs(self.path, exist_ok=True)
+        if self.vectors is not None:
+            self.vectors.flush()
+        _write_json(os.path.join(self.path, 'labels.json'), {
+            'ids': self.ids, 'descriptions': self.descriptions,
+            'brands': self.brands, 'categories': self.categories,
+        })
+        np.save(os.path.join(self.path, 'valid.npy'), self.valid)
+        _write_json(os.path.join(self.path, 'state.json'), self.state)
+
+    def upsert(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert or overwrite rows
+
+        Args:
+            rows (list): Dicts with id, description, brand, category and vector (text or sequence)
+
+        Returns:
+            int: Number of appended rows
+        """
+        if not rows:
+            return 0
+        vectors = np.vstack([parse_vector(row['vector']) if isinstance(row['vector'], str)
+                             else np.asarray(row['vector'], dtype=np.float32) for row in rows])
+        if self.state['dim'] is None:
+            self.state['dim'] = int(vectors.shape[1])
+        elif vectors.shape[1] != self.state['dim']:
+            raise ValueError(f"Vector dimensions {vectors.shape[1]} do not match index dimensions {self.state['dim']}")
+        vectors = _normalize(vectors)
+
+        new_ids = [str(row['id']) for row in rows if str(row['id']) not in self.row_by_id]
+        self._grow(self.count + len(new_ids))
+
+        for row, vector in zip(rows, vectors):
+            product_id = str(row['id'])
+            position = self.row_by_id.get(product_id)
+            if position is None:
+                position = self.count
+                self.row_by_id[product_id] = position
+                self.ids.append(product_id)
+                self.descriptions.append(row.get('description'))
+                self.brands.append(row.get('brand'))
+                self.categories.append(row.get('category'))
+                self.state['count'] += 1
+            else:
+                self.descriptions[position] = row.get('description')
+                self.brands[position] = row.get('brand')
+                self.categories[position] = row.get('category')
+            self.vectors[position] = vector
+            self.valid[position] = True
+
+        self._codes = None
+        self._quantized = {}
+        return len(new_ids)
+
+    def invalidate(self, product_ids) -> int:
+        """Mark rows of products as not live (deleted or waiting for a new vector)"""
+        invalidated = 0
+        for product_id in product_ids:
+            position = self.row_by_id.get(str(product_id))
+            if position is not None and self.valid[position]:
+                self.valid[position] = False
+                invalidated += 1
+        return invalidated
+
+    def compact(self) -> None:
+        """Rewrite matrix without rows that are not live"""
+        live = np.flatnonzero(self.valid[:self.count])
+        if len(live) == self.count:
+            return
+        matrix = np.array(self.vectors[live]) if len(live) else np.zeros((0, self.state['dim']), dtype=np.float32)
+        self.ids = [self.ids[i] for i in live]
+        self.descriptions = [self.descriptions[i] for i in live]
+        self.brands = [self.brands[i] for i in live]
+        self.categories = [self.categories[i] for i in live]
+
+        self.vectors = None
+        path = os.path.join(self.path, 'vectors.f32')
+        capacity = max(len(live), 1024)
+        with open(path, 'wb') as f:
+            f.truncate(capacity * self.state['dim'] * 4)
+        self.state.update({'count': len(live), 'capacity': capacity})
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.valid[:len(live)] = True
+        self._map()
+        self.vectors[:len(live)] = matrix
+        self._build_lookups()
+        logger.info(f"🧹 Матрица векторов уплотнена: {len(live)} строк")
+
+    def _fetch(self, connection, source, where: str, params: tuple, chunk_rows: int):
+        """Stream products with vectors through a server-side cursor"""
+        cursor = connection.cursor(name='memmap_vector_export')
+        cursor.itersize = chunk_rows
+        # В боковой таблице вектор есть только у векторизованных товаров: строки, ждущие вектор, не выбираются
+        is_vector = "true" if source.side_table else "p.is_vector"
+        cursor.execute(f"""
+            SELECT p.id, p.description, p.brand, p.category, {is_vector} AS is_vector,
+                   {source.vector}::text AS vector, {source.updated_at} AS updated_at
+            FROM {source.from_clause}
+            WHERE {where}
+        """, params)
+        columns = ['id', 'description', 'brand', 'category', 'is_vector', 'vector', 'updated_at']
+        batch = []
+        for row in cursor:
+            batch.append(dict(zip(columns, row)))
+            if len(batch) >= chunk_rows:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        cursor.close()
+
+    def refresh(self, client, full: bool = False, chunk_rows: int = 10000, source=None) -> Dict[str, Any]:
+        """
+        Export vectors or apply changes since the last refresh
+
+        Rows with updated_at past the watermark are re-read: vectorised rows are
+        upserted, rows waiting for a new vector are invalidated (and the watermark stays
+        before them, so they are picked up once embedded). Products missing from the
+        table are invalidated. With the product_embeddings side table the watermark
+        also covers vector writes (embedding updated_at).
+
+        Args:
+            client (PostgresClient): Initialized client
+            full (bool): Re-export everything
+            chunk_rows (int): Rows per fetch
+            source (VectorSource): Vector storage (default: vector_storage from config)
+
+        Returns:
+            dict: Refresh statistics with 'status'
+        """
+        from oneC_etl.vector_search.storage import VectorSource
+
+        source = source or VectorSource(self.table)
+        started = datetime.utcnow()
+        watermark = None if full else self.state.get('watermark')
+        stats = {'mode': 'full' if watermark is None else 'incremental', 'upserted': 0, 'appended': 0, 'invalidated': 0}
+
+        if watermark is None:
+            self.valid[:] = False
+            where, params = source.vectorised, ()
+        else:
+            where, params = f"{source.updated_at} > %s", (watermark,)
+
+        connection = client.engine.raw_connection()
+        try:
+            newest = None
+            for batch in self._fetch(connection, source, where, params, chunk_rows):
+                ready = [row for row in batch if row['is_vector'] and row['vector']]
+                dirty = [row for row in batch if not (row['is_vector'] and row['vector'])]
+                stats['appended'] += self.upsert(ready)
+                stats['upserted'] += len(ready)
+                stats['invalidated'] += self.invalidate(row['id'] for row in dirty)
+                for row in batch:
+                    if row['updated_at'] is not None:
+                        newest = max(newest, row['updated_at']) if newest else row['updated_at']
+
+            # Расчёт вектора не меняет updated_at: водяной знак не должен обгонять строки, ждущие вектор
+            cursor = connection.cursor()
+            oldest_dirty = None
+            if not source.side_table:
+                cursor.execute(f"SELECT MIN(updated_at) FROM {self.table} WHERE is_vector = false")
+                oldest_dirty = cursor.fetchone()[0]
+
+            # Удалённые из таблицы товары (cleanup) не видны по updated_at - сверяем набор id
+            cursor.execute(f"SELECT p.id FROM {source.from_clause} WHERE {source.vectorised}")
+            live_ids = {str(row[0]) for row in cursor.fetchall()}
+            stats['invalidated'] += self.invalidate(
+                product_id for row, product_id in enumerate(self.ids) if self.valid[row] and product_id not in live_ids
+            )
+            connection.commit()
+        finally:
+            connection.close()
+
+        if oldest_dirty is not None and newest is not None:
+            newest = min(newest, oldest_dirty - timedelta(microseconds=1))
+        if newest is not None:
+            self.state['watermark'] = newest.isoformat() if hasattr(newest, 'isoformat') else str(newest)
+
+        if self.count and (self.count - int(self.valid[:self.count].sum())) / self.count > COMPACT_RATIO:
+            self.compact()
+        self.save()
+
+        stats.update({'rows': int(self.valid[:self.count].sum()), 'watermark': self.state['watermark'],
+                      'duration_s': round((datetime.utcnow() - started).total_seconds(), 3), 'status': 'success'})
+        logger.info(f"🔄 Матрица векторов {self.path}: {stats['mode']}, обновлено {stats['upserted']}, "
+                    f"добавлено {stats['appended']}, исключено {stats['invalidated']}, строк {stats['rows']}")
+        return stats
+
+    def quantized(self, kind: str):
+        """
+        Compact in-memory copy of the matrix used for candidate generation
+
+        float16 - half precision; int8 - symmetric per-dimension scalar quantization;
+        binary - sign bits (packed). Built on first use from the float32 matrix and
+        dropped when rows change.
+
+        Args:
+            kind (str): 'float16', 'int8' or 'binary'
+
+        Returns:
+            Tuple[np.ndarray, Optional[np.ndarray]]: Compact matrix (count rows) and int8 scales per dimension
+        """
+        if kind not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {kind}")
+        if kind not in self._quantized:
+            count, dim = self.count, self.state['dim'] or 0
+            scale = None
+            if kind == 'int8':
+                scale = np.zeros(dim, dtype=np.float32)
+                for start in range(0, count, DEFAULT_BLOCK_ROWS):
+                    block = np.abs(np.asarray(self.vectors[start:start + DEFAULT_BLOCK_ROWS]))
+                    scale = np.maximum(scale, block.max(axis=0))
+                scale = np.where(scale > 0, scale / 127, 1.0).astype(np.float32)
+                matrix = np.empty((count, dim), dtype=np.int8)
+            elif kind == 'float16':
+                matrix = np.empty((count, dim), dtype=np.float16)
+            else:
+                matrix = np.empty((count, (dim + 7) // 8), dtype=np.uint8)
+
+            for start in range(0, count, DEFAULT_BLOCK_ROWS):
+                block = np.asarray(self.vectors[start:start + DEFAULT_BLOCK_ROWS])
+                if kind == 'int8':
+                    matrix[start:start + len(block)] = np.clip(np.rint(block / scale), -127, 127)
+                elif kind == 'float16':
+                    matrix[start:start + len(block)] = block
+                else:
+                    matrix[start:start + len(block)] = np.packbits(block > 0, axis=1)
+            self._quantized[kind] = (matrix, scale)
+        return self._quantized[kind]
+
+    def _block_matrix(self, block: np.ndarray, contiguous: Optional[slice], quantization: Optional[str]) -> np.ndarray:
+        """Float32 matrix of block rows: exact, or decoded from the compact copy"""
+        if quantization is None:
+            source = self.vectors
+        else:
+            source = self.quantized(quantization)[0]
+        matrix = np.asarray(source[contiguous] if contiguous is not None else source[block])
+        if quantization == 'binary':
+            return np.unpackbits(matrix, axis=1, count=self.state['dim']).astype(np.float32) * 2 - 1
+        return matrix.astype(np.float32, copy=False)
+
+    def top_k(self, queries: np.ndarray, k: int, query_brands: Optional[Sequence[Optional[str]]] = None,
+              query_categories: Optional[Sequence[Optional[str]]] = None, exclude_rows: Optional[Sequence[int]] = None,
+              category_weight: float = 0.0, block_rows: int = DEFAULT_BLOCK_ROWS,
+              candidate_rows: Optional[np.ndarray] = None, quantization: Optional[str] = None,
+              oversample: Optional[int] = None):
+        """
+        Blocked top-k over the matrix for a batch of query vectors
+
+        Score: similarity * (1 - category_weight) + category_match * category_weight,
+        where similarity = 1 - cosine distance. With quantization, k * oversample
+        candidates are taken from the compact copy and re-ranked on the float32 rows.
+
+        Args:
+            queries (np.ndarray): m x dim query vectors
+            k (int): Results per query
+            query_brands (Sequence): Brand to exclude per query (None - no exclusion)
+            query_categories (Sequence): Category to match per query (None - no category weighting)
+            exclude_rows (Sequence[int]): Row to exclude per query (e.g. the reference product, -1 - none)
+            category_weight (float): Weight of category match
+            block_rows (int): Matrix rows per multiplication block
+            candidate_rows (np.ndarray): Only score these matrix rows (None - all rows)
+            quantization (str): None (float32), 'float16', 'int8' or 'binary'
+            oversample (int): Candidates per result for re-ranking (default QUANTIZATION_OVERSAMPLE)
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray]: rows, scores and similarities, m x k each
+                (row -1 when fewer than k rows match)
+        """
+        queries = _normalize(np.atleast_2d(np.asarray(queries, dtype=np.float32)))
+        m = len(queries)
+        k = max(1, min(k, self.count))
+        best_rows = np.full((m, k), -1, dtype=np.int64)
+        best_scores = np.full((m, k), -np.inf, dtype=np.float32)
+        best_similarity = np.zeros((m, k), dtype=np.float32)
+        if not self.count:
+            return best_rows, best_scores, best_similarity
+
+        row_brands, brand_code, row_categories, category_code = self._label_codes()
+        brand_codes = None
+        if query_brands is not None:
+            brand_codes = np.array([brand_code.get(brand, -1) for brand in query_brands], dtype=np.int32)[:, None]
+        category_codes = None
+        if query_categories is not None and category_weight:
+            category_codes = np.array([category_code.get(category, -1) for category in query_categories], dtype=np.int32)[:, None]
+        excluded = np.asarray(exclude_rows if exclude_rows is not None else [-1] * m, dtype=np.int64)[:, None]
+
+        final_k = k
+        block_queries = queries
+        if quantization is not None:
+            k = max(1, min(k * (oversample or QUANTIZATION_OVERSAMPLE[quantization]), self.count))
+            best_rows = np.full((m, k), -1, dtype=np.int64)
+            best_scores = np.full((m, k), -np.inf, dtype=np.float32)
+            best_similarity = np.zeros((m, k), dtype=np.float32)
+            scale = self.quantized(quantization)[1]
+            if scale is not None:
+                # x ~ x_int8 * scale: масштаб переносится на запрос, матрица умножается как есть
+                block_queries = queries * scale
+
+        total = self.count if candidate_rows is None else len(candidate_rows)
+        for start in range(0, total, block_rows):
+            stop = min(start + block_rows, total)
+            if candidate_rows is None:
+                block = np.arange(start, stop)
+                matrix = self._block_matrix(block, slice(start, stop), quantization)
+            else:
+                block = np.asarray(candidate_rows[start:stop], dtype=np.int64)
+                matrix = self._block_matrix(block, None, quantization)
+            similarity = block_queries @ matrix.T
+            if quantization == 'binary':
+                # Скалярное произведение с ±1 пропорционально сходству, а не равно ему: нормируем на sqrt(dim)
+                similarity = similarity / np.float32(np.sqrt(self.state['dim']))
+            scores = similarity * (1 - category_weight)
+            if category_codes is not None:
+                scores = scores + (row_categories[block][None, :] == category_codes) * np.float32(category_weight)
+
+            mask = ~self.valid[block][None, :] | (block[None, :] == excluded)
+            if brand_codes is not None:
+                mask = mask | (row_brands[block][None, :] == brand_codes)
+            scores = np.where(mask, -np.inf, scores).astype(np.float32)
+
+            # Кандидаты блока + текущие лучшие -> новые лучшие k
+            block_k = min(k, stop - start)
+            candidates = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+            merged_rows = np.concatenate([best_rows, block[candidates]], axis=1)
+            merged_scores = np.concatenate([best_scores, np.take_along_axis(scores, candidates, axis=1)], axis=1)
+            merged_similarity = np.concatenate([best_similarity, np.take_along_axis(similarity, candidates, axis=1)], axis=1)
+            order = np.argsort(-merged_scores, axis=1, kind='stable')[:, :k]
+            best_rows = np.take_along_axis(merged_rows, order, axis=1)
+            best_scores = np.take_along_axis(merged_scores, order, axis=1)
+            best_similarity = np.take_along_axis(merged_similarity, order, axis=1)
+
+        best_rows[~np.isfinite(best_scores)] = -1
+        if quantization is not None:
+            return self._rerank(queries, best_rows, final_k, row_categories, category_codes, category_weight)
+        return best_rows, best_scores, best_similarity
+
+    def _rerank(self, queries: np.ndarray, candidates: np.ndarray, k: int, row_categories: np.ndarray,
+                category_codes: Optional[np.ndarray], category_weight: float):
+        """Exact scores of candidate rows on the float32 matrix, top k per query"""
+        m = len(queries)
+        best_rows = np.full((m, k), -1, dtype=np.int64)
+        best_scores = np.full((m, k), -np.inf, dtype=np.float32)
+        best_similarity = np.zeros((m, k), dtype=np.float32)
+        for i in range(m):
+            rows = candidates[i][candidates[i] >= 0]
+            if not len(rows):
+                continue
+            # Чтение строк в порядке файла - последовательнее для memmap
+            rows = np.sort(rows)
+            similarity = np.asarray(self.vectors[rows]) @ queries[i]
+            scores = similarity * (1 - category_weight)
+            if category_codes is not None:
+                scores = scores + (row_categories[rows] == category_codes[i, 0]) * np.float32(category_weight)
+            order = np.argsort(-scores, kind='stable')[:k]
+            best_rows[i, :len(order)] = rows[order]
+            best_scores[i, :len(order)] = scores[order]
+            best_similarity[i, :len(order)] = similarity[order]
+        return best_rows, best_scores, best_similarity
+
+    def similar_products(self, product_id: str, limit: int = 4, exclude_same_brand: bool = False,
+                         category_weight: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        Similar products of a reference product, like search.find_similar_products(exact=True)
+
+        Args:
+            product_id (str): Reference product UUID
+            limit (int): Number of similar products to return
+            exclude_same_brand (bool): Exclude products of the reference brand
+            category_weight (float): Weight of category match in the combined score
+
+        Returns:
+            List[dict]: Rows with search.RESULT_COLUMNS ordered by combined_score
+        """
+        position = self.row_by_id.get(str(product_id))
+        if position is None or not self.valid[position]:
+            return []
+        rows, scores, similarity = self.top_k(
+            self.vectors[position], limit,
+            query_brands=[self.brands[position]] if exclude_same_brand else None,
+            query_categories=[self.categories[position]],
+            exclude_rows=[position],
+            category_weight=category_weight
+        )
+        results = []
+        for row, score, sim in zip(rows[0], scores[0], similarity[0]):
+            if row < 0:
+                continue
+            results.append({
+                'id': self.ids[row],
+                'description': self.descriptions[row],
+                'brand': self.brands[row],
+                'category': self.categories[row],
+                'vector_distance': float(1 - sim),
+                'category_match': 1.0 if self.categories[row] == self.categories[position] else 0.0,
+                'combined_score': float(score),
+            })
+        return results
+
+def main():
+    """Export/refresh the matrix or query it from command line"""
+    parser = argparse.ArgumentParser(description="Memory-mapped vector index for similar product search")
+    parser.add_argument("command", choices=['refresh', 'similar'])
+    parser.add_argument("--path", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--table", default='companyproducts')
+    parser.add_argument("--full", action='store_true', help="Re-export all vectors")
+    parser.add_argument("--product-id", help="Reference product for 'similar'")
+    parser.add_argument("--limit", type=int, default=4)
+    parser.add_argument("--exclude-same-brand", action='store_true')
+    parser.add_argument("--category-weight", type=float, default=1.0)
+    args = parser.parse_args()
+
+    index = MemmapVectorIndex(args.path, args.table)
+    if args.command == 'refresh':
+        from oneC_etl.services.postgres.client import PostgresClient
+        print(json.dumps(index.refresh(PostgresClient(), full=args.full), ensure_ascii=False, indent=2))
+        return
+
+    if not args.product_id:
+        parser.error("--product-id is required for 'similar'")
+    for row in index.similar_products(args.product_id, args.limit, args.exclude_same_brand, args.category_weight):
+        print(f"{row['combined_score']:.4f}  {row['vector_distance']:.4f}  {row['id']}  {row['brand']}  "
+              f"{row['category']}  {row['description']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,288 @@
+"""
+Hard filters for vector search and the plan that serves them
+
+An ANN index ordered by distance knows nothing about the filters of a query:
+with "same category only" the index returns the nearest products of all
+categories and the filter throws most of them away, so a small category gets
+fewer results than asked and a large one pays for scanning the rest of the
+catalogue. PrefilterPlanner counts the vectorised rows matching the filters
+(category, brand, on_order, withdrawn_from_range) from cached group statistics
+and picks one of:
+
+    exact         - few matching rows: exact distance over the filtered rows only
+    partial_index - a single category with its own partial ANN index
+                    (WHERE is_vector = true AND category = '...'), kept for the
+                    largest categories by ensure_partial_indexes
+    index         - the table ANN index with the filter applied to its candidates,
+                    oversampled by the inverse selectivity of the filter
+
+Partial indexes need the category next to the vector, so they are built only with
+inline vector storage; with the side table large filtered sets use the table index.
+"""
+
+import math
+import time
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from oneC_etl.vector_search.index import (MAX_EF_SEARCH, PARTIAL_INDEX_MARKER, VectorIndexManager, _parse_index,
+                                          execute_autocommit)
+from oneC_etl.vector_search.storage import VectorSource
+
+FILTER_COLUMNS = ('category', 'brand', 'on_order', 'withdrawn_from_range')
+
+PLAN_STRATEGIES = ('exact', 'partial_index', 'index')
+
+# Точный перебор отфильтрованных строк быстрее ANN индекса, пока строк не больше этого числа
+EXACT_MAX_ROWS = 10000
+
+# Частичные индексы строятся для категорий крупнее порога точного перебора, не больше MAX_PARTIAL_INDEXES
+PARTIAL_INDEX_MIN_ROWS = EXACT_MAX_ROWS
+MAX_PARTIAL_INDEXES = 20
+
+# Статистика групп товаров перечитывается не чаще чем раз в STATS_TTL секунд
+STATS_TTL = 300
+
+def _literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+def normalize_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Filters as lists of allowed values, without empty ones
+
+    Args:
+        filters (dict): Column -> value or list of values (None - no filter on the column)
+
+    Returns:
+        Dict[str, list]: Column -> allowed values
+    """
+    normalized = {}
+    for column, value in (filters or {}).items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Unknown search filter: {column} (supported: {', '.join(FILTER_COLUMNS)})")
+        if value is None:
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        if not values:
+            raise ValueError(f"Empty value list for search filter {column}")
+        normalized[column] = values
+    return normalized
+
+def filter_clause(filters: Optional[Dict[str, Any]], alias: str = 'p',
+                  literal_columns: Tuple[str, ...] = ()) -> Tuple[str, Dict[str, Any]]:
+    """
+    SQL predicate of the filters on the products table
+
+    A single value is compared with '=' so that a query on one category implies
+    the predicate of its partial index.
+
+    Args:
+        filters (dict): Column -> value or list of values
+        alias (str): Products table alias in the query
+        literal_columns (tuple): Columns whose single value is written into the text instead of a parameter
+
+    Returns:
+        Tuple[str, dict]: "AND ..." clause (empty without filters) and its parameters
+    """
+    clauses, params = [], {}
+    for column, values in normalize_filters(filters).items():
+        name = f"filter_{column}"
+        if len(values) == 1 and column in literal_columns:
+            clauses.append(f"{alias}.{column} = {_literal(values[0])}")
+        elif len(values) == 1:
+            clauses.append(f"{alias}.{column} = %({name})s")
+            params[name] = values[0]
+        else:
+            clauses.append(f"{alias}.{column} = ANY(%({name})s)")
+            params[name] = values
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+def partial_index_prefix(category: str, table: str = 'companyproducts') -> str:
+    """Name prefix of the partial index of a category (category values are not valid identifiers)"""
+    return f"{table}_vector_{PARTIAL_INDEX_MARKER}_{hashlib.md5(category.encode('utf-8')).hexdigest()[:12]}"
+
+def partial_index_manager(client, category: str, table: str = 'companyproducts') -> VectorIndexManager:
+    """
+    VectorIndexManager of the partial ANN index of one category
+
+    Args:
+        client (PostgresClient): Initialized client
+        category (str): Category value
+        table (str): Products table (inline vectors)
+    """
+    return VectorIndexManager(client, table, predicate=f"is_vector = true AND category = {_literal(category)}",
+                              name=partial_index_prefix(category, table))
+
+def category_counts(client, source: VectorSource) -> Dict[str, int]:
+    """Vectorised products per category, largest first"""
+    rows = client.execute_query(f"""
+        SELECT p.category, COUNT(*) AS count
+        FROM {source.from_clause}
+        WHERE {source.vectorised} AND p.category IS NOT NULL
+        GROUP BY p.category
+        ORDER BY count DESC
+    """)
+    return {row['category']: int(row['count']) for row in rows}
+
+def ensure_partial_indexes(client, source: Optional[VectorSource] = None, min_rows: int = PARTIAL_INDEX_MIN_ROWS,
+                           max_indexes: int = MAX_PARTIAL_INDEXES, method: Optional[str] = None,
+                           quantization: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Create partial ANN indexes for the largest categories and drop those of categories that shrank
+
+    Args:
+        client (PostgresClient): Initialized client
+        source (VectorSource): Vector storage (default: vector_storage from config)
+        min_rows (int): Vectorised products a category needs for its own index
+        max_indexes (int): Maximum number of partial indexes
+        method (str): 'hnsw' or 'ivfflat' (default: vector_index_method from config)
+        quantization (str): Index representation (default: vector_quantization from config)
+
+    Returns:
+        dict: {'status', 'categories': category -> index status, 'dropped': [...]}
+    """
+    source = source or VectorSource()
+    if source.side_table:
+        logger.info("ℹ️ Векторы в боковой таблице: частичные индексы по категориям не строятся")
+        return {'status': 'skipped', 'categories': {}, 'dropped': []}
+
+    counts = category_counts(client, source)
+    hot = [category for category, count in counts.items() if count >= min_rows][:max_indexes]
+    statuses = {}
+    for category in hot:
+        result = partial_index_manager(client, category, source.products_table).ensure_index(
+            method, quantization=quantization)
+        statuses[category] = result['status']
+
+    keep = {partial_index_prefix(category, source.products_table) for category in hot}
+    prefix = f"{source.products_table}_vector_{PARTIAL_INDEX_MARKER}_"
+    rows = client.execute_query(f"""
+        SELECT indexname FROM pg_indexes
+        WHERE tablename = '{source.products_table}' AND indexname LIKE '{prefix}%'
+    """)
+    dropped = []
+    for row in rows:
+        if not any(row['indexname'].startswith(f"{name}_") for name in keep):
+            execute_autocommit(client, f"DROP INDEX CONCURRENTLY IF EXISTS {row['indexname']}")
+            dropped.append(row['indexname'])
+
+    logger.info(f"✅ Частичные индексы по категориям: {len(hot)} категорий от {min_rows} товаров, "
+                f"удалено устаревших: {len(dropped)}")
+    changed = dropped or any(status in ('created', 'rebuilt') for status in statuses.values())
+    return {'status': 'updated' if changed else 'unchanged', 'categories': statuses, 'dropped': dropped}
+
+class PrefilterPlanner:
+    """Chooses how a filtered vector search is executed"""
+
+    def __init__(self, source: Optional[VectorSource] = None, table: str = 'companyproducts',
+                 exact_max_rows: int = EXACT_MAX_ROWS, stats_ttl: float = STATS_TTL):
+        """
+        Initialize planner
+
+        Args:
+            source (VectorSource): Vector storage (default: vector_storage from config)
+            table (str): Products table
+            exact_max_rows (int): Filtered sets up to this size are searched exactly
+            stats_ttl (float): Seconds the group statistics and partial index list are reused
+        """
+        self.source = source or VectorSource(table)
+        self.exact_max_rows = exact_max_rows
+        self.stats_ttl = stats_ttl
+        self._stats = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load(self, conn) -> Dict[str, Any]:
+        source = self.source
+        prefix = f"{source.products_table}_vector_{PARTIAL_INDEX_MARKER}_"
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(f"""
+                    SELECT p.category, p.brand, p.on_order, p.withdrawn_from_range, COUNT(*)
+                    FROM {source.from_clause}
+                    WHERE {source.vectorised}
+                    GROUP BY 1, 2, 3, 4
+                """)
+                groups = [dict(zip(FILTER_COLUMNS + ('count',), row)) for row in cur.fetchall()]
+                indexes = []
+                if not source.side_table:
+                    cur.execute("""
+                        SELECT i.indexname, i.indexdef
+                        FROM pg_indexes i
+                        JOIN pg_class c ON c.relname = i.indexname
+                        JOIN pg_index x ON x.indexrelid = c.oid
+                        WHERE i.tablename = %s AND i.indexname LIKE %s AND x.indisvalid
+                    """, (source.products_table, prefix + '%'))
+                    indexes = cur.fetchall()
+
+        # Имя частичного индекса содержит хэш категории: сопоставляем с категориями из статистики
+        partial = {}
+        for category in {group['category'] for group in groups if group['category'] is not None}:
+            name = partial_index_prefix(category, source.products_table) + '_'
+            for index_name, definition in indexes:
+                if index_name.startswith(name) and not index_name.endswith('_new'):
+                    partial[category] = _parse_index(index_name, definition)
+        return {'groups': groups, 'total': sum(group['count'] for group in groups), 'partial_indexes': partial}
+
+    def stats(self, conn) -> Dict[str, Any]:
+        """
+        Cached group statistics of vectorised products
+
+        Args:
+            conn: DBAPI (psycopg2) connection
+
+        Returns:
+            dict: {'groups': counts per (category, brand, on_order, withdrawn_from_range), 'total',
+                   'partial_indexes': category -> index description}
+        """
+        with self._lock:
+            if self._stats is None or time.monotonic() - self._loaded_at > self.stats_ttl:
+                self._stats = self._load(conn)
+                self._loaded_at = time.monotonic()
+            return self._stats
+
+    def estimate(self, conn, filters: Optional[Dict[str, Any]]) -> int:
+        """Vectorised products matching the filters"""
+        normalized = normalize_filters(filters)
+        return sum(
+            group['count'] for group in self.stats(conn)['groups']
+            if all(group[column] in values for column, values in normalized.items())
+        )
+
+    def plan(self, conn, filters: Optional[Dict[str, Any]], candidates: int = 100) -> Dict[str, Any]:
+        """
+        Strategy for a filtered search
+
+        Args:
+            conn: DBAPI (psycopg2) connection
+            filters (dict): Column -> value or list of values
+            candidates (int): Rows the ANN stage must return after filtering
+
+        Returns:
+            dict: {'strategy', 'rows' (matching products), 'selectivity', 'index' (partial index or None),
+                   'oversample' (candidates multiplier for the table index)}
+        """
+        normalized = normalize_filters(filters)
+        stats = self.stats(conn)
+        rows = self.estimate(conn, normalized)
+        selectivity = rows / stats['total'] if stats['total'] else 0.0
+        plan = {'strategy': 'index', 'rows': rows, 'selectivity': round(selectivity, 6), 'index': None, 'oversample': 1}
+        if not normalized:
+            return plan
+
+        categories = normalized.get('category', [])
+        if rows <= self.exact_max_rows:
+            plan['strategy'] = 'exact'
+        elif len(categories) == 1 and categories[0] in stats['partial_indexes']:
+            # Остальные фильтры применяются к кандидатам частичного индекса
+            category_rows = self.estimate(conn, {'category': categories[0]})
+            plan.update({'strategy': 'partial_index', 'index': stats['partial_indexes'][categories[0]],
+                         'oversample': max(1, math.ceil(category_rows / max(rows, 1)))})
+        else:
+            plan['oversample'] = max(1, math.ceil(1 / selectivity)) if selectivity else 1
+
+        # HNSW не вернёт больше ef_search строк: при слишком редком фильтре индекс не наберёт кандидатов
+        if plan['strategy'] != 'exact' and candidates * plan['oversample'] > MAX_EF_SEARCH:
+            plan.update({'strategy': 'exact', 'index': None, 'oversample': 1})
+        return plan
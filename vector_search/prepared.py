@@ -0,0 +1,97 @@
+"""
+Server-side prepared statements on pooled connections
+
+A long-running search service sends the same few query texts thousands of times;
+PREPARE parses and analyses a text once per connection and EXECUTE only binds the
+parameters. Queries keep the psycopg2 %(name)s placeholders: they are rewritten
+to $1..$n, prepared under a name derived from the text on first use on a
+connection, and executed with the parameters in placeholder order.
+
+Prepared statements live in the database session, so the names prepared on each
+pooled DBAPI connection are tracked here and forgotten when the pool opens a new
+connection. Values that must be visible to the planner (e.g. the category of a
+partial index predicate) have to be literals in the text, not parameters.
+"""
+
+import re
+import hashlib
+import threading
+from typing import Any, Dict, List, Tuple
+from sqlalchemy import event
+
+PLACEHOLDER = re.compile(r'%\((\w+)\)s')
+
+def to_positional(query: str) -> Tuple[str, str, List[str]]:
+    """
+    Rewrite a query with %(name)s placeholders for PREPARE
+
+    Args:
+        query (str): Query in psycopg2 pyformat style
+
+    Returns:
+        Tuple[str, str, List[str]]: Statement name, text with $n placeholders, parameter names by position
+    """
+    names = []
+
+    def replace(match):
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    # Без параметров psycopg2 не обрабатывает %, поэтому %% возвращается к %
+    text = PLACEHOLDER.sub(replace, query).replace('%%', '%')
+    name = 'search_' + hashlib.md5(text.encode('utf-8')).hexdigest()[:16]
+    return name, text, names
+
+class PreparedStatements:
+    """Prepared statements per pooled connection of an engine"""
+
+    def __init__(self, engine=None):
+        """
+        Initialize registry
+
+        Args:
+            engine (Engine): SQLAlchemy engine whose pool hands out the connections
+                (None - connections are not pooled and not reused after close)
+        """
+        self._prepared = {}
+        self._lock = threading.Lock()
+        self.prepares = 0
+        self.executes = 0
+        if engine is not None:
+            event.listen(engine, 'connect', self._forget)
+
+    def _forget(self, dbapi_connection, connection_record) -> None:
+        # Новое соединение может получить id закрытого - подготовленных операторов в нём нет
+        with self._lock:
+            self._prepared.pop(id(dbapi_connection), None)
+
+    def execute(self, cursor, query: str, params: Dict[str, Any]) -> None:
+        """
+        Execute query as a prepared statement on the cursor's connection
+
+        Args:
+            cursor: DBAPI (psycopg2) cursor
+            query (str): Query with %(name)s placeholders
+            params (dict): Parameters
+        """
+        name, text, names = to_positional(query)
+        key = id(cursor.connection)
+        with self._lock:
+            prepared = name in self._prepared.get(key, ())
+        if not prepared:
+            cursor.execute(f"PREPARE {name} AS {text}")
+            with self._lock:
+                self._prepared.setdefault(key, set()).add(name)
+                self.prepares += 1
+        arguments = ', '.join(['%s'] * len(names))
+        cursor.execute(f"EXECUTE {name}({arguments})" if names else f"EXECUTE {name}",
+                       [params[parameter] for parameter in names])
+        with self._lock:
+            self.executes += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'connections': len(self._prepared),
+                    'statements': sum(len(names) for names in self._prepared.values()),
+                    'prepares': self.prepares, 'executes': self.executes}
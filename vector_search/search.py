@@ -0,0 +1,265 @@
+"""
+Similar product search over product vectors
+
+Two-stage query: the ANN index returns the top-K rows by cosine distance (overall and
+within the reference category, so a high category weight still sees same-category
+products), then the candidates are re-ranked with the blended score
+(1 - distance) * (1 - category_weight) + category_match * category_weight.
+exact=True scores every vectorised row, as the original full scan did.
+With a quantized index (halfvec / binary) the candidates are ordered by the compact
+representation, oversampled, and re-ranked by exact cosine distance on the full vectors.
+Vectors are read from companyproducts.vector or from the product_embeddings side table
+(storage.VectorSource).
+
+Hard filters (category, brand, on_order, withdrawn_from_range) restrict the rows
+before ranking; with a PrefilterPlanner (prefilter.py) a filtered search runs
+exactly on small filtered sets, on the partial index of a large category, or on the
+table index with oversampled candidates.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from oneC_etl.vector_search.index import candidate_count, distance_expression, search_settings
+from oneC_etl.vector_search.prefilter import PrefilterPlanner, filter_clause
+from oneC_etl.vector_search.prepared import PreparedStatements
+from oneC_etl.vector_search.storage import VectorSource
+
+RESULT_COLUMNS = ['id', 'description', 'brand', 'category', 'vector_distance', 'category_match', 'combined_score']
+
+def _fetch_dicts(cursor) -> List[Dict[str, Any]]:
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+def _run(conn, query: str, params: Dict[str, Any], settings: List[str],
+         prepared: Optional[PreparedStatements] = None) -> List[Dict[str, Any]]:
+    """Run query in its own transaction with SET LOCAL settings (as a prepared statement with prepared)"""
+    with conn:
+        with conn.cursor() as cur:
+            for statement in settings:
+                cur.execute(statement)
+            if prepared is not None:
+                prepared.execute(cur, query, params)
+            else:
+                cur.execute(query, params)
+            return _fetch_dicts(cur)
+
+def default_candidates(limit: int) -> int:
+    """ANN candidates per stage for a result of the given size"""
+    return max(limit * 10, 100)
+
+def plan_filters(conn, filters: Optional[Dict[str, Any]], planner: Optional[PrefilterPlanner], candidates: int,
+                 exact: bool, index: Optional[Dict[str, Any]]) -> Tuple[str, Dict[str, Any], bool, Optional[Dict[str, Any]], int]:
+    """
+    Filter clause and execution choice of a filtered search
+
+    Args:
+        conn: DBAPI (psycopg2) connection
+        filters (dict): Column -> value or list of values
+        planner (PrefilterPlanner): Planner (None - filters applied to the table index candidates as is)
+        candidates (int): ANN candidates of the unfiltered search
+        exact (bool): Exact search requested by the caller
+        index (dict): Table index description
+
+    Returns:
+        Tuple: ("AND ..." clause, its parameters, exact, index to order by, ANN candidates)
+    """
+    filter_sql, params = filter_clause(filters)
+    if not filter_sql or planner is None or exact:
+        return filter_sql, params, exact, index, candidates
+    plan = planner.plan(conn, filters, candidates)
+    if plan['strategy'] == 'exact':
+        return filter_sql, params, True, None, candidates
+    if plan['strategy'] == 'partial_index':
+        # Категория - литералом: предикат частичного индекса доказывается и в подготовленном операторе
+        filter_sql, params = filter_clause(filters, literal_columns=('category',))
+        index = plan['index']
+    return filter_sql, params, False, index, candidates * plan['oversample']
+
+def nearest_products(conn, product_id: str, k: int = 10, exact: bool = False,
+                     index: Optional[Dict[str, Any]] = None, table: str = 'companyproducts',
+                     source: Optional[VectorSource] = None) -> List[Dict[str, Any]]:
+    """
+    Top-K products by cosine distance to the reference product
+
+    Args:
+        conn: DBAPI (psycopg2) connection
+        product_id (str): Reference product UUID
+        k (int): Number of neighbours
+        exact (bool): Disable index scans (exact ordering over all rows)
+        index (dict): Current index description for search settings (VectorIndexManager.get_index)
+        table (str): Products table
+        source (VectorSource): Vector storage (default: vector_storage from config)
+
+    Returns:
+        List[dict]: {'id', 'vector_distance'} ordered by distance
+    """
+    source = source or VectorSource(table)
+    ref = f"SELECT {source.vector} AS vector FROM {source.from_clause} WHERE p.id = %(product_id)s AND {source.vectorised}"
+    if exact:
+        query = f"""
+            WITH ref AS MATERIALIZED ({ref})
+            SELECT p.id, {source.vector} <=> (SELECT vector FROM ref) AS vector_distance
+            FROM {source.from_clause}
+            WHERE {source.vectorised} AND p.id <> %(product_id)s
+            ORDER BY {source.vector} <=> (SELECT vector FROM ref)
+            LIMIT %(k)s
+        """
+        return _run(conn, query, {'product_id': product_id, 'k': k}, ["SET LOCAL enable_indexscan = off"])
+
+    # ORDER BY по самому выражению расстояния (как в индексе) - так планировщик может использовать индекс
+    candidates = candidate_count(k, index)
+    query = f"""
+        WITH ref AS MATERIALIZED ({ref}),
+        candidates AS (
+            SELECT p.id, {source.vector} AS vector
+            FROM {source.from_clause}
+            WHERE {source.vectorised} AND p.id <> %(product_id)s
+            ORDER BY {distance_expression(source.vector, '(SELECT vector FROM ref)', index)}
+            LIMIT %(candidates)s
+        )
+        SELECT id, vector <=> (SELECT vector FROM ref) AS vector_distance
+        FROM candidates
+        ORDER BY vector_distance
+        LIMIT %(k)s
+    """
+    params = {'product_id': product_id, 'k': k, 'candidates': candidates}
+    return _run(conn, query, params, search_settings(candidates + 1, index))
+
+def find_similar_products(conn, product_id: str, limit: int = 4, exclude_same_brand: bool = False,
+                          category_weight: float = 1.0, candidates: Optional[int] = None, exact: bool = False,
+                          index: Optional[Dict[str, Any]] = None, table: str = 'companyproducts',
+                          source: Optional[VectorSource] = None, filters: Optional[Dict[str, Any]] = None,
+                          same_category: bool = False, planner: Optional[PrefilterPlanner] = None,
+                          prepared: Optional[PreparedStatements] = None) -> List[Dict[str, Any]]:
+    """
+    Find similar products with weighted category similarity
+
+    Args:
+        conn: DBAPI (psycopg2) connection
+        product_id (str): Reference product UUID
+        limit (int): Number of similar products to return
+        exclude_same_brand (bool): Exclude products of the reference brand
+        category_weight (float): Weight of category match in the combined score (0.0 - 1.0)
+        candidates (int): ANN candidates per stage (default: max(limit * 10, 100))
+        exact (bool): Score every vectorised row instead of the ANN candidates
+        index (dict): Current index description for search settings (VectorIndexManager.get_index)
+        table (str): Products table
+        source (VectorSource): Vector storage (default: vector_storage from config)
+        filters (dict): Hard filters: category, brand, on_order, withdrawn_from_range -> value or list of values
+        same_category (bool): Only products of the reference category (a category filter)
+        planner (PrefilterPlanner): Chooses exact search / partial index / table index for filtered searches
+        prepared (PreparedStatements): Run the queries as prepared statements (long-lived pooled connections)
+
+    Returns:
+        List[dict]: Rows with RESULT_COLUMNS ordered by combined_score
+    """
+    source = source or VectorSource(table)
+    filters = dict(filters or {})
+    if same_category:
+        # Категория эталона подставляется значением, чтобы запрос мог использовать частичный индекс категории
+        reference = _run(conn, f"SELECT p.category FROM {source.from_clause} WHERE p.id = %(product_id)s",
+                         {'product_id': product_id}, [], prepared)
+        if not reference:
+            return []
+        filters['category'] = reference[0]['category']
+    candidates = candidates or default_candidates(limit)
+    filter_sql, params, exact, index, candidates = plan_filters(conn, filters, planner, candidates, exact, index)
+
+    brand_filter = "AND p.brand IS DISTINCT FROM (SELECT brand FROM ref)" if exclude_same_brand else ""
+    params.update({'product_id': product_id, 'limit': limit, 'category_weight': category_weight})
+    ref = f"""
+        SELECT p.id, p.brand, p.category, {source.vector} AS vector
+        FROM {source.from_clause}
+        WHERE p.id = %(product_id)s AND {source.vectorised}
+    """
+
+    if exact:
+        query = f"""
+            WITH ref AS MATERIALIZED ({ref})
+            SELECT p.id, p.description, p.brand, p.category,
+                   {source.vector} <=> (SELECT vector FROM ref) AS vector_distance,
+                   CASE WHEN p.category = (SELECT category FROM ref) THEN 1.0 ELSE 0.0 END AS category_match
+            FROM {source.from_clause}
+            WHERE {source.vectorised} AND p.id <> %(product_id)s {brand_filter}{filter_sql}
+        """
+        settings = ["SET LOCAL enable_indexscan = off"]
+    else:
+        params['candidates'] = candidate_count(candidates, index)
+        order = distance_expression(source.vector, '(SELECT vector FROM ref)', index)
+        # Вторая выборка кандидатов - внутри категории эталона: при большом category_weight
+        # товары той же категории выигрывают у более близких по вектору из других категорий.
+        # С фильтром по категории она не нужна
+        same_category_candidates = "" if 'category' in filters else f"""
+                UNION
+                (SELECT p.id FROM {source.from_clause}
+                 WHERE {source.vectorised} AND p.id <> %(product_id)s {brand_filter}{filter_sql}
+                 AND p.category = (SELECT category FROM ref) AND %(category_weight)s::float8 > 0
+                 ORDER BY {order}
+                 LIMIT %(candidates)s)"""
+        query = f"""
+            WITH ref AS MATERIALIZED ({ref}),
+            candidates AS (
+                (SELECT p.id FROM {source.from_clause}
+                 WHERE {source.vectorised} AND p.id <> %(product_id)s {brand_filter}{filter_sql}
+                 ORDER BY {order}
+                 LIMIT %(candidates)s){same_category_candidates}
+            )
+            SELECT p.id, p.description, p.brand, p.category,
+                   {source.vector} <=> (SELECT vector FROM ref) AS vector_distance,
+                   CASE WHEN p.category = (SELECT category FROM ref) THEN 1.0 ELSE 0.0 END AS category_match
+            FROM {source.from_clause}
+            JOIN candidates c ON c.id = p.id
+        """
+        settings = search_settings(params['candidates'], index)
+
+    query = f"""
+        SELECT *, (1 - vector_distance) * (1 - %(category_weight)s::float8) + category_match * %(category_weight)s::float8 AS combined_score
+        FROM ({query}) scored
+        ORDER BY combined_score DESC, vector_distance
+        LIMIT %(limit)s
+    """
+    return _run(conn, query, params, settings, prepared)
+
+def nearest_to_vector(conn, vector, k: int = 10, exact: bool = False, index: Optional[Dict[str, Any]] = None,
+                      table: str = 'companyproducts', source: Optional[VectorSource] = None,
+                      filters: Optional[Dict[str, Any]] = None,
+                      planner: Optional[PrefilterPlanner] = None) -> List[Dict[str, Any]]:
+    """
+    Top-K products by cosine distance to a query vector (e.g. an embedded search text)
+
+    Args:
+        conn: DBAPI (psycopg2) connection
+        vector (Sequence[float]): Query vector
+        k (int): Number of products
+        exact (bool): Disable index scans (exact ordering over all rows)
+        index (dict): Current index description for search settings (VectorIndexManager.get_index)
+        table (str): Products table
+        source (VectorSource): Vector storage (default: vector_storage from config)
+        filters (dict): Hard filters: category, brand, on_order, withdrawn_from_range -> value or list of values
+        planner (PrefilterPlanner): Chooses exact search / partial index / table index for filtered searches
+
+    Returns:
+        List[dict]: {'id', 'item_number', 'description', 'brand', 'category', 'vector_distance'} ordered by distance
+    """
+    source = source or VectorSource(table)
+    filter_sql, params, exact, index, candidates = plan_filters(conn, filters, planner, k, exact, index)
+    candidates = k if exact else candidate_count(candidates, index)
+    if exact:
+        order = f"{source.vector} <=> %(vector)s::vector"
+    else:
+        order = distance_expression(source.vector, '%(vector)s::vector', index)
+    query = f"""
+        WITH candidates AS (
+            SELECT p.id, p.item_number, p.description, p.brand, p.category, {source.vector} AS vector
+            FROM {source.from_clause}
+            WHERE {source.vectorised}{filter_sql}
+            ORDER BY {order}
+            LIMIT %(candidates)s
+        )
+        SELECT id, item_number, description, brand, category, vector <=> %(vector)s::vector AS vector_distance
+        FROM candidates
+        ORDER BY vector_distance
+        LIMIT %(k)s
+    """
+    params.update({'vector': '[' + ','.join(repr(float(x)) for x in vector) + ']', 'k': k, 'candidates': candidates})
+    settings = ["SET LOCAL enable_indexscan = off"] if exact else search_settings(candidates, index)
+    return _run(conn, query, params, settings)
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Product search HTTP service
+
+A long-running replacement of the interactive vector_search_test.py loop: one
+process keeps the engine connection pool, prepared statements on the pooled
+connections (prepared.py), the filter planner statistics (prefilter.py) and the
+query embedding cache warm between requests. JSON endpoints:
+
+    GET /products?q=<text>&limit=10&vectorised=1           - description / item number search
+    GET /similar?id=<uuid>&limit=4&category_weight=1&exclude_same_brand=0&same_category=0
+                &category=..&brand=..&on_order=..&withdrawn_from_range=..&exact=0
+                                                            - similar products (filters may repeat)
+    GET /search?q=<text>&limit=10&lexical_weight=1&vector_weight=1 - hybrid search
+    GET /health                                             - pool, caches and prepared statements
+
+Example:
+    python -m oneC_etl.vector_search.service --port 8780
+    curl 'http://127.0.0.1:8780/products?q=смеситель&limit=5'
+    curl 'http://127.0.0.1:8780/similar?id=<uuid>&same_category=1'
+    python -m oneC_etl.benchmarks.search_load --url http://127.0.0.1:8780 --concurrency 16 --duration 30
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+from loguru import logger
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.vector_search.hybrid import HybridSearcher
+from oneC_etl.vector_search.prefilter import FILTER_COLUMNS, PrefilterPlanner
+from oneC_etl.vector_search.prepared import PreparedStatements
+from oneC_etl.vector_search.search import find_similar_products
+from oneC_etl.vector_search.text_search import search_products
+
+BOOLEAN_FILTERS = ('on_order', 'withdrawn_from_range')
+
+def parse_bool(value: str) -> bool:
+    """Query string flag: 1/true/yes/y or 0/false/no/n"""
+    lowered = value.strip().lower()
+    if lowered in ('1', 'true', 'yes', 'y'):
+        return True
+    if lowered in ('0', 'false', 'no', 'n', ''):
+        return False
+    raise ValueError(f"Invalid flag value: {value}")
+
+class SearchService:
+    """Search endpoints sharing one connection pool"""
+
+    def __init__(self, client: Optional[PostgresClient] = None, searcher: Optional[HybridSearcher] = None,
+                 table: str = 'companyproducts', text_method: Optional[str] = None, prepare: bool = True):
+        """
+        Initialize service
+
+        Args:
+            client (PostgresClient): Optional initialized client (its engine pool serves all requests)
+            searcher (HybridSearcher): Hybrid searcher for /search (default: HybridSearcher on the same client)
+            table (str): Products table
+            text_method (str): Lexical method, 'trgm' or 'fts' (default: text_search_method from config)
+            prepare (bool): Run description and similar-products queries as prepared statements
+        """
+        self.client = client or (searcher.client if searcher is not None else PostgresClient())
+        self.searcher = searcher or HybridSearcher(self.client, table=table, text_method=text_method)
+        self.table = table
+        self.text_method = text_method
+        self.source = self.searcher.source
+        self.planner = PrefilterPlanner(self.source)
+        self.prepared = PreparedStatements(self.client.engine) if prepare else None
+        self.index = None
+        self._index_checked = 0.0
+        self._index_lock = threading.Lock()
+
+    def close(self) -> None:
+        """Stop hybrid search threads and close pooled connections"""
+        self.searcher.close()
+
+    def _with_connection(self, func):
+        """Run func with a DBAPI connection borrowed from the engine pool"""
+        connection = self.client.engine.raw_connection()
+        try:
+            return func(connection.connection)
+        finally:
+            connection.close()
+
+    def _current_index(self) -> Optional[Dict[str, Any]]:
+        """ANN index description for search settings, re-read at most once a minute"""
+        with self._index_lock:
+            if time.monotonic() - self._index_checked > 60:
+                self.index = self.source.index_manager(self.client).get_index()
+                self._index_checked = time.monotonic()
+            return self.index
+
+    def products(self, text: str, limit: int = 10, vectorised_only: bool = False) -> Dict[str, Any]:
+        """
+        Products matching text in description or item number
+
+        Args:
+            text (str): Search text
+            limit (int): Number of products to return
+            vectorised_only (bool): Only products with a vector (candidates for /similar)
+
+        Returns:
+            dict: {'query', 'results' (TEXT_RESULT_COLUMNS rows), 'total_ms'}
+        """
+        started = time.perf_counter()
+        results = self._with_connection(lambda conn: search_products(
+            conn, text, limit, method=self.text_method, vectorised_only=vectorised_only, table=self.table,
+            prepared=self.prepared))
+        return {'query': text.strip(), 'results': results, 'total_ms': round((time.perf_counter() - started) * 1000, 2)}
+
+    def similar(self, product_id: str, limit: int = 4, exclude_same_brand: bool = False, category_weight: float = 1.0,
+                same_category: bool = False, filters: Optional[Dict[str, Any]] = None,
+                exact: bool = False) -> Dict[str, Any]:
+        """
+        Similar products of a reference product
+
+        Args:
+            product_id (str): Reference product UUID
+            limit (int): Number of products to return
+            exclude_same_brand (bool): Exclude products of the reference brand
+            category_weight (float): Weight of category match in the combined score (0.0 - 1.0)
+            same_category (bool): Only products of the reference category
+            filters (dict): Hard filters: category, brand, on_order, withdrawn_from_range
+            exact (bool): Exact search instead of the ANN index
+
+        Returns:
+            dict: {'id', 'results' (RESULT_COLUMNS rows), 'total_ms'}
+        """
+        started = time.perf_counter()
+        index = self._current_index()
+        results = self._with_connection(lambda conn: find_similar_products(
+            conn, product_id, limit, exclude_same_brand, category_weight, exact=exact, index=index,
+            source=self.source, filters=filters, same_category=same_category, planner=self.planner,
+            prepared=self.prepared))
+        return {'id': product_id, 'results': results, 'total_ms': round((time.perf_counter() - started) * 1000, 2)}
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            'status': 'ok',
+            'pool': self.client.engine.pool.status(),
+            'query_cache': self.searcher.cache.stats(),
+            'prepared': self.prepared.stats() if self.prepared is not None else None,
+        }
+
+def _similar_params(params: Dict[str, List[str]]) -> Dict[str, Any]:
+    """Arguments of SearchService.similar from query string values"""
+    first = {name: values[0] for name, values in params.items()}
+    filters = {}
+    for column in FILTER_COLUMNS:
+        if column in params:
+            values = [parse_bool(value) for value in params[column]] if column in BOOLEAN_FILTERS else params[column]
+            filters[column] = values[0] if len(values) == 1 else values
+    category_weight = float(first.get('category_weight', 1.0))
+    if not 0 <= category_weight <= 1:
+        raise ValueError("category_weight must be between 0 and 1")
+    return {
+        'product_id': first['id'],
+        'limit': int(first.get('limit', 4)),
+        'exclude_same_brand': parse_bool(first.get('exclude_same_brand', '0')),
+        'category_weight': category_weight,
+        'same_category': parse_bool(first.get('same_category', '0')),
+        'filters': filters,
+        'exact': parse_bool(first.get('exact', '0')),
+    }
+
+def make_handler(service: SearchService):
+    """
+    Create request handler class bound to a service
+
+    Args:
+        service (SearchService): Shared service
+
+    Returns:
+        type: BaseHTTPRequestHandler subclass
+    """
+    class SearchHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Заголовки и тело уходят отдельными записями: без TCP_NODELAY keep-alive ответ ждёт отложенный ACK (~40 мс)
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            # Запросы логируются в do_GET с длительностью, стандартный лог не нужен
+            pass
+
+        def _send_json(self, status: int, body) -> None:
+            payload = json.dumps(body, ensure_ascii=False, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = parse_qs(url.query)
+            first = {name: values[0] for name, values in params.items()}
+
+            if url.path == "/health":
+                self._send_json(200, service.health())
+                return
+
+            try:
+                if url.path == "/search":
+                    call = lambda: service.searcher.search(
+                        first['q'], int(first.get('limit', 10)), float(first.get('lexical_weight', 1.0)),
+                        float(first.get('vector_weight', 1.0)))
+                elif url.path == "/products":
+                    text, limit = first['q'], int(first.get('limit', 10))
+                    vectorised_only = parse_bool(first.get('vectorised', '0'))
+                    call = lambda: service.products(text, limit, vectorised_only)
+                elif url.path == "/similar":
+                    arguments = _similar_params(params)
+                    call = lambda: service.similar(**arguments)
+                else:
+                    self._send_json(404, {'error': f"Unknown path {url.path}"})
+                    return
+            except (KeyError, ValueError) as e:
+                self._send_json(400, {'error': f"Invalid parameters: {str(e)}"})
+                return
+
+            try:
+                response = call()
+            except ValueError as e:
+                self._send_json(400, {'error': str(e)})
+                return
+            except Exception as e:
+                logger.error(f"❌ Ошибка запроса {url.path}?{url.query}: {str(e)}")
+                self._send_json(500, {'error': str(e)})
+                return
+            logger.debug(f"🔎 {url.path}?{url.query}: {len(response['results'])} товаров за {response['total_ms']} мс")
+            self._send_json(200, response)
+
+    return SearchHandler
+
+def start_service(service: Optional[SearchService] = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Start search service in a background thread
+
+    Args:
+        service (SearchService): Shared service (default: SearchService())
+        host (str): Interface to bind
+        port (int): Port to bind, 0 for a free port
+
+    Returns:
+        Tuple[ThreadingHTTPServer, SearchService]: Running server and its service;
+            stop with server.shutdown() and service.close()
+    """
+    service = service or SearchService()
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, service
+
+def main():
+    """Run search service from command line"""
+    parser = argparse.ArgumentParser(description="Product search HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--table", default='companyproducts')
+    parser.add_argument("--candidates", type=int, default=50, help="Results per ranking before fusion")
+    parser.add_argument("--text-method", choices=['trgm', 'fts'], default=None)
+    parser.add_argument("--cache-size", type=int, default=1024, help="Query embeddings kept in memory")
+    parser.add_argument("--cache-table", default='embedding_cache', help="Embedding cache table ('' - none)")
+    parser.add_argument("--no-prepare", action='store_true', help="Send query texts instead of prepared statements")
+    args = parser.parse_args()
+
+    searcher = HybridSearcher(table=args.table, candidates=args.candidates, text_method=args.text_method,
+                              cache_size=args.cache_size, cache_table=args.cache_table or None)
+    service = SearchService(searcher=searcher, table=args.table, text_method=args.text_method,
+                            prepare=not args.no_prepare)
+    server, _ = start_service(service, args.host, args.port)
+    print(f"Search service listening on http://{args.host}:{server.server_address[1]}")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        service.close()
+        sys.exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Where product vectors are stored
+
+    inline     - companyproducts.vector next to the business columns; is_vector marks
+                 rows whose vector matches the current text (reset by the MERGE)
+    side_table - narrow product_embeddings(product_id, model, vector, text_hash) table
+                 (database/sql/create_product_embeddings_table.sql) joined at search time
+
+With the side table a MERGE of business columns never touches vector storage and
+writing vectors never rewrites product rows. A vector is current while its text_hash
+equals the hash of the product's merged text; a product whose text changed keeps
+its previous vector in search until it is re-embedded.
+
+VectorSource gives the search, embedding and export queries the FROM clause and
+column expressions for the configured storage (products are aliased p, embeddings e).
+"""
+
+from typing import Optional
+from oneC_etl.config.settings import get_config
+
+VECTOR_STORAGES = ('inline', 'side_table')
+
+DEFAULT_EMBEDDINGS_TABLE = 'product_embeddings'
+
+class VectorSource:
+    """SQL fragments reading product vectors from the configured storage"""
+
+    def __init__(self, products_table: str = 'companyproducts', storage: Optional[str] = None,
+                 embeddings_table: str = DEFAULT_EMBEDDINGS_TABLE, model: Optional[str] = None):
+        """
+        Initialize source
+
+        Args:
+            products_table (str): Products table
+            storage (str): 'inline' or 'side_table' (default: vector_storage from config)
+            embeddings_table (str): Side table with vectors
+            model (str): Embedding model of the side table rows (default: vector_model from config)
+        """
+        storage = storage or get_config()['vector_storage']
+        if storage not in VECTOR_STORAGES:
+            raise ValueError(f"Unknown vector storage: {storage}")
+        self.products_table = products_table
+        self.storage = storage
+        self.embeddings_table = embeddings_table
+        self.model = model or (get_config()['vector_model'] if storage == 'side_table' else None)
+
+    @property
+    def side_table(self) -> bool:
+        return self.storage == 'side_table'
+
+    @property
+    def model_literal(self) -> str:
+        return "'" + self.model.replace("'", "''") + "'"
+
+    @property
+    def model_filter(self) -> str:
+        """Side table predicate selecting the model (also the partial index predicate)"""
+        return f"model = {self.model_literal}"
+
+    @property
+    def from_clause(self) -> str:
+        """Products with their vectors"""
+        if self.side_table:
+            return (f"{self.products_table} p JOIN {self.embeddings_table} e "
+                    f"ON e.product_id = p.id AND e.{self.model_filter}")
+        return f"{self.products_table} p"
+
+    @property
+    def vector(self) -> str:
+        return "e.vector" if self.side_table else "p.vector"
+
+    @property
+    def vectorised(self) -> str:
+        """Predicate of rows with a searchable vector (the join already filters the side table)"""
+        return "e.vector IS NOT NULL" if self.side_table else "p.is_vector = true"
+
+    @property
+    def updated_at(self) -> str:
+        """Last change of the product row or of its vector"""
+        return "GREATEST(p.updated_at, e.updated_at)" if self.side_table else "p.updated_at"
+
+    def vectorised_filter(self, products: str) -> str:
+        """
+        Predicate on an unjoined products table reference: the product has a searchable vector
+
+        Args:
+            products (str): Table name or alias in the query
+        """
+        if self.side_table:
+            return (f"EXISTS (SELECT 1 FROM {self.embeddings_table} e "
+                    f"WHERE e.product_id = {products}.id AND e.{self.model_filter})")
+        return f"{products}.is_vector = true"
+
+    def index_manager(self, client=None):
+        """VectorIndexManager for the table holding the vectors"""
+        from oneC_etl.vector_search.index import VectorIndexManager
+
+        if self.side_table:
+            return VectorIndexManager(client, self.embeddings_table, predicate=self.model_filter)
+        return VectorIndexManager(client, self.products_table)
@@ -0,0 +1,233 @@
+"""
+Product lookup by description and item_number
+
+ILIKE '%text%' cannot use a btree index and scans companyproducts on every search.
+This module maintains GIN indexes for two indexed search methods and ranks matches:
+
+    trgm - pg_trgm trigram indexes on description and item_number; matches words of
+           the description similar to the query (substrings, typos) and similar item
+           numbers, ranked by word_similarity / similarity
+    fts  - expression index on the Russian tsvector of description and item_number;
+           matches all query words (prefix match, Russian stemming), ranked by ts_rank_cd
+
+The tsvector is an expression index rather than a stored column, so companyproducts
+keeps the structure synchronised from Power BI.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from oneC_etl.config.settings import get_config
+from oneC_etl.services.postgres.client import PostgresClient
+from oneC_etl.vector_search.index import execute_autocommit
+from oneC_etl.vector_search.search import _run
+from oneC_etl.vector_search.storage import VectorSource
+
+TEXT_SEARCH_METHODS = ('trgm', 'fts')
+
+TEXT_RESULT_COLUMNS = ['id', 'item_number', 'description', 'brand', 'category', 'score']
+
+TSVECTOR_EXPRESSION = "to_tsvector('russian', coalesce(description, '') || ' ' || coalesce(item_number, ''))"
+
+# Порог word_similarity по умолчанию в pg_trgm - 0.6: слово описания должно совпадать с запросом на 60% триграмм
+DEFAULT_WORD_SIMILARITY_THRESHOLD = 0.6
+
+def _index_definitions(table: str) -> Dict[str, List[Dict[str, str]]]:
+    return {
+        'trgm': [
+            {'name': f"idx_{table}_description_trgm", 'using': "gin (description gin_trgm_ops)"},
+            {'name': f"idx_{table}_item_number_trgm", 'using': "gin (item_number gin_trgm_ops)"},
+        ],
+        'fts': [
+            {'name': f"idx_{table}_search_tsv", 'using': f"gin ({TSVECTOR_EXPRESSION})"},
+        ],
+    }
+
+def _escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def prefix_tsquery(text: str) -> Optional[str]:
+    """
+    to_tsquery input matching all words of text as prefixes
+
+    Args:
+        text (str): User query
+
+    Returns:
+        str: "word1:* & word2:*" or None if text has no words
+    """
+    words = re.findall(r'\w+', text)
+    return ' & '.join(f"{word}:*" for word in words) if words else None
+
+class TextSearchIndexManager:
+    """Creates the GIN indexes used by search_products"""
+
+    def __init__(self, client: Optional[PostgresClient] = None, table: str = 'companyproducts'):
+        """
+        Initialize manager
+
+        Args:
+            client (PostgresClient): Optional initialized client
+            table (str): Products table
+        """
+        self.client = client or PostgresClient()
+        self.table = table
+
+    def get_indexes(self) -> Dict[str, bool]:
+        """
+        Get indexes of the table
+
+        Returns:
+            Dict[str, bool]: Index name -> valid (False after an interrupted concurrent build)
+        """
+        rows = self.client.execute_query(f"""
+            SELECT c.relname AS name, i.indisvalid AS valid
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = '{self.table}'::regclass
+        """)
+        return {row['name']: row['valid'] for row in rows}
+
+    def ensure_indexes(self, methods: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Create missing or invalid search indexes concurrently
+
+        Args:
+            methods (List[str]): Methods to index (default: text_search_method from config)
+
+        Returns:
+            dict: {'status': 'created'/'unchanged', 'created': [...], 'indexes': [...]}
+        """
+        methods = methods or [get_config()['text_search_method']]
+        unknown = set(methods) - set(TEXT_SEARCH_METHODS)
+        if unknown:
+            raise ValueError(f"Unknown text search methods: {sorted(unknown)}")
+
+        if 'trgm' in methods:
+            execute_autocommit(self.client, "CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+        existing = self.get_indexes()
+        definitions = _index_definitions(self.table)
+        created = []
+        for method in methods:
+            for index in definitions[method]:
+                if existing.get(index['name']):
+                    continue
+                logger.info(f"🏗️ Построение индекса поиска {index['name']} ({method})")
+                # Невалидный индекс остаётся после прерванного CREATE INDEX CONCURRENTLY
+                execute_autocommit(
+                    self.client,
+                    f"DROP INDEX CONCURRENTLY IF EXISTS {index['name']}",
+                    f"CREATE INDEX CONCURRENTLY {index['name']} ON {self.table} USING {index['using']}",
+                )
+                created.append(index['name'])
+
+        if created:
+            execute_autocommit(self.client, f"ANALYZE {self.table}")
+            logger.info(f"✅ Индексы поиска созданы: {', '.join(created)}")
+        else:
+            logger.info(f"✅ Индексы поиска ({', '.join(methods)}) на {self.table} актуальны")
+        return {
+            'status': 'created' if created else 'unchanged',
+            'created': created,
+            'indexes': [index['name'] for method in methods for index in definitions[method]],
+        }
+
+def build_search_query(text: str, limit: int = 10, method: Optional[str] = None, vectorised_only: bool = False,
+                       threshold: Optional[float] = None,
+                       table: str = 'companyproducts') -> Optional[Tuple[str, Dict[str, Any], List[str]]]:
+    """
+    Query, parameters and SET LOCAL settings of search_products
+
+    Returns:
+        Optional[Tuple[str, dict, List[str]]]: None if text has nothing to search for
+    """
+    method = method or get_config()['text_search_method']
+    text = text.strip()
+    if not text:
+        return None
+    vector_filter = f"AND {VectorSource(table).vectorised_filter(table)}" if vectorised_only else ""
+
+    if method == 'trgm':
+        # <% и ILIKE по триграммам используют GIN индексы; порог задаётся на время запроса
+        threshold = DEFAULT_WORD_SIMILARITY_THRESHOLD if threshold is None else threshold
+        query = f"""
+            SELECT id, item_number, description, brand, category,
+                   GREATEST(word_similarity(%(text)s, coalesce(description, '')),
+                            similarity(%(text)s, coalesce(item_number, ''))) AS score
+            FROM {table}
+            WHERE (%(text)s <%% description OR item_number ILIKE %(prefix)s) {vector_filter}
+            ORDER BY score DESC, id
+            LIMIT %(limit)s
+        """
+        params = {'text': text, 'prefix': _escape_like(text) + '%', 'limit': limit}
+        settings = [f"SET LOCAL pg_trgm.word_similarity_threshold = {float(threshold)}"]
+    elif method == 'fts':
+        tsquery = prefix_tsquery(text)
+        if tsquery is None:
+            return None
+        # Выражение совпадает с выражением индекса - иначе планировщик не использует индекс
+        query = f"""
+            SELECT id, item_number, description, brand, category,
+                   ts_rank_cd({TSVECTOR_EXPRESSION}, to_tsquery('russian', %(tsquery)s)) AS score
+            FROM {table}
+            WHERE {TSVECTOR_EXPRESSION} @@ to_tsquery('russian', %(tsquery)s) {vector_filter}
+            ORDER BY score DESC, id
+            LIMIT %(limit)s
+        """
+        params = {'tsquery': tsquery, 'limit': limit}
+        settings = []
+    else:
+        raise ValueError(f"Unknown text search method: {method}")
+    return query, params, settings
+
+def search_products(conn, text: str, limit: int = 10, method: Optional[str] = None,
+                    vectorised_only: bool = False, threshold: Optional[float] = None,
+                    table: str = 'companyproducts', prepared=None) -> List[Dict[str, Any]]:
+    """
+    Products matching text in description or item_number, best matches first
+
+    Args:
+        conn: DBAPI (psycopg2) connection
+        text (str): User query
+        limit (int): Number of products to return
+        method (str): 'trgm' or 'fts' (default: text_search_method from config)
+        vectorised_only (bool): Only products with a searchable vector
+        threshold (float): trgm word similarity threshold (default 0.6)
+        table (str): Products table
+        prepared (PreparedStatements): Run the query as a prepared statement (long-lived pooled connections)
+
+    Returns:
+        List[dict]: Rows with TEXT_RESULT_COLUMNS ordered by score
+    """
+    built = build_search_query(text, limit, method, vectorised_only, threshold, table)
+    return _run(conn, *built, prepared) if built else []
+
+def build_ilike_query(text: str, limit: int = 10, vectorised_only: bool = False,
+                      table: str = 'companyproducts') -> Tuple[str, Dict[str, Any], List[str]]:
+    """Query, parameters and settings of ilike_products"""
+    vector_filter = f"AND {VectorSource(table).vectorised_filter(table)}" if vectorised_only else ""
+    query = f"""
+        SELECT id, item_number, description, brand, category, NULL::real AS score
+        FROM {table}
+        WHERE description ILIKE %(pattern)s {vector_filter}
+        LIMIT %(limit)s
+    """
+    return query, {'pattern': f"%{_escape_like(text.strip())}%", 'limit': limit}, []
+
+def ilike_products(conn, text: str, limit: int = 10, vectorised_only: bool = False,
+                   table: str = 'companyproducts') -> List[Dict[str, Any]]:
+    """
+    Unranked description ILIKE '%text%' lookup (sequential scan), kept as the benchmark baseline
+
+    Args:
+        conn: DBAPI (psycopg2) connection
+        text (str): User query
+        limit (int): Number of products to return
+        vectorised_only (bool): Only products with a searchable vector
+        table (str): Products table
+
+    Returns:
+        List[dict]: Rows with TEXT_RESULT_COLUMNS (score is NULL)
+    """
+    return _run(conn, *build_ilike_query(text, limit, vectorised_only, table))
@@ -3,6 +3,9 @@ import psycopg2
 import numpy as np
 from dotenv import load_dotenv
 from pgvector.psycopg2 import register_vector
+from oneC_etl.vector_search.search import RESULT_COLUMNS, find_similar_products as search_similar_products
+from oneC_etl.vector_search.storage import VectorSource
+from oneC_etl.vector_search.text_search import search_products
 
 # Load environment variables
 load_dotenv()
@@ -18,48 +21,41 @@ db_params = {
 
 def find_products_by_description(conn, search_text, limit=5):
     """
-    Find products by text description using LIKE query
+    Find products by text description or item number, best matches first
     Args:
         conn: database connection
-        search_text: text to search for in description
+        search_text: text to search for in description or item number
         limit: number of products to return
     """
-    with conn.cursor() as cur:
-        # Search for products with similar description
-        cur.execute('''
-            SELECT id, description, brand, category
-            FROM companyproducts
-            WHERE description ILIKE %s
-            AND is_vector = true
-            LIMIT %s;
-        ''', (f'%{search_text}%', limit))
+    # Индексный поиск (pg_trgm / tsvector) вместо сканирования таблицы по ILIKE
+    results = search_products(conn, search_text, limit=limit, vectorised_only=True)
+    if not results:
+        print(f"No products found matching '{search_text}'")
+        return None
         
-        results = cur.fetchall()
-        if not results:
-            print(f"No products found matching '{search_text}'")
-            return None
-            
-        print(f"\nFound {len(results)} products matching '{search_text}':")
+    print(f"\nFound {len(results)} products matching '{search_text}':")
+    print("----------------------")
+    for i, row in enumerate(results, 1):
+        print(f"{i}. ID: {row['id']}")
+        print(f"   Item number: {row['item_number']}")
+        print(f"   Description: {row['description']}")
+        print(f"   Brand: {row['brand']}")
+        print(f"   Category: {row['category']}")
+        print(f"   Match: {row['score']:.2f}")
         print("----------------------")
-        for i, (id, description, brand, category) in enumerate(results, 1):
-            print(f"{i}. ID: {id}")
-            print(f"   Description: {description}")
-            print(f"   Brand: {brand}")
-            print(f"   Category: {category}")
-            print("----------------------")
-        
-        # If multiple products found, ask user to select one
-        if len(results) > 1:
-            while True:
-                try:
-                    choice = int(input("\nEnter the number of the product to find similar items (1-{}): ".format(len(results))))
-                    if 1 <= choice <= len(results):
-                        return results[choice-1][0]  # Return the selected product ID
-                    print("Invalid choice. Please try again.")
-                except ValueError:
-                    print("Please enter a valid number.")
-        else:
-            return results[0][0]  # Return the only product ID found
+    
+    # If multiple products found, ask user to select one
+    if len(results) > 1:
+        while True:
+            try:
+                choice = int(input("\nEnter the number of the product to find similar items (1-{}): ".format(len(results))))
+                if 1 <= choice <= len(results):
+                    return results[choice-1]['id']  # Return the selected product ID
+                print("Invalid choice. Please try again.")
+            except ValueError:
+                print("Please enter a valid number.")
+    else:
+        return results[0]['id']  # Return the only product ID found
 
 def find_similar_products(conn, product_id, limit=4, exclude_same_brand=False, category_weight=1.0):
     """
@@ -73,10 +69,11 @@ def find_similar_products(conn, product_id, limit=4, exclude_same_brand=False, c
     """
     with conn.cursor() as cur:
         # First, get the reference product details
-        cur.execute('''
-            SELECT id, description, brand, category, vector 
-            FROM companyproducts 
-            WHERE id = %s AND is_vector = true;
+        source = VectorSource()
+        cur.execute(f'''
+            SELECT p.id, p.description, p.brand, p.category, {source.vector}
+            FROM {source.from_clause}
+            WHERE p.id = %s AND {source.vectorised};
         ''', (product_id,))
         
         reference = cur.fetchone()
@@ -95,49 +92,12 @@ def find_similar_products(conn, product_id, limit=4, exclude_same_brand=False, c
         print("\nSimilar Products:")
         print("----------------------")
         
-        # Find similar products with weighted category similarity
-        query = '''
-            WITH similarity_scores AS (
-                SELECT 
-                    id,
-                    description,
-                    brand,
-                    category,
-                    vector <=> %s::vector as vector_distance,
-                    CASE 
-                        WHEN category = %s THEN 1.0
-                        ELSE 0.0
-                    END as category_match
-                FROM companyproducts
-                WHERE is_vector = true 
-                AND id != %s
-        '''
-        
-        if exclude_same_brand:
-            query += " AND brand != %s"
-            params = (ref_vector, ref_category, product_id, ref_brand)
-        else:
-            params = (ref_vector, ref_category, product_id)
-            
-        query += '''
-            )
-            SELECT 
-                id,
-                description,
-                brand,
-                category,
-                vector_distance,
-                category_match,
-                (1 - vector_distance) * (1 - %s) + category_match * %s as combined_score
-            FROM similarity_scores
-            ORDER BY combined_score DESC
-            LIMIT %s;
-        '''
-        
-        cur.execute(query, params + (category_weight, category_weight, limit))
-        
-        results = cur.fetchall()
-        for id, description, brand, category, vector_distance, category_match, combined_score in results:
+        # Two-stage search: ANN index candidates, then re-rank with category weight
+        results = search_similar_products(
+            conn, product_id, limit=limit, exclude_same_brand=exclude_same_brand, category_weight=category_weight
+        )
+        for row in results:
+            id, description, brand, category, vector_distance, category_match, combined_score = (row[c] for c in RESULT_COLUMNS)
             print(f"ID: {id}")
             print(f"Description: {description}")
             print(f"Brand: {brand}")